@@ -7,6 +7,7 @@ import json
 import os
 import sys
 import subprocess
+import zlib
 from lxml import etree
 from functools import wraps
 from flask import url_for, make_response
@@ -14,6 +15,10 @@ from flask_babel import lazy_gettext as _
 from io import BytesIO
 from util.flask_util import problem
 from util.problem_detail import ProblemDetail
+from util.request_timing import (
+    RequestTimer,
+    timed,
+)
 import traceback
 import logging
 from entrypoint import EntryPoint
@@ -27,6 +32,7 @@ from util.opds_writer import (
     OPDSMessage,
 )
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import joinedload
 from sqlalchemy.orm.session import Session
 from sqlalchemy.orm.exc import (
     NoResultFound,
@@ -36,7 +42,10 @@ from model import (
     get_one,
     Complaint,
     Identifier,
+    LicensePool,
     Patron,
+    replica_reads,
+    Work,
 )
 from cdn import cdnify
 from classifier import Classifier
@@ -148,15 +157,22 @@ def compressible(f):
             # fail. This is pure copy-and-paste magic.
             response.direct_passthrough = False
 
-            buffer = BytesIO()
-            gzipped = gzip.GzipFile(mode='wb', fileobj=buffer)
-            gzipped.write(response.data)
-            gzipped.close()
-            response.data = buffer.getvalue()
+            if response.is_streamed:
+                # Compress each piece of the response as it's sent,
+                # rather than waiting for the whole thing.
+                response.response = gzip_pieces(response.iter_encoded())
+                response.headers.pop('Content-Length', None)
+            else:
+                with timed(RequestTimer.GZIP):
+                    buffer = BytesIO()
+                    gzipped = gzip.GzipFile(mode='wb', fileobj=buffer)
+                    gzipped.write(response.data)
+                    gzipped.close()
+                    response.data = buffer.getvalue()
+                response.headers['Content-Length'] = len(response.data)
 
             response.headers['Content-Encoding'] = 'gzip'
             response.vary.add('Accept-Encoding')
-            response.headers['Content-Length'] = len(response.data)
 
             return response
 
@@ -164,6 +180,28 @@ def compressible(f):
     return compressor
 
 
+def gzip_pieces(pieces):
+    """Compress a streamed response body a piece at a time.
+
+    :param pieces: An iterable of bytestrings.
+    :yield: Bytestrings that together make up a gzip file.
+    """
+    # A window size of 16 + MAX_WBITS makes zlib write a gzip header
+    # and trailer.
+    compressor = zlib.compressobj(
+        zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+    )
+    for piece in pieces:
+        with timed(RequestTimer.GZIP):
+            compressed = compressor.compress(piece)
+            # Send whatever we have, so the client isn't kept waiting.
+            compressed += compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressed
+    with timed(RequestTimer.GZIP):
+        compressed = compressor.flush()
+    yield compressed
+
+
 class ErrorHandler(object):
     def __init__(self, app, debug=False):
         """Constructor.
@@ -260,6 +298,66 @@ class ErrorHandler(object):
         return response
 
 
+class RequestTimingHandler(object):
+    """Time the SQL statements, Elasticsearch requests, OPDS generation
+    and compression done while handling each request.
+
+    The results are sent to the client in a Server-Timing header, and
+    logged as structured data.
+    """
+
+    log = logging.getLogger("Request timing")
+
+    def __init__(self, app, slow_request_threshold=None):
+        """Constructor.
+
+        :param app: A flask.app object.
+        :param slow_request_threshold: If this is set, only requests
+           that take longer than this many seconds will be logged. By
+           default, the threshold comes from the site configuration;
+           if it's not configured there, every request is logged.
+        """
+        if slow_request_threshold is None:
+            slow_request_threshold = Configuration.slow_request_threshold()
+        self.slow_request_threshold = slow_request_threshold
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        app.teardown_request(self.teardown)
+
+    def start(self):
+        RequestTimer.start()
+
+    def finish(self, response):
+        """Add the Server-Timing header and log the timings."""
+        timer = RequestTimer.stop()
+        if timer is None:
+            return response
+        response.headers['Server-Timing'] = timer.server_timing_header()
+
+        elapsed = timer.elapsed
+        threshold = self.slow_request_threshold
+        if threshold is not None and elapsed < threshold:
+            return response
+        if threshold is None:
+            log_method = self.log.info
+        else:
+            log_method = self.log.warn
+        log_method(
+            "%s %s: %d in %.3fsec", flask.request.method,
+            flask.request.path, response.status_code, elapsed,
+            extra=dict(json_data=dict(
+                method=flask.request.method, path=flask.request.path,
+                status=response.status_code, timing=timer.as_dict(),
+            ))
+        )
+        return response
+
+    def teardown(self, exception=None):
+        # If the request ended without a response, the timer is still
+        # running. Make sure it's not used for the next request.
+        RequestTimer.stop()
+
+
 class HeartbeatController(object):
 
     HEALTH_CHECK_TYPE = 'application/vnd.health+json'
@@ -370,10 +468,34 @@ class URNLookupHandler(object):
         identifiers_by_urn, failures = Identifier.parse_urns(self._db, urns)
         self.add_urn_failure_messages(failures)
 
-        for urn, identifier in identifiers_by_urn.items():
-            self.process_identifier(identifier, urn, **process_urn_kwargs)
+        # Finding the Works for these Identifiers only requires
+        # reading from the database, so it can be done with a read
+        # replica.
+        with replica_reads(self._db):
+            self.load_works(identifiers_by_urn.values())
+            for urn, identifier in identifiers_by_urn.items():
+                self.process_identifier(identifier, urn, **process_urn_kwargs)
         self.post_lookup_hook()
 
+    def load_works(self, identifiers):
+        """Load the LicensePools, Works and presentation Editions for
+        a number of Identifiers with a single query.
+
+        Otherwise process_identifier(), and the OPDS feed built from
+        its results, would look them up one Identifier at a time. A
+        Work's cached OPDS entries are loaded along with the Work.
+        """
+        ids = [identifier.id for identifier in identifiers if identifier.id]
+        if not ids:
+            return
+        pools = joinedload(Identifier.licensed_through)
+        self._db.query(Identifier).filter(Identifier.id.in_(ids)).options(
+            pools.joinedload(LicensePool.presentation_edition),
+            pools.joinedload(LicensePool.work).joinedload(
+                Work.presentation_edition
+            ),
+        ).all()
+
     def add_urn_failure_messages(self, failures):
         for urn in failures:
             self.add_message(urn, 400, INVALID_URN.detail)
@@ -0,0 +1,48 @@
+# encoding: utf-8
+"""Benchmarks for performance-sensitive code.
+
+These aren't run as part of the test suite. Run a benchmark module
+directly from the directory that contains `core`, e.g.
+
+ python -m core.benchmarks.hasfulltablecache
+
+Each benchmark prints its results as JSON, so they can be compared
+between releases.
+"""
+import json
+import sys
+import time
+
+
+def time_operation(name, function, iterations, **extra):
+    """Call `function` `iterations` times and report how long it took.
+
+    :param extra: Additional information to include in the result.
+    :return: A dictionary suitable for passing into report().
+    """
+    start = time.time()
+    for i in xrange(iterations):
+        function()
+    elapsed = time.time() - start
+    return result(name, iterations, elapsed, **extra)
+
+
+def result(name, operations, elapsed, **extra):
+    """Describe the outcome of a benchmark as a dictionary."""
+    data = dict(
+        name=name,
+        operations=operations,
+        seconds=round(elapsed, 6),
+        operations_per_second=(
+            round(operations / elapsed, 2) if elapsed else None
+        ),
+    )
+    data.update(extra)
+    return data
+
+
+def report(results, out=None):
+    """Write a list of benchmark results to `out` as JSON."""
+    out = out or sys.stdout
+    json.dump(results, out, indent=2, sort_keys=True)
+    out.write("\n")
@@ -0,0 +1,139 @@
+# encoding: utf-8
+"""Compare the ways of applying many Metadata objects, the way an
+OPDS import does:
+
+* Metadata.edition() and Metadata.apply(), called once for each
+  Metadata, and
+* Metadata.bulk_apply(), which writes the rows the Metadata objects
+  need with one multi-row statement per table.
+
+Each Metadata has equivalent identifiers, subjects, measurements and
+circulation information. Both ways are run twice: once to import
+books that are new, and once to update them. They're run against
+different identifiers, so neither gets a head start from the other,
+and are checked to give the same answers.
+
+Everything happens in the test database (SIMPLIFIED_TEST_DATABASE),
+inside a transaction that is rolled back when the benchmark is done.
+"""
+import argparse
+import datetime
+import time
+
+from . import (
+    report,
+    result,
+)
+from .catalog import SyntheticCatalog
+from ..metadata_layer import (
+    CirculationData,
+    IdentifierData,
+    MeasurementData,
+    Metadata,
+    ReplacementPolicy,
+    SubjectData,
+)
+from ..model import (
+    DataSource,
+    Identifier,
+    Measurement,
+    Subject,
+)
+from ..util.request_timing import RequestTimer
+
+
+def metadata(prefix, number, version):
+    """Describe a book, as version `version` of a feed would."""
+    primary = IdentifierData(
+        Identifier.GUTENBERG_ID, u"%s%d" % (prefix, number)
+    )
+    taken_at = datetime.datetime(2019, 1, version)
+    return Metadata(
+        DataSource.GUTENBERG,
+        title=u"Book %d, version %d" % (number, version),
+        primary_identifier=primary,
+        identifiers=[
+            IdentifierData(Identifier.ISBN, u"%s-isbn-%d" % (prefix, number)),
+            IdentifierData(Identifier.URI, u"http://%s/%d" % (prefix, number)),
+        ],
+        subjects=[
+            SubjectData(Subject.TAG, u"Tag %d" % (number % 50)),
+            SubjectData(Subject.TAG, u"Tag %d" % (number % 7 + version)),
+            SubjectData(Subject.LCSH, u"Subject %d" % (number % 100)),
+        ],
+        measurements=[
+            MeasurementData(Measurement.POPULARITY, number * version,
+                            taken_at=taken_at),
+            MeasurementData(Measurement.RATING, version, taken_at=taken_at),
+        ],
+        circulation=CirculationData(
+            DataSource.GUTENBERG, primary, licenses_owned=version,
+            licenses_available=version, last_checked=taken_at
+        ),
+    )
+
+
+def apply_one_at_a_time(_db, metadatas, collection, policy):
+    results = []
+    for item in metadatas:
+        edition, ignore = item.edition(_db)
+        results.append(item.apply(edition, collection, replace=policy))
+    return results
+
+
+def apply_in_bulk(_db, metadatas, collection, policy):
+    return Metadata.bulk_apply(_db, metadatas, collection, replace=policy)
+
+
+def run(catalog, books, batch_size):
+    _db = catalog._db
+    collection = catalog._default_collection
+    policy = ReplacementPolicy(subjects=True)
+    results = []
+    answers = {}
+    for version, description in ((1, "new"), (2, "update")):
+        for prefix, name, function in (
+            (u"a", "Metadata.apply", apply_one_at_a_time),
+            (u"b", "Metadata.bulk_apply", apply_in_bulk),
+        ):
+            timer = RequestTimer.start()
+            start = time.time()
+            applied = []
+            for i in xrange(0, books, batch_size):
+                batch = [
+                    metadata(prefix, number, version)
+                    for number in xrange(i, min(i + batch_size, books))
+                ]
+                applied.extend(function(_db, batch, collection, policy))
+            _db.flush()
+            elapsed = time.time() - start
+            RequestTimer.stop()
+            statements = timer.counts.get(RequestTimer.DATABASE, 0)
+            results.append(result(
+                "%s (%s books)" % (name, description), books, elapsed,
+                batch_size=batch_size, statements=statements,
+                statements_per_book=round(float(statements) / books, 2),
+            ))
+            answers[prefix] = [
+                (edition.title, changed) for edition, changed in applied
+            ]
+        if answers[u"a"] != answers[u"b"]:
+            raise Exception("The two ways gave different answers.")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--books', type=int, default=1000,
+        help="Number of Metadata objects applied each time."
+    )
+    parser.add_argument(
+        '--batch-size', type=int, default=500,
+        help="Number of Metadata objects per call to Metadata.bulk_apply."
+    )
+    args = parser.parse_args()
+
+    with SyntheticCatalog(0) as catalog:
+        results = run(catalog, args.books, args.batch_size)
+    report(results)
@@ -0,0 +1,315 @@
+# encoding: utf-8
+"""Measure the throughput of the code that does the most work while
+ingesting, classifying, indexing and serving a catalog:
+
+* Work.to_search_documents
+* AcquisitionFeed entry generation
+* AcquisitionFeed assembly from cached entries, with and without
+  splicing
+* KeywordBasedClassifier.genre
+* WorkClassifier.classify
+* OPDSImporter.extract_feed_data
+* MARCExporter.create_record
+* CachedFeed.fetch, both cache hits and cache refreshes
+* Work.calculate_presentation, one work at a time and in batches
+
+A synthetic catalog of the requested size is created in the test
+database (SIMPLIFIED_TEST_DATABASE) with the same factory methods the
+test suite uses. Everything happens inside a transaction that is rolled
+back when the benchmarks are done, so the database is left as it was
+found. None of these code paths talk to Elasticsearch or any other
+outside service.
+"""
+import argparse
+import os
+import time
+
+from . import (
+    report,
+    result,
+)
+from ..classifier import (
+    Classifier,
+    KeywordBasedClassifier,
+    WorkClassifier,
+)
+from ..lane import (
+    Facets,
+    Pagination,
+    WorkList,
+)
+from ..marc import (
+    Annotator as MARCAnnotator,
+    MARCExporter,
+)
+from ..model import (
+    CachedFeed,
+    DataSource,
+    Identifier,
+    PresentationCalculationPolicy,
+    Subject,
+    Work,
+)
+from ..opds import (
+    AcquisitionFeed,
+    TestAnnotator,
+)
+from ..opds_import import OPDSImporter
+from ..testing import DatabaseTest
+
+GENRES = [
+    "Science Fiction", "Fantasy", "Mystery", "Romance", "Horror",
+    "History", "Cooking", "Biography & Memoir", "Science", "Humor",
+]
+
+AUDIENCES = [
+    Classifier.AUDIENCE_ADULT, Classifier.AUDIENCE_ADULT,
+    Classifier.AUDIENCE_YOUNG_ADULT, Classifier.AUDIENCE_CHILDREN,
+]
+
+# Subject names that KeywordBasedClassifier has something to say about.
+TAGS = [
+    u"Space opera", u"Epic fantasy", u"Detective and mystery stories",
+    u"Love stories", u"Ghost stories", u"World War, 1939-1945 -- History",
+    u"Cookery, Italian", u"Autobiography", u"Astronomy", u"Humorous fiction",
+    u"Juvenile fiction", u"Young adult fiction", u"Vampires", u"Cats",
+]
+
+
+class SyntheticCatalog(DatabaseTest):
+    """A catalog of made-up works, created inside a transaction that
+    is rolled back on exit.
+    """
+
+    def __init__(self, size, authors=None):
+        self.size = size
+        self.authors = authors or max(1, size // 5)
+        self.works = []
+
+    def __enter__(self):
+        # Make sure we connect to the test database, never production.
+        os.environ['TESTING'] = 'true'
+        self.setup_class()
+        self.setup_method()
+        return self
+
+    def __exit__(self, *args):
+        self.teardown_method()
+        self.teardown_class()
+
+    def populate(self, batch_size=500):
+        """Create the works, each with a presentation edition, an
+        open-access license pool, contributors, a genre and some
+        tag classifications.
+
+        :return: A benchmark result describing how long it took.
+        """
+        start = time.time()
+        data_source = DataSource.lookup(self._db, DataSource.LIBRARY_STAFF)
+        tags = [self._subject(Subject.TAG, tag) for tag in TAGS]
+        for i in xrange(self.size):
+            authors = [
+                "Author %d" % (i % self.authors),
+                "Author %d" % ((i * 7) % self.authors),
+            ]
+            work = self._work(
+                title="Synthetic Work %d" % i, authors=authors,
+                genre=GENRES[i % len(GENRES)],
+                audience=AUDIENCES[i % len(AUDIENCES)],
+                fiction=(i % 3 != 0), with_open_access_download=True,
+            )
+            identifier = work.presentation_edition.primary_identifier
+            for j in range(3):
+                self._classification(
+                    identifier, tags[(i + j * 5) % len(tags)], data_source,
+                    weight=j + 1
+                )
+            self.works.append(work.id)
+            if i % batch_size == batch_size - 1:
+                self._db.flush()
+        self._db.flush()
+        return result(
+            "populate catalog", self.size, time.time() - start,
+            works=self.size
+        )
+
+    def sample(self, count):
+        """Load up to `count` of the works created by populate()."""
+        ids = self.works[:count]
+        return self._db.query(Work).filter(Work.id.in_(ids)).all()
+
+
+def timed(name, items, function, **extra):
+    """Call `function` on every item in `items`."""
+    start = time.time()
+    for item in items:
+        function(item)
+    return result(name, len(items), time.time() - start, **extra)
+
+
+def batches(items, size):
+    return [items[i:i+size] for i in xrange(0, len(items), size)]
+
+
+def run(catalog, sample_size, batch_size, feed_size):
+    _db = catalog._db
+    works = catalog.sample(sample_size)
+    results = []
+
+    # Search documents are created in batches, just as the search
+    # index coverage provider does.
+    start = time.time()
+    for batch in batches(works, batch_size):
+        Work.to_search_documents(batch)
+    results.append(result(
+        "Work.to_search_documents", len(works), time.time() - start,
+        batch_size=batch_size
+    ))
+
+    feed = AcquisitionFeed(_db, "Benchmark", "http://feed/", [], TestAnnotator)
+    results.append(timed(
+        "AcquisitionFeed.create_entry", works,
+        lambda work: feed.create_entry(work, force_create=True)
+    ))
+
+    subjects = (TAGS * (sample_size // len(TAGS) + 1))[:sample_size]
+    results.append(timed(
+        "KeywordBasedClassifier.genre", subjects,
+        lambda name: KeywordBasedClassifier.genre(None, name)
+    ))
+
+    # Load each work's classifications up front, so that only the
+    # classification itself is timed.
+    classifications = dict(
+        (work, Identifier.classifications_for_identifier_ids(
+            _db, [work.presentation_edition.primary_identifier.id]
+        ).all())
+        for work in works
+    )
+    def classify(work):
+        classifier = WorkClassifier(work)
+        for classification in classifications[work]:
+            classifier.add(classification)
+        classifier.classify()
+    results.append(timed("WorkClassifier.classify", works, classify))
+
+    # Import an OPDS feed describing the works we already have.
+    importer = OPDSImporter(
+        _db, catalog._default_collection,
+        data_source_name=DataSource.OA_CONTENT_SERVER
+    )
+    feeds = [
+        unicode(AcquisitionFeed(
+            _db, "Benchmark", "http://feed/", batch, TestAnnotator
+        ))
+        for batch in batches(works, feed_size)
+    ]
+    start = time.time()
+    for document in feeds:
+        importer.extract_feed_data(document)
+    results.append(result(
+        "OPDSImporter.extract_feed_data", len(works), time.time() - start,
+        entries_per_feed=feed_size
+    ))
+
+    results.append(timed(
+        "MARCExporter.create_record", works,
+        lambda work: MARCExporter.create_record(
+            work, MARCAnnotator, force_create=True
+        )
+    ))
+
+    # A feed of `feed_size` works, as it would be served to a patron.
+    library = catalog._default_library
+    worklist = WorkList()
+    worklist.initialize(library)
+    facets = Facets.default(library)
+    pagination = Pagination.default()
+    feed_works = works[:feed_size]
+    refresh = lambda: AcquisitionFeed(
+        _db, "Benchmark", "http://feed/", feed_works, TestAnnotator
+    )
+    fetches = range(max(1, sample_size // feed_size))
+
+    # Every work now has a cached OPDS entry. Assemble a feed from
+    # them, first by parsing each one, then by splicing annotations
+    # onto them.
+    class SplicingAnnotator(TestAnnotator):
+        splice_entries = True
+    for name, annotator in (
+        ("AcquisitionFeed (parsed entries)", TestAnnotator),
+        ("AcquisitionFeed (spliced entries)", SplicingAnnotator),
+    ):
+        results.append(timed(
+            name, fetches,
+            lambda i: unicode(AcquisitionFeed(
+                _db, "Benchmark", "http://feed/", feed_works, annotator
+            )),
+            entries_per_feed=len(feed_works)
+        ))
+
+    results.append(timed(
+        "CachedFeed.fetch (refresh)", fetches,
+        lambda i: CachedFeed.fetch(
+            _db, worklist, facets, pagination, refresh, max_age=0
+        ),
+        entries_per_feed=len(feed_works)
+    ))
+    results.append(timed(
+        "CachedFeed.fetch (cache hit)", fetches,
+        lambda i: CachedFeed.fetch(
+            _db, worklist, facets, pagination, refresh, max_age=3600
+        ),
+        entries_per_feed=len(feed_works)
+    ))
+
+    # Recalculate presentation the way WorkClassificationCoverageProvider
+    # does, first one work at a time, then a batch at a time.
+    policy = PresentationCalculationPolicy.recalculate_everything()
+    policy.verbose = False
+    results.append(timed(
+        "Work.calculate_presentation", works,
+        lambda work: work.calculate_presentation(policy)
+    ))
+    start = time.time()
+    for batch in batches(works, batch_size):
+        Work.bulk_calculate_presentation(batch, policy)
+    results.append(result(
+        "Work.bulk_calculate_presentation", len(works), time.time() - start,
+        batch_size=batch_size
+    ))
+
+    for item in results:
+        item['catalog_size'] = catalog.size
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--works', type=int, default=1000,
+        help="Number of works in the synthetic catalog."
+    )
+    parser.add_argument(
+        '--sample', type=int, default=None,
+        help="Number of works to run each benchmark against. "
+        "Defaults to the whole catalog."
+    )
+    parser.add_argument(
+        '--batch-size', type=int, default=100,
+        help="Number of works per call to Work.to_search_documents "
+        "and Work.bulk_calculate_presentation."
+    )
+    parser.add_argument(
+        '--feed-size', type=int, default=50,
+        help="Number of entries in each OPDS feed."
+    )
+    args = parser.parse_args()
+
+    with SyntheticCatalog(args.works) as catalog:
+        results = [catalog.populate()]
+        results.extend(run(
+            catalog, args.sample or args.works, args.batch_size,
+            args.feed_size
+        ))
+    report(results)
@@ -0,0 +1,119 @@
+# encoding: utf-8
+"""Measure how much memory OPDSImporter.extract_feed_data uses on a
+large feed.
+
+A feed of the requested size is made up by repeating an entry with
+covers, ratings, subjects, an author and an open-access link, giving
+each copy its own identifier. The resident set size (RSS) of this
+process is reported before the feed is parsed, while the extracted
+Metadata and CirculationData objects are still around, and at its
+peak. Run each measurement in a fresh process; the peak can't be
+reset once it has been reached.
+
+An importer needs a database connection, so this runs in the test
+database (SIMPLIFIED_TEST_DATABASE), inside a transaction that is
+rolled back when the benchmark is done.
+"""
+import argparse
+import gc
+import os
+import resource
+import time
+
+from . import (
+    report,
+    result,
+)
+from .catalog import SyntheticCatalog
+from ..model import DataSource
+from ..opds_import import OPDSImporter
+
+HEADER = u"""<feed xmlns:simplified="http://librarysimplified.org/terms/" xmlns:dcterms="http://purl.org/dc/terms/" xmlns:opds="http://opds-spec.org/2010/catalog" xmlns:schema="http://schema.org/" xmlns="http://www.w3.org/2005/Atom" xmlns:bibframe="http://bibframe.org/vocab/">
+  <id>http://localhost/</id>
+  <title>Memory benchmark</title>
+  <updated>2015-01-02T16:56:40Z</updated>
+"""
+
+ENTRY = u"""  <entry schema:additionalType="http://schema.org/EBook">
+    <id>urn:librarysimplified.org/terms/id/Gutenberg%%20ID/%(id)d</id>
+    <bibframe:distribution bibframe:ProviderName="Gutenberg"/>
+    <title>Book %(id)d</title>
+    <author>
+      <name>Author %(author)d</name>
+      <simplified:sort_name>Author, %(author)d</simplified:sort_name>
+    </author>
+    <summary>A summary of book %(id)d.</summary>
+    <updated>2015-01-02T16:56:40Z</updated>
+    <published>2014-01-02T16:56:40Z</published>
+    <schema:Rating schema:ratingValue="0.3333" schema:additionalType="http://librarysimplified.org/terms/rel/quality"/>
+    <schema:Rating schema:ratingValue="0.2500" schema:additionalType="http://librarysimplified.org/terms/rel/popularity"/>
+    <link href="http://covers/%(id)d.png" rel="http://opds-spec.org/image"/>
+    <link href="http://covers/%(id)d.thumb.png" rel="http://opds-spec.org/image/thumbnail"/>
+    <category term="sh85047114" label="Fantasy fiction" scheme="http://purl.org/dc/terms/LCSH"/>
+    <category term="sh2008107174" label="Magic -- Fiction" scheme="http://purl.org/dc/terms/LCSH"/>
+    <category term="PZ" label="Juvenile Fiction" scheme="http://purl.org/dc/terms/LCC"/>
+    <category term="Children" label="Children" scheme="http://schema.org/audience"/>
+    <dcterms:language>en</dcterms:language>
+    <dcterms:publisher>Project Gutenberg</dcterms:publisher>
+    <link href="http://books/%(id)d.epub" type="application/epub+zip" rel="http://opds-spec.org/acquisition/open-access"/>
+  </entry>
+"""
+
+
+def feed(entries):
+    """Make up an OPDS feed with the given number of entries."""
+    return HEADER + u"".join(
+        ENTRY % dict(id=i, author=i % 100) for i in xrange(entries)
+    ) + u"</feed>"
+
+
+def rss():
+    """The current resident set size of this process, in megabytes."""
+    with open('/proc/self/statm') as f:
+        pages = int(f.read().split()[1])
+    return pages * resource.getpagesize() / 1024.0 / 1024.0
+
+
+def peak_rss():
+    """The highest resident set size this process has reached, in
+    megabytes.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run(catalog, entries):
+    document = feed(entries)
+    importer = OPDSImporter(
+        catalog._db, catalog._default_collection,
+        data_source_name=DataSource.OA_CONTENT_SERVER
+    )
+
+    gc.collect()
+    before = rss()
+    start = time.time()
+    metadata, failures = importer.extract_feed_data(document)
+    elapsed = time.time() - start
+    gc.collect()
+    retained = rss() - before
+    peak = peak_rss() - before
+    return [result(
+        "OPDSImporter.extract_feed_data", entries, elapsed,
+        rss_before_mb=round(before, 1),
+        rss_retained_mb=round(retained, 1),
+        rss_peak_increase_mb=round(peak, 1),
+        retained_kb_per_entry=round(retained * 1024 / entries, 2),
+        entries_extracted=len(metadata),
+    )]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--entries', type=int, default=20000,
+        help="Number of entries in the feed."
+    )
+    args = parser.parse_args()
+
+    with SyntheticCatalog(0) as catalog:
+        results = run(catalog, args.entries)
+    report(results)
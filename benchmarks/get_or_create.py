@@ -0,0 +1,88 @@
+# encoding: utf-8
+"""Compare the ways of finding or creating many Identifiers:
+
+* get_one_or_create(), called once for each Identifier, and
+* get_many_or_create(), which finds or creates a whole batch of them
+  with one statement.
+
+Both ways are run twice: once when none of the Identifiers exist, and
+once when all of them do. They're run against different identifiers,
+so neither gets a head start from the other.
+
+Everything happens in the test database (SIMPLIFIED_TEST_DATABASE),
+inside a transaction that is rolled back when the benchmark is done.
+"""
+import argparse
+import time
+
+from . import (
+    report,
+    result,
+)
+from .catalog import SyntheticCatalog
+from ..model import (
+    get_many_or_create,
+    get_one_or_create,
+    Identifier,
+)
+from ..util.request_timing import RequestTimer
+
+
+def one_at_a_time(_db, kwargs_list):
+    return [get_one_or_create(_db, Identifier, **kwargs)
+            for kwargs in kwargs_list]
+
+
+def in_bulk(_db, kwargs_list):
+    return get_many_or_create(_db, Identifier, kwargs_list)
+
+
+def run(catalog, identifiers, batch_size):
+    _db = catalog._db
+    results = []
+    for description in ("new", "existing"):
+        for prefix, name, function in (
+            (u"a", "get_one_or_create", one_at_a_time),
+            (u"b", "get_many_or_create", in_bulk),
+        ):
+            kwargs_list = [
+                dict(type=Identifier.GUTENBERG_ID,
+                     identifier=u"%s%d" % (prefix, i))
+                for i in xrange(identifiers)
+            ]
+            timer = RequestTimer.start()
+            start = time.time()
+            found = []
+            for i in xrange(0, identifiers, batch_size):
+                found.extend(function(_db, kwargs_list[i:i+batch_size]))
+            elapsed = time.time() - start
+            RequestTimer.stop()
+            statements = timer.counts.get(RequestTimer.DATABASE, 0)
+            expect_new = (description == "new")
+            if any(is_new != expect_new for obj, is_new in found):
+                raise Exception("%s gave the wrong answer." % name)
+            results.append(result(
+                "%s (%s identifiers)" % (name, description), identifiers,
+                elapsed, batch_size=batch_size, statements=statements,
+                statements_per_identifier=round(
+                    float(statements) / identifiers, 2
+                ),
+            ))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--identifiers', type=int, default=5000,
+        help="Number of Identifiers found or created each time."
+    )
+    parser.add_argument(
+        '--batch-size', type=int, default=500,
+        help="Number of Identifiers per call to get_many_or_create."
+    )
+    args = parser.parse_args()
+
+    with SyntheticCatalog(0) as catalog:
+        results = run(catalog, args.identifiers, args.batch_size)
+    report(results)
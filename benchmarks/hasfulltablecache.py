@@ -0,0 +1,150 @@
+# encoding: utf-8
+"""Measure HasFullTableCache lookup throughput while other threads
+invalidate the cache.
+
+The database is simulated, so this measures only the cost of the
+cache itself: repopulating after a full reset versus evicting a
+single row.
+"""
+import argparse
+import random
+import threading
+import time
+
+from . import (
+    report,
+    result,
+)
+from ..model.hasfulltablecache import HasFullTableCache
+
+
+class FakeSession(object):
+    """Stands in for a database session that every cached object
+    already belongs to.
+    """
+
+    _flushing = False
+
+    def __init__(self, rows, delay):
+        self.rows = rows
+        self.delay = delay
+
+    def __contains__(self, obj):
+        return True
+
+    def flush(self):
+        pass
+
+    def query(self, cls):
+        return FakeQuery(self)
+
+
+class FakeQuery(object):
+    """Just enough of a Query to look up a row by ID."""
+
+    def __init__(self, session):
+        self.session = session
+
+    def filter_by(self, id):
+        self.id = id
+        return self
+
+    def one(self):
+        time.sleep(self.session.delay)
+        return self.session.rows[self.id]
+
+
+class CachedRow(object):
+
+    def __init__(self, id):
+        self.id = id
+        self.key = "key-%d" % id
+
+    def cache_key(self):
+        return self.key
+
+
+def cached_table(size, load_delay):
+    """Create a HasFullTableCache class backed by `size` fake rows.
+
+    :param load_delay: Seconds spent per batch when loading rows,
+        to simulate database round trips.
+    """
+    rows = [CachedRow(i) for i in xrange(size)]
+
+    class Table(HasFullTableCache):
+        _cache = HasFullTableCache.RESET
+        _id_cache = HasFullTableCache.RESET
+        populations = 0
+
+        @classmethod
+        def _all_rows(cls, _db):
+            cls.populations += 1
+            for i in xrange(0, len(rows), cls.POPULATE_BATCH_SIZE):
+                time.sleep(load_delay)
+                for row in rows[i:i+cls.POPULATE_BATCH_SIZE]:
+                    yield row
+
+    return Table, rows
+
+
+def run(mode, size, threads, duration, invalidation_interval, load_delay):
+    Table, rows = cached_table(size, load_delay)
+    _db = FakeSession(rows, load_delay)
+    lookup_hook = lambda: (random.choice(rows), False)
+    stop = threading.Event()
+    counts = []
+
+    def reader():
+        count = 0
+        while not stop.is_set():
+            id = random.randrange(size)
+            Table.by_id(_db, id)
+            Table.by_cache_key(_db, "key-%d" % id, lookup_hook)
+            count += 2
+        counts.append(count)
+
+    def invalidator():
+        while not stop.is_set():
+            time.sleep(invalidation_interval)
+            if mode == 'reset':
+                Table.reset_cache()
+            else:
+                Table.evict_from_cache(random.randrange(size))
+
+    workers = [threading.Thread(target=reader) for i in range(threads)]
+    workers.append(threading.Thread(target=invalidator))
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    time.sleep(duration)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - start
+    return result(
+        "HasFullTableCache lookups with %s invalidation" % mode,
+        sum(counts), elapsed, table_size=size, threads=threads,
+        populations=Table.populations,
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument(
+        '--invalidation-interval', type=float, default=0.05,
+        help="Seconds between cache invalidations."
+    )
+    parser.add_argument(
+        '--load-delay', type=float, default=0.002,
+        help="Simulated database time per batch of rows loaded."
+    )
+    args = parser.parse_args()
+    report([
+        run(mode, args.size, args.threads, args.duration,
+            args.invalidation_interval, args.load_delay)
+        for mode in ('reset', 'evict')
+    ])
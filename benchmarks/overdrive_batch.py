@@ -0,0 +1,110 @@
+# encoding: utf-8
+"""Compare the ways of looking up Overdrive metadata for many books:
+
+* OverdriveAPI.metadata_lookup, called once for each identifier, and
+* OverdriveAPI.metadata_lookups, which makes the requests for a batch
+  of identifiers concurrently, in batch mode.
+
+Overdrive itself is never contacted. Each request is answered with the
+same canned document after a simulated network delay. Batch mode's rate
+limiter is set high enough that it doesn't get in the way, so this
+measures how well the concurrent requests hide the delay.
+
+An OverdriveAPI needs a database connection, so this runs in the test
+database (SIMPLIFIED_TEST_DATABASE), inside a transaction that is
+rolled back when the benchmark is done.
+"""
+import argparse
+import json
+import time
+
+from . import (
+    report,
+    result,
+)
+from .catalog import (
+    SyntheticCatalog,
+    batches,
+)
+from ..model import Identifier
+from ..overdrive import (
+    MockOverdriveAPI,
+    OverdriveAPI,
+)
+
+
+class SlowOverdriveAPI(MockOverdriveAPI):
+    """Answer every metadata request after a delay."""
+
+    def __init__(self, _db, collection, latency, **kwargs):
+        super(SlowOverdriveAPI, self).__init__(_db, collection, **kwargs)
+        self.latency = latency
+        self._collection_token = "collection token"
+
+    def _do_get(self, url, headers):
+        time.sleep(self.latency)
+        item_id = url.split("/products/")[1].split("/")[0]
+        return 200, {}, json.dumps(dict(id=item_id, title="A book"))
+
+    # Use real worker threads rather than the mock's instant answers.
+    _submit_get = OverdriveAPI._submit_get.__func__
+
+
+def run(catalog, books, batch_size, latency, max_workers):
+    collection = MockOverdriveAPI.mock_collection(catalog._db)
+    api = SlowOverdriveAPI(
+        catalog._db, collection, latency, max_workers=max_workers,
+        requests_per_second=1000000
+    )
+    identifiers = [
+        catalog._identifier(identifier_type=Identifier.OVERDRIVE_ID)
+        for i in xrange(books)
+    ]
+    extra = dict(latency_ms=latency * 1000, max_workers=max_workers)
+
+    start = time.time()
+    one_at_a_time = [api.metadata_lookup(x) for x in identifiers]
+    results = [result(
+        "OverdriveAPI.metadata_lookup", books, time.time() - start, **extra
+    )]
+
+    start = time.time()
+    in_batches = []
+    for batch in batches(identifiers, batch_size):
+        in_batches.extend(api.metadata_lookups(batch))
+    results.append(result(
+        "OverdriveAPI.metadata_lookups", books, time.time() - start,
+        batch_size=batch_size, **extra
+    ))
+
+    if one_at_a_time != in_batches:
+        raise Exception("The two ways gave different answers.")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--books', type=int, default=200,
+        help="Number of identifiers looked up each way."
+    )
+    parser.add_argument(
+        '--batch-size', type=int, default=100,
+        help="Number of identifiers per call to metadata_lookups."
+    )
+    parser.add_argument(
+        '--latency', type=float, default=0.05,
+        help="Simulated time, in seconds, for Overdrive to answer a request."
+    )
+    parser.add_argument(
+        '--max-workers', type=int, default=OverdriveAPI.BATCH_MAX_WORKERS,
+        help="Number of requests in flight at once in batch mode."
+    )
+    args = parser.parse_args()
+
+    with SyntheticCatalog(0) as catalog:
+        results = run(
+            catalog, args.books, args.batch_size, args.latency,
+            args.max_workers
+        )
+    report(results)
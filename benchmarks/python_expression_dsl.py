@@ -0,0 +1,119 @@
+# encoding: utf-8
+"""Compare the ways of evaluating a python_expression_dsl expression
+against many different contexts:
+
+* parsing and interpreting the expression every time (the original
+  behavior of DSLEvaluator.evaluate),
+* interpreting an AST that was parsed once, and
+* DSLEvaluator.evaluate, which parses and compiles the expression once.
+
+It also compares evaluating an arithmetic rule against a whole
+collection's worth of contexts one at a time, with DSLEvaluator.evaluate,
+and all at once, with DSLEvaluator.evaluate_many.
+"""
+import argparse
+import time
+
+import numpy
+
+from . import (
+    report,
+    result,
+    time_operation,
+)
+from ..python_expression_dsl.evaluator import (
+    DSLEvaluationVisitor,
+    DSLEvaluator,
+)
+from ..python_expression_dsl.parser import DSLParser
+
+EXPRESSION = (
+    "(licenses_owned - licenses_available) / max(licenses_owned, 1) > 0.5 "
+    "and ('ebook' in medium.lower()) or patrons_in_hold_queue >= 10"
+)
+
+ARITHMETIC_EXPRESSION = (
+    "(licenses_owned - licenses_available) / (licenses_owned + 1) > 0.5 "
+    "or patrons_in_hold_queue >= 10"
+)
+
+
+def contexts(count):
+    return [
+        dict(
+            licenses_owned=i % 20, licenses_available=i % 7,
+            patrons_in_hold_queue=i % 13, medium="EBook",
+        )
+        for i in xrange(count)
+    ]
+
+
+def run(iterations):
+    parser = DSLParser()
+    visitor = DSLEvaluationVisitor()
+    evaluator = DSLEvaluator(parser, DSLEvaluationVisitor())
+    all_contexts = contexts(iterations)
+    node = parser.parse(EXPRESSION)
+
+    def interpreter(parse_every_time):
+        remaining = iter(all_contexts)
+
+        def evaluate():
+            visitor.context = next(remaining)
+            visitor.visit(parser.parse(EXPRESSION) if parse_every_time else node)
+        return evaluate
+
+    def compiled():
+        remaining = iter(all_contexts)
+        return lambda: evaluator.evaluate(EXPRESSION, next(remaining), [])
+
+    extra = dict(expression=EXPRESSION)
+    return [
+        time_operation(
+            "parse and interpret", interpreter(True), iterations, **extra
+        ),
+        time_operation(
+            "interpret parsed expression", interpreter(False), iterations,
+            **extra
+        ),
+        time_operation("compile once", compiled(), iterations, **extra),
+    ]
+
+
+def run_many(count):
+    evaluator = DSLEvaluator(DSLParser(), DSLEvaluationVisitor())
+    rows = contexts(count)
+    columns = dict(
+        (key, numpy.array([row[key] for row in rows]))
+        for key in ('licenses_owned', 'licenses_available',
+                    'patrons_in_hold_queue')
+    )
+    extra = dict(expression=ARITHMETIC_EXPRESSION)
+
+    def timed(name, function):
+        start = time.time()
+        function()
+        return result(name, count, time.time() - start, **extra)
+
+    return [
+        timed("evaluate each context", lambda: [
+            evaluator.evaluate(ARITHMETIC_EXPRESSION, row, []) for row in rows
+        ]),
+        timed("evaluate_many on a list of contexts", lambda:
+            evaluator.evaluate_many(ARITHMETIC_EXPRESSION, rows)
+        ),
+        timed("evaluate_many on columns", lambda:
+            evaluator.evaluate_many(ARITHMETIC_EXPRESSION, columns)
+        ),
+    ]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=5000)
+    parser.add_argument(
+        '--contexts', type=int, default=100000,
+        help="Number of contexts to evaluate with evaluate_many."
+    )
+    args = parser.parse_args()
+    report(run(args.iterations) + run_many(args.contexts))
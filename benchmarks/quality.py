@@ -0,0 +1,102 @@
+# encoding: utf-8
+"""Compare the ways of calculating the overall quality of many works
+from their Measurements:
+
+* Measurement.overall_quality, called once for each work, and
+* MeasurementColumns.overall_qualities, which normalizes and averages
+  every work's measurements at once with NumPy.
+
+The Measurements are made up and never touch the database, so this
+measures only the calculation itself. Both ways are checked to give
+the same answers.
+"""
+import argparse
+import random
+import time
+
+from . import (
+    report,
+    result,
+)
+from ..model import (
+    DataSource,
+    Measurement,
+)
+from ..model.measurement import MeasurementColumns
+
+# (quantity, data source) combinations a work's Measurements might have.
+KINDS = [
+    (Measurement.POPULARITY, DataSource.OVERDRIVE, lambda: random.randint(1, 6000)),
+    (Measurement.POPULARITY, DataSource.AMAZON, lambda: random.randint(1, 2000000)),
+    (Measurement.RATING, DataSource.OVERDRIVE, lambda: random.uniform(1, 5)),
+    (Measurement.RATING, DataSource.LIBRARY_STAFF, lambda: random.randint(1, 5)),
+    (Measurement.QUALITY, DataSource.METADATA_WRANGLER, random.random),
+    (Measurement.HOLDINGS, DataSource.OCLC, lambda: random.randint(1, 8000)),
+    (Measurement.PUBLISHED_EDITIONS, DataSource.OCLC, lambda: random.randint(1, 300)),
+    (Measurement.DOWNLOADS, DataSource.GUTENBERG, lambda: random.randint(0, 5000)),
+]
+
+
+def measurements(works, per_work):
+    """Create up to `per_work` Measurements for each of `works` works."""
+    data_sources = dict(
+        (name, DataSource(name=name)) for quantity, name, value in KINDS
+    )
+    groups = []
+    for i in xrange(works):
+        group = []
+        for quantity, name, value in random.sample(
+            KINDS, random.randint(0, per_work)
+        ):
+            group.append(Measurement(
+                quantity_measured=quantity, value=value(),
+                data_source=data_sources[name], weight=random.choice([1, 1, 2])
+            ))
+        groups.append(group)
+    return groups
+
+
+def run(works, per_work):
+    random.seed(42)
+    groups = measurements(works, per_work)
+    extra = dict(measurements=sum(len(group) for group in groups))
+
+    # The columns are built before Measurement.normalized_value has a
+    # chance to cache anything.
+    start = time.time()
+    columns = MeasurementColumns.from_measurements(groups)
+    built = result(
+        "MeasurementColumns.from_measurements", works, time.time() - start,
+        **extra
+    )
+
+    start = time.time()
+    vectorized = columns.overall_qualities()
+    vectorized_result = result(
+        "MeasurementColumns.overall_qualities", works, time.time() - start,
+        **extra
+    )
+
+    start = time.time()
+    scalar = [Measurement.overall_quality(group) for group in groups]
+    scalar_result = result(
+        "Measurement.overall_quality", works, time.time() - start, **extra
+    )
+
+    if scalar != vectorized:
+        raise Exception("The two calculations gave different answers.")
+    return [scalar_result, built, vectorized_result]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--works', type=int, default=100000,
+        help="Number of works whose quality is calculated."
+    )
+    parser.add_argument(
+        '--measurements', type=int, default=5,
+        help="Maximum number of Measurements per work."
+    )
+    args = parser.parse_args()
+    report(run(args.works, args.measurements))
@@ -0,0 +1,86 @@
+# encoding: utf-8
+"""Measure a URN lookup request: URNLookupHandler.process_urns()
+followed by the LookupAcquisitionFeed built from its results, the way
+URNLookupController.work_lookup() does it.
+
+A synthetic catalog of the requested size is created in the test
+database (SIMPLIFIED_TEST_DATABASE), and each lookup asks about a
+batch of its works by the URNs of their primary identifiers. Every
+work's OPDS entry is cached before the timing starts, and each lookup
+starts with an empty session, as a new request would. Everything
+happens inside a transaction that is rolled back when the benchmark is
+done.
+"""
+import argparse
+import time
+
+from . import (
+    report,
+    result,
+)
+from .catalog import (
+    SyntheticCatalog,
+    batches,
+)
+from ..app_server import URNLookupHandler
+from ..opds import (
+    AcquisitionFeed,
+    LookupAcquisitionFeed,
+    TestAnnotator,
+)
+from ..util.request_timing import RequestTimer
+
+
+def run(catalog, urns_per_lookup):
+    _db = catalog._db
+    works = catalog.sample(catalog.size)
+
+    # Cache every work's OPDS entry.
+    unicode(AcquisitionFeed(_db, "Benchmark", "http://feed/", works,
+                            TestAnnotator))
+    _db.flush()
+    lookups = batches(
+        [work.presentation_edition.primary_identifier.urn for work in works],
+        urns_per_lookup
+    )
+
+    timer = RequestTimer.start()
+    start = time.time()
+    entries = 0
+    for urns in lookups:
+        _db.expunge_all()
+        handler = URNLookupHandler(_db)
+        handler.process_urns(urns)
+        feed = LookupAcquisitionFeed(
+            _db, "Lookup results", "http://lookup/", handler.works,
+            TestAnnotator, precomposed_entries=handler.precomposed_entries
+        )
+        unicode(feed)
+        entries += len(handler.works)
+    elapsed = time.time() - start
+    RequestTimer.stop()
+    statements = timer.counts.get(RequestTimer.DATABASE, 0)
+    urns = sum(len(urns) for urns in lookups)
+    return [result(
+        "URN lookup", urns, elapsed, urns_per_lookup=urns_per_lookup,
+        works_found=entries, statements=statements,
+        statements_per_urn=round(float(statements) / urns, 2),
+    )]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--works', type=int, default=1000,
+        help="Number of works in the synthetic catalog."
+    )
+    parser.add_argument(
+        '--urns', type=int, default=100,
+        help="Number of URNs per lookup request."
+    )
+    args = parser.parse_args()
+
+    with SyntheticCatalog(args.works) as catalog:
+        catalog.populate()
+        results = run(catalog, args.urns)
+    report(results)
@@ -72,10 +72,38 @@ class Configuration(ConfigurationConstants):
     instance = None
 
 
+    # Requests that take longer than this many milliseconds are logged
+    # as slow requests. If this isn't set, every request is logged.
+    SLOW_REQUEST_THRESHOLD_ENVIRONMENT_VARIABLE = 'SIMPLIFIED_SLOW_REQUEST_THRESHOLD'
+
     # Environment variables that contain URLs to the database
     DATABASE_TEST_ENVIRONMENT_VARIABLE = 'SIMPLIFIED_TEST_DATABASE'
     DATABASE_PRODUCTION_ENVIRONMENT_VARIABLE = 'SIMPLIFIED_PRODUCTION_DATABASE'
 
+    # Environment variables that control the database connection pool.
+    # Any that aren't set take SQLAlchemy's defaults.
+    DATABASE_POOL_SIZE_ENVIRONMENT_VARIABLE = 'SIMPLIFIED_DATABASE_POOL_SIZE'
+    DATABASE_MAX_OVERFLOW_ENVIRONMENT_VARIABLE = 'SIMPLIFIED_DATABASE_MAX_OVERFLOW'
+    DATABASE_POOL_PRE_PING_ENVIRONMENT_VARIABLE = 'SIMPLIFIED_DATABASE_POOL_PRE_PING'
+    DATABASE_POOL_RECYCLE_ENVIRONMENT_VARIABLE = 'SIMPLIFIED_DATABASE_POOL_RECYCLE'
+
+    # Statement timeout, in milliseconds.
+    DATABASE_STATEMENT_TIMEOUT_ENVIRONMENT_VARIABLE = 'SIMPLIFIED_DATABASE_STATEMENT_TIMEOUT'
+
+    # Set this when connecting through an external connection pooler
+    # such as PgBouncer, so that we don't keep our own pool of
+    # connections open.
+    DATABASE_DISABLE_POOL_ENVIRONMENT_VARIABLE = 'SIMPLIFIED_DATABASE_DISABLE_POOL'
+
+    # Environment variables that contain comma-separated URLs to read
+    # replicas of the database.
+    DATABASE_TEST_REPLICAS_ENVIRONMENT_VARIABLE = 'SIMPLIFIED_TEST_DATABASE_REPLICAS'
+    DATABASE_PRODUCTION_REPLICAS_ENVIRONMENT_VARIABLE = 'SIMPLIFIED_PRODUCTION_DATABASE_REPLICAS'
+
+    # A replica more than this many seconds behind the primary
+    # database won't be used.
+    DATABASE_REPLICA_MAX_LAG_ENVIRONMENT_VARIABLE = 'SIMPLIFIED_DATABASE_REPLICA_MAX_LAG'
+
     # The version of the app.
     APP_VERSION = 'app_version'
     VERSION_FILENAME = '.version'
@@ -469,6 +497,96 @@ class Configuration(ConfigurationConstants):
         logging.info("Connecting to database: %s" % url_obj.__to_string__())
         return url
 
+    @classmethod
+    def database_pool_settings(cls):
+        """Find the connection pool settings configured for this site.
+
+        :return: A dictionary with the keys 'pool_size',
+            'max_overflow', 'pool_pre_ping', 'pool_recycle',
+            'statement_timeout' and 'disable_pool'. A value is None if
+            the corresponding environment variable is not set.
+        """
+        integer = cls._integer_environment_variable
+        boolean = cls._boolean_environment_variable
+        return dict(
+            pool_size=integer(cls.DATABASE_POOL_SIZE_ENVIRONMENT_VARIABLE),
+            max_overflow=integer(
+                cls.DATABASE_MAX_OVERFLOW_ENVIRONMENT_VARIABLE
+            ),
+            pool_pre_ping=boolean(
+                cls.DATABASE_POOL_PRE_PING_ENVIRONMENT_VARIABLE
+            ),
+            pool_recycle=integer(
+                cls.DATABASE_POOL_RECYCLE_ENVIRONMENT_VARIABLE
+            ),
+            statement_timeout=integer(
+                cls.DATABASE_STATEMENT_TIMEOUT_ENVIRONMENT_VARIABLE
+            ),
+            disable_pool=boolean(
+                cls.DATABASE_DISABLE_POOL_ENVIRONMENT_VARIABLE
+            ),
+        )
+
+    @classmethod
+    def database_replica_settings(cls):
+        """Find the read replicas configured for this site.
+
+        As with database_url(), test and production replicas are
+        configured with separate environment variables.
+
+        :return: A dictionary with the keys 'urls' (a list of database
+            URLs, possibly empty) and 'max_lag' (a number of seconds,
+            or None if not set).
+        """
+        if os.environ.get('TESTING', False):
+            environment_variable = cls.DATABASE_TEST_REPLICAS_ENVIRONMENT_VARIABLE
+        else:
+            environment_variable = cls.DATABASE_PRODUCTION_REPLICAS_ENVIRONMENT_VARIABLE
+        value = os.environ.get(environment_variable) or ''
+        urls = [x.strip() for x in value.split(',') if x.strip()]
+        return dict(
+            urls=urls,
+            max_lag=cls._integer_environment_variable(
+                cls.DATABASE_REPLICA_MAX_LAG_ENVIRONMENT_VARIABLE
+            )
+        )
+
+    @classmethod
+    def slow_request_threshold(cls):
+        """How long a request can take, in seconds, before it's logged
+        as a slow request.
+
+        :return: A number of seconds, or None if every request
+            should be logged.
+        """
+        milliseconds = cls._integer_environment_variable(
+            cls.SLOW_REQUEST_THRESHOLD_ENVIRONMENT_VARIABLE
+        )
+        if milliseconds is None:
+            return None
+        return milliseconds / 1000.0
+
+    @classmethod
+    def _integer_environment_variable(cls, environment_variable):
+        value = os.environ.get(environment_variable)
+        if value is None or not value.strip():
+            return None
+        try:
+            return int(value)
+        except ValueError, e:
+            raise CannotLoadConfiguration(
+                "Environment variable %s must be an integer, not %r." % (
+                    environment_variable, value
+                )
+            )
+
+    @classmethod
+    def _boolean_environment_variable(cls, environment_variable):
+        value = os.environ.get(environment_variable)
+        if value is None or not value.strip():
+            return None
+        return value.strip().lower() in ('true', 'yes', 'on', '1')
+
     @classmethod
     def app_version(cls):
         """Returns the git version of the app, if a .version file exists."""
@@ -1570,6 +1570,15 @@ class WorkPresentationEditionCoverageProvider(WorkPresentationProvider):
         work.calculate_presentation(self.POLICY)
         return work
 
+    def process_batch(self, batch):
+        """Recalculate the presentation for a batch of Works, gathering
+        the information needed for all of them at once.
+        """
+        Work.bulk_calculate_presentation(batch, self.POLICY)
+        for work in batch:
+            self.handle_success(work)
+        return list(batch)
+
 
 class WorkClassificationCoverageProvider(
     WorkPresentationEditionCoverageProvider
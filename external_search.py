@@ -3,6 +3,7 @@ import contextlib
 import datetime
 
 import json
+from expiringdict import ExpiringDict
 from elasticsearch import Elasticsearch
 from elasticsearch.helpers import bulk as elasticsearch_bulk
 from elasticsearch.exceptions import (
@@ -31,6 +32,7 @@ from elasticsearch_dsl.query import (
     Term,
     Terms,
 )
+from elasticsearch_dsl.response import Hit
 from spellchecker import SpellChecker
 
 from flask_babel import lazy_gettext as _
@@ -52,6 +54,7 @@ from model import (
     Contributor,
     ConfigurationSetting,
     DataSource,
+    DeliverableWork,
     Edition,
     ExternalIntegration,
     Identifier,
@@ -72,6 +75,10 @@ from selftest import (
 )
 from util.personal_names import display_name_to_sort_name
 from util.problem_detail import ProblemDetail
+from util.request_timing import (
+    RequestTimer,
+    timed,
+)
 from util.stopwords import ENGLISH_STOPWORDS
 
 import os
@@ -91,6 +98,114 @@ def mock_search_index(mock=None):
         ExternalSearchIndex.MOCK_IMPLEMENTATION = None
 
 
+class SearchResultCache(object):
+    """Remember the results of recent searches for a short time.
+
+    A small number of searches (bestsellers, popular authors, the
+    first page of a lane) account for a large share of search
+    traffic. For those searches, the cache makes it unnecessary to
+    build the query or talk to Elasticsearch at all.
+
+    Only the ID and sort key of each hit are kept, which is all
+    that's needed to turn the results into Works and paginate them.
+    """
+
+    # By default, keep the results of this many different searches.
+    DEFAULT_MAX_LENGTH = 1000
+
+    def __init__(self, ttl, max_length=None):
+        """Constructor.
+
+        :param ttl: Search results are forgotten after this number of
+            seconds.
+        :param max_length: Keep at most this many sets of search results.
+        """
+        self.ttl = ttl
+        self.results = ExpiringDict(
+            max_len=max_length or self.DEFAULT_MAX_LENGTH,
+            max_age_seconds=ttl
+        )
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        """The proportion of lookups that found cached results.
+
+        :return: A number between 0 and 1, or None if there have been
+            no lookups.
+        """
+        total = self.hits + self.misses
+        if not total:
+            return None
+        return float(self.hits) / total
+
+    def clear(self):
+        """Forget every search result, e.g. because the search index
+        has changed.
+        """
+        self.results.clear()
+
+    @classmethod
+    def key(cls, index, query_string, filter, pagination):
+        """Summarize a search in a hashable object.
+
+        :param index: The name of the index or alias being searched.
+        :return: A tuple, or None if the results of this search
+            shouldn't be cached.
+        """
+        filter_key = None
+        if filter is not None:
+            filter_key = filter.cache_key
+            if (filter_key is None or filter.scoring_functions
+                or filter.script_fields):
+                # The results of this search can't be reproduced from
+                # IDs and sort keys alone.
+                return None
+            order = filter.order
+            if isinstance(order, list):
+                order = tuple(order)
+            filter_key = (
+                filter_key, order, filter.order_ascending, filter.min_score
+            )
+        if query_string:
+            # Differences in whitespace don't affect the results.
+            query_string = " ".join(query_string.split())
+        return (
+            index, query_string, filter_key,
+            pagination.__class__.__name__, pagination.query_string
+        )
+
+    def get(self, key):
+        """Look up the results of a search.
+
+        :return: A list of Hit objects, or None if the search results
+            are not in the cache.
+        """
+        results = self.results.get(key)
+        if results is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        hits = []
+        for id, work_id, sort in results:
+            document = dict(_id=id, _source=dict(work_id=work_id))
+            if sort is not None:
+                document['sort'] = list(sort)
+            hits.append(Hit(document))
+        return hits
+
+    def put(self, key, hits):
+        """Add the results of a search to the cache."""
+        results = []
+        for hit in hits:
+            sort = getattr(hit.meta, 'sort', None)
+            if sort is not None:
+                sort = tuple(sort)
+            results.append((hit.meta.id, hit.work_id, sort))
+        self.results[key] = tuple(results)
+
+
 class ExternalSearchIndex(HasSelfTests):
 
     NAME = ExternalIntegration.ELASTICSEARCH
@@ -106,6 +221,11 @@ class ExternalSearchIndex(HasSelfTests):
     TEST_SEARCH_TERM_KEY = u'test_search_term'
     DEFAULT_TEST_SEARCH_TERM = u'test'
 
+    RESULT_CACHE_TTL_KEY = u'result_cache_ttl'
+
+    # A SearchResultCache, if search results are being cached.
+    result_cache = None
+
     work_document_type = 'work-type'
     __client = None
 
@@ -123,7 +243,13 @@ class ExternalSearchIndex(HasSelfTests):
           "label": _("Test search term"),
           "default": DEFAULT_TEST_SEARCH_TERM,
           "description": _("Self tests will use this value as the search term.")
-        }
+        },
+        { "key": RESULT_CACHE_TTL_KEY,
+          "label": _("Search result cache lifetime (seconds)"),
+          "type": "number",
+          "default": 0,
+          "description": _("If this is set, the results of each search will be remembered for this number of seconds, and identical searches will not be sent to Elasticsearch. Set this to zero to disable the cache.")
+        },
     ]
 
     SITEWIDE = True
@@ -184,7 +310,7 @@ class ExternalSearchIndex(HasSelfTests):
         return cls(_db, *args, **kwargs)
 
     def __init__(self, _db, url=None, works_index=None, test_search_term=None,
-                 in_testing=False, mapping=None):
+                 in_testing=False, mapping=None, result_cache_ttl=None):
         """Constructor
 
         :param in_testing: Set this to true if you don't want an
@@ -194,6 +320,11 @@ class ExternalSearchIndex(HasSelfTests):
 
         :param mapping: A custom Mapping object, for use in unit tests. By
         default, the most recent mapping will be instantiated.
+
+        :param result_cache_ttl: Remember the results of query_works()
+        for this number of seconds. By default, this is taken from the
+        search integration; if it's not set there, search results
+        are not cached.
         """
         self.log = logging.getLogger("External search index")
         self.works_index = None
@@ -229,6 +360,15 @@ class ExternalSearchIndex(HasSelfTests):
         self.test_search_term = (
             test_search_term or self.DEFAULT_TEST_SEARCH_TERM
         )
+
+        if result_cache_ttl is None and integration:
+            result_cache_ttl = integration.setting(
+                self.RESULT_CACHE_TTL_KEY
+            ).int_value
+        if result_cache_ttl:
+            self.result_cache = SearchResultCache(result_cache_ttl)
+        else:
+            self.result_cache = None
         if not in_testing:
             if not ExternalSearchIndex.__client:
                 use_ssl = url.startswith('https://')
@@ -265,7 +405,8 @@ class ExternalSearchIndex(HasSelfTests):
         self.search = Search(using=self.__client, index=self.works_alias)
 
         def bulk(docs, **kwargs):
-            return elasticsearch_bulk(self.__client, docs, **kwargs)
+            with timed(RequestTimer.SEARCH):
+                return elasticsearch_bulk(self.__client, docs, **kwargs)
         self.bulk = bulk
 
     def set_works_index_and_alias(self, _db):
@@ -407,6 +548,11 @@ class ExternalSearchIndex(HasSelfTests):
 
         self.works_alias = self.__client.works_alias = alias_name
 
+        # Search results obtained through the old alias may not be
+        # found through the new one.
+        if self.result_cache:
+            self.result_cache.clear()
+
     def base_index_name(self, index_or_alias):
         """Removes version or current suffix from base index name"""
 
@@ -474,8 +620,24 @@ class ExternalSearchIndex(HasSelfTests):
             return []
 
         pagination = pagination or Pagination.default()
+
+        cache_key = None
+        if self.result_cache is not None and not debug:
+            cache_key = self.result_cache.key(
+                self.works_alias, query_string, filter, pagination
+            )
+        if cache_key is not None:
+            hits = self.result_cache.get(cache_key)
+            if hits is not None:
+                # The Pagination object needs to know about this page
+                # just as though it had come from Elasticsearch.
+                pagination.page_loaded(hits)
+                return hits
+
         query_data = (query_string, filter, pagination)
         [result] = self.query_works_multi([query_data], debug)
+        if cache_key is not None:
+            self.result_cache.put(cache_key, result)
         return result
 
     def query_works_multi(self, queries, debug=False):
@@ -520,7 +682,8 @@ class ExternalSearchIndex(HasSelfTests):
         a = time.time()
         # NOTE: This is the code that actually executes the ElasticSearch
         # request.
-        resultset = [x for x in multi.execute()]
+        with timed(RequestTimer.SEARCH):
+            resultset = [x for x in multi.execute()]
 
         if debug:
             b = time.time()
@@ -554,7 +717,8 @@ class ExternalSearchIndex(HasSelfTests):
         qu = self.create_search_doc(
             query_string=None, filter=filter, pagination=None, debug=False
         )
-        return qu.count()
+        with timed(RequestTimer.SEARCH):
+            return qu.count()
 
     def bulk_update(self, works, retry_on_batch_failure=True):
         """Upload a batch of works to the search index at once."""
@@ -2124,6 +2288,10 @@ class Filter(SearchBase):
         Contributor.DIRECTOR_ROLE, Contributor.ACTOR_ROLE
     ]
 
+    # The output of build() for recently seen filters, keyed by
+    # Filter.cache_key.
+    _built_filters = ExpiringDict(max_len=1000, max_age_seconds=3600)
+
     @classmethod
     def from_worklist(cls, _db, worklist, facets):
         """Create a Filter that finds only works that belong in the given
@@ -2382,6 +2550,53 @@ class Filter(SearchBase):
             return as_is
         return with_all_ages
 
+    @classmethod
+    def reset_cache(cls):
+        """Forget about every filter built so far."""
+        cls._built_filters.clear()
+
+    @property
+    def cache_key(self):
+        """A hashable summary of every value that affects the output of
+        build().
+
+        Most of the Filters created to serve feeds for a given lane
+        and set of facets are identical, so there's no need to build
+        them from scratch every time.
+
+        :return: A tuple, or None if this Filter should not be cached.
+        """
+        if self.match_nothing or self.author is not None or self.identifiers:
+            # These filters are either trivial to build or specific to
+            # one request.
+            return None
+
+        def freeze(value):
+            if isinstance(value, (list, tuple, set)):
+                return tuple(freeze(x) for x in value)
+            return value
+
+        scrub_list = self._scrub_list
+        filter_ids = self._filter_ids
+        return freeze((
+            filter_ids(self.collection_ids),
+            filter_ids(self.license_datasources),
+            scrub_list(self.media or []),
+            scrub_list(self.languages or []),
+            self.fiction,
+            self.series,
+            scrub_list(self.audiences or []),
+            self.target_age,
+            [filter_ids(x) for x in self.genre_restriction_sets],
+            [filter_ids(x) for x in self.customlist_restriction_sets],
+            self.availability,
+            self.subcollection,
+            self.minimum_featured_quality,
+            self.excluded_audiobook_data_sources,
+            self.allow_holds,
+            self.updated_after,
+        ))
+
     def build(self, _chain_filters=None):
         """Convert this object to an Elasticsearch Filter object.
 
@@ -2395,6 +2610,28 @@ class Filter(SearchBase):
         :param _chain_filters: Mock function to use instead of
             Filter._chain_filters
         """
+        key = None
+        if _chain_filters is None:
+            key = self.cache_key
+        if key is None:
+            return self._build(_chain_filters)
+
+        built = self._built_filters.get(key)
+        if built is None:
+            built = self._build()
+            self._built_filters[key] = built
+
+        # The caller may add to what we return, so make sure it
+        # doesn't change what's in the cache.
+        f, nested_filters = built
+        if f is not None:
+            f = f._clone()
+        return f, defaultdict(
+            list, [(path, list(x)) for path, x in nested_filters.items()]
+        )
+
+    def _build(self, _chain_filters=None):
+        """Method that does the work of build()."""
 
         # Since a Filter object can be modified after it's created, we
         # need to scrub all the inputs, whether or not they were
@@ -3269,6 +3506,10 @@ class SearchIndexCoverageProvider(WorkPresentationProvider):
         """
         :return: a mixed list of Works and CoverageFailure objects.
         """
+        # The events that make a work need reindexing also affect
+        # whether and how it shows up in database-backed lanes.
+        DeliverableWork.refresh(self._db, works)
+
         successes, failures = self.search_index_client.bulk_update(works)
 
         records = list(successes)
@@ -1,8 +1,15 @@
 # encoding: utf-8
-from collections import defaultdict
+from collections import (
+    defaultdict,
+    namedtuple,
+)
 
 import datetime
+import dateutil.parser
+from itertools import chain
+import json
 import logging
+from threading import RLock
 import time
 import urllib
 
@@ -23,6 +30,7 @@ from classifier import (
 from sqlalchemy import (
     and_,
     case,
+    false,
     or_,
     not_,
     Integer,
@@ -44,8 +52,11 @@ from sqlalchemy.orm import (
     joinedload,
     lazyload,
     relationship,
+    selectinload,
 )
+from sqlalchemy.orm.util import identity_key
 from sqlalchemy.sql.expression import literal
+from sqlalchemy.sql.operators import desc_op
 
 from entrypoint import (
     EntryPoint,
@@ -63,6 +74,7 @@ from model import (
     CustomList,
     CustomListEntry,
     DataSource,
+    DeliverableWork,
     DeliveryMechanism,
     Edition,
     Genre,
@@ -75,6 +87,10 @@ from model import (
     WorkGenre,
 )
 from model.constants import EditionConstants
+from model.deliverablework import (
+    CannotUseDeliverableWorks,
+    DeliverableWorkQuery,
+)
 from facets import FacetConstants
 from problem_details import *
 from util import (
@@ -100,6 +116,15 @@ from sqlalchemy.dialects.postgresql import (
     INT4RANGE,
 )
 
+def canonical_query_string(items):
+    """Turn (key, value) 2-tuples into a query string fragment that
+    doesn't depend on the order in which they were given or whether
+    any of them were given twice.
+    """
+    items = set((unicode(k), unicode(v)) for k, v in items)
+    return u"&".join(u"=".join(x) for x in sorted(items))
+
+
 class BaseFacets(FacetConstants):
     """Basic faceting class that doesn't modify a search filter at all.
 
@@ -116,6 +141,10 @@ class BaseFacets(FacetConstants):
     # generated using them should be cached.
     max_cache_age = None
 
+    # These settings control how a feed is cached, not what goes into
+    # it, so they are left out of cache_key.
+    CACHE_CONTROL_SETTINGS = set([FacetConstants.MAX_CACHE_AGE_NAME])
+
     def items(self):
         """Yields a 2-tuple for every active facet setting.
 
@@ -143,6 +172,21 @@ class BaseFacets(FacetConstants):
         """
         return "&".join("=".join(x) for x in sorted(self.items()))
 
+    @property
+    def cache_key(self):
+        """A canonical string that distinguishes CachedFeeds generated
+        with these facet settings from CachedFeeds generated with
+        different settings.
+
+        This is like query_string, except that settings which only
+        control caching are left out; a feed requested with
+        max_age=0 is the same feed as one requested without it.
+        """
+        return canonical_query_string(
+            (k, v) for k, v in self.items()
+            if k not in self.CACHE_CONTROL_SETTINGS
+        )
+
     @property
     def facet_groups(self):
         """Yield a list of 4-tuples
@@ -1178,6 +1222,18 @@ class Pagination(object):
     def query_string(self):
        return "&".join("=".join(map(str, x)) for x in self.items())
 
+    @property
+    def cache_key(self):
+        """A canonical string that distinguishes CachedFeeds for this
+        page from CachedFeeds for other pages.
+
+        The page size is left out when it's the default.
+        """
+        return canonical_query_string(
+            (k, v) for k, v in self.items()
+            if not (k == 'size' and v == self.DEFAULT_SIZE)
+        )
+
     @property
     def first_page(self):
         return Pagination(0, self.size)
@@ -1240,6 +1296,252 @@ class Pagination(object):
         self.page_has_loaded = True
 
 
+class KeysetPagination(Pagination):
+    """A database-specific implementation of Pagination that picks up
+    where the previous page left off by remembering the sort key of
+    the last item on that page, rather than using OFFSET.
+
+    With OFFSET, the database has to find and throw away every item
+    that came before the current page, so deep pages of a long list
+    are much more expensive than the first page. With
+    KeysetPagination, every page costs about the same.
+
+    This is the database counterpart of SortKeyPagination. The sort
+    key of an item is its value for each of the fields in
+    DatabaseBackedFacets.order_by(), which always end with Work.id,
+    so no two works have the same sort key.
+    """
+
+    def __init__(self, last_item_on_previous_page=None,
+                 size=Pagination.DEFAULT_SIZE):
+        self.size = size
+        self.last_item_on_previous_page = last_item_on_previous_page
+
+        # This is set by modify_database_query().
+        self.sort_fields = None
+
+        # These variables are set by page_loaded(), after the query
+        # is run.
+        self.page_has_loaded = False
+        self.last_item_on_this_page = None
+        self.this_page_size = None
+
+    @classmethod
+    def from_request(cls, get_arg, default_size=None):
+        """Instantiate a KeysetPagination object from a Flask request."""
+        size = cls.size_from_request(get_arg, default_size)
+        if isinstance(size, ProblemDetail):
+            return size
+        raw_key = get_arg('key', None)
+        pagination_key = None
+        if raw_key:
+            try:
+                pagination_key = json.loads(raw_key)
+            except ValueError, e:
+                pass
+            if not isinstance(pagination_key, list):
+                return INVALID_INPUT.detailed(
+                    _("Invalid page key: %(key)s", key=raw_key)
+                )
+        return cls(pagination_key, size)
+
+    def items(self):
+        """Yield the URL arguments necessary to convey the current page
+        state.
+        """
+        pagination_key = self.pagination_key
+        if pagination_key:
+            yield("key", self.pagination_key)
+        yield("size", self.size)
+
+    @property
+    def pagination_key(self):
+        """Create the pagination key for this page."""
+        if not self.last_item_on_previous_page:
+            return None
+        return json.dumps(self.last_item_on_previous_page)
+
+    @property
+    def offset(self):
+        # This object never uses the traditional offset system; offset
+        # is determined relative to the last item on the previous
+        # page.
+        return 0
+
+    @property
+    def total_size(self):
+        # We never count the items in the list.
+        return None
+
+    @property
+    def first_page(self):
+        return KeysetPagination(size=self.size)
+
+    @property
+    def previous_page(self):
+        # As with SortKeyPagination, getting the previous page would
+        # mean reversing the sort order and looking before the first
+        # item on this page. We don't need this feature.
+        return None
+
+    @property
+    def next_page(self):
+        """If possible, create a new KeysetPagination representing the
+        next page of results.
+        """
+        if self.this_page_size == 0:
+            # This page is empty; there is no next page.
+            return None
+        if not self.last_item_on_this_page:
+            # This probably means page_loaded wasn't called. At any
+            # rate, we can't say anything about the next page.
+            return None
+        return KeysetPagination(self.last_item_on_this_page, self.size)
+
+    def modify_database_query(self, _db, qu):
+        """Modify the given database query so that it picks up items
+        immediately after the previous page, and stops after a page's
+        worth of items.
+
+        :param qu: A query against Work, joined against the
+           presentation Edition, as created by
+           DatabaseBackedWorkList.works_from_database.
+        """
+        if not qu._order_by:
+            # Without a complete sort order there's no way to tell
+            # where the previous page left off.
+            qu = qu.order_by(Work.id)
+
+        self.sort_fields = []
+        for clause in qu._order_by:
+            field = getattr(clause, 'element', clause)
+            descending = getattr(clause, 'modifier', None) is desc_op
+            # If the query was sorted on a copy of a field in the
+            # DeliverableWork table, find the original field.
+            field = DeliverableWork.source_column_for(field)
+            if field.table not in (Work.__table__, Edition.__table__):
+                raise ValueError(
+                    "Cannot paginate a query ordered by %s." % field
+                )
+            self.sort_fields.append((field, descending))
+
+        if self.last_item_on_previous_page:
+            values = self.sort_values(self.last_item_on_previous_page)
+            if values is None:
+                # This key was made for a different sort order.
+                # Start over from the beginning of the list.
+                logging.warn(
+                    "Ignoring pagination key %r, which doesn't match the "
+                    "sort order.", self.last_item_on_previous_page
+                )
+            else:
+                qu = qu.filter(self.after_clause(self.sort_fields, values))
+        return qu.limit(self.size)
+
+    def sort_values(self, key):
+        """Convert the values in a pagination key into values that
+        can be compared against the fields the query is sorted on.
+
+        :return: A list of values, or None if the key doesn't match
+           the sort order.
+        """
+        if len(key) != len(self.sort_fields):
+            return None
+        values = []
+        for (field, descending), value in zip(self.sort_fields, key):
+            if value is not None:
+                python_type = field.type.python_type
+                try:
+                    if python_type is datetime.datetime:
+                        value = dateutil.parser.parse(value)
+                    elif python_type is int:
+                        if isinstance(value, bool):
+                            raise ValueError(value)
+                        value = int(value)
+                    elif not isinstance(value, basestring):
+                        raise ValueError(value)
+                except (ValueError, TypeError, AttributeError), e:
+                    return None
+            values.append(value)
+        return values
+
+    @classmethod
+    def after_clause(cls, sort_fields, values):
+        """Build a clause that matches items whose sort key comes after
+        the given values.
+
+        :param sort_fields: A list of (field, descending) 2-tuples.
+        :param values: A list of sort values, one for each field.
+        """
+        clauses = []
+        equal = []
+        for (field, descending), value in zip(sort_fields, values):
+            clauses.append(
+                and_(*(equal + [cls._after(field, descending, value)]))
+            )
+            equal.append(field == value)
+        return or_(*clauses)
+
+    @classmethod
+    def _after(cls, field, descending, value):
+        """A clause that matches values of `field` that are sorted after
+        `value`.
+
+        Postgres sorts NULL after every other value, so it comes last
+        in ascending order and first in descending order.
+        """
+        if descending:
+            if value is None:
+                return field != None
+            return field < value
+        if value is None:
+            return false()
+        return or_(field > value, field == None)
+
+    def modify_search_query(self, search):
+        raise NotImplementedError(
+            "KeysetPagination does not work with search queries."
+        )
+
+    def page_loaded(self, page):
+        """An actual page of results has been fetched. Keep any internal state
+        that would be useful to know when reasoning about earlier or
+        later pages.
+
+        Specifically, keep track of the sort key of the last item on
+        this page, so that self.next_page will create a
+        KeysetPagination object capable of generating the subsequent
+        page.
+
+        :param page: A list of Work objects.
+        """
+        super(KeysetPagination, self).page_loaded(page)
+        if page and self.sort_fields:
+            last_item = page[-1]
+            values = [
+                self.sort_value(last_item, field)
+                for field, descending in self.sort_fields
+            ]
+        else:
+            # Either there's nothing on this page, so there's no next
+            # page either, or we don't know how the page was sorted.
+            values = None
+        self.last_item_on_this_page = values
+
+    @classmethod
+    def sort_value(cls, work, field):
+        """Find a Work's value for one of the fields it was sorted on,
+        in a form that can be stored in a pagination key.
+        """
+        if field.table is Edition.__table__:
+            value = getattr(work.presentation_edition, field.key)
+        else:
+            value = getattr(work, field.key)
+        if isinstance(value, datetime.datetime):
+            value = value.isoformat()
+        return value
+
+
 class WorkList(object):
     """An object that can obtain a list of Work objects for use
     in generating an OPDS feed.
@@ -1282,17 +1584,21 @@ class WorkList(object):
         Otherwise, a WorkList containing the visible top-level lanes
         is returned.
         """
-        # Load all of this Library's visible top-level Lane objects
-        # from the database.
-        top_level_lanes = _db.query(Lane).filter(
-            Lane.library==library
-        ).filter(
-            Lane.parent==None
-        ).filter(
-            Lane._visible==True
-        ).order_by(
-            Lane.priority
-        ).all()
+        # Find all of this Library's visible top-level Lane objects,
+        # preferably from a snapshot of its lane tree.
+        tree = LaneTree.for_library(_db, library.id)
+        if tree is not None:
+            top_level_lanes = tree.lanes(_db, tree.top_level_ids)
+        else:
+            top_level_lanes = _db.query(Lane).filter(
+                Lane.library==library
+            ).filter(
+                Lane.parent==None
+            ).filter(
+                Lane._visible==True
+            ).order_by(
+                Lane.priority
+            ).all()
 
         if len(top_level_lanes) == 1:
             # The site configuration includes a single top-level lane;
@@ -2128,6 +2434,12 @@ class DatabaseBackedWorkList(WorkList):
     for use in an OPDS feed.
     """
 
+    # If this is set, works_from_database() finds works by scanning
+    # the DeliverableWork table rather than by joining Work,
+    # LicensePool and Edition. Don't set it until that table has been
+    # populated.
+    USE_DELIVERABLE_WORKS = False
+
     def works_from_database(self, _db, facets=None, pagination=None, **kwargs):
         """Create a query against the `works` table that finds Work objects
         corresponding to all the Works that belong in this WorkList.
@@ -2146,9 +2458,27 @@ class DatabaseBackedWorkList(WorkList):
         :param kwargs: Ignored -- only included for compatibility with works().
         :return: A Query.
         """
+        if self.USE_DELIVERABLE_WORKS:
+            try:
+                return self._works_from_base_query(
+                    _db, self.deliverable_works_base_query(_db), facets,
+                    pagination
+                )
+            except CannotUseDeliverableWorks, e:
+                # Some part of this query needs a field that's not
+                # copied into the DeliverableWork table.
+                logging.info(
+                    "Not using the DeliverableWork table: %s", e.message
+                )
+        return self._works_from_base_query(
+            _db, self.base_query(_db), facets, pagination
+        )
 
-        qu = self.base_query(_db)
-
+    def _works_from_base_query(self, _db, qu, facets, pagination):
+        """Restrict a query created by base_query() or
+        deliverable_works_base_query() to the works that belong in this
+        WorkList.
+        """
         # In general, we only show books that are present in one of
         # the WorkList's collections and ready to be delivered to
         # patrons.
@@ -2181,6 +2511,9 @@ class DatabaseBackedWorkList(WorkList):
         if pagination is not None:
             qu = pagination.modify_database_query(_db, qu)
 
+        # This query only reads data, so a read replica can run it
+        # whenever it's executed.
+        qu = qu.execution_options(read_from_replica=True)
         return qu
 
     @classmethod
@@ -2203,6 +2536,25 @@ class DatabaseBackedWorkList(WorkList):
         qu = cls._defer_unused_fields(qu)
         return qu
 
+    @classmethod
+    def deliverable_works_base_query(cls, _db):
+        """Return a query against Work, joined to DeliverableWork, which can
+        be filtered and sorted as though it were created by base_query().
+        """
+        qu = DeliverableWorkQuery(Work, session=_db).join(
+            DeliverableWork, DeliverableWork.work_id==Work.id
+        )
+
+        # LicensePool and Edition aren't part of the query, so they
+        # must be loaded separately.
+        qu = qu.options(
+            joinedload(Work.presentation_edition),
+            joinedload(Work.license_pools),
+        )
+        qu = cls._load_license_pool_details(qu)
+        qu = cls._defer_unused_fields(qu)
+        return qu
+
     @classmethod
     def _modify_loading(cls, qu):
         """Optimize a query for use in generating OPDS feeds, by modifying
@@ -2213,6 +2565,13 @@ class DatabaseBackedWorkList(WorkList):
             contains_eager(Work.presentation_edition),
             contains_eager(Work.license_pools),
         )
+        return cls._load_license_pool_details(qu)
+
+    @classmethod
+    def _load_license_pool_details(cls, qu):
+        """Load the objects related to a Work's LicensePools that are
+        needed to generate OPDS feeds.
+        """
         license_pool_name = 'license_pools'
 
         # Load some objects that wouldn't normally be loaded, but
@@ -2635,8 +2994,27 @@ class Lane(Base, DatabaseBackedWorkList, HierarchyWorkList):
     def children(self):
         return self.sublanes
 
+    def _snapshot(self):
+        """Find this Lane in a snapshot of its library's lane tree.
+
+        :return: A 2-tuple (LaneTree, LaneTree.Node), or (None, None) if
+            no usable snapshot includes this Lane.
+        """
+        _db = Session.object_session(self)
+        if _db is None or self.id is None:
+            return None, None
+        tree = LaneTree.for_library(_db, self.library_id)
+        if tree is None:
+            return None, None
+        return tree, tree.get(self.id)
+
     @property
     def visible_children(self):
+        tree, node = self._snapshot()
+        if node is not None:
+            return tree.lanes(
+                Session.object_session(self), node.visible_children
+            )
         children = [lane for lane in self.sublanes if lane.visible]
         return sorted(children, key=lambda x: (x.priority, x.display_name or ""))
 
@@ -2647,6 +3025,14 @@ class Lane(Base, DatabaseBackedWorkList, HierarchyWorkList):
         The Lane may be inside one or more non-Lane WorkLists, but those
         WorkLists are not counted in the parentage.
         """
+        tree, node = self._snapshot()
+        if node is not None and node.parentage is not None:
+            for parent in tree.lanes(
+                Session.object_session(self), node.parentage
+            ):
+                yield parent
+            return
+
         if not self.parent:
             return
         parent = self.parent
@@ -2692,6 +3078,17 @@ class Lane(Base, DatabaseBackedWorkList, HierarchyWorkList):
         """Lanes cannot currently have EntryPoints."""
         return []
 
+    def inherited_value(self, k):
+        """Try to find this Lane's value for the given key, inheriting
+        it from the Lane's parentage if necessary.
+
+        See WorkList.inherited_value.
+        """
+        tree, node = self._snapshot()
+        if node is not None and k in (node.inherited or {}):
+            return tree.inherited_value(self.id, k)
+        return super(Lane, self).inherited_value(k)
+
     @hybrid_property
     def visible(self):
         return self._visible and (not self.parent or self.parent.visible)
@@ -2855,7 +3252,13 @@ class Lane(Base, DatabaseBackedWorkList, HierarchyWorkList):
             consider genres at all.
         """
         if not hasattr(self, '_genre_ids'):
-            self._genre_ids = self._gather_genre_ids()
+            tree, node = self._snapshot()
+            if node is not None:
+                self._genre_ids = node.genre_ids
+                if self._genre_ids is not None:
+                    self._genre_ids = set(self._genre_ids)
+            else:
+                self._genre_ids = self._gather_genre_ids()
         return self._genre_ids
 
     def _gather_genre_ids(self):
@@ -2901,7 +3304,13 @@ class Lane(Base, DatabaseBackedWorkList, HierarchyWorkList):
         :return: A list of CustomList IDs, possibly empty.
         """
         if not hasattr(self, '_customlist_ids'):
-            self._customlist_ids = self._gather_customlist_ids()
+            tree, node = self._snapshot()
+            if node is not None:
+                self._customlist_ids = node.customlist_ids
+                if self._customlist_ids is not None:
+                    self._customlist_ids = list(self._customlist_ids)
+            else:
+                self._customlist_ids = self._gather_customlist_ids()
         return self._customlist_ids
 
     def _gather_customlist_ids(self):
@@ -3110,12 +3519,252 @@ lanes_customlists = Table(
     UniqueConstraint('lane_id', 'customlist_id'),
 )
 
+class LaneTree(object):
+    """A read-only snapshot of one library's lane hierarchy.
+
+    Generating a feed consults a Lane's parentage, children, genres,
+    custom lists and inherited restrictions over and over. Looked up
+    through the ORM, each of those can mean another trip to the
+    database. A LaneTree answers the same questions from data gathered
+    in a single pass over the library's lanes.
+
+    LaneTrees are cached per library. The cache is cleared whenever
+    the lane configuration changes in this process (see the listeners
+    at the bottom of this module), and a cached tree is ignored once
+    the site configuration is known to have changed elsewhere.
+    """
+
+    # Lane fields whose values may be inherited from a parent lane.
+    INHERITED_FIELDS = (
+        'audiences', 'fiction', 'languages', 'license_datasource_id',
+        'list_seen_in_previous_days', 'media', 'target_age',
+    )
+
+    # A session with unflushed changes to any of these classes may see
+    # a different lane configuration than the one in the snapshot.
+    RELEVANT_CLASSES = (Lane, LaneGenre, CustomList)
+
+    Node = namedtuple(
+        'Node', [
+            'id', 'parent_id', 'priority', 'display_name', 'visible',
+            'inherit_parent_restrictions', 'root_for_patron_type',
+            'genre_ids', 'customlist_ids', 'parentage',
+            'visible_children', 'inherited',
+        ]
+    )
+
+    _cache = {}
+    _building = set()
+    _lock = RLock()
+
+    def __init__(self, library_id, nodes, version=None):
+        """Constructor.
+
+        :param library_id: The ID of the Library whose lanes these are.
+        :param nodes: A list of LaneTree.Node objects.
+        :param version: The time the site configuration last changed,
+            as of when the snapshot was taken.
+        """
+        self.library_id = library_id
+        self.version = version
+        self.nodes = dict((node.id, node) for node in nodes)
+        top_level = [
+            node for node in nodes
+            if node.parent_id is None and node.visible
+        ]
+        self.top_level_ids = tuple(
+            node.id for node in sorted(
+                top_level, key=lambda x: (x.priority, x.id)
+            )
+        )
+
+    @classmethod
+    def for_library(cls, _db, library_id):
+        """Find the current LaneTree for a library, taking a new snapshot
+        if necessary.
+
+        :return: A LaneTree, or None if `_db` has unflushed changes
+            that might affect the lane configuration. In that case
+            the snapshot may not reflect what the caller has done, and
+            the Lanes themselves should be consulted.
+        """
+        for obj in chain(_db.new, _db.dirty, _db.deleted):
+            if isinstance(obj, cls.RELEVANT_CLASSES):
+                return None
+
+        version = Configuration._site_configuration_last_update()
+        with cls._lock:
+            if library_id in cls._building:
+                # We're in the middle of taking this snapshot.
+                return None
+            tree = cls._cache.get(library_id)
+            if tree is None or tree.version != version:
+                cls._building.add(library_id)
+                try:
+                    tree = cls.build(_db, library_id, version)
+                finally:
+                    cls._building.discard(library_id)
+                cls._cache[library_id] = tree
+        return tree
+
+    @classmethod
+    def reset_cache(cls, library_id=None):
+        """Forget the snapshot for one library, or for every library.
+
+        Search filters built from the old snapshots are forgotten as well.
+        """
+        from external_search import Filter
+        with cls._lock:
+            if library_id is None:
+                cls._cache.clear()
+            else:
+                cls._cache.pop(library_id, None)
+        Filter.reset_cache()
+
+    @classmethod
+    def build(cls, _db, library_id, version=None):
+        """Take a snapshot of a library's lanes.
+
+        :return: A LaneTree.
+        """
+        lanes = _db.query(Lane).filter(
+            Lane.library_id==library_id
+        ).options(
+            selectinload(Lane.lane_genres).joinedload(LaneGenre.genre),
+            selectinload(Lane.customlists),
+        ).all()
+        by_id = dict((lane.id, lane) for lane in lanes)
+
+        # Work out each lane's parentage from the parent IDs, so that
+        # no relationships need to be loaded.
+        parentage = {}
+        for lane in lanes:
+            chain_ids = []
+            seen = set([lane.id])
+            parent_id = lane.parent_id
+            while parent_id is not None:
+                if parent_id in seen or parent_id not in by_id:
+                    # There's a loop, or the parent belongs to some
+                    # other library. Leave this lane's parentage
+                    # unknown so the Lane itself will be consulted.
+                    chain_ids = None
+                    break
+                chain_ids.append(parent_id)
+                seen.add(parent_id)
+                parent_id = by_id[parent_id].parent_id
+            parentage[lane.id] = chain_ids
+
+        # A lane is only visible if its parentage is visible.
+        visible = dict(
+            (lane.id, lane._visible and all(
+                by_id[x]._visible for x in (parentage[lane.id] or [])
+            ))
+            for lane in lanes
+        )
+        children = defaultdict(list)
+        for lane in lanes:
+            if visible[lane.id]:
+                children[lane.parent_id].append(lane)
+
+        nodes = []
+        for lane in lanes:
+            ancestors = parentage[lane.id]
+            visible_children = sorted(
+                children[lane.id],
+                key=lambda x: (x.priority, x.display_name or "")
+            )
+            inherited = None
+            if ancestors is not None:
+                inherited = dict(
+                    (k, cls._inherited_value(by_id, lane, ancestors, k))
+                    for k in cls.INHERITED_FIELDS
+                )
+            genre_ids = lane._gather_genre_ids()
+            if genre_ids is not None:
+                genre_ids = frozenset(genre_ids)
+            customlist_ids = lane._gather_customlist_ids()
+            if customlist_ids is not None:
+                customlist_ids = tuple(customlist_ids)
+            nodes.append(cls.Node(
+                id=lane.id, parent_id=lane.parent_id,
+                priority=lane.priority, display_name=lane.display_name,
+                visible=visible[lane.id],
+                inherit_parent_restrictions=lane.inherit_parent_restrictions,
+                root_for_patron_type=cls._freeze(lane.root_for_patron_type),
+                genre_ids=genre_ids, customlist_ids=customlist_ids,
+                parentage=cls._freeze(ancestors),
+                visible_children=tuple(x.id for x in visible_children),
+                inherited=inherited,
+            ))
+        return cls(library_id, nodes, version)
+
+    @classmethod
+    def _inherited_value(cls, by_id, lane, ancestors, k):
+        """The equivalent of WorkList.inherited_value, using only lanes
+        that have already been loaded.
+        """
+        for candidate in [lane] + [by_id[x] for x in ancestors]:
+            value = getattr(candidate, k)
+            if value not in (None, []):
+                return cls._freeze(value)
+            if not candidate.inherit_parent_restrictions:
+                break
+        return None
+
+    @classmethod
+    def _freeze(cls, value):
+        if isinstance(value, list):
+            return tuple(value)
+        return value
+
+    @classmethod
+    def _thaw(cls, value):
+        if isinstance(value, tuple):
+            return list(value)
+        return value
+
+    def get(self, lane_id):
+        """Find the snapshot of a single lane.
+
+        :return: A LaneTree.Node, or None if the lane is not part of
+            this tree.
+        """
+        return self.nodes.get(lane_id)
+
+    def inherited_value(self, lane_id, k):
+        """Find a lane's value for the given key, taking inheritance into
+        account, as WorkList.inherited_value() would.
+        """
+        return self._thaw(self.nodes[lane_id].inherited[k])
+
+    def lanes(self, _db, lane_ids):
+        """Turn a sequence of lane IDs into Lane objects associated with
+        `_db`, in the same order.
+
+        Lanes already present in the session cost nothing; any others
+        are loaded with a single query.
+        """
+        lanes = {}
+        missing = []
+        for lane_id in lane_ids:
+            lane = _db.identity_map.get(identity_key(Lane, lane_id))
+            if lane is None:
+                missing.append(lane_id)
+            else:
+                lanes[lane_id] = lane
+        if missing:
+            for lane in _db.query(Lane).filter(Lane.id.in_(missing)):
+                lanes[lane.id] = lane
+        return [lanes[x] for x in lane_ids if x in lanes]
+
+
 @event.listens_for(Lane, 'after_insert')
 @event.listens_for(Lane, 'after_delete')
 @event.listens_for(LaneGenre, 'after_insert')
 @event.listens_for(LaneGenre, 'after_delete')
 def configuration_relevant_lifecycle_event(mapper, connection, target):
     site_configuration_has_changed(target)
+    LaneTree.reset_cache()
 
 
 @event.listens_for(Lane, 'after_update')
@@ -3130,3 +3779,18 @@ def configuration_relevant_update(mapper, connection, target):
         # Remove this information whenever the Lane configuration
         # changes. This will force it to be recalculated.
         Library._has_root_lane_cache.clear()
+        LaneTree.reset_cache()
+
+
+# Changes to the set of CustomLists that feed a lane don't count as
+# changes to the site configuration, but the lane tree snapshots
+# need to know about them.
+@event.listens_for(Lane.customlists, 'append')
+@event.listens_for(Lane.customlists, 'remove')
+def lane_customlists_changed(target, value, initiator):
+    LaneTree.reset_cache()
+
+@event.listens_for(CustomList, 'after_insert')
+@event.listens_for(CustomList, 'after_delete')
+def customlist_lifecycle_event(mapper, connection, target):
+    LaneTree.reset_cache()
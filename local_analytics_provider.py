@@ -1,12 +1,207 @@
+import atexit
+import logging
+import os
+from Queue import (
+    Empty,
+    Full,
+    Queue,
+)
+from threading import (
+    Event,
+    Lock,
+    Thread,
+)
+
 from flask_babel import lazy_gettext as _
 from model import (
     Session,
+    SessionManager,
     CirculationEvent,
     ExternalIntegration,
     get_one,
     create
 )
 
+
+class CirculationEventBuffer(object):
+    """A bounded, per-process queue of circulation events waiting to be
+    written to the database.
+
+    Events are written by a background thread, in batches, using
+    CirculationEvent.bulk_log. This keeps analytics writes off the
+    request path.
+    """
+
+    # When the queue is full, throw away new events.
+    DROP = "drop"
+
+    # When the queue is full, make the caller wait (up to
+    # `block_timeout` seconds) for room to open up. Events that still
+    # don't fit are dropped.
+    BLOCK = "block"
+
+    DEFAULT_MAX_SIZE = 10000
+    DEFAULT_BATCH_SIZE = 500
+
+    # The longest an event will wait in the queue before the
+    # background thread writes it, in seconds.
+    DEFAULT_FLUSH_INTERVAL = 2
+
+    DEFAULT_BLOCK_TIMEOUT = 1
+
+    # How long to wait for the background thread to finish its
+    # current batch when shutting down.
+    SHUTDOWN_TIMEOUT = 10
+
+    # The buffer for this process; see for_process().
+    _instance = None
+
+    def __init__(self, session_factory, policy=DROP, max_size=None,
+                 batch_size=None, flush_interval=None, block_timeout=None):
+        """Constructor.
+
+        :param session_factory: Called with no arguments to get a
+            database session for writing a batch of events.
+        :param policy: What to do when the queue is full: DROP or BLOCK.
+        """
+        if policy not in (self.DROP, self.BLOCK):
+            raise ValueError("Unknown full buffer policy: %s" % policy)
+        self.session_factory = session_factory
+        self.policy = policy
+        self.batch_size = batch_size or self.DEFAULT_BATCH_SIZE
+        self.flush_interval = flush_interval or self.DEFAULT_FLUSH_INTERVAL
+        if block_timeout is None:
+            block_timeout = self.DEFAULT_BLOCK_TIMEOUT
+        self.block_timeout = block_timeout
+        self.queue = Queue(maxsize=max_size or self.DEFAULT_MAX_SIZE)
+        self.pid = os.getpid()
+        self.log = logging.getLogger("Circulation event buffer")
+
+        self.queued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+        self._counter_lock = Lock()
+
+        self._stopping = Event()
+        self._write_lock = Lock()
+        self.thread = None
+
+    @classmethod
+    def for_process(cls, _db, **kwargs):
+        """Find or create the buffer for the current process, and make
+        sure its background thread is running.
+
+        A buffer inherited from a parent process is ignored, since its
+        thread didn't survive the fork.
+        """
+        instance = cls._instance
+        if instance is None or instance.pid != os.getpid():
+            instance = cls(SessionManager.sessionmaker(session=_db), **kwargs)
+            instance.start()
+            atexit.register(instance.shutdown)
+            cls._instance = instance
+        return instance
+
+    def _count(self, counter, amount=1):
+        with self._counter_lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    @property
+    def counters(self):
+        return dict(
+            queued=self.queued, flushed=self.flushed,
+            dropped=self.dropped, failed=self.failed,
+            pending=self.queue.qsize(),
+        )
+
+    def add(self, event):
+        """Queue up an event to be written later.
+
+        :param event: A dictionary created by CirculationEvent.event_data.
+        :return: True if the event was queued, False if it was dropped.
+        """
+        try:
+            if self.policy == self.BLOCK:
+                self.queue.put(event, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(event)
+        except Full:
+            self._count('dropped')
+            self.log.warn(
+                "Buffer full, dropping %s event.", event.get('type')
+            )
+            return False
+        self._count('queued')
+        return True
+
+    def start(self):
+        self.thread = Thread(target=self.run, name="circulation-event-buffer")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        while not self._stopping.is_set():
+            batch = self._next_batch(self.flush_interval)
+            if batch:
+                self.write(batch)
+
+    def _next_batch(self, timeout=None):
+        """Take up to `batch_size` events off the queue.
+
+        :param timeout: Wait this long for the first event. If None,
+            don't wait at all.
+        """
+        batch = []
+        try:
+            if timeout is None:
+                batch.append(self.queue.get_nowait())
+            else:
+                batch.append(self.queue.get(timeout=timeout))
+            while len(batch) < self.batch_size:
+                batch.append(self.queue.get_nowait())
+        except Empty:
+            pass
+        return batch
+
+    def write(self, batch):
+        """Write a batch of events in a single transaction."""
+        with self._write_lock:
+            _db = self.session_factory()
+            try:
+                CirculationEvent.bulk_log(_db, batch)
+                _db.commit()
+            except Exception, e:
+                _db.rollback()
+                self._count('failed', len(batch))
+                self.log.error(
+                    "Could not write %d circulation events.", len(batch),
+                    exc_info=e
+                )
+                return
+            finally:
+                _db.close()
+        self._count('flushed', len(batch))
+
+    def flush(self):
+        """Write every queued event in the current thread."""
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                break
+            self.write(batch)
+
+    def shutdown(self):
+        """Stop the background thread and write any events still in
+        the queue.
+        """
+        self._stopping.set()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(self.SHUTDOWN_TIMEOUT)
+        self.flush()
+        self.log.info("Shut down: %r", self.counters)
+
+
 class LocalAnalyticsProvider(object):
     NAME = _("Local Analytics")
 
@@ -25,6 +220,18 @@ class LocalAnalyticsProvider(object):
     # Analytics events have no 'location'.
     LOCATION_SOURCE_DISABLED = ""
 
+    # How to write analytics events to the database.
+    WRITE_MODE = "write_mode"
+
+    # Write each event as part of the request that caused it.
+    WRITE_MODE_IMMEDIATE = "immediate"
+
+    # Queue up events and write them in batches, in the background.
+    WRITE_MODE_BUFFERED = "buffered"
+
+    # What to do with new events when the buffer is full.
+    FULL_BUFFER_POLICY = "full_buffer_policy"
+
     SETTINGS = [
         {
             "key": LOCATION_SOURCE,
@@ -37,6 +244,28 @@ class LocalAnalyticsProvider(object):
                 { "key": LOCATION_SOURCE_NEIGHBORHOOD, "label": _("Use the patron's neighborhood as the event location.") },
             ],
         },
+        {
+            "key": WRITE_MODE,
+            "label": _("How to store events"),
+            "description": _("Buffered events are written to the database in batches, in the background, so that recording an event doesn't slow down the request that caused it. Events still in the buffer when the server shuts down uncleanly will be lost."),
+            "default": WRITE_MODE_IMMEDIATE,
+            "type": "select",
+            "options": [
+                { "key": WRITE_MODE_IMMEDIATE, "label": _("Store each event immediately.") },
+                { "key": WRITE_MODE_BUFFERED, "label": _("Buffer events and store them in batches.") },
+            ],
+        },
+        {
+            "key": FULL_BUFFER_POLICY,
+            "label": _("When the event buffer is full"),
+            "description": _("Only used when events are buffered."),
+            "default": CirculationEventBuffer.DROP,
+            "type": "select",
+            "options": [
+                { "key": CirculationEventBuffer.DROP, "label": _("Drop new events.") },
+                { "key": CirculationEventBuffer.BLOCK, "label": _("Make the request wait briefly for room in the buffer.") },
+            ],
+        },
     ]
 
     def __init__(self, integration, library=None):
@@ -44,13 +273,38 @@ class LocalAnalyticsProvider(object):
         self.location_source = integration.setting(
             self.LOCATION_SOURCE
         ).value or self.LOCATION_SOURCE_DISABLED
+        self.write_mode = integration.setting(
+            self.WRITE_MODE
+        ).value or self.WRITE_MODE_IMMEDIATE
+        self.full_buffer_policy = integration.setting(
+            self.FULL_BUFFER_POLICY
+        ).value or CirculationEventBuffer.DROP
         if library:
             self.library_id = library.id
         else:
             self.library_id = None
 
+        # Tests may set this to a specific CirculationEventBuffer.
+        self.buffer = None
+
+    def event_buffer(self, _db):
+        """The CirculationEventBuffer used when events are buffered."""
+        if self.buffer is None:
+            return CirculationEventBuffer.for_process(
+                _db, policy=self.full_buffer_policy
+            )
+        return self.buffer
+
     def collect_event(self, library, license_pool, event_type, time,
         old_value=None, new_value=None, **kwargs):
+        """Record a circulation event.
+
+        :return: A 2-tuple (event, is_new), as returned by
+            CirculationEvent.log. When events are buffered, the
+            CirculationEvent doesn't exist yet, so `event` is None and
+            `is_new` says whether the event was queued to be written
+            (rather than dropped because the buffer was full).
+        """
         if not library and not license_pool:
             raise ValueError("Either library or license_pool must be provided.")
         if library:
@@ -64,6 +318,16 @@ class LocalAnalyticsProvider(object):
         if self.location_source == self.LOCATION_SOURCE_NEIGHBORHOOD:
             neighborhood = kwargs.pop("neighborhood", None)
 
+        if self.write_mode == self.WRITE_MODE_BUFFERED:
+            # The event will be written later, so there's no
+            # CirculationEvent to return.
+            data = CirculationEvent.event_data(
+                license_pool, event_type, old_value, new_value, start=time,
+                library=library, location=neighborhood
+            )
+            queued = self.event_buffer(_db).add(data)
+            return None, queued
+
         return CirculationEvent.log(
             _db, license_pool, event_type, old_value, new_value, start=time,
             library=library, location=neighborhood
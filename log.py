@@ -65,6 +65,13 @@ class JSONFormatter(logging.Formatter):
         )
         if record.exc_info:
             data['traceback'] = self.formatException(record.exc_info)
+
+        # Structured data can be passed in as extra=dict(json_data=...).
+        # It won't overwrite any of the standard fields.
+        json_data = getattr(record, 'json_data', None)
+        if isinstance(json_data, dict):
+            for key, value in json_data.items():
+                data.setdefault(key, value)
         return json.dumps(data)
 
 
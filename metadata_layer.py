@@ -7,7 +7,12 @@ model. Doing a third-party integration should be as simple as putting
 the information into this format.
 """
 
-from collections import defaultdict
+from collections import (
+    defaultdict,
+    OrderedDict,
+)
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm.session import Session
 
 from dateutil.parser import parse
@@ -15,7 +20,10 @@ from sqlalchemy.sql.expression import and_, or_
 from sqlalchemy.orm.exc import (
     NoResultFound,
 )
-from sqlalchemy.orm import aliased
+from sqlalchemy.orm import (
+    aliased,
+    joinedload,
+)
 import csv
 import datetime
 import logging
@@ -46,6 +54,7 @@ from model import (
     LicensePool,
     LicensePoolDeliveryMechanism,
     LinkRelations,
+    Measurement,
     Subject,
     Hyperlink,
     PresentationCalculationPolicy,
@@ -60,6 +69,33 @@ from classifier import NO_VALUE, NO_NUMBER
 from analytics import Analytics
 from util.personal_names import display_name_to_sort_name
 
+
+# Identifier types, link relations, media types and the like come
+# from a small vocabulary and are repeated in every entry of a feed.
+# Keeping one copy of each value saves a lot of memory when millions
+# of the objects below are alive at once.
+_interned = {}
+INTERN_LIMIT = 10000
+
+def intern_value(value):
+    """Return a shared copy of a string that is likely to show up many
+    times, such as an identifier type or a media type.
+
+    Unlike the intern() builtin, this works for Unicode strings. Once
+    INTERN_LIMIT distinct values have been seen, new values are
+    returned unchanged, so a feed full of unexpected values can't use
+    up memory this way.
+    """
+    if not isinstance(value, basestring):
+        return value
+    key = (type(value), value)
+    interned = _interned.get(key)
+    if interned is not None:
+        return interned
+    if len(_interned) < INTERN_LIMIT:
+        _interned[key] = value
+    return value
+
 class ReplacementPolicy(object):
     """How serious should we be about overwriting old metadata with
     this new metadata?
@@ -150,8 +186,10 @@ class ReplacementPolicy(object):
         )
 
 class SubjectData(object):
+    __slots__ = ['type', 'identifier', 'name', 'weight']
+
     def __init__(self, type, identifier, name=None, weight=1):
-        self.type = type
+        self.type = intern_value(type)
 
         # Because subjects are sometimes evaluated according to keyword
         # matching, it's important that any leading or trailing white
@@ -177,6 +215,10 @@ class SubjectData(object):
 
 
 class ContributorData(object):
+    __slots__ = [
+        'sort_name', 'display_name', 'family_name', 'wikipedia_name',
+        'roles', 'lc', 'viaf', 'biography', 'aliases', 'extra',
+    ]
 
     def __init__(self, sort_name=None, display_name=None,
                  family_name=None, wikipedia_name=None, roles=None,
@@ -189,7 +231,7 @@ class ContributorData(object):
             roles = Contributor.AUTHOR_ROLE
         if not isinstance(roles, list):
             roles = [roles]
-        self.roles = roles
+        self.roles = [intern_value(role) for role in roles]
         self.lc = lc
         self.viaf = viaf
         self.biography = biography
@@ -473,8 +515,10 @@ class ContributorData(object):
 
 
 class IdentifierData(object):
+    __slots__ = ['type', 'identifier', 'weight']
+
     def __init__(self, type, identifier, weight=1):
-        self.type = type
+        self.type = intern_value(type)
         self.weight = weight
         self.identifier = identifier
 
@@ -490,6 +534,11 @@ class IdentifierData(object):
 
 
 class LinkData(object):
+    __slots__ = [
+        'rel', 'href', 'media_type', 'content', 'thumbnail', 'rights_uri',
+        'rights_explanation', 'original', 'transformation_settings',
+    ]
+
     def __init__(self, rel, href=None, media_type=None, content=None,
                  thumbnail=None, rights_uri=None, rights_explanation=None,
                  original=None, transformation_settings=None):
@@ -498,14 +547,14 @@ class LinkData(object):
 
         if not href and not content:
             raise ValueError("Either href or content is required")
-        self.rel = rel
+        self.rel = intern_value(rel)
         self.href = href
-        self.media_type = media_type
+        self.media_type = intern_value(media_type)
         self.content = content
         self.thumbnail = thumbnail
         # This handles content sources like unglue.it that have rights for each link
         # rather than each edition, and rights for cover images.
-        self.rights_uri = rights_uri
+        self.rights_uri = intern_value(rights_uri)
         self.rights_explanation = rights_explanation
         # If this LinkData is a derivative, it may also contain the original link
         # and the settings used to transform the original into the derivative.
@@ -555,6 +604,8 @@ class LinkData(object):
 
 
 class MeasurementData(object):
+    __slots__ = ['quantity_measured', 'value', 'weight', 'taken_at']
+
     def __init__(self,
                  quantity_measured,
                  value,
@@ -564,7 +615,7 @@ class MeasurementData(object):
             raise ValueError("quantity_measured is required.")
         if value is None:
             raise ValueError("measurement value is required.")
-        self.quantity_measured = quantity_measured
+        self.quantity_measured = intern_value(quantity_measured)
         if not isinstance(value, float) and not isinstance(value, int):
             value = float(value)
         self.value = value
@@ -578,20 +629,27 @@ class MeasurementData(object):
 
 
 class FormatData(object):
+    __slots__ = ['content_type', 'drm_scheme', 'link', 'rights_uri']
+
     def __init__(self, content_type, drm_scheme, link=None, rights_uri=None):
-        self.content_type = content_type
-        self.drm_scheme = drm_scheme
+        self.content_type = intern_value(content_type)
+        self.drm_scheme = intern_value(drm_scheme)
         if link and not isinstance(link, LinkData):
             raise TypeError(
                 "Expected LinkData object, got %s" % type(link)
             )
         self.link = link
-        self.rights_uri = rights_uri
+        self.rights_uri = intern_value(rights_uri)
         if ((not self.rights_uri) and self.link and self.link.rights_uri):
             self.rights_uri = self.link.rights_uri
 
 
 class LicenseData(object):
+    __slots__ = [
+        'identifier', 'checkout_url', 'status_url', 'expires',
+        'remaining_checkouts', 'concurrent_checkouts',
+    ]
+
     def __init__(self, identifier, checkout_url, status_url, expires=None, remaining_checkouts=None,
                  concurrent_checkouts=None):
         self.identifier = identifier
@@ -1108,22 +1166,29 @@ class CirculationData(MetaToModelUtility):
         )
 
         if is_new:
-            license_pool.open_access = self.has_open_access_link
-            license_pool.availability_time = self.last_checked
-            # This is our first time seeing this LicensePool. Log its
-            # occurrence as a separate analytics event.
-            if analytics:
-                for library in collection.libraries:
-                    analytics.collect_event(
-                        library, license_pool,
-                        CirculationEvent.DISTRIBUTOR_TITLE_ADD,
-                        self.last_checked,
-                        old_value=0, new_value=1,
-                    )
-            license_pool.last_checked = self.last_checked
+            self._initialize_license_pool(license_pool, collection, analytics)
 
         return license_pool, is_new
 
+    def _initialize_license_pool(self, license_pool, collection,
+                                 analytics=None):
+        """Set up a LicensePool that was just created for this
+        CirculationData.
+        """
+        license_pool.open_access = self.has_open_access_link
+        license_pool.availability_time = self.last_checked
+        # This is our first time seeing this LicensePool. Log its
+        # occurrence as a separate analytics event.
+        if analytics:
+            for library in collection.libraries:
+                analytics.collect_event(
+                    library, license_pool,
+                    CirculationEvent.DISTRIBUTOR_TITLE_ADD,
+                    self.last_checked,
+                    old_value=0, new_value=1,
+                )
+        license_pool.last_checked = self.last_checked
+
 
     @property
     def has_open_access_link(self):
@@ -1151,7 +1216,7 @@ class CirculationData(MetaToModelUtility):
             # We still haven't determined rights, so it's unknown.
             self.default_rights_uri = RightsStatus.UNKNOWN
 
-    def apply(self, _db, collection, replace=None):
+    def apply(self, _db, collection, replace=None, batch=None):
         """Update the title with this CirculationData's information.
 
         :param collection: A Collection representing actual copies of
@@ -1160,6 +1225,8 @@ class CirculationData(MetaToModelUtility):
             this is not present, only delivery information (e.g. format
             information and open-access downloads) will be processed.
 
+        :param batch: An ApplyBatch that has already found or created
+            the LicensePool for this CirculationData.
         """
         # Immediately raise an exception if there is information that
         # can only be stored in a LicensePool, but we have no
@@ -1181,7 +1248,11 @@ class CirculationData(MetaToModelUtility):
         analytics = replace.analytics or Analytics(_db)
 
         pool = None
-        if collection:
+        if batch is not None and self in batch.license_pools:
+            pool, is_new = batch.license_pools[self]
+            if is_new:
+                self._initialize_license_pool(pool, collection, analytics)
+        elif collection:
             pool, ignore = self.license_pool(_db, collection, analytics)
 
         data_source = self.data_source(_db)
@@ -1310,6 +1381,28 @@ class CirculationData(MetaToModelUtility):
 
         return pool, made_changes
 
+    @classmethod
+    def bulk_apply(cls, _db, circulations, collection, replace=None):
+        """Apply a number of CirculationData objects.
+
+        This has the same effect as calling apply() on each one in
+        turn, but the LicensePools are found or created together by an
+        ApplyBatch.
+
+        :return: A list of (LicensePool, made_changes) 2-tuples, one
+            for each CirculationData.
+        """
+        circulations = list(circulations)
+        replace = replace or ReplacementPolicy()
+        batch = ApplyBatch(
+            _db, circulations=circulations, collection=collection,
+            replace=replace
+        )
+        return [
+            circulation.apply(_db, collection, replace, batch=batch)
+            for circulation in circulations
+        ]
+
     def _availability_needs_update(self, pool):
         """Does this CirculationData represent information more recent than
         what we have for the given LicensePool?
@@ -1677,9 +1770,14 @@ class Metadata(MetaToModelUtility):
               replace_formats=False,
               replace_rights=False,
               force=False,
+              batch=None,
     ):
         """Apply this metadata to the given edition.
 
+        :param batch: An ApplyBatch covering this Metadata, which has
+            already written the rows it could write for many Metadata
+            objects at once.
+
         :return: (edition, made_core_changes), where edition is the newly-updated object, and made_core_changes
             answers the question: were any edition core fields harmed in the making of this update?
             So, if title changed, return True.
@@ -1726,14 +1824,9 @@ class Metadata(MetaToModelUtility):
         # Check whether we should do any work at all.
         data_source = self.data_source(_db)
 
-        if self.data_source_last_updated and not replace.even_if_not_apparently_updated:
-            coverage_record = CoverageRecord.lookup(edition, data_source)
-            if coverage_record:
-                check_time = coverage_record.timestamp
-                last_time = self.data_source_last_updated
-                if check_time >= last_time:
-                    # The metadata has not changed since last time. Do nothing.
-                    return edition, False
+        if self.up_to_date(edition, data_source, replace, batch):
+            # The metadata has not changed since last time. Do nothing.
+            return edition, False
 
         if metadata_client and not self.permanent_work_id:
             self.calculate_permanent_work_id(_db, metadata_client)
@@ -1760,61 +1853,18 @@ class Metadata(MetaToModelUtility):
         if contributors_changed:
             work_requires_new_presentation_edition = True
 
-        # TODO: remove equivalencies when replace.identifiers is True.
-        if self.identifiers is not None:
-            for identifier_data in self.identifiers:
-                if not identifier_data.identifier:
-                    continue
-                if (identifier_data.identifier==identifier.identifier and
-                    identifier_data.type==identifier.type):
-                    # These are the same identifier.
-                    continue
-                new_identifier, ignore = Identifier.for_foreign_id(
-                    _db, identifier_data.type, identifier_data.identifier)
-                identifier.equivalent_to(
-                    data_source, new_identifier, identifier_data.weight)
-
-        new_subjects = {}
-        if self.subjects:
-            new_subjects = dict(
-                (subject.key, subject)
-                for subject in self.subjects
-            )
-        if replace.subjects:
-            # Remove any old Subjects from this data source, unless they
-            # are also in the list of new subjects.
-            surviving_classifications = []
-
-            def _key(classification):
-                s = classification.subject
-                return s.type, s.identifier, s.name, classification.weight
-
-            for classification in identifier.classifications:
-                if classification.data_source == data_source:
-                    key = _key(classification)
-                    if not key in new_subjects:
-                        # The data source has stopped claiming that
-                        # this classification should exist.
-                        _db.delete(classification)
-                        work_requires_full_recalculation = True
-                    else:
-                        # The data source maintains that this
-                        # classification is a good idea. We don't have
-                        # to do anything.
-                        del new_subjects[key]
-                        surviving_classifications.append(classification)
-                else:
-                    # This classification comes from some other data
-                    # source.  Don't mess with it.
-                    surviving_classifications.append(classification)
-            identifier.classifications = surviving_classifications
-
-        # Apply all new subjects to the identifier.
-        for subject in new_subjects.values():
-            identifier.classify(
-                data_source, subject.type, subject.identifier,
-                subject.name, weight=subject.weight)
-            work_requires_full_recalculation = True
+        if batch is not None and self in batch.applied:
+            # The batch has already written this Metadata's
+            # equivalencies, classifications and measurements.
+            if batch.applied[self]:
+                work_requires_full_recalculation = True
+        else:
+            self.update_equivalencies(_db, identifier, data_source)
+            if self.update_subjects(_db, identifier, data_source,
+                                    replace.subjects):
+                work_requires_full_recalculation = True
+            if self.update_measurements(identifier, data_source):
+                work_requires_full_recalculation = True
 
         # Associate all links with the primary identifier.
         if replace.links and self.links is not None:
@@ -1891,15 +1941,6 @@ class Metadata(MetaToModelUtility):
                     )
                     link.thumbnail = None
 
-        # Apply all measurements to the primary identifier
-        for measurement in self.measurements:
-            work_requires_full_recalculation = True
-            identifier.add_measurement(
-                data_source, measurement.quantity_measured,
-                measurement.value, measurement.weight,
-                measurement.taken_at
-            )
-
         if not edition.sort_author:
             # This may be a situation like the NYT best-seller list where
             # we know the display name of the author but weren't able
@@ -1921,7 +1962,7 @@ class Metadata(MetaToModelUtility):
         # that that Collection has a LicensePool for this book and that
         # its information is up-to-date.
         if self.circulation:
-            self.circulation.apply(_db, collection, replace)
+            self.circulation.apply(_db, collection, replace, batch=batch)
 
         # obtains a presentation_edition for the title, which will later be used to get a mirror link.
         has_image = any([link.rel == Hyperlink.IMAGE for link in self.links])
@@ -2006,6 +2047,54 @@ class Metadata(MetaToModelUtility):
         return edition, work_requires_new_presentation_edition
 
 
+    @classmethod
+    def bulk_apply(cls, _db, metadatas, collection, metadata_client=None,
+                   replace=None):
+        """Apply a number of Metadata objects to their Editions,
+        creating the Editions if necessary.
+
+        This has the same effect as calling edition() and apply() on
+        each Metadata in turn, but the rows that can be written for all
+        of them at once are written by an ApplyBatch.
+
+        :return: A list of (edition, made_core_changes) 2-tuples, one
+            for each Metadata.
+        """
+        metadatas = list(metadatas)
+        replace = replace or ReplacementPolicy()
+        batch = ApplyBatch(
+            _db, metadatas, collection=collection, replace=replace
+        )
+        results = []
+        for metadata in metadatas:
+            edition = batch.editions.get(metadata)
+            if not edition:
+                edition, ignore = metadata.edition(_db)
+            results.append(metadata.apply(
+                edition, collection, metadata_client, replace=replace,
+                batch=batch
+            ))
+        return results
+
+    def up_to_date(self, edition, data_source, replace, batch=None):
+        """Has this metadata already been applied to the given edition?
+
+        :param batch: An ApplyBatch that has already looked up the
+            edition's CoverageRecord.
+        """
+        if (not self.data_source_last_updated
+            or replace.even_if_not_apparently_updated):
+            return False
+        if batch is not None and self in batch.editions:
+            coverage_record = batch.coverage_records.get(
+                (edition.primary_identifier.id, data_source.id)
+            )
+        else:
+            coverage_record = CoverageRecord.lookup(edition, data_source)
+        if not coverage_record:
+            return False
+        return coverage_record.timestamp >= self.data_source_last_updated
+
     def make_thumbnail(self, data_source, link, link_obj):
         """Make sure a Hyperlink representing an image is connected
         to its thumbnail.
@@ -2036,6 +2125,91 @@ class Metadata(MetaToModelUtility):
         return thumbnail_obj
 
 
+    def update_equivalencies(self, _db, identifier, data_source):
+        """Make all of this Metadata's identifiers equivalent to the
+        given primary identifier.
+        """
+        # TODO: remove equivalencies when replace.identifiers is True.
+        if self.identifiers is None:
+            return
+        for identifier_data in self.identifiers:
+            if not identifier_data.identifier:
+                continue
+            if (identifier_data.identifier==identifier.identifier and
+                identifier_data.type==identifier.type):
+                # These are the same identifier.
+                continue
+            new_identifier, ignore = Identifier.for_foreign_id(
+                _db, identifier_data.type, identifier_data.identifier)
+            identifier.equivalent_to(
+                data_source, new_identifier, identifier_data.weight)
+
+    def update_subjects(self, _db, identifier, data_source, replace=False):
+        """Classify the given identifier under this Metadata's subjects.
+
+        :param replace: If this is True, classifications from this data
+            source that aren't mentioned in this Metadata are removed.
+        :return: True if any classifications were added or removed.
+        """
+        changed = False
+        new_subjects = {}
+        if self.subjects:
+            new_subjects = dict(
+                (subject.key, subject)
+                for subject in self.subjects
+            )
+        if replace:
+            # Remove any old Subjects from this data source, unless they
+            # are also in the list of new subjects.
+            surviving_classifications = []
+
+            for classification in identifier.classifications:
+                if classification.data_source == data_source:
+                    key = self._classification_key(classification)
+                    if not key in new_subjects:
+                        # The data source has stopped claiming that
+                        # this classification should exist.
+                        _db.delete(classification)
+                        changed = True
+                    else:
+                        # The data source maintains that this
+                        # classification is a good idea. We don't have
+                        # to do anything.
+                        del new_subjects[key]
+                        surviving_classifications.append(classification)
+                else:
+                    # This classification comes from some other data
+                    # source.  Don't mess with it.
+                    surviving_classifications.append(classification)
+            identifier.classifications = surviving_classifications
+
+        # Apply all new subjects to the identifier.
+        for subject in new_subjects.values():
+            identifier.classify(
+                data_source, subject.type, subject.identifier,
+                subject.name, weight=subject.weight)
+            changed = True
+        return changed
+
+    @classmethod
+    def _classification_key(cls, classification):
+        """The SubjectData.key that describes the given Classification."""
+        s = classification.subject
+        return s.type, s.identifier, s.name, classification.weight
+
+    def update_measurements(self, identifier, data_source):
+        """Apply all measurements to the given identifier.
+
+        :return: True if there were any measurements.
+        """
+        for measurement in self.measurements:
+            identifier.add_measurement(
+                data_source, measurement.quantity_measured,
+                measurement.value, measurement.weight,
+                measurement.taken_at
+            )
+        return bool(self.measurements)
+
     def update_contributions(self, _db, edition, metadata_client=None,
                              replace=True):
         contributors_changed = False
@@ -2114,6 +2288,483 @@ class Metadata(MetaToModelUtility):
             self.recommendations.remove(identifier_data)
 
 
+class ApplyBatch(object):
+    """Write the rows that a number of Metadata and CirculationData
+    objects need with one multi-row statement per table, rather than
+    looking them up or creating them one at a time.
+
+    The Identifiers, Subjects and LicensePools the objects refer to
+    are created with INSERT ... ON CONFLICT DO NOTHING and loaded with
+    one query per table. Each Metadata's equivalencies,
+    classifications and measurements are compared against the rows
+    already in the database, and the new ones are inserted together.
+
+    Contributors, links, delivery mechanisms and availability are
+    still handled by Metadata.apply() and CirculationData.apply(),
+    which consult the batch for anything it has already done. An
+    object the batch can't handle -- a second Metadata for the same
+    Edition, say, or one with an invalid identifier -- is left out of
+    the batch and applied the usual way.
+    """
+
+    # The most rows to put in a single statement.
+    ROWS_PER_STATEMENT = 1000
+
+    def __init__(self, _db, metadatas=(), circulations=(), collection=None,
+                 replace=None):
+        self._db = _db
+        self.collection = collection
+        self.replace = replace or ReplacementPolicy()
+
+        # (type, identifier) -> Identifier
+        self.identifiers = {}
+
+        # Metadata -> Edition
+        self.editions = {}
+
+        # (identifier_id, data_source_id) -> CoverageRecord
+        self.coverage_records = {}
+
+        # Metadata whose equivalencies, classifications and
+        # measurements have been written -> whether its Work needs a
+        # full presentation recalculation as a result.
+        self.applied = {}
+
+        # CirculationData -> (LicensePool, is_new)
+        self.license_pools = {}
+
+        # Anything waiting to be written by the ORM should be in the
+        # database before we start writing rows directly.
+        _db.flush()
+
+        metadatas = list(metadatas)
+        circulations = list(circulations)
+        self._load_identifiers(
+            metadatas + circulations + [
+                m.circulation for m in metadatas if m.circulation
+            ]
+        )
+        self._load_editions(metadatas)
+        self._load_coverage_records()
+
+        applied = [
+            metadata for metadata in metadatas
+            if metadata in self.editions and not metadata.up_to_date(
+                self.editions[metadata], metadata.data_source(_db),
+                self.replace, self
+            )
+        ]
+        changed = self._write_classifications(applied)
+        changed.update(self._write_measurements(applied))
+        self._write_equivalencies(applied)
+        for metadata in applied:
+            self.applied[metadata] = metadata in changed
+
+        if collection:
+            self._load_license_pools(
+                circulations + [m.circulation for m in applied
+                                if m.circulation]
+            )
+
+        _db.flush()
+        for identifier in self.identifiers.values():
+            _db.expire(identifier, [
+                'equivalencies', 'inbound_equivalencies', 'classifications',
+                'measurements', 'licensed_through',
+            ])
+
+    @classmethod
+    def _chunks(cls, items):
+        items = list(items)
+        for i in xrange(0, len(items), cls.ROWS_PER_STATEMENT):
+            yield items[i:i+cls.ROWS_PER_STATEMENT]
+
+    def _insert(self, model, rows, conflict=None):
+        """Insert rows into the given model's table.
+
+        :param conflict: If the rows might already exist, the names of
+            the columns in the unique constraint they would violate.
+        :return: The IDs of the rows that were inserted.
+        """
+        table = model.__table__
+        ids = []
+        for chunk in self._chunks(rows):
+            statement = insert(table).values(chunk)
+            if conflict:
+                statement = statement.on_conflict_do_nothing(
+                    index_elements=conflict
+                )
+            result = self._db.execute(statement.returning(table.c.id))
+            ids.extend(row[0] for row in result)
+        return ids
+
+    def _query(self, model, columns, keys, *options):
+        """Find the rows of the given model whose values for `columns`
+        are among `keys`.
+        """
+        columns = tuple_(*columns)
+        qu = self._db.query(model).options(*options)
+        for chunk in self._chunks(keys):
+            for obj in qu.filter(columns.in_(chunk)):
+                yield obj
+
+    @classmethod
+    def _identifier_key(cls, identifier_data):
+        """Turn an IdentifierData (or Identifier) into the (type,
+        identifier) of the Identifier it describes.
+
+        :return: None if Identifier.for_foreign_id() would not give an
+            Identifier for it.
+        """
+        try:
+            key = Identifier.prepare_foreign_type_and_identifier(
+                identifier_data.type, identifier_data.identifier
+            )
+        except ValueError:
+            return None
+        if not all(key):
+            return None
+        return key
+
+    def identifier(self, identifier_data):
+        """The Identifier described by an IdentifierData, if the batch
+        has loaded it.
+        """
+        key = self._identifier_key(identifier_data)
+        return self.identifiers.get(key)
+
+    def _load_identifiers(self, items):
+        """Create and load the Identifiers mentioned by a number of
+        Metadata and CirculationData objects.
+        """
+        keys = set()
+        for item in items:
+            if isinstance(item, CirculationData):
+                if item.primary_identifier_obj:
+                    continue
+                mentioned = [item._primary_identifier]
+            else:
+                mentioned = [item.primary_identifier] + [
+                    x for x in (item.identifiers or []) if x.identifier
+                ]
+            for identifier_data in mentioned:
+                if identifier_data is None:
+                    continue
+                key = self._identifier_key(identifier_data)
+                if key:
+                    keys.add(key)
+
+        self._insert(
+            Identifier,
+            [dict(type=type, identifier=identifier)
+             for type, identifier in keys],
+            conflict=['type', 'identifier']
+        )
+        for identifier in self._query(
+            Identifier, (Identifier.type, Identifier.identifier), keys
+        ):
+            self.identifiers[(identifier.type, identifier.identifier)] = identifier
+
+    def _batchable(self, metadata):
+        """Can everything the batch does for this Metadata be done the
+        same way Metadata.apply() would do it?
+        """
+        if not metadata.primary_identifier:
+            return False
+        for identifier_data in metadata.identifiers or []:
+            if (identifier_data.identifier
+                and not self.identifier(identifier_data)):
+                return False
+        for subject in metadata.subjects:
+            if not subject.type or not (subject.identifier or subject.name):
+                return False
+        return True
+
+    def _load_editions(self, metadatas):
+        """Find or create the Edition for each Metadata."""
+        by_key = {}
+        for metadata in metadatas:
+            if not self._batchable(metadata):
+                continue
+            data_source = metadata.data_source(self._db)
+            identifier = self.identifier(metadata.primary_identifier)
+            key = (data_source.id, identifier.id)
+            if key in by_key:
+                # A second Metadata for the same Edition has to be
+                # applied after the first one.
+                continue
+            by_key[key] = (metadata, data_source, identifier)
+
+        editions = {}
+        for edition in self._query(
+            Edition, (Edition.data_source_id, Edition.primary_identifier_id),
+            by_key.keys()
+        ):
+            editions[(edition.data_source_id, edition.primary_identifier_id)] = edition
+
+        for key, (metadata, data_source, identifier) in by_key.items():
+            edition = editions.get(key)
+            if not edition:
+                edition = Edition(
+                    data_source=data_source, primary_identifier=identifier
+                )
+                self._db.add(edition)
+            self.editions[metadata] = edition
+        self._db.flush()
+
+    def _load_coverage_records(self):
+        """Find the CoverageRecords that tell us which Metadata have
+        already been applied.
+        """
+        keys = set(
+            (edition.primary_identifier_id, edition.data_source_id)
+            for edition in self.editions.values()
+        )
+        for record in self._query(
+            CoverageRecord,
+            (CoverageRecord.identifier_id, CoverageRecord.data_source_id),
+            keys
+        ):
+            if record.operation is None and record.collection_id is None:
+                key = (record.identifier_id, record.data_source_id)
+                self.coverage_records.setdefault(key, record)
+
+    def _targets(self, metadatas):
+        """Yield (metadata, identifier, data_source) 3-tuples."""
+        for metadata in metadatas:
+            edition = self.editions[metadata]
+            yield metadata, edition.primary_identifier, edition.data_source
+
+    def _write_equivalencies(self, metadatas):
+        """Make each Metadata's identifiers equivalent to its Edition's
+        primary identifier, as Metadata.update_equivalencies() would.
+        """
+        strengths = OrderedDict()
+        for metadata, identifier, data_source in self._targets(metadatas):
+            for identifier_data in metadata.identifiers or []:
+                if not identifier_data.identifier:
+                    continue
+                output = self.identifier(identifier_data)
+                if output == identifier:
+                    continue
+                key = (data_source.id, identifier.id, output.id)
+                strengths[key] = identifier_data.weight
+
+        existing = {}
+        for equivalency in self._query(
+            Equivalency, (Equivalency.data_source_id, Equivalency.input_id),
+            set(key[:2] for key in strengths)
+        ):
+            key = (equivalency.data_source_id, equivalency.input_id,
+                   equivalency.output_id)
+            existing.setdefault(key, equivalency)
+
+        new = []
+        for key, strength in strengths.items():
+            if key in existing:
+                existing[key].strength = strength
+            else:
+                data_source_id, input_id, output_id = key
+                new.append(dict(
+                    data_source_id=data_source_id, input_id=input_id,
+                    output_id=output_id, strength=strength
+                ))
+        self._insert(Equivalency, new)
+
+    def _write_classifications(self, metadatas):
+        """Classify each Metadata's primary identifier under its
+        subjects, as Metadata.update_subjects() would.
+
+        :return: The Metadata whose classifications changed.
+        """
+        _db = self._db
+        targets = [
+            target for target in self._targets(metadatas)
+            if target[0].subjects or self.replace.subjects
+        ]
+
+        existing = defaultdict(list)
+        for classification in self._query(
+            Classification,
+            (Classification.identifier_id, Classification.data_source_id),
+            set((identifier.id, data_source.id)
+                for metadata, identifier, data_source in targets),
+            joinedload(Classification.subject)
+        ):
+            key = (classification.identifier_id, classification.data_source_id)
+            existing[key].append(classification)
+
+        changed = set()
+        todo = []
+        subject_names = OrderedDict()
+        for metadata, identifier, data_source in targets:
+            key = (identifier.id, data_source.id)
+            new_subjects = dict(
+                (subject.key, subject) for subject in metadata.subjects
+            )
+            if self.replace.subjects:
+                surviving = []
+                for classification in existing[key]:
+                    subject_key = Metadata._classification_key(classification)
+                    if subject_key in new_subjects:
+                        del new_subjects[subject_key]
+                        surviving.append(classification)
+                    else:
+                        _db.delete(classification)
+                        changed.add(metadata)
+                existing[key] = surviving
+            if new_subjects:
+                changed.add(metadata)
+            for subject in new_subjects.values():
+                todo.append((key, subject))
+                if subject.identifier:
+                    subject_names.setdefault(
+                        (subject.type, subject.identifier), subject.name
+                    )
+
+        # Subjects are looked up by identifier if they have one,
+        # by name if they don't.
+        self._insert(
+            Subject,
+            [dict(type=type, identifier=identifier, name=name)
+             for (type, identifier), name in subject_names.items()],
+            conflict=['type', 'identifier']
+        )
+        subjects = {}
+        for subject in self._query(
+            Subject, (Subject.type, Subject.identifier), subject_names.keys()
+        ):
+            subjects[(subject.type, subject.identifier)] = subject
+
+        new = OrderedDict()
+        for key, subject_data in todo:
+            if subject_data.identifier:
+                subject = subjects[(subject_data.type, subject_data.identifier)]
+                if subject_data.name and not subject.name:
+                    subject.name = subject_data.name
+            else:
+                subject, ignore = Subject.lookup(
+                    _db, subject_data.type, None, subject_data.name
+                )
+            identifier_id, data_source_id = key
+            matches = [
+                classification for classification in existing[key]
+                if classification.subject_id == subject.id
+            ]
+            if matches:
+                for duplicate in matches[1:]:
+                    _db.delete(duplicate)
+                    existing[key].remove(duplicate)
+                matches[0].weight = subject_data.weight
+            else:
+                new[(identifier_id, subject.id, data_source_id)] = dict(
+                    identifier_id=identifier_id, subject_id=subject.id,
+                    data_source_id=data_source_id,
+                    weight=subject_data.weight
+                )
+        self._insert(Classification, new.values())
+        for subject in subjects.values():
+            _db.expire(subject, ['classifications'])
+        return changed
+
+    def _write_measurements(self, metadatas):
+        """Add each Metadata's measurements to its primary identifier,
+        as Metadata.update_measurements() would.
+
+        :return: The Metadata that had measurements.
+        """
+        targets = [
+            target for target in self._targets(metadatas)
+            if target[0].measurements
+        ]
+
+        # (identifier_id, data_source_id, quantity) -> the most recent
+        # Measurement, either in the database or about to be.
+        most_recent = {}
+        for measurement in self._query(
+            Measurement,
+            (Measurement.identifier_id, Measurement.data_source_id),
+            set((identifier.id, data_source.id)
+                for metadata, identifier, data_source in targets)
+        ):
+            if measurement.is_most_recent:
+                key = (measurement.identifier_id, measurement.data_source_id,
+                       measurement.quantity_measured)
+                most_recent.setdefault(key, measurement)
+
+        new = []
+        for metadata, identifier, data_source in targets:
+            for measurement_data in metadata.measurements:
+                taken_at = (measurement_data.taken_at
+                            or datetime.datetime.utcnow())
+                key = (identifier.id, data_source.id,
+                       measurement_data.quantity_measured)
+                previous = most_recent.get(key)
+                if previous and previous.taken_at < taken_at:
+                    previous.is_most_recent = False
+                measurement = Measurement(
+                    identifier_id=identifier.id,
+                    data_source_id=data_source.id,
+                    quantity_measured=measurement_data.quantity_measured,
+                    taken_at=taken_at, value=measurement_data.value,
+                    weight=measurement_data.weight, is_most_recent=True
+                )
+                new.append(measurement)
+                most_recent[key] = measurement
+
+        columns = ['identifier_id', 'data_source_id', 'quantity_measured',
+                   'taken_at', 'value', 'weight', 'is_most_recent']
+        self._insert(
+            Measurement,
+            [dict((column, getattr(measurement, column))
+                  for column in columns)
+             for measurement in new]
+        )
+        return set(metadata for metadata, ignore, ignore in targets)
+
+    def _load_license_pools(self, circulations):
+        """Find or create the LicensePool in this batch's Collection for
+        each CirculationData.
+        """
+        _db = self._db
+        by_key = OrderedDict()
+        for circulation in circulations:
+            data_source = circulation.data_source(_db)
+            if circulation.primary_identifier_obj:
+                identifier = circulation.primary_identifier_obj
+            else:
+                identifier = self.identifier(circulation._primary_identifier)
+            if not data_source or not identifier:
+                continue
+            primary_type = data_source.primary_identifier_type
+            if primary_type and identifier.type not in (
+                primary_type, Identifier.DEPRECATED_NAMES.get(primary_type)
+            ):
+                # LicensePool.for_foreign_id will raise an exception.
+                continue
+            circulation.primary_identifier_obj = identifier
+            key = (identifier.id, data_source.id)
+            if key not in by_key:
+                by_key[key] = circulation
+
+        collection_id = self.collection.id
+        new_ids = set(self._insert(
+            LicensePool,
+            [dict(identifier_id=identifier_id, data_source_id=data_source_id,
+                  collection_id=collection_id)
+             for identifier_id, data_source_id in by_key],
+            conflict=['identifier_id', 'data_source_id', 'collection_id']
+        ))
+        for pool in self._query(
+            LicensePool,
+            (LicensePool.identifier_id, LicensePool.data_source_id,
+             LicensePool.collection_id),
+            [key + (collection_id,) for key in by_key]
+        ):
+            circulation = by_key[(pool.identifier_id, pool.data_source_id)]
+            self.license_pools[circulation] = (pool, pool.id in new_ids)
+
+
 class CSVFormatError(csv.Error):
     pass
 
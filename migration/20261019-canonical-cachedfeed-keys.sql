@@ -0,0 +1,6 @@
+-- CachedFeeds are now keyed without the max_age setting and without
+-- the default page size. Feeds stored under the old keys will never
+-- be found again, so remove them rather than waiting for the reaper.
+DELETE FROM cachedfeeds
+WHERE facets LIKE '%max_age=%'
+   OR pagination LIKE '%size=50';
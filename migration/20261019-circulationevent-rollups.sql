@@ -0,0 +1,23 @@
+-- Hourly and daily aggregates of circulation events, kept up to date
+-- by the CirculationEventRollupMonitor.
+CREATE TABLE IF NOT EXISTS circulationeventrollups (
+    id serial NOT NULL PRIMARY KEY,
+    period character varying(8) NOT NULL,
+    period_start timestamp without time zone NOT NULL,
+    library_id integer REFERENCES libraries(id),
+    collection_id integer REFERENCES collections(id),
+    license_pool_id integer REFERENCES licensepools(id),
+    type character varying(32) NOT NULL,
+    location character varying,
+    count integer NOT NULL,
+    delta integer NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_circulationeventrollups_period_start on circulationeventrollups (period_start);
+CREATE INDEX IF NOT EXISTS ix_circulationeventrollups_library_id on circulationeventrollups (library_id);
+CREATE INDEX IF NOT EXISTS ix_circulationeventrollups_collection_id on circulationeventrollups (collection_id);
+CREATE INDEX IF NOT EXISTS ix_circulationeventrollups_license_pool_id on circulationeventrollups (license_pool_id);
+CREATE INDEX IF NOT EXISTS ix_circulationeventrollups_type on circulationeventrollups (type);
+
+-- Null foreign keys and locations are treated as equal to each other.
+CREATE UNIQUE INDEX IF NOT EXISTS ix_circulationeventrollups_unique on circulationeventrollups (period, period_start, coalesce(library_id, 0), coalesce(collection_id, 0), coalesce(license_pool_id, 0), type, coalesce(location, ''));
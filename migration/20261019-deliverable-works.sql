@@ -0,0 +1,52 @@
+-- A copy of the fields used to filter and sort database-backed lanes,
+-- kept up to date by the search index coverage provider.
+CREATE TABLE IF NOT EXISTS deliverableworks (
+    id serial NOT NULL PRIMARY KEY,
+    work_id integer NOT NULL REFERENCES works(id) ON DELETE CASCADE,
+    license_pool_id integer NOT NULL REFERENCES licensepools(id) ON DELETE CASCADE,
+    collection_id integer,
+    data_source_id integer,
+    identifier_id integer,
+    suppressed boolean,
+    open_access boolean,
+    self_hosted boolean,
+    licenses_owned integer,
+    licenses_available integer,
+    audience character varying,
+    target_age int4range,
+    fiction boolean,
+    quality double precision,
+    last_update_time timestamp without time zone,
+    medium character varying,
+    language character varying,
+    sort_title character varying,
+    sort_author character varying,
+    UNIQUE (license_pool_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_deliverableworks_work_id on deliverableworks (work_id);
+CREATE INDEX IF NOT EXISTS ix_deliverableworks_collection_id on deliverableworks (collection_id);
+CREATE INDEX IF NOT EXISTS ix_deliverableworks_sort_author on deliverableworks (sort_author, sort_title, work_id);
+CREATE INDEX IF NOT EXISTS ix_deliverableworks_sort_title on deliverableworks (sort_title, sort_author, work_id);
+CREATE INDEX IF NOT EXISTS ix_deliverableworks_last_update_time on deliverableworks (last_update_time, work_id);
+CREATE INDEX IF NOT EXISTS ix_deliverableworks_medium_language_audience on deliverableworks (medium, language, audience);
+
+-- Populate the table from scratch.
+INSERT INTO deliverableworks (
+    license_pool_id, work_id, collection_id, data_source_id, identifier_id,
+    suppressed, open_access, self_hosted,
+    licenses_owned, licenses_available,
+    audience, target_age, fiction, quality, last_update_time,
+    medium, language, sort_title, sort_author
+)
+SELECT
+    lp.id, w.id, lp.collection_id, lp.data_source_id, lp.identifier_id,
+    lp.suppressed, lp.open_access, lp.self_hosted,
+    lp.licenses_owned, lp.licenses_available,
+    w.audience, w.target_age, w.fiction, w.quality, w.last_update_time,
+    e.medium, e.language, e.sort_title, e.sort_author
+FROM works w
+    JOIN licensepools lp ON lp.work_id = w.id
+    JOIN editions e ON w.presentation_edition_id = e.id
+WHERE w.presentation_ready = true AND lp.superceded = false
+ON CONFLICT (license_pool_id) DO NOTHING;
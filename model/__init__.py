@@ -1,38 +1,61 @@
 # encoding: utf-8
 
 
+from contextlib import contextmanager
 import logging
 import os
+import random
+import time
 import warnings
+from threading import RLock
 from psycopg2.extensions import adapt as sqlescape
 from psycopg2.extras import NumericRange
 from sqlalchemy import (
     Column,
     create_engine,
+    event,
     ForeignKey,
+    inspect,
     Integer,
+    literal,
     Table,
     text,
+    tuple_,
+    union_all,
+    UniqueConstraint,
 )
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import (
     IntegrityError,
     SAWarning,
 )
+from sqlalchemy.engine.url import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import (
+    aliased,
+    lazyload,
+    Query,
     relationship,
     sessionmaker,
 )
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.orm.exc import (
     NoResultFound,
     MultipleResultsFound,
 )
+from sqlalchemy.orm.interfaces import MANYTOONE
+from sqlalchemy.orm.session import Session
+from sqlalchemy.pool import (
+    NullPool,
+    QueuePool,
+)
 from sqlalchemy.sql import (
     compiler,
     select,
 )
 from sqlalchemy.sql.expression import (
     literal_column,
+    Select,
     table,
 )
 
@@ -108,23 +131,306 @@ def get_one_or_create(db, model, create_method='',
     one = get_one(db, model, **kwargs)
     if one:
         return one, False
-    else:
-        __transaction = db.begin_nested()
+
+    if not create_method and 'constraint' not in kwargs:
+        # If the object can be created with a single INSERT ... ON
+        # CONFLICT DO NOTHING, there's no need for a savepoint.
+        filter_kwargs = dict(
+            (k, v) for k, v in kwargs.items() if k != 'on_multiple'
+        )
+        upsert = _Upsert.for_model(model, filter_kwargs)
+        values = upsert and upsert.values(
+            dict(create_method_kwargs or {}, **filter_kwargs)
+        )
+        if values is not None:
+            obj = upsert.insert(db, values)
+            if obj is None:
+                # Someone else created the object after get_one()
+                # looked for it.
+                return db.query(model).filter_by(**filter_kwargs).one(), False
+            upsert.set_relationships(
+                obj, dict(create_method_kwargs or {}, **filter_kwargs)
+            )
+            return obj, True
+
+    __transaction = db.begin_nested()
+    try:
+        # These kwargs are supported by get_one() but not by create().
+        get_one_keys = ['on_multiple', 'constraint']
+        for key in get_one_keys:
+            if key in kwargs:
+                del kwargs[key]
+        obj = create(db, model, create_method, create_method_kwargs, **kwargs)
+        __transaction.commit()
+        return obj
+    except IntegrityError, e:
+        logging.info(
+            "INTEGRITY ERROR on %r %r, %r: %r", model, create_method_kwargs,
+            kwargs, e)
+        __transaction.rollback()
+        return db.query(model).filter_by(**kwargs).one(), False
+
+def get_many_or_create(db, model, kwargs_list):
+    """Find or create a number of objects of the same model.
+
+    :param kwargs_list: A list of dictionaries, each of which could be
+        passed into get_one_or_create() as keyword arguments.
+    :return: A list of (object, is_new) 2-tuples, one for each item
+        in `kwargs_list`, in the same order.
+
+    If every dictionary names the columns of one of the model's unique
+    constraints, the objects that already exist are found and the
+    missing ones are created with a single statement for the whole
+    batch. Otherwise get_one_or_create() is called for each item.
+    """
+    kwargs_list = list(kwargs_list)
+    results = [None] * len(kwargs_list)
+
+    # Group the items by the statement that can find or create them.
+    batches = {}
+    for i, kwargs in enumerate(kwargs_list):
+        upsert = _Upsert.for_model(model, kwargs)
+        values = upsert and upsert.values(kwargs)
+        if values is None:
+            results[i] = get_one_or_create(db, model, **kwargs)
+        else:
+            batches.setdefault(upsert, []).append((i, values))
+
+    for upsert, items in batches.items():
+        by_key = dict()
+        for obj, is_new in upsert.run(db, [values for i, values in items]):
+            by_key[upsert.key(obj)] = (obj, is_new)
+        for i, values in items:
+            key = upsert.key(values)
+            if key not in by_key:
+                # Someone else created the object while we were
+                # looking for it.
+                by_key[key] = (
+                    db.query(model).filter_by(**kwargs_list[i]).one(), False
+                )
+            obj, is_new = by_key[key]
+            if is_new:
+                upsert.set_relationships(obj, kwargs_list[i])
+                # If the same object shows up again later in the
+                # list, it's not new any more.
+                by_key[key] = (obj, False)
+            results[i] = (obj, is_new)
+    return results
+
+class _Upsert(object):
+    """Find or create rows of a model with a single INSERT ... ON
+    CONFLICT DO NOTHING statement, aimed at one of the model's unique
+    constraints.
+
+    This bypasses the ORM's unit of work, so it's only used for models
+    whose rows don't need anything from the ORM when they're created:
+    no insert event listeners, no validators, no inheritance.
+    """
+
+    # The most rows to put in a single statement.
+    ROWS_PER_STATEMENT = 1000
+
+    # model -> ({attribute name: Column}, {frozenset of Columns: _Upsert}),
+    # for the unique constraints of models this can be used with.
+    _cache = {}
+
+    def __init__(self, model, columns):
+        self.model = model
+        self.mapper = model.__mapper__
+        self.columns = columns
+
+    @classmethod
+    def for_model(cls, model, kwargs):
+        """Find the _Upsert that can create an object of the given
+        model from the given keyword arguments.
+
+        :return: An _Upsert, or None if the arguments don't name the
+            columns of one of the model's unique constraints.
+        """
+        if model not in cls._cache:
+            cls._cache[model] = cls._for_constraints(model)
+        columns_by_name, upserts = cls._cache[model]
         try:
-            # These kwargs are supported by get_one() but not by create().
-            get_one_keys = ['on_multiple', 'constraint']
-            for key in get_one_keys:
-                if key in kwargs:
-                    del kwargs[key]
-            obj = create(db, model, create_method, create_method_kwargs, **kwargs)
-            __transaction.commit()
-            return obj
-        except IntegrityError, e:
-            logging.info(
-                "INTEGRITY ERROR on %r %r, %r: %r", model, create_method_kwargs,
-                kwargs, e)
-            __transaction.rollback()
-            return db.query(model).filter_by(**kwargs).one(), False
+            columns = frozenset(columns_by_name[key] for key in kwargs)
+        except KeyError:
+            return None
+        return upserts.get(columns)
+
+    @classmethod
+    def _for_constraints(cls, model):
+        mapper = getattr(model, '__mapper__', None)
+        if (mapper is None or mapper.inherits or mapper.validators
+            or mapper.dispatch.before_insert or mapper.dispatch.after_insert):
+            return {}, {}
+        local_table = mapper.local_table
+
+        # A column can be named by its own attribute, or by a
+        # many-to-one relationship that uses it as a foreign key.
+        columns_by_name = {}
+        for prop in mapper.column_attrs:
+            if len(prop.columns) == 1:
+                columns_by_name[prop.key] = prop.columns[0]
+        for prop in mapper.relationships:
+            if (prop.direction is MANYTOONE and not prop.viewonly
+                and len(prop.local_columns) == 1):
+                [columns_by_name[prop.key]] = prop.local_columns
+
+        upserts = {}
+        uniques = [
+            constraint.columns for constraint in local_table.constraints
+            if isinstance(constraint, UniqueConstraint)
+        ] + [
+            index.columns for index in local_table.indexes
+            if index.unique and len(index.columns) == len(index.expressions)
+            and index.dialect_options['postgresql']['where'] is None
+        ]
+        for columns in uniques:
+            columns = list(columns)
+            if columns and all(c.table is local_table for c in columns):
+                upserts[frozenset(columns)] = cls(model, columns)
+        return columns_by_name, upserts
+
+    def values(self, kwargs):
+        """Turn keyword arguments into values for the model's columns.
+
+        A many-to-one relationship is turned into the value of its
+        foreign key.
+
+        :return: A dictionary mapping Column objects to values, or
+            None if an argument can't be turned into a column value,
+            or a value for one of the unique columns is missing.
+        """
+        values = {}
+        for key, value in kwargs.items():
+            if key in self.mapper.column_attrs:
+                columns = self.mapper.column_attrs[key].columns
+                if len(columns) != 1:
+                    return None
+                values[columns[0]] = value
+            elif key in self.mapper.relationships:
+                prop = self.mapper.relationships[key]
+                if prop.direction is not MANYTOONE or prop.viewonly:
+                    return None
+                for local, remote in prop.local_remote_pairs:
+                    if value is None:
+                        values[local] = None
+                        continue
+                    state = inspect(value)
+                    if not state.persistent:
+                        return None
+                    values[local] = getattr(
+                        value, state.mapper.get_property_by_column(remote).key
+                    )
+                    if values[local] is None:
+                        return None
+            else:
+                return None
+        if any(values.get(c) is None for c in self.columns):
+            # NULL never conflicts with anything, so a unique
+            # constraint can't tell us whether the row exists.
+            return None
+        return values
+
+    def key(self, obj_or_values):
+        """The values of the unique columns for an object or a
+        dictionary returned by values().
+        """
+        if isinstance(obj_or_values, dict):
+            return tuple(obj_or_values[c] for c in self.columns)
+        return tuple(
+            getattr(obj_or_values, self.mapper.get_property_by_column(c).key)
+            for c in self.columns
+        )
+
+    def insert(self, db, values):
+        """Create one object, unless its row already exists.
+
+        :param values: A dictionary returned by values().
+        :return: The new object, or None if the row already existed.
+        """
+        local_table = self.mapper.local_table
+        statement = insert(local_table).values(
+            dict((c.key, v) for c, v in values.items())
+        ).on_conflict_do_nothing(
+            index_elements=self.columns
+        ).returning(*local_table.c)
+        objs = list(db.query(self.model).instances(db.execute(statement)))
+        self._record_write(db)
+        if objs:
+            return objs[0]
+        return None
+
+    def run(self, db, rows):
+        """Find or create objects for a number of rows.
+
+        :param rows: A list of dictionaries returned by values(), all
+            with the same keys.
+        :return: A list of (object, is_new) 2-tuples. An object is
+            missing from the list if someone else created its row
+            after the statement started.
+        """
+        local_table = self.mapper.local_table
+        results = []
+        for i in xrange(0, len(rows), self.ROWS_PER_STATEMENT):
+            chunk = rows[i:i+self.ROWS_PER_STATEMENT]
+
+            # The new rows come back from the INSERT; the rows that
+            # already existed are found with the same statement.
+            inserted = insert(local_table).values(
+                [dict((c.key, v) for c, v in row.items()) for row in chunk]
+            ).on_conflict_do_nothing(
+                index_elements=self.columns
+            ).returning(*local_table.c).cte('inserted')
+            existing = select(
+                list(local_table.c) + [literal(False).label('is_new')]
+            ).where(
+                tuple_(*self.columns).in_(set(self.key(row) for row in chunk))
+            )
+            found = union_all(
+                select(list(inserted.c) + [literal(True).label('is_new')]),
+                existing
+            ).alias('found')
+            # Relationships are left to be loaded when they're needed,
+            # as they would be for an object the ORM had just created.
+            results.extend(
+                db.query(aliased(self.model, found), found.c.is_new).options(
+                    lazyload('*')
+                )
+            )
+
+        self._record_write(db)
+        return [tuple(result) for result in results]
+
+    @classmethod
+    def _record_write(cls, db):
+        # As far as a RoutingSession is concerned, this is a write
+        # even though nothing was flushed.
+        db.info[RoutingSession.UNCOMMITTED_WRITES] = True
+
+    def set_relationships(self, obj, kwargs):
+        """Make a newly created object, and the objects it was created
+        with, look the way they would if the ORM had created it: the
+        object knows what it's related to, and the other side of any
+        relationship that's already been loaded includes the object.
+        """
+        for key, value in (kwargs or {}).items():
+            if key not in self.mapper.relationships:
+                continue
+            set_committed_value(obj, key, value)
+            if value is None:
+                continue
+            related = inspect(value)
+            for reverse in self.mapper.relationships[key]._reverse_property:
+                if reverse.key not in related.dict:
+                    # It'll be loaded from the database when needed.
+                    continue
+                if reverse.uselist:
+                    collection = list(related.dict[reverse.key])
+                    if obj not in collection:
+                        collection.append(obj)
+                    set_committed_value(value, reverse.key, collection)
+                else:
+                    set_committed_value(value, reverse.key, obj)
 
 def numericrange_to_string(r):
     """Helper method to convert a NumericRange to a human-readable string."""
@@ -299,18 +605,341 @@ def dump_query(query):
 
 DEBUG = False
 
+class TimedQueuePool(QueuePool):
+    """A QueuePool that keeps track of how long it takes to check out
+    a connection.
+
+    The time includes waiting for another thread to return a
+    connection to the pool, and opening a new connection if the pool
+    has room for one.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TimedQueuePool, self).__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _do_get(self):
+        start = time.time()
+        try:
+            return super(TimedQueuePool, self)._do_get()
+        finally:
+            wait = time.time() - start
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def wait_statistics(self):
+        """Summarize the time spent checking out connections.
+
+        :return: A dictionary.
+        """
+        average = None
+        if self.checkouts:
+            average = self.total_wait / self.checkouts
+        return dict(
+            checkouts=self.checkouts,
+            total_wait=self.total_wait,
+            max_wait=self.max_wait,
+            average_wait=average,
+        )
+
+
+class ReplicaSet(object):
+    """A set of read replicas of the primary database, and the
+    knowledge of how far behind the primary each one is.
+    """
+
+    # By default, a replica more than this many seconds behind the
+    # primary won't be used.
+    DEFAULT_MAX_LAG = 30
+
+    # Replication lag is measured at most this often, in seconds.
+    LAG_CHECK_INTERVAL = 5
+
+    # The time since the replica last replayed a transaction from the
+    # primary. On a primary database this is NULL. If the primary has
+    # been idle, this overestimates the lag, which just means we use
+    # the primary more often than necessary.
+    LAG_QUERY = "SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+
+    log = logging.getLogger("Read replicas")
+
+    def __init__(self, engines, max_lag=None):
+        self.engines = list(engines)
+        if max_lag is None:
+            max_lag = self.DEFAULT_MAX_LAG
+        self.max_lag = max_lag
+
+        # Maps each Engine to a 2-tuple (time checked, lag in seconds).
+        self._lag = {}
+
+    def lag(self, engine):
+        """How many seconds is this replica behind the primary?
+
+        :return: A number of seconds, or None if the replica couldn't
+            be reached.
+        """
+        now = time.time()
+        checked_at, lag = self._lag.get(engine, (None, None))
+        if checked_at is None or now - checked_at > self.LAG_CHECK_INTERVAL:
+            lag = self.measure_lag(engine)
+            self._lag[engine] = (now, lag)
+        return lag
+
+    def measure_lag(self, engine):
+        try:
+            connection = engine.connect()
+            try:
+                return float(connection.execute(text(self.LAG_QUERY)).scalar())
+            finally:
+                connection.close()
+        except Exception, e:
+            self.log.error(
+                "Could not measure replication lag for %s", engine.url,
+                exc_info=e
+            )
+            return None
+
+    def engine(self, last_write=None):
+        """Choose a replica that's fresh enough to use.
+
+        :param last_write: The time (as returned by time.time()) that
+            the caller last wrote to the primary database. A replica
+            that's too far behind to have seen that write won't be
+            chosen.
+
+        :return: An Engine, or None if no replica is fresh enough,
+            in which case the primary should be used.
+        """
+        now = time.time()
+        candidates = []
+        for engine in self.engines:
+            lag = self.lag(engine)
+            if lag is None or lag > self.max_lag:
+                continue
+            if last_write is not None and lag >= now - last_write:
+                continue
+            candidates.append(engine)
+        if not candidates:
+            return None
+        return random.choice(candidates)
+
+
+class RoutingQuery(Query):
+    """A Query that can be sent to a read replica, via the
+    'read_from_replica' execution option:
+
+        qu = qu.execution_options(read_from_replica=True)
+
+    The option is kept as the query is modified, so the query is
+    routed to a replica whenever it's finally run.
+    """
+
+    def __iter__(self):
+        if self.get_execution_options().get('read_from_replica'):
+            with replica_reads(self.session):
+                return super(RoutingQuery, self).__iter__()
+        return super(RoutingQuery, self).__iter__()
+
+
+class RoutingSession(Session):
+    """A Session that sends read-only queries to a read replica when
+    asked to, and everything else to the primary database.
+
+    Reads go to a replica only inside a replica_reads() block (or
+    for a RoutingQuery marked 'read_from_replica'), never inside a
+    needs_primary() block, never while the current transaction has
+    written anything (a replica can't see uncommitted writes), and
+    only if a replica is known to be caught up with this session's
+    most recent committed write.
+    """
+
+    # Keys into Session.info.
+    READ_FROM_REPLICA = 'read_from_replica'
+    NEEDS_PRIMARY = 'needs_primary'
+    LAST_WRITE = 'last_write'
+    UNCOMMITTED_WRITES = 'uncommitted_writes'
+
+    def __init__(self, bind=None, replicas=None, **kwargs):
+        kwargs.setdefault('query_cls', RoutingQuery)
+        super(RoutingSession, self).__init__(bind=bind, **kwargs)
+        self.replicas = replicas
+
+    def get_bind(self, mapper=None, clause=None):
+        if clause is not None and self.may_write(clause):
+            # This statement may write to the primary, outside of a
+            # flush. Until the transaction is over, reads need to go
+            # to the primary too.
+            self.info[self.UNCOMMITTED_WRITES] = True
+        elif (self.replicas
+            and self.info.get(self.READ_FROM_REPLICA)
+            and not self.info.get(self.NEEDS_PRIMARY)
+            and not self.info.get(self.UNCOMMITTED_WRITES)
+            and not self._flushing
+            and self.is_read_only(clause)):
+            engine = self.replicas.engine(self.info.get(self.LAST_WRITE))
+            if engine is not None:
+                return engine
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+    @classmethod
+    def is_read_only(cls, clause):
+        """Is it safe to run this statement against a replica?"""
+        return (
+            isinstance(clause, Select)
+            and getattr(clause, '_for_update_arg', None) is None
+        )
+
+    @classmethod
+    def may_write(cls, clause):
+        """Might this statement change the database?"""
+        return not isinstance(clause, Select)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def record_uncommitted_write(session, flush_context):
+    # No replica can see this write until it's committed, so
+    # further reads in this transaction need to go to the primary.
+    session.info[RoutingSession.UNCOMMITTED_WRITES] = True
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def record_last_write(session, transaction):
+    # Once the outermost transaction is over, any writes it made are
+    # either committed or gone. Until the replicas catch up, further
+    # reads from this session need to go to the primary.
+    if (transaction.parent is None
+        and session.info.pop(RoutingSession.UNCOMMITTED_WRITES, None)):
+        session.info[RoutingSession.LAST_WRITE] = time.time()
+
+@contextmanager
+def replica_reads(_db):
+    """Within this block, read-only queries made through `_db` may be
+    sent to a read replica.
+
+    This has no effect unless `_db` is a RoutingSession with replicas
+    configured.
+    """
+    key = RoutingSession.READ_FROM_REPLICA
+    old_value = _db.info.get(key)
+    _db.info[key] = True
+    try:
+        yield _db
+    finally:
+        _db.info[key] = old_value
+
+@contextmanager
+def needs_primary(_db):
+    """Within this block, every query made through `_db` goes to the
+    primary database, even inside a replica_reads() block.
+
+    Use this for code that must see data it (or a recent request)
+    just wrote.
+    """
+    key = RoutingSession.NEEDS_PRIMARY
+    old_value = _db.info.get(key)
+    _db.info[key] = True
+    try:
+        yield _db
+    finally:
+        _db.info[key] = old_value
+
+
 class SessionManager(object):
 
     # A function that calculates recursively equivalent identifiers
     # is also defined in SQL.
     RECURSIVE_EQUIVALENTS_FUNCTION = 'recursive_equivalents.sql'
 
+    # Engines whose databases have been fully initialized, keyed by URL.
     engine_for_url = {}
 
+    # Every Engine created by this process, keyed by URL. Each Engine
+    # has its own connection pool, so we only ever want one per URL.
+    engines = {}
+    _engines_lock = RLock()
+
     @classmethod
     def engine(cls, url=None):
+        """Find or create the Engine for the given database URL."""
         url = url or Configuration.database_url()
-        return create_engine(url, echo=DEBUG)
+        with cls._engines_lock:
+            engine = cls.engines.get(url)
+            if engine is None:
+                engine = create_engine(url, **cls.engine_options())
+                cls.engines[url] = engine
+        return engine
+
+    @classmethod
+    def engine_options(cls, settings=None):
+        """Turn the site's connection pool settings into keyword
+        arguments to create_engine().
+
+        :param settings: A dictionary like the one returned by
+            Configuration.database_pool_settings().
+        """
+        if settings is None:
+            settings = Configuration.database_pool_settings()
+        options = dict(echo=DEBUG)
+        if settings.get('disable_pool'):
+            # Some other piece of software is pooling connections;
+            # open a new one every time we need one.
+            options['poolclass'] = NullPool
+        else:
+            options['poolclass'] = TimedQueuePool
+            for key in ('pool_size', 'max_overflow', 'pool_recycle'):
+                if settings.get(key) is not None:
+                    options[key] = settings[key]
+        if settings.get('pool_pre_ping'):
+            options['pool_pre_ping'] = True
+        statement_timeout = settings.get('statement_timeout')
+        if statement_timeout is not None:
+            options['connect_args'] = dict(
+                options='-c statement_timeout=%d' % statement_timeout
+            )
+        return options
+
+    # ReplicaSets, keyed by a tuple of replica URLs.
+    replica_sets = {}
+
+    @classmethod
+    def replica_set(cls):
+        """Find or create the ReplicaSet for the site's configured read
+        replicas.
+
+        :return: A ReplicaSet, or None if no replicas are configured.
+        """
+        settings = Configuration.database_replica_settings()
+        urls = tuple(settings['urls'])
+        if not urls:
+            return None
+        with cls._engines_lock:
+            replicas = cls.replica_sets.get(urls)
+            if replicas is None:
+                replicas = ReplicaSet(
+                    [cls.engine(url) for url in urls],
+                    max_lag=settings['max_lag']
+                )
+                cls.replica_sets[urls] = replicas
+        return replicas
+
+    @classmethod
+    def pool_status(cls):
+        """Describe the connection pool for every Engine in this process.
+
+        :return: A dictionary mapping each database URL (with the
+            password hidden) to a dictionary describing its pool.
+        """
+        status = {}
+        with cls._engines_lock:
+            engines = list(cls.engines.items())
+        for url, engine in engines:
+            pool = engine.pool
+            data = dict(status=pool.status())
+            if isinstance(pool, TimedQueuePool):
+                data.update(pool.wait_statistics())
+            status[make_url(url).__to_string__()] = data
+        return status
 
     @classmethod
     def sessionmaker(cls, url=None, session=None):
@@ -325,7 +954,9 @@ class SessionManager(object):
                 # use the same Connection for all of the tests so objects can
                 # be accessed. Otherwise, bind against an Engine object.
                 bind_obj = bind_obj.engine
-        return sessionmaker(bind=bind_obj)
+        return sessionmaker(
+            bind=bind_obj, class_=RoutingSession, replicas=cls.replica_set()
+        )
 
     @classmethod
     def resource_directory(cls):
@@ -410,7 +1041,7 @@ class SessionManager(object):
                 url, initialize_data=initialize_data,
                 initialize_schema=initialize_schema
             )
-        session = Session(connection)
+        session = RoutingSession(connection, replicas=cls.replica_set())
         if initialize_data:
             session = cls.initialize_data(session)
         return session
@@ -428,11 +1059,6 @@ class SessionManager(object):
 
         # Create any genres not in the database.
         for g in classifier.genres.values():
-            # TODO: On the very first startup this is rather expensive
-            # because the cache is invalidated every time a Genre is
-            # created, then populated the next time a Genre is looked
-            # up. This wouldn't be a big problem, but this also happens
-            # on setup for the unit tests.
             Genre.lookup(session, g, autocreate=True)
 
         # Make sure that the mechanisms fulfillable by the default
@@ -474,6 +1100,11 @@ def production_session(initialize_data=True):
     # with the right arguments.
     from ..log import LogConfiguration
     LogConfiguration.initialize(_db)
+
+    # Keep this process's full-table caches in sync with changes
+    # made by other processes.
+    from hasfulltablecache import CacheInvalidationListener
+    CacheInvalidationListener.start_for_process(_db.get_bind().engine)
     return _db
 
 from admin import (
@@ -491,7 +1122,10 @@ from cachedfeed import (
     WillNotGenerateExpensiveFeed,
     CachedMARCFile,
 )
-from circulationevent import CirculationEvent
+from circulationevent import (
+    CirculationEvent,
+    CirculationEventRollup,
+)
 from classification import (
     Classification,
     Genre,
@@ -523,6 +1157,11 @@ from customlist import (
     CustomListEntry,
 )
 from datasource import DataSource
+from deliverablework import (
+    CannotUseDeliverableWorks,
+    DeliverableWork,
+    DeliverableWorkQuery,
+)
 from edition import Edition
 from hasfulltablecache import HasFullTableCache
 from identifier import (
@@ -556,6 +1195,7 @@ from resource import (
     ResourceTransformation,
 )
 from work import (
+    PresentationBatch,
     Work,
     WorkGenre,
 )
@@ -7,6 +7,7 @@ from . import (
     flush,
     get_one,
     get_one_or_create,
+    replica_reads,
 )
 
 from collections import namedtuple
@@ -84,7 +85,7 @@ class CachedFeed(Base):
 
     @classmethod
     def fetch(cls, _db, worklist, facets, pagination, refresher_method,
-              max_age=None, raw=False, **response_kwargs
+              max_age=None, raw=False, stream=False, **response_kwargs
     ):
         """Retrieve a cached feed from the database if possible.
 
@@ -113,6 +114,12 @@ class CachedFeed(Base):
             converted into a Flask Response object will be returned. If this
             is True, the CachedFeed object itself will be returned. In most
             non-test situations the default is better.
+        :param stream: If this is True, `raw` is False, and the feed
+            needs to be regenerated, the Response will send the feed
+            to the client a piece at a time, using the iter_serialized()
+            method of the object returned by `refresher_method`. A copy
+            is stored in the database once the whole feed has been
+            sent.
 
         :return: A Response or CachedFeed containing up-to-date content.
         """
@@ -150,34 +157,45 @@ class CachedFeed(Base):
             # just going to replace it.
             feed_obj = None
         else:
-            feed_obj = get_one(_db, cls, **kwargs)
+            # A read replica may be a few seconds behind the primary,
+            # which at worst means we regenerate a feed that someone
+            # else just regenerated.
+            with replica_reads(_db):
+                feed_obj = get_one(_db, cls, **kwargs)
+
+        # Set some defaults for the response in case the caller
+        # didn't pass them in.
+        if isinstance(max_age, int):
+            response_kwargs.setdefault('max_age', max_age)
+
+        if max_age == cls.IGNORE_CACHE:
+            # If we were asked to ignore our internal cache, we should
+            # also tell the client not to store this document in _its_
+            # internal cache.
+            response_kwargs['max_age'] = 0
 
         should_refresh = cls._should_refresh(feed_obj, max_age)
         if should_refresh:
             # This is a cache miss. Either feed_obj is None or
             # it's no good. We need to generate a new feed.
-            feed_data = unicode(refresher_method())
+            feed = refresher_method()
+            store = (max_age is not cls.IGNORE_CACHE)
+            if stream and not raw and hasattr(feed, 'iter_serialized'):
+                generation_time = datetime.datetime.utcnow()
+                return OPDSFeedResponse(
+                    response=cls._stream(
+                        _db, feed, kwargs, generation_time, store
+                    ),
+                    **response_kwargs
+                )
+
+            feed_data = unicode(feed)
             generation_time = datetime.datetime.utcnow()
 
-            if max_age is not cls.IGNORE_CACHE:
+            if store:
                 # Having gone through all the trouble of generating
                 # the feed, we want to cache it in the database.
-
-                # Since it can take a while to generate a feed, and we know
-                # that the feed in the database is stale, it's possible that
-                # another thread _also_ noticed that feed was stale, and
-                # generated a similar feed while we were working.
-                #
-                # To avoid a database error, fetch the feed _again_ from the
-                # database rather than assuming we have the up-to-date
-                # object.
-                feed_obj, is_new = get_one_or_create(_db, cls, **kwargs)
-                if feed_obj.timestamp is None or feed_obj.timestamp < generation_time:
-                    # Either there was no contention for this object, or there
-                    # was contention but our feed is more up-to-date than
-                    # the other thread(s). Our feed takes priority.
-                    feed_obj.content = feed_data
-                    feed_obj.timestamp = generation_time
+                feed_obj = cls._store(_db, kwargs, feed_data, generation_time)
         elif feed_obj:
             feed_data = feed_obj.content
 
@@ -186,22 +204,50 @@ class CachedFeed(Base):
 
         # We have the information necessary to create a useful
         # response-type object.
-        #
-        # Set some defaults in case the caller didn't pass them in.
-        if isinstance(max_age, int):
-            response_kwargs.setdefault('max_age', max_age)
-
-        if max_age == cls.IGNORE_CACHE:
-            # If we were asked to ignore our internal cache, we should
-            # also tell the client not to store this document in _its_
-            # internal cache.
-            response_kwargs['max_age'] = 0
-
         return OPDSFeedResponse(
             response=feed_data,
             **response_kwargs
         )
 
+    @classmethod
+    def _store(cls, _db, keys, feed_data, generation_time):
+        """Store a newly generated feed in the database.
+
+        :param keys: The arguments that identify the CachedFeed.
+        :return: The CachedFeed.
+        """
+        # Since it can take a while to generate a feed, and we know
+        # that the feed in the database is stale, it's possible that
+        # another thread _also_ noticed that feed was stale, and
+        # generated a similar feed while we were working.
+        #
+        # To avoid a database error, fetch the feed _again_ from the
+        # database rather than assuming we have the up-to-date
+        # object.
+        feed_obj, is_new = get_one_or_create(_db, cls, **keys)
+        if feed_obj.timestamp is None or feed_obj.timestamp < generation_time:
+            # Either there was no contention for this object, or there
+            # was contention but our feed is more up-to-date than
+            # the other thread(s). Our feed takes priority.
+            feed_obj.content = feed_data
+            feed_obj.timestamp = generation_time
+        return feed_obj
+
+    @classmethod
+    def _stream(cls, _db, feed, keys, generation_time, store):
+        """Send a newly generated feed a piece at a time, keeping a
+        copy to store in the database once it's all been sent.
+
+        If the feed can't be sent in its entirety, nothing is stored.
+        """
+        pieces = []
+        for piece in feed.iter_serialized():
+            if store:
+                pieces.append(piece)
+            yield piece
+        if store:
+            cls._store(_db, keys, u"".join(pieces), generation_time)
+
     @classmethod
     def feed_type(cls, worklist, facets):
         """Determine the 'type' of the feed.
@@ -330,11 +376,11 @@ class CachedFeed(Base):
 
         facets_key = u""
         if facets is not None:
-            facets_key = unicode(facets.query_string)
+            facets_key = unicode(facets.cache_key)
 
         pagination_key = u""
         if pagination is not None:
-            pagination_key = unicode(pagination.query_string)
+            pagination_key = unicode(pagination.cache_key)
 
         return cls.CachedFeedKeys(
             feed_type=feed_type, library=library, work=work, lane_id=lane_id,
@@ -18,6 +18,13 @@ from sqlalchemy import (
     String,
     Unicode,
 )
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql.expression import (
+    and_,
+    func,
+    literal,
+    select,
+)
 
 class CirculationEvent(Base):
 
@@ -130,10 +137,13 @@ class CirculationEvent(Base):
     TIME_FORMAT = "%Y-%m-%dT%H:%M:%S+00:00"
 
     @classmethod
-    def log(cls, _db, license_pool, event_name, old_value, new_value,
-            start=None, end=None, library=None, location=None):
-        """Log a CirculationEvent to the database, assuming it
-        hasn't already been recorded.
+    def event_data(cls, license_pool, event_name, old_value, new_value,
+                   start=None, end=None, library=None, location=None):
+        """Turn the arguments to log() into a dictionary of column values,
+        suitable for bulk_log().
+
+        Only database IDs are stored, so the dictionary can be kept
+        around after the objects' session goes away.
         """
         if new_value is None or old_value is None:
             delta = None
@@ -143,17 +153,198 @@ class CirculationEvent(Base):
             start = datetime.datetime.utcnow()
         if not end:
             end = start
+        return dict(
+            license_pool_id=license_pool.id if license_pool else None,
+            library_id=library.id if library else None,
+            type=event_name,
+            start=start,
+            end=end,
+            old_value=old_value,
+            new_value=new_value,
+            delta=delta,
+            location=location,
+        )
+
+    @classmethod
+    def log(cls, _db, license_pool, event_name, old_value, new_value,
+            start=None, end=None, library=None, location=None):
+        """Log a CirculationEvent to the database, assuming it
+        hasn't already been recorded.
+        """
+        data = cls.event_data(
+            license_pool, event_name, old_value, new_value, start, end,
+            library, location
+        )
         event, was_new = get_one_or_create(
             _db, CirculationEvent, license_pool=license_pool,
-            type=event_name, start=start, library=library,
+            type=event_name, start=data['start'], library=library,
             create_method_kwargs=dict(
                 old_value=old_value,
                 new_value=new_value,
-                delta=delta,
-                end=end,
+                delta=data['delta'],
+                end=data['end'],
                 location=location
             )
         )
         if was_new:
             logging.info("EVENT %s %s=>%s", event_name, old_value, new_value)
         return event, was_new
+
+    @classmethod
+    def bulk_log(cls, _db, events):
+        """Log a number of CirculationEvents with a single multi-row
+        INSERT, skipping any that have already been recorded.
+
+        :param events: A list of dictionaries, as created by event_data().
+        :return: The number of events actually inserted.
+        """
+        if not events:
+            return 0
+        # The unique indexes on this table define what it means for
+        # an event to have already been recorded.
+        statement = insert(cls.__table__).values(
+            list(events)
+        ).on_conflict_do_nothing()
+        result = _db.execute(statement)
+        logging.info(
+            "Logged %d/%d buffered circulation events.",
+            result.rowcount, len(events)
+        )
+        return result.rowcount
+
+
+class CirculationEventRollup(Base):
+    """The number of CirculationEvents of a given type that happened in a
+    given hour or day, for a given library, collection, license pool
+    and location.
+
+    Usage reports can read this much smaller table instead of scanning
+    every row in `circulationevents`.
+    """
+    __tablename__ = 'circulationeventrollups'
+
+    # The possible values for `period`. These are also the arguments
+    # to the database's date_trunc() function.
+    HOUR = u'hour'
+    DAY = u'day'
+    PERIODS = [HOUR, DAY]
+
+    id = Column(Integer, primary_key=True)
+
+    period = Column(String(8), nullable=False)
+    period_start = Column(DateTime, nullable=False, index=True)
+
+    library_id = Column(
+        Integer, ForeignKey('libraries.id'), index=True, nullable=True
+    )
+    collection_id = Column(
+        Integer, ForeignKey('collections.id'), index=True, nullable=True
+    )
+    license_pool_id = Column(
+        Integer, ForeignKey('licensepools.id'), index=True, nullable=True
+    )
+    type = Column(String(32), nullable=False, index=True)
+    location = Column(Unicode, nullable=True)
+
+    # The number of events covered by this rollup.
+    count = Column(Integer, nullable=False, default=0)
+
+    # The sum of CirculationEvent.delta for those events.
+    delta = Column(Integer, nullable=False, default=0)
+
+    # Any of the foreign keys, and the location, may be null, so the
+    # uniqueness constraint is on expressions that turn null into a
+    # value that can be compared.
+    UNIQUE_EXPRESSIONS = [
+        period,
+        period_start,
+        func.coalesce(library_id, 0),
+        func.coalesce(collection_id, 0),
+        func.coalesce(license_pool_id, 0),
+        type,
+        func.coalesce(location, u''),
+    ]
+
+    __table_args__ = (
+        Index(
+            "ix_circulationeventrollups_unique",
+            *UNIQUE_EXPRESSIONS,
+            unique=True
+        ),
+    )
+
+    def __repr__(self):
+        return "<CirculationEventRollup %s %s %s: %d>" % (
+            self.period, self.period_start, self.type, self.count
+        )
+
+    @classmethod
+    def truncate(cls, period, time):
+        """Find the start of the period that contains `time`, as the
+        database's date_trunc() would.
+        """
+        if period == cls.HOUR:
+            return time.replace(minute=0, second=0, microsecond=0)
+        if period == cls.DAY:
+            return time.replace(hour=0, minute=0, second=0, microsecond=0)
+        raise ValueError("Unknown rollup period: %s" % period)
+
+    @classmethod
+    def roll_up(cls, _db, period, start, cutoff):
+        """Recalculate the rollups for the given period from every
+        CirculationEvent that started between the beginning of the
+        period containing `start`, and `cutoff`.
+
+        Existing rollups for those periods are deleted and recounted
+        from scratch, with one DELETE and one INSERT ... SELECT, so
+        rolling up the same span of time twice does no harm. A period
+        that extends past `cutoff` only counts the events before
+        `cutoff`, until it's rolled up again.
+
+        :return: The number of rollups created.
+        """
+        from licensing import LicensePool
+        start = cls.truncate(period, start)
+        table = cls.__table__
+        _db.execute(
+            table.delete().where(
+                and_(
+                    table.c.period == period,
+                    table.c.period_start >= start,
+                    table.c.period_start < cutoff,
+                )
+            )
+        )
+
+        event = CirculationEvent.__table__
+        pool = LicensePool.__table__
+        period_start = func.date_trunc(period, event.c.start)
+        grouped = [
+            period_start,
+            event.c.library_id,
+            pool.c.collection_id,
+            event.c.license_pool_id,
+            event.c.type,
+            event.c.location,
+        ]
+        source = select(
+            [literal(period)] + grouped + [
+                func.count(event.c.id),
+                func.coalesce(func.sum(event.c.delta), 0),
+            ]
+        ).select_from(
+            event.outerjoin(pool, event.c.license_pool_id==pool.c.id)
+        ).where(
+            and_(
+                event.c.start >= start,
+                event.c.start < cutoff,
+                event.c.type != None,
+            )
+        ).group_by(*grouped)
+
+        columns = [
+            'period', 'period_start', 'library_id', 'collection_id',
+            'license_pool_id', 'type', 'location', 'count', 'delta'
+        ]
+        statement = insert(table).from_select(columns, source)
+        return _db.execute(statement).rowcount
@@ -0,0 +1,277 @@
+# encoding: utf-8
+# DeliverableWork
+
+
+from . import Base
+from edition import Edition
+from licensing import LicensePool
+from work import Work
+
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    Unicode,
+)
+from sqlalchemy.dialects.postgresql import (
+    INT4RANGE,
+    insert,
+)
+from sqlalchemy.orm import Query
+from sqlalchemy.sql import select
+from sqlalchemy.sql.expression import and_
+from sqlalchemy.sql.visitors import replacement_traverse
+
+
+class CannotUseDeliverableWorks(Exception):
+    """A query refers to a LicensePool or Edition field that isn't
+    copied into the DeliverableWork table.
+    """
+
+
+class DeliverableWork(Base):
+    """A copy of the fields used to filter and sort database-backed
+    lanes, for every non-superceded LicensePool of a presentation-ready
+    Work.
+
+    Finding the works in a DatabaseBackedWorkList normally means
+    joining Work, LicensePool and Edition. With this table, the same
+    query can be answered by scanning one table's indexes.
+
+    Rows are brought up to date by refresh(), which the
+    SearchIndexCoverageProvider calls whenever it reindexes a batch
+    of works, so the table changes in response to the same events as
+    the search index.
+    """
+    __tablename__ = 'deliverableworks'
+
+    id = Column(Integer, primary_key=True)
+    work_id = Column(
+        Integer, ForeignKey('works.id', ondelete='CASCADE'), index=True,
+        nullable=False
+    )
+    license_pool_id = Column(
+        Integer, ForeignKey('licensepools.id', ondelete='CASCADE'),
+        unique=True, nullable=False
+    )
+
+    # Copied from the LicensePool.
+    collection_id = Column(Integer, index=True)
+    data_source_id = Column(Integer)
+    identifier_id = Column(Integer)
+    suppressed = Column(Boolean)
+    open_access = Column(Boolean)
+    self_hosted = Column(Boolean)
+    licenses_owned = Column(Integer)
+    licenses_available = Column(Integer)
+
+    # Copied from the Work.
+    audience = Column(Unicode)
+    target_age = Column(INT4RANGE)
+    fiction = Column(Boolean)
+    quality = Column(Float)
+    last_update_time = Column(DateTime)
+
+    # Copied from the Work's presentation Edition.
+    medium = Column(Unicode)
+    language = Column(Unicode)
+    sort_title = Column(Unicode)
+    sort_author = Column(Unicode)
+
+    __table_args__ = (
+        Index(
+            'ix_deliverableworks_sort_author',
+            sort_author, sort_title, work_id
+        ),
+        Index(
+            'ix_deliverableworks_sort_title',
+            sort_title, sort_author, work_id
+        ),
+        Index(
+            'ix_deliverableworks_last_update_time',
+            last_update_time, work_id
+        ),
+        Index(
+            'ix_deliverableworks_medium_language_audience',
+            medium, language, audience
+        ),
+    )
+
+    # For each table we copy from, the names of the fields we copy,
+    # mapped to the names they have in this table.
+    LICENSEPOOL_FIELDS = {
+        'id': 'license_pool_id',
+        'work_id': 'work_id',
+        'collection_id': 'collection_id',
+        'data_source_id': 'data_source_id',
+        'identifier_id': 'identifier_id',
+        'suppressed': 'suppressed',
+        'open_access': 'open_access',
+        'self_hosted': 'self_hosted',
+        'licenses_owned': 'licenses_owned',
+        'licenses_available': 'licenses_available',
+    }
+
+    WORK_FIELDS = {
+        'id': 'work_id',
+        'audience': 'audience',
+        'target_age': 'target_age',
+        'fiction': 'fiction',
+        'quality': 'quality',
+        'last_update_time': 'last_update_time',
+    }
+
+    EDITION_FIELDS = {
+        'medium': 'medium',
+        'language': 'language',
+        'sort_title': 'sort_title',
+        'sort_author': 'sort_author',
+    }
+
+    def __repr__(self):
+        return '<DeliverableWork work=%s license_pool=%s>' % (
+            self.work_id, self.license_pool_id
+        )
+
+    @classmethod
+    def _sources(cls):
+        """Yield (source table, field mapping) 2-tuples."""
+        yield LicensePool.__table__, cls.LICENSEPOOL_FIELDS
+        yield Work.__table__, cls.WORK_FIELDS
+        yield Edition.__table__, cls.EDITION_FIELDS
+
+    @classmethod
+    def source_query(cls):
+        """A SELECT statement that finds the current value of every
+        row in this table.
+
+        :return: A 2-tuple (names, select) -- the names of the
+            columns in this table, and a SELECT statement that finds
+            their values.
+        """
+        names = []
+        columns = []
+        for table, fields in cls._sources():
+            for source, name in sorted(fields.items()):
+                if name in names:
+                    continue
+                names.append(name)
+                columns.append(table.c[source])
+
+        source = select(columns).select_from(
+            Work.__table__.join(
+                LicensePool.__table__, LicensePool.work_id==Work.id
+            ).join(
+                Edition.__table__, Work.presentation_edition_id==Edition.id
+            )
+        ).where(
+            and_(
+                Work.presentation_ready==True,
+                LicensePool.superceded==False,
+            )
+        )
+        return names, source
+
+    @classmethod
+    def refresh(cls, _db, works=None):
+        """Bring this table up to date.
+
+        :param works: Replace the rows for these Works (or Work IDs).
+            If this is not provided, the entire table is rebuilt.
+        :return: The number of rows written.
+        """
+        table = cls.__table__
+        names, source = cls.source_query()
+        delete = table.delete()
+        if works is not None:
+            work_ids = [getattr(work, 'id', work) for work in works]
+            if not work_ids:
+                return 0
+            delete = delete.where(table.c.work_id.in_(work_ids))
+            source = source.where(Work.id.in_(work_ids))
+        _db.execute(delete)
+
+        # Another process may be refreshing the same works at the same
+        # time. Its rows are just as up to date as ours.
+        insert_statement = insert(table).from_select(
+            names, source
+        ).on_conflict_do_nothing(index_elements=['license_pool_id'])
+        return _db.execute(insert_statement).rowcount
+
+    @classmethod
+    def column_for(cls, column):
+        """Find the column in this table that holds a copy of the
+        given Work, LicensePool or Edition column.
+
+        :return: A Column, or None if the given column is not from one
+            of those tables.
+        :raise CannotUseDeliverableWorks: If the column is from one of
+            those tables but isn't copied into this one.
+        """
+        table = getattr(column, 'table', None)
+        for source, fields in cls._sources():
+            if table is not source:
+                continue
+            name = fields.get(column.key)
+            if name is not None:
+                return cls.__table__.c[name]
+            if source is Work.__table__:
+                # The Work itself is always part of the query.
+                return None
+            raise CannotUseDeliverableWorks(
+                "%s.%s is not copied into the %s table." % (
+                    table.name, column.key, cls.__tablename__
+                )
+            )
+        return None
+
+    @classmethod
+    def source_column_for(cls, column):
+        """Find the Work or Edition column that the given column of this
+        table was copied from.
+
+        This is the opposite of column_for(); a column that's not in
+        this table is returned unchanged.
+        """
+        if getattr(column, 'table', None) is not cls.__table__:
+            return column
+        for source, fields in cls._sources():
+            if source is LicensePool.__table__:
+                continue
+            for source_name, name in fields.items():
+                if name == column.key:
+                    return source.c[source_name]
+        return column
+
+    @classmethod
+    def adapt(cls, clause):
+        """Rewrite a clause that refers to the Work, LicensePool and
+        Edition tables so that it refers to this table instead.
+
+        :raise CannotUseDeliverableWorks: If the clause refers to a
+            field that isn't copied into this table.
+        """
+        return replacement_traverse(clause, {}, cls.column_for)
+
+
+class DeliverableWorkQuery(Query):
+    """A query against Work, joined to DeliverableWork, whose filters
+    and sort order may be written as though Work were joined to
+    LicensePool and Edition.
+    """
+
+    def filter(self, *criterion):
+        criterion = [DeliverableWork.adapt(x) for x in criterion]
+        return super(DeliverableWorkQuery, self).filter(*criterion)
+
+    def order_by(self, *criterion):
+        criterion = [DeliverableWork.adapt(x) for x in criterion]
+        return super(DeliverableWorkQuery, self).order_by(*criterion)
+
+    def distinct(self, *expr):
+        expr = [DeliverableWork.adapt(x) for x in expr]
+        return super(DeliverableWorkQuery, self).distinct(*expr)
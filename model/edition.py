@@ -541,10 +541,18 @@ class Edition(Base, EditionConstants):
                 if similarity >= threshold:
                     yield candidate
 
-    def best_cover_within_distance(self, distance, rel=None, policy=None):
+    def best_cover_within_distance(self, distance, rel=None, policy=None,
+                                   batch=None):
+        if batch is not None:
+            result = batch.best_cover_for(
+                self.primary_identifier, distance, rel or LinkRelations.IMAGE
+            )
+            if result is not None:
+                return result
+
         _db = Session.object_session(self)
         identifier_ids = [self.primary_identifier.id]
-        
+
         if distance > 0:
             if policy is None:
                 new_policy = PresentationCalculationPolicy()
@@ -623,8 +631,12 @@ class Edition(Base, EditionConstants):
 
 
 
-    def calculate_presentation(self, policy=None):
-        """Make sure the presentation of this Edition is up-to-date."""
+    def calculate_presentation(self, policy=None, batch=None):
+        """Make sure the presentation of this Edition is up-to-date.
+
+        :param batch: A PresentationBatch that may already have found
+            the cover images for this Edition.
+        """
         _db = Session.object_session(self)
         changed = False
         if policy is None:
@@ -650,7 +662,7 @@ class Edition(Base, EditionConstants):
             )
 
         if policy.choose_cover:
-            self.choose_cover(policy=policy)
+            self.choose_cover(policy=policy, batch=batch)
 
         if (self.author != old_author
             or self.sort_author != old_sort_author
@@ -707,7 +719,7 @@ class Edition(Base, EditionConstants):
             sort_author = self.UNKNOWN_AUTHOR
         return author, sort_author
 
-    def choose_cover(self, policy=None):
+    def choose_cover(self, policy=None, batch=None):
         """Try to find a cover that can be used for this Edition."""
         self.cover_full_url = None
         self.cover_thumbnail_url = None
@@ -716,7 +728,7 @@ class Edition(Base, EditionConstants):
             # Edition's primary ID, use it. Otherwise, find the
             # best cover associated with any related identifier.
             best_cover, covers = self.best_cover_within_distance(
-                distance=distance, policy=policy
+                distance=distance, policy=policy, batch=batch
             )
 
             if best_cover:
@@ -756,7 +768,7 @@ class Edition(Base, EditionConstants):
             for distance in (0, 5):
                 best_thumbnail, thumbnails = self.best_cover_within_distance(
                     distance=distance, policy=policy,
-                    rel=LinkRelations.THUMBNAIL_IMAGE,
+                    rel=LinkRelations.THUMBNAIL_IMAGE, batch=batch
                 )
                 if best_thumbnail:
                     if not best_thumbnail.representation:
@@ -1,9 +1,20 @@
 # encoding: utf-8
 # HasFullTableCache
 
-from . import get_one
+from . import (
+    flush,
+    get_one,
+)
 
+from collections import deque
 import logging
+import os
+import select
+import threading
+import time
+
+from sqlalchemy import text
+from sqlalchemy.orm.session import Session
 
 class HasFullTableCache(object):
     """A mixin class for ORM classes that maintain an in-memory cache of
@@ -12,20 +23,144 @@ class HasFullTableCache(object):
 
     RESET = object()
 
+    # Changes to a cached table are announced on this Postgres
+    # NOTIFY channel, so that other processes can evict the changed
+    # object from their own caches.
+    CHANGE_CHANNEL = 'hasfulltablecache'
+
     # You MUST define your own class-specific '_cache' and '_id_cache'
     # variables, like so:
     #
     # _cache = HasFullTableCache.RESET
     # _id_cache = HasFullTableCache.RESET
 
+    # The classes whose tables have been changed in a session's
+    # current transaction are kept in its .info under this key.
+    CHANGED_CLASSES = 'hasfulltablecache_changed'
+
+    # Rows are loaded in batches of this size when populating the cache.
+    POPULATE_BATCH_SIZE = 1000
+
+    # Incremented every time a class's cache is reset, so that
+    # populate_cache() can tell whether the caches it built are
+    # already out of date.
+    _cache_generation = 0
+
+    # A record of recent evictions from every class's cache, as
+    # (sequence number, class, ID) tuples. Evictions that happen while
+    # a cache is being populated are applied to the new cache before
+    # it's installed.
+    EVICTION_LOG_SIZE = 1000
+    _eviction_log = deque(maxlen=EVICTION_LOG_SIZE)
+    _eviction_sequence = 0
+
+    # Held only while swapping in or modifying a cache, never while
+    # talking to the database.
+    _cache_lock = threading.RLock()
+
     @classmethod
     def reset_cache(cls):
-        cls._cache = cls.RESET
-        cls._id_cache = cls.RESET
+        with cls._cache_lock:
+            cls._cache_generation += 1
+            cls._cache = cls.RESET
+            cls._id_cache = cls.RESET
 
     def cache_key(self):
         raise NotImplementedError()
 
+    @classmethod
+    def evict_from_cache(cls, id):
+        """Remove the object with the given database ID from the
+        in-memory caches, leaving everything else in place.
+
+        The next lookup for that object will go to the database and
+        put a fresh copy in the cache.
+        """
+        with cls._cache_lock:
+            HasFullTableCache._eviction_sequence += 1
+            HasFullTableCache._eviction_log.append(
+                (HasFullTableCache._eviction_sequence, cls, id)
+            )
+            cls._evict(cls._cache, cls._id_cache, id)
+
+    @classmethod
+    def _evict(cls, cache, id_cache, id):
+        """Remove the object with the given ID from a specific pair
+        of caches.
+        """
+        if id_cache == cls.RESET:
+            return
+        obj = id_cache.pop(id, None)
+        if obj is None or cache == cls.RESET:
+            return
+
+        # Find the object by identity rather than calling
+        # cache_key(). The object's cache key may have changed since
+        # it was cached, and if the object's attributes have expired,
+        # calculating its cache key would reload them through whatever
+        # session the object belongs to -- perhaps a session being
+        # used in another thread, or none at all.
+        for key, value in cache.items():
+            if value is obj:
+                del cache[key]
+
+    @classmethod
+    def class_for_table(cls, table_name):
+        """Find the HasFullTableCache subclass that caches the given
+        database table.
+
+        :return: A class, or None if no such class is known.
+        """
+        to_check = list(cls.__subclasses__())
+        while to_check:
+            subclass = to_check.pop()
+            if getattr(subclass, '__tablename__', None) == table_name:
+                return subclass
+            to_check.extend(subclass.__subclasses__())
+        return None
+
+    @classmethod
+    def notify_change(cls, connection, target):
+        """Tell every process listening on CHANGE_CHANNEL that `target`
+        has changed.
+
+        Postgres delivers the notification only if and when the
+        current transaction is committed.
+
+        Also remember that this class's table was changed in the
+        current transaction, so that our own cache can be reset if the
+        transaction is rolled back.
+
+        :param connection: The Connection used to flush `target`, as
+            passed in to a mapper event listener.
+        :param target: The object that was inserted, updated or deleted.
+        """
+        session = Session.object_session(target)
+        if session is not None:
+            session.info.setdefault(cls.CHANGED_CLASSES, set()).add(cls)
+        payload = "%s:%s" % (target.__tablename__, target.id or '')
+        connection.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            channel=cls.CHANGE_CHANNEL, payload=payload
+        )
+
+    @classmethod
+    def reset_changed_caches(cls, session):
+        """Reset the cache of every class whose table was changed in
+        the session's current transaction.
+
+        Called when the transaction is rolled back, since the caches
+        may have been populated with rows that no longer exist, or
+        that have gone back to their old values.
+        """
+        for changed in session.info.get(cls.CHANGED_CLASSES, ()):
+            changed.reset_cache()
+
+    @classmethod
+    def forget_changed_caches(cls, session):
+        """Called when a session's outermost transaction ends."""
+        session.info.pop(cls.CHANGED_CLASSES, None)
+
     @classmethod
     def _cache_insert(cls, obj, cache, id_cache):
         """Cache an object for later retrieval, possibly by a different
@@ -33,28 +168,67 @@ class HasFullTableCache(object):
         """
         key = obj.cache_key()
         id = obj.id
-        try:
-            if cache != cls.RESET:
-                cache[key] = obj
-            if id_cache != cls.RESET:
-                id_cache[id] = obj
-        except TypeError, e:
-            # The cache was reset in between the time we checked for a
-            # reset and the time we tried to put an object in the
-            # cache. Stop trying to mess with the cache.
-            pass
+        if cache != cls.RESET:
+            cache[key] = obj
+        if id_cache != cls.RESET:
+            id_cache[id] = obj
 
     @classmethod
     def populate_cache(cls, _db):
         """Populate the in-memory caches from scratch with every single
         object from the database table.
+
+        The new caches are built up without holding any lock, and
+        swapped in all at once. Objects evicted while we're working
+        are removed from the new caches before they're installed, and
+        if the cache is reset while we're working, the new caches are
+        thrown away.
         """
+        # Flush pending changes now, rather than letting a query
+        # autoflush them partway through, so that any resulting cache
+        # evictions happen before we start.
+        flush(_db)
+        with cls._cache_lock:
+            generation = cls._cache_generation
+            sequence = HasFullTableCache._eviction_sequence
         cache = {}
         id_cache = {}
-        for obj in _db.query(cls):
+        for obj in cls._all_rows(_db):
             cls._cache_insert(obj, cache, id_cache)
-        cls._cache = cache
-        cls._id_cache = id_cache
+        with cls._cache_lock:
+            if cls._cache_generation != generation:
+                # The cache was reset while we were working.
+                return
+            log = HasFullTableCache._eviction_log
+            if sequence < HasFullTableCache._eviction_sequence - len(log):
+                # So many objects were evicted while we were working
+                # that we can no longer tell which ones they were.
+                return
+            for evicted_sequence, evicted_class, id in log:
+                if evicted_sequence > sequence and evicted_class is cls:
+                    cls._evict(cache, id_cache, id)
+            cls._cache = cache
+            cls._id_cache = id_cache
+
+    @classmethod
+    def _all_rows(cls, _db):
+        """Iterate over every row in the table, loading them in batches
+        to keep memory use down.
+
+        Query.yield_per() can't be used here because some cached classes
+        eagerly load collections with joins.
+        """
+        last_id = None
+        while True:
+            qu = _db.query(cls).order_by(cls.id)
+            if last_id is not None:
+                qu = qu.filter(cls.id > last_id)
+            batch = qu.limit(cls.POPULATE_BATCH_SIZE).all()
+            for obj in batch:
+                yield obj
+            if len(batch) < cls.POPULATE_BATCH_SIZE:
+                break
+            last_id = batch[-1].id
 
     @classmethod
     def _cache_lookup(cls, _db, cache, cache_name, cache_key, lookup_hook):
@@ -63,6 +237,10 @@ class HasFullTableCache(object):
         Looks up `cache_key` in `cache` and calls `lookup_hook`
         to find/create it if it's not in there.
         """
+        # If this process was forked from one that was listening for
+        # changes, it needs a listener of its own.
+        CacheInvalidationListener.ensure_running()
+
         new = False
         obj = None
         if cache == cls.RESET:
@@ -99,8 +277,11 @@ class HasFullTableCache(object):
                 return obj, new
 
             # Stick the object in the caches, assuming they're not
-            # currently in a reset state.
-            cls._cache_insert(obj, cls._cache, cls._id_cache)
+            # currently in a reset state. An object that was just
+            # created isn't committed yet, so it waits until the next
+            # time it's looked up.
+            if not new:
+                cls._cache_insert(obj, cls._cache, cls._id_cache)
 
         if obj and obj not in _db:
             try:
@@ -136,3 +317,171 @@ class HasFullTableCache(object):
         return cls._cache_lookup(
             _db, cls._cache, '_cache', cache_key, lookup_hook
         )
+
+
+class CacheInvalidationListener(object):
+    """Listen for HasFullTableCache change notifications sent by other
+    processes and evict the changed objects from this process's caches.
+
+    The listener holds its own database connection, outside of any
+    connection pool, and runs in a daemon thread.
+    """
+
+    # How long to wait for a notification before checking whether
+    # we've been asked to stop.
+    POLL_TIMEOUT = 5
+
+    # How long to wait before reconnecting after losing the database
+    # connection.
+    RECONNECT_DELAY = 10
+
+    # The listener running in this process, if any, and the ID of the
+    # process it was started in.
+    _instance = None
+    _pid = None
+
+    # The Engine to listen with, once start_for_process() has been
+    # called in this process or in a process it was forked from.
+    _engine = None
+    _start_lock = threading.Lock()
+
+    log = logging.getLogger("Cache invalidation listener")
+
+    def __init__(self, engine, channel=HasFullTableCache.CHANGE_CHANNEL):
+        self.engine = engine
+        self.channel = channel
+        self.connection = None
+        self.thread = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def start_for_process(cls, engine):
+        """Make sure a listener is running in this process, and in any
+        process forked from it.
+
+        :return: The running CacheInvalidationListener.
+        """
+        cls._engine = engine
+        return cls.ensure_running()
+
+    @classmethod
+    def ensure_running(cls):
+        """Start a listener in this process if one should be running
+        but isn't.
+
+        Threads don't survive a fork(), so a process forked after
+        start_for_process() was called (e.g. a uWSGI worker forked
+        after the app was loaded) inherits a listener that isn't
+        running. This is called on every cache lookup, so the worker
+        starts its own listener the first time it uses a cache.
+
+        :return: The running CacheInvalidationListener, or None if
+            start_for_process() was never called.
+        """
+        instance = cls._instance
+        pid = os.getpid()
+        if (instance and cls._pid == pid and instance.thread
+            and instance.thread.is_alive()):
+            return instance
+        if cls._engine is None:
+            return None
+        with cls._start_lock:
+            instance = cls._instance
+            if (instance and cls._pid == pid and instance.thread
+                and instance.thread.is_alive()):
+                return instance
+            instance = cls(cls._engine)
+            instance.start()
+            cls._instance = instance
+            cls._pid = pid
+        return instance
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name=self.channel)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def listen(self):
+        """Open a dedicated connection and LISTEN on the channel."""
+        # Connect directly rather than through the pool. After a
+        # fork, the pool may still hold connections that belong to
+        # the parent process, and we'll be holding on to this one for
+        # the life of the process.
+        dialect = self.engine.dialect
+        args, kwargs = dialect.create_connect_args(self.engine.url)
+        connection = dialect.connect(*args, **kwargs)
+        connection.autocommit = True
+        cursor = connection.cursor()
+        cursor.execute('LISTEN "%s";' % self.channel)
+        cursor.close()
+        self.connection = connection
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                if not self.connection:
+                    self.listen()
+                    # We may have missed notifications while we were
+                    # not listening, so every cache is suspect.
+                    self.reset_all_caches()
+                self.wait_for_notifications()
+            except Exception, e:
+                self.log.error(
+                    "Lost connection while listening for cache changes.",
+                    exc_info=e
+                )
+                self.close()
+                time.sleep(self.RECONNECT_DELAY)
+        self.close()
+
+    def wait_for_notifications(self):
+        """Wait up to POLL_TIMEOUT seconds for notifications and
+        process any that arrive.
+        """
+        ready, ignore, ignore = select.select(
+            [self.connection], [], [], self.POLL_TIMEOUT
+        )
+        if not ready:
+            return
+        self.connection.poll()
+        while self.connection.notifies:
+            notification = self.connection.notifies.pop(0)
+            self.handle(notification.payload)
+
+    def handle(self, payload):
+        """Evict an object from the cache in response to a notification.
+
+        :param payload: A string of the form "[table name]:[id]". If
+            the ID is missing, the whole table's cache is reset.
+        """
+        table_name, ignore, id = payload.partition(':')
+        cls = HasFullTableCache.class_for_table(table_name)
+        if not cls:
+            return
+        try:
+            id = int(id)
+        except ValueError, e:
+            id = None
+        if id is None:
+            cls.reset_cache()
+        else:
+            cls.evict_from_cache(id)
+
+    def reset_all_caches(self):
+        to_check = list(HasFullTableCache.__subclasses__())
+        while to_check:
+            subclass = to_check.pop()
+            if hasattr(subclass, '__tablename__'):
+                subclass.reset_cache()
+            to_check.extend(subclass.__subclasses__())
+
+    def close(self):
+        if self.connection:
+            try:
+                self.connection.close()
+            except Exception, e:
+                pass
+        self.connection = None
@@ -700,7 +700,14 @@ class Identifier(Base, IdentifierConstants):
             _db, identifier_ids, rel)
         images = images.join(Resource.representation)
         images = images.all()
+        return cls.choose_best_cover(images), images
 
+    @classmethod
+    def choose_best_cover(cls, images):
+        """Choose the best of the given image Resources, picking at
+        random between equally good ones.
+        """
+        from resource import Resource
         champions = Resource.best_covers_among(images)
         if not champions:
             champion = None
@@ -708,12 +715,11 @@ class Identifier(Base, IdentifierConstants):
             [champion] = champions
         else:
             champion = random.choice(champions)
-
-        return champion, images
+        return champion
 
     @classmethod
     def evaluate_summary_quality(cls, _db, identifier_ids,
-                                 privileged_data_sources=None):
+                                 privileged_data_sources=None, batch=None):
         """Evaluate the summaries for the given group of Identifier IDs.
         This is an automatic evaluation based solely on the content of
         the summaries. It will be combined with human-entered ratings
@@ -725,6 +731,8 @@ class Identifier(Base, IdentifierConstants):
         :param privileged_data_sources: If present, a summary from one
         of these data source will be instantly chosen, short-circuiting the
         decision process. Data sources are in order of priority.
+        :param batch: A PresentationBatch that may already have loaded
+        the descriptions.
         :return: The single highest-rated summary Resource.
         """
         evaluator = SummaryEvaluator()
@@ -736,9 +744,15 @@ class Identifier(Base, IdentifierConstants):
 
         # Find all rel="description" resources associated with any of
         # these records.
-        rels = [LinkRelations.DESCRIPTION, LinkRelations.SHORT_DESCRIPTION]
-        descriptions = cls.resources_for_identifier_ids(
-            _db, identifier_ids, rels, privileged_data_source).all()
+        descriptions = None
+        if batch is not None:
+            descriptions = batch.descriptions_for(
+                identifier_ids, privileged_data_source
+            )
+        if descriptions is None:
+            rels = [LinkRelations.DESCRIPTION, LinkRelations.SHORT_DESCRIPTION]
+            descriptions = cls.resources_for_identifier_ids(
+                _db, identifier_ids, rels, privileged_data_source).all()
 
         champion = None
         # Add each resource's content to the evaluator's corpus.
@@ -759,7 +773,9 @@ class Identifier(Base, IdentifierConstants):
         if privileged_data_source and not champion:
             # We could not find any descriptions from the privileged
             # data source. Try relaxing that restriction.
-            return cls.evaluate_summary_quality(_db, identifier_ids, privileged_data_sources[1:])
+            return cls.evaluate_summary_quality(
+                _db, identifier_ids, privileged_data_sources[1:], batch=batch
+            )
         return champion, descriptions
 
     @classmethod
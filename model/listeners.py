@@ -15,6 +15,7 @@ from admin import (
     AdminRole,
 )
 from datasource import DataSource
+from hasfulltablecache import HasFullTableCache
 from classification import Genre
 from collection import Collection
 from ..config import Configuration
@@ -141,79 +142,137 @@ def configuration_relevant_update(mapper, connection, target):
         site_configuration_has_changed(target)
 
 @event.listens_for(Admin, 'after_insert')
+@event.listens_for(AdminRole, 'after_insert')
+@event.listens_for(Collection, 'after_insert')
+@event.listens_for(ConfigurationSetting, 'after_insert')
+@event.listens_for(DataSource, 'after_insert')
+@event.listens_for(DeliveryMechanism, 'after_insert')
+@event.listens_for(ExternalIntegration, 'after_insert')
+@event.listens_for(Genre, 'after_insert')
+@event.listens_for(Library, 'after_insert')
+def reset_cache_after_insert(mapper, connection, target):
+    # A new row isn't committed yet, and may never be, so it mustn't
+    # go into a cache that other sessions use. Reset the cache
+    # instead; the next time someone looks something up, the cache
+    # will be repopulated.
+    cls = type(target)
+    cls.reset_cache()
+
+    # Other processes will do the same, once the change is committed.
+    cls.notify_change(connection, target)
+
+@event.listens_for(Session, 'after_rollback')
+def reset_caches_after_rollback(session):
+    # A cache may have been repopulated from rows that were changed
+    # in the transaction that was just rolled back.
+    HasFullTableCache.reset_changed_caches(session)
+
+@event.listens_for(Session, 'after_transaction_end')
+def forget_changed_caches(session, transaction):
+    if transaction.parent is None:
+        HasFullTableCache.forget_changed_caches(session)
+
 @event.listens_for(Admin, 'after_delete')
 @event.listens_for(Admin, 'after_update')
 def refresh_admin_cache(mapper, connection, target):
-    # The next time someone tries to access an Admin,
-    # the cache will be repopulated.
-    Admin.reset_cache()
+    # Forget about this one Admin; the next time someone
+    # looks it up, a fresh copy will be loaded from the database.
+    Admin.evict_from_cache(target.id)
+
+    # Other processes will evict this Admin from their
+    # caches, once the change is committed.
+    Admin.notify_change(connection, target)
 
-@event.listens_for(AdminRole, 'after_insert')
 @event.listens_for(AdminRole, 'after_delete')
 @event.listens_for(AdminRole, 'after_update')
 def refresh_admin_role_cache(mapper, connection, target):
-    # The next time someone tries to access an AdminRole,
-    # the cache will be repopulated.
-    AdminRole.reset_cache()
+    # Forget about this one AdminRole; the next time someone
+    # looks it up, a fresh copy will be loaded from the database.
+    AdminRole.evict_from_cache(target.id)
+
+    # Other processes will evict this AdminRole from their
+    # caches, once the change is committed.
+    AdminRole.notify_change(connection, target)
 
-@event.listens_for(Collection, 'after_insert')
 @event.listens_for(Collection, 'after_delete')
 @event.listens_for(Collection, 'after_update')
 def refresh_collection_cache(mapper, connection, target):
-    # The next time someone tries to access a Collection,
-    # the cache will be repopulated.
-    Collection.reset_cache()
+    # Forget about this one Collection; the next time someone
+    # looks it up, a fresh copy will be loaded from the database.
+    Collection.evict_from_cache(target.id)
+
+    # Other processes will evict this Collection from their
+    # caches, once the change is committed.
+    Collection.notify_change(connection, target)
 
-@event.listens_for(ConfigurationSetting, 'after_insert')
 @event.listens_for(ConfigurationSetting, 'after_delete')
 @event.listens_for(ConfigurationSetting, 'after_update')
 def refresh_configuration_settings(mapper, connection, target):
-    # The next time someone tries to access a configuration setting,
-    # the cache will be repopulated.
-    ConfigurationSetting.reset_cache()
+    # Forget about this one configuration setting; the next time someone
+    # looks it up, a fresh copy will be loaded from the database.
+    ConfigurationSetting.evict_from_cache(target.id)
+
+    # Other processes will evict this configuration setting from their
+    # caches, once the change is committed.
+    ConfigurationSetting.notify_change(connection, target)
 
-@event.listens_for(DataSource, 'after_insert')
 @event.listens_for(DataSource, 'after_delete')
 @event.listens_for(DataSource, 'after_update')
 def refresh_datasource_cache(mapper, connection, target):
-    # The next time someone tries to access a DataSource,
-    # the cache will be repopulated.
-    DataSource.reset_cache()
+    # Forget about this one DataSource; the next time someone
+    # looks it up, a fresh copy will be loaded from the database.
+    DataSource.evict_from_cache(target.id)
+
+    # Other processes will evict this DataSource from their
+    # caches, once the change is committed.
+    DataSource.notify_change(connection, target)
 
-@event.listens_for(DeliveryMechanism, 'after_insert')
 @event.listens_for(DeliveryMechanism, 'after_delete')
 @event.listens_for(DeliveryMechanism, 'after_update')
 def refresh_datasource_cache(mapper, connection, target):
-    # The next time someone tries to access a DeliveryMechanism,
-    # the cache will be repopulated.
-    DeliveryMechanism.reset_cache()
+    # Forget about this one DeliveryMechanism; the next time someone
+    # looks it up, a fresh copy will be loaded from the database.
+    DeliveryMechanism.evict_from_cache(target.id)
+
+    # Other processes will evict this DeliveryMechanism from their
+    # caches, once the change is committed.
+    DeliveryMechanism.notify_change(connection, target)
 
-@event.listens_for(ExternalIntegration, 'after_insert')
 @event.listens_for(ExternalIntegration, 'after_delete')
 @event.listens_for(ExternalIntegration, 'after_update')
 def refresh_datasource_cache(mapper, connection, target):
-    # The next time someone tries to access an ExternalIntegration,
-    # the cache will be repopulated.
-    ExternalIntegration.reset_cache()
+    # Forget about this one ExternalIntegration; the next time someone
+    # looks it up, a fresh copy will be loaded from the database.
+    ExternalIntegration.evict_from_cache(target.id)
+
+    # Other processes will evict this ExternalIntegration from their
+    # caches, once the change is committed.
+    ExternalIntegration.notify_change(connection, target)
 
-@event.listens_for(Genre, 'after_insert')
 @event.listens_for(Genre, 'after_delete')
 @event.listens_for(Genre, 'after_update')
 def refresh_genre_cache(mapper, connection, target):
-    # The next time someone tries to access a genre,
-    # the cache will be repopulated.
+    # Forget about this one genre; the next time someone
+    # looks it up, a fresh copy will be loaded from the database.
     #
     # The only time this should really happen is the very first time a
     # site is brought up, but just in case.
-    Genre.reset_cache()
+    Genre.evict_from_cache(target.id)
+
+    # Other processes will evict this genre from their
+    # caches, once the change is committed.
+    Genre.notify_change(connection, target)
 
-@event.listens_for(Library, 'after_insert')
 @event.listens_for(Library, 'after_delete')
 @event.listens_for(Library, 'after_update')
 def refresh_library_cache(mapper, connection, target):
-    # The next time someone tries to access a library,
-    # the cache will be repopulated.
-    Library.reset_cache()
+    # Forget about this one library; the next time someone
+    # looks it up, a fresh copy will be loaded from the database.
+    Library.evict_from_cache(target.id)
+
+    # Other processes will evict this library from their
+    # caches, once the change is committed.
+    Library.notify_change(connection, target)
 
 # When a pool gets a work and a presentation edition for the first time,
 # the work should be added to any custom lists associated with the pool's
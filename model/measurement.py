@@ -7,6 +7,7 @@ from constants import DataSourceConstants
 
 import bisect
 import logging
+import numpy
 from sqlalchemy import (
     Boolean,
     Column,
@@ -105,6 +106,14 @@ class Measurement(Base):
         DataSourceConstants.LIBRARY_STAFF: [1, 5],
     }
 
+    # The quantities that go into a Work's overall quality: direct
+    # measurements of popularity and quality, plus any quantity that
+    # might be mapppable to the 0..1 range -- ratings, and measurements
+    # with an associated percentile score.
+    QUALITY_QUANTITIES = set(
+        [POPULARITY, QUALITY, RATING] + PERCENTILE_SCALES.keys()
+    )
+
     id = Column(Integer, primary_key=True)
 
     # A Measurement is always associated with some Identifier.
@@ -145,11 +154,7 @@ class Measurement(Base):
     def overall_quality(cls, measurements, popularity_weight=0.3,
                         rating_weight=0.7, default_value=0):
         """Turn a bunch of measurements into an overall measure of quality."""
-        if popularity_weight + rating_weight != 1.0:
-            raise ValueError(
-                "Popularity weight and rating weight must sum to 1! (%.2f + %.2f)" % (
-                    popularity_weight, rating_weight)
-        )
+        cls._check_weights(popularity_weight, rating_weight)
         popularities = []
         ratings = []
         qualities = []
@@ -201,6 +206,30 @@ class Measurement(Base):
             logging.debug("Final value: %.2f" % final)
         return final
 
+    @classmethod
+    def _check_weights(cls, popularity_weight, rating_weight):
+        if popularity_weight + rating_weight != 1.0:
+            raise ValueError(
+                "Popularity weight and rating weight must sum to 1! (%.2f + %.2f)" % (
+                    popularity_weight, rating_weight)
+        )
+
+    @classmethod
+    def overall_qualities(cls, _db, identifier_id_sets, popularity_weight=0.3,
+                          rating_weight=0.7, default_value=0):
+        """Calculate overall_quality() for many groups of Identifiers at
+        once.
+
+        :param identifier_id_sets: A list of collections of Identifier
+            IDs, typically one for each Work.
+        :return: A list with the overall quality of each group, or
+            `default_value` for groups with no usable measurements.
+        """
+        columns = MeasurementColumns.load(_db, identifier_id_sets)
+        return columns.overall_qualities(
+            popularity_weight, rating_weight, default_value
+        )
+
     @classmethod
     def _average_normalized_value(cls, measurements):
         num_measurements = 0
@@ -252,3 +281,221 @@ class Measurement(Base):
             self._normalized_value = position * 0.01
 
         return self._normalized_value
+
+
+class MeasurementColumns(object):
+    """Measurements for a number of groups of Identifiers, stored as
+    NumPy arrays with one element per (group, Measurement) pair.
+
+    This lets us normalize the measurements and calculate the overall
+    quality of every group in one pass, with the same results as
+    calling Measurement.overall_quality() on each group.
+    """
+
+    # The index of each kind of measurement in the averages.
+    POPULARITY, RATING, QUALITY = range(3)
+
+    def __init__(self, group_count, groups, quantities, data_sources,
+                 values, normalized_values, weights):
+        """Constructor.
+
+        :param group_count: The number of groups.
+        :param groups: The group each Measurement belongs to.
+        :param quantities: The quantity_measured of each Measurement.
+        :param data_sources: The name of each Measurement's DataSource.
+        :param values: The value of each Measurement, or None.
+        :param normalized_values: The normalized value stored with each
+            Measurement, or None.
+        :param weights: The weight of each Measurement.
+        """
+        self.group_count = group_count
+        self.groups = numpy.asarray(groups, dtype=numpy.intp)
+        self.quantities = numpy.asarray(quantities, dtype=object)
+        self.data_sources = numpy.asarray(data_sources, dtype=object)
+        self.values = numpy.asarray(values, dtype=float)
+        self.normalized_values = numpy.asarray(normalized_values, dtype=float)
+        weights = numpy.asarray(weights, dtype=float)
+        # A measurement with no weight gets the column default.
+        self.weights = numpy.where(numpy.isnan(weights), 1, weights)
+
+    @classmethod
+    def from_measurements(cls, groups_of_measurements):
+        """Arrange lists of Measurement objects into columns."""
+        rows = [
+            (group, m.quantity_measured, m.data_source.name, m.value,
+             m._normalized_value, m.weight)
+            for group, measurements in enumerate(groups_of_measurements)
+            for m in measurements
+        ]
+        columns = zip(*rows) or [[]] * 6
+        return cls(len(groups_of_measurements), *columns)
+
+    @classmethod
+    def load(cls, _db, identifier_id_sets):
+        """Load the most recent quality-related Measurements of each set
+        of Identifiers with a single query.
+
+        An Identifier's Measurements count towards every set it's in.
+        """
+        from datasource import DataSource
+        identifier_id_sets = [list(x) for x in identifier_id_sets]
+        pair_ids = numpy.array(
+            [i for ids in identifier_id_sets for i in ids], dtype=numpy.int64
+        )
+        pair_groups = numpy.repeat(
+            numpy.arange(len(identifier_id_sets)),
+            [len(ids) for ids in identifier_id_sets]
+        )
+        rows = []
+        if len(pair_ids):
+            rows = _db.query(
+                Measurement.identifier_id, Measurement.quantity_measured,
+                DataSource.name, Measurement.value,
+                Measurement._normalized_value, Measurement.weight,
+            ).join(Measurement.data_source).filter(
+                Measurement.identifier_id.in_(numpy.unique(pair_ids).tolist())
+            ).filter(
+                Measurement.is_most_recent==True
+            ).filter(
+                Measurement.quantity_measured.in_(
+                    Measurement.QUALITY_QUANTITIES
+                )
+            ).order_by(Measurement.id).all()
+        if not rows:
+            return cls(len(identifier_id_sets), [], [], [], [], [], [])
+        (identifier_ids, quantities, data_sources, values, normalized,
+         weights) = [numpy.array(x, dtype=object) for x in zip(*rows)]
+        identifier_ids = identifier_ids.astype(numpy.int64)
+
+        # Find every set each row's Identifier belongs to, and repeat
+        # the row once for each of them.
+        order = numpy.argsort(pair_ids, kind='mergesort')
+        sorted_ids = pair_ids[order]
+        sorted_groups = pair_groups[order]
+        start = numpy.searchsorted(sorted_ids, identifier_ids, 'left')
+        counts = numpy.searchsorted(sorted_ids, identifier_ids, 'right') - start
+        rows = numpy.repeat(numpy.arange(len(identifier_ids)), counts)
+        offsets = numpy.arange(len(rows)) - numpy.repeat(
+            numpy.cumsum(counts) - counts, counts
+        )
+        groups = sorted_groups[numpy.repeat(start, counts) + offsets]
+        return cls(
+            len(identifier_id_sets), groups, quantities[rows],
+            data_sources[rows], values[rows], normalized[rows], weights[rows]
+        )
+
+    def normalize(self):
+        """Normalize every measurement, just as
+        Measurement.normalized_value does.
+
+        :return: An array of normalized values, with NaN for
+            measurements that can't be normalized.
+        """
+        stored = self.normalized_values
+        normalized = numpy.where(
+            numpy.isnan(stored) | (stored == 0), numpy.nan, stored
+        )
+        pending = numpy.isnan(normalized) & ~numpy.isnan(self.values)
+
+        # There are only a few combinations of quantity and data
+        # source, so handle each one in turn.
+        quantities, quantity_codes = numpy.unique(
+            self.quantities, return_inverse=True
+        )
+        data_sources, data_source_codes = numpy.unique(
+            self.data_sources, return_inverse=True
+        )
+        combinations = quantity_codes * len(data_sources) + data_source_codes
+        for combination in numpy.unique(combinations[pending]):
+            mask = pending & (combinations == combination)
+            quantity = quantities[combination // len(data_sources)]
+            data_source = data_sources[combination % len(data_sources)]
+            values = self.values[mask]
+            if data_source == DataSourceConstants.METADATA_WRANGLER:
+                # Data from the metadata wrangler comes in pre-normalized.
+                normalized[mask] = values
+            elif (quantity == Measurement.RATING
+                  and data_source in Measurement.RATING_SCALES):
+                scale_min, scale_max = Measurement.RATING_SCALES[data_source]
+                width = float(scale_max-scale_min)
+                normalized[mask] = (values-scale_min) / width
+            elif quantity in Measurement.PERCENTILE_SCALES:
+                percentiles = Measurement.PERCENTILE_SCALES[quantity].get(
+                    data_source
+                )
+                if percentiles is not None:
+                    positions = numpy.searchsorted(percentiles, values, 'left')
+                    normalized[mask] = positions * 0.01
+            else:
+                normalized[mask] = stored[mask]
+        return normalized
+
+    def averages(self):
+        """Find the weighted average normalized popularity, rating and
+        quality of each group.
+
+        :return: A 3-tuple of arrays (popularity, rating, quality),
+            with NaN where a group has no usable measurements.
+        """
+        normalized = self.normalize()
+        usable = ~numpy.isnan(normalized)
+        kinds = numpy.full(len(self.groups), self.POPULARITY)
+        kinds[self.quantities == Measurement.RATING] = self.RATING
+        kinds[self.quantities == Measurement.QUALITY] = self.QUALITY
+        averages = []
+        for kind in (self.POPULARITY, self.RATING, self.QUALITY):
+            mask = usable & (kinds == kind)
+            groups = self.groups[mask]
+            weights = self.weights[mask]
+            total_weight = numpy.bincount(
+                groups, weights=weights, minlength=self.group_count
+            )
+            total = numpy.bincount(
+                groups, weights=normalized[mask] * weights,
+                minlength=self.group_count
+            )
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                averages.append(numpy.where(
+                    total_weight != 0, total / total_weight, numpy.nan
+                ))
+        return tuple(averages)
+
+    def overall_qualities(self, popularity_weight=0.3, rating_weight=0.7,
+                          default_value=0):
+        """Calculate Measurement.overall_quality for every group.
+
+        :return: A list with one quality per group, or `default_value`
+            for groups with no usable measurements.
+        """
+        Measurement._check_weights(popularity_weight, rating_weight)
+        popularity, rating, quality = self.averages()
+        has_popularity = ~numpy.isnan(popularity)
+        has_rating = ~numpy.isnan(rating)
+        has_quality = ~numpy.isnan(quality)
+
+        # With at least two of the three, we start with popularity,
+        # rating, or a weighted combination, and then average that
+        # with any nonzero quality score.
+        final = numpy.where(
+            ~has_popularity, rating, numpy.where(
+                ~has_rating, popularity,
+                (popularity * popularity_weight) + (rating * rating_weight)
+            )
+        )
+        with_quality = has_quality & (quality != 0)
+        final = numpy.where(with_quality, (final / 2) + (quality / 2), final)
+
+        # With only one, we use it as is.
+        present = (
+            has_popularity.astype(int) + has_rating + has_quality
+        )
+        for has, value in (
+            (has_popularity, popularity), (has_rating, rating),
+            (has_quality, quality)
+        ):
+            final = numpy.where((present == 1) & has, value, final)
+
+        qualities = final.tolist()
+        for group in numpy.flatnonzero(present == 0):
+            qualities[group] = default_value
+        return qualities
@@ -3,7 +3,10 @@
 
 import datetime
 import logging
-from collections import Counter
+from collections import (
+    Counter,
+    defaultdict,
+)
 
 from sqlalchemy import (
     Boolean,
@@ -21,7 +24,9 @@ from sqlalchemy.dialects.postgresql import INT4RANGE
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.orm import (
     contains_eager,
+    joinedload,
     relationship,
+    selectinload,
 )
 from sqlalchemy.orm.session import Session
 from sqlalchemy.sql.expression import (
@@ -754,13 +759,22 @@ class Work(Base):
             if lp.identifier
         ]
 
-    def all_identifier_ids(self, policy=None):
+    def all_identifier_ids(self, policy=None, batch=None):
         """Return all Identifier IDs associated with this Work.
 
         :param policy: A `PresentationCalculationPolicy`.
+        :param batch: A `PresentationBatch` that may already know
+             the answer.
         :return: A set containing all Identifier IDs associated
              with this Work (as per the rules set down in `policy`).
         """
+        if batch is not None:
+            all_identifier_ids = batch.all_identifier_ids(
+                self._direct_identifier_ids
+            )
+            if all_identifier_ids is not None:
+                return all_identifier_ids
+
         _db = Session.object_session(self)
         # Get a dict that maps identifier ids to lists of their equivalents.
         equivalent_lists = Identifier.recursively_equivalent_identifier_ids(
@@ -809,12 +823,15 @@ class Work(Base):
         for pool in self.presentation_edition.is_presentation_for:
             pool.work = self
 
-    def calculate_presentation_edition(self, policy=None):
+    def calculate_presentation_edition(self, policy=None, batch=None):
         """ Which of this Work's Editions should be used as the default?
         First, every LicensePool associated with this work must have
         its presentation edition set.
         Then, we go through the pools, see which has the best presentation edition,
         and make it our presentation edition.
+
+        :param batch: A `PresentationBatch`. If this is provided, the
+            WorkCoverageRecord is written along with the rest of the batch.
         """
         changed = False
         policy = policy or PresentationCalculationPolicy()
@@ -865,8 +882,8 @@ class Work(Base):
             self.set_presentation_edition(new_presentation_edition)
 
         # tell everyone else we tried to set work's presentation edition
-        WorkCoverageRecord.add_for(
-            self, operation=WorkCoverageRecord.CHOOSE_EDITION_OPERATION
+        self._add_coverage_record(
+            WorkCoverageRecord.CHOOSE_EDITION_OPERATION, batch
         )
 
         changed = (
@@ -875,6 +892,16 @@ class Work(Base):
         )
         return changed
 
+    def _add_coverage_record(self, operation, batch=None):
+        """Record that an operation was performed on this Work, either
+        now or, if there's a `PresentationBatch`, along with the rest of
+        the batch.
+        """
+        if batch is not None:
+            batch.add_work_coverage_record(self, operation)
+        else:
+            WorkCoverageRecord.add_for(self, operation=operation)
+
     def _get_default_audience(self):
         """Return the default audience.
 
@@ -889,7 +916,7 @@ class Work(Base):
 
     def calculate_presentation(
         self, policy=None, search_index_client=None, exclude_search=False,
-        default_fiction=None, default_audience=None
+        default_fiction=None, default_audience=None, batch=None
     ):
         """Make a Work ready to show to patrons.
         Call calculate_presentation_edition() to find the best-quality presentation edition
@@ -900,6 +927,10 @@ class Work(Base):
         * The intended audience for the work.
         * The best available summary for the work.
         * The overall popularity of the work.
+
+        :param batch: A `PresentationBatch` containing information
+           gathered ahead of time for this Work and others. This is
+           used by bulk_calculate_presentation().
         """
         if not default_audience:
             default_audience = self._get_default_audience()
@@ -912,7 +943,7 @@ class Work(Base):
 
         policy = policy or PresentationCalculationPolicy()
 
-        edition_changed = self.calculate_presentation_edition(policy)
+        edition_changed = self.calculate_presentation_edition(policy, batch)
 
         if not self.presentation_edition:
             # Without a presentation edition, we can't calculate presentation
@@ -920,7 +951,9 @@ class Work(Base):
             return
 
         if policy.choose_cover or policy.set_edition_metadata:
-            cover_changed = self.presentation_edition.calculate_presentation(policy)
+            cover_changed = self.presentation_edition.calculate_presentation(
+                policy, batch=batch
+            )
             edition_changed = edition_changed or cover_changed
 
         summary = self.summary
@@ -944,7 +977,9 @@ class Work(Base):
             _db = Session.object_session(self)
 
             direct_identifier_ids = self._direct_identifier_ids
-            all_identifier_ids = self.all_identifier_ids(policy=policy)
+            all_identifier_ids = self.all_identifier_ids(
+                policy=policy, batch=batch
+            )
         else:
             # Don't bother.
             direct_identifier_ids = all_identifier_ids = []
@@ -953,16 +988,16 @@ class Work(Base):
             classification_changed = self.assign_genres(
                 all_identifier_ids,
                 default_fiction=default_fiction,
-                default_audience=default_audience
+                default_audience=default_audience, batch=batch
             )
-            WorkCoverageRecord.add_for(
-                self, operation=WorkCoverageRecord.CLASSIFY_OPERATION
+            self._add_coverage_record(
+                WorkCoverageRecord.CLASSIFY_OPERATION, batch
             )
 
         if policy.choose_summary:
             self._choose_summary(
                 direct_identifier_ids, all_identifier_ids,
-                licensed_data_sources
+                licensed_data_sources, batch=batch
             )
 
         if policy.calculate_quality:
@@ -986,7 +1021,7 @@ class Work(Base):
                 # then at least make it an integer zero, not none.
                 default_quality = 0
             self.calculate_quality(
-                all_identifier_ids, default_quality
+                all_identifier_ids, default_quality, batch=batch
             )
 
         if self.summary_text:
@@ -1036,9 +1071,33 @@ class Work(Base):
         # title.
         self.set_presentation_ready_based_on_content()
 
+    @classmethod
+    def bulk_calculate_presentation(cls, works, policy=None, **kwargs):
+        """Call calculate_presentation() on a number of Works.
+
+        The equivalent identifiers, classifications, measurements,
+        descriptions, covers and contributors for all of the Works are
+        loaded up front with a fixed number of queries, rather than
+        separately for each Work, and their WorkCoverageRecords are
+        written together at the end.
+
+        :param policy: A PresentationCalculationPolicy to use for
+           every Work.
+        :param kwargs: Passed along to calculate_presentation().
+        """
+        works = list(works)
+        if not works:
+            return
+        _db = Session.object_session(works[0])
+        policy = policy or PresentationCalculationPolicy()
+        batch = PresentationBatch(_db, works, policy)
+        for work in works:
+            work.calculate_presentation(policy, batch=batch, **kwargs)
+        batch.write_coverage_records()
+
     def _choose_summary(
         self, direct_identifier_ids, all_identifier_ids,
-        licensed_data_sources
+        licensed_data_sources, batch=None
     ):
         """Helper method for choosing a summary as part of presentation
         calculation.
@@ -1059,6 +1118,9 @@ class Work(Base):
         :param licensed_data_sources: A list of DataSources that should be
             given priority -- either because they provided the books or because
             they are trusted sources such as library staff.
+
+        :param batch: A `PresentationBatch` that may already have loaded
+            the descriptions.
         """
         _db = Session.object_session(self)
         staff_data_source = DataSource.lookup(
@@ -1068,7 +1130,7 @@ class Work(Base):
         summary = None
         for id_set in (direct_identifier_ids, all_identifier_ids):
             summary, summaries = Identifier.evaluate_summary_quality(
-                _db, id_set, data_sources
+                _db, id_set, data_sources, batch=batch
             )
             if summary:
                 # We found a summary.
@@ -1297,30 +1359,37 @@ class Work(Base):
         else:
             self.set_presentation_ready(search_index_client=search_index_client)
 
-    def calculate_quality(self, identifier_ids, default_quality=0):
-        _db = Session.object_session(self)
-        # Relevant Measurements are direct measurements of popularity
-        # and quality, plus any quantity that might be mapppable to the 0..1
-        # range -- ratings, and measurements with an associated percentile
-        # score.
-        quantities = set([
-            Measurement.POPULARITY, Measurement.QUALITY, Measurement.RATING
-        ])
-        quantities = quantities.union(Measurement.PERCENTILE_SCALES.keys())
-        measurements = _db.query(Measurement).filter(
+    @classmethod
+    def _measurements_query(cls, _db, identifier_ids):
+        """Find the Measurements that go into a Work's quality."""
+        return _db.query(Measurement).filter(
             Measurement.identifier_id.in_(identifier_ids)).filter(
                 Measurement.is_most_recent==True).filter(
-                    Measurement.quantity_measured.in_(quantities)).all()
-
-        self.quality = Measurement.overall_quality(
-            measurements, default_value=default_quality)
-        WorkCoverageRecord.add_for(
-            self, operation=WorkCoverageRecord.QUALITY_OPERATION
+                    Measurement.quantity_measured.in_(
+                        Measurement.QUALITY_QUANTITIES
+                    ))
+
+    def calculate_quality(self, identifier_ids, default_quality=0, batch=None):
+        quality = None
+        if batch is not None:
+            quality = batch.quality_for(identifier_ids, default_quality)
+        if quality is None:
+            _db = Session.object_session(self)
+            measurements = self._measurements_query(
+                _db, identifier_ids
+            ).all()
+            quality = Measurement.overall_quality(
+                measurements, default_value=default_quality)
+        self.quality = quality
+        self._add_coverage_record(
+            WorkCoverageRecord.QUALITY_OPERATION, batch
         )
 
-    def assign_genres(self, identifier_ids, default_fiction=False, default_audience=Classifier.AUDIENCE_ADULT):
+    def assign_genres(self, identifier_ids, default_fiction=False, default_audience=Classifier.AUDIENCE_ADULT, batch=None):
         """Set classification information for this work based on the
         subquery to get equivalent identifiers.
+        :param batch: A `PresentationBatch` that may already have loaded
+        the classifications.
         :return: A boolean explaining whether or not any data actually
         changed.
         """
@@ -1330,10 +1399,14 @@ class Work(Base):
         old_audience = self.audience
         old_target_age = self.target_age
 
-        _db = Session.object_session(self)
-        classifications = Identifier.classifications_for_identifier_ids(
-            _db, identifier_ids
-        )
+        classifications = None
+        if batch is not None:
+            classifications = batch.classifications_for(identifier_ids)
+        if classifications is None:
+            _db = Session.object_session(self)
+            classifications = Identifier.classifications_for_identifier_ids(
+                _db, identifier_ids
+            )
         for classification in classifications:
             classifier.add(classification)
 
@@ -1890,3 +1963,268 @@ class Work(Base):
         if search_index is not None:
             search_index.remove_work(self)
         _db.delete(self)
+
+
+class PresentationBatch(object):
+    """The information needed to calculate presentation for a number
+    of Works, gathered with a fixed number of set-based queries.
+
+    Work.calculate_presentation() normally looks up equivalent
+    identifiers, classifications, measurements, descriptions and cover
+    images separately for every Work it's called on. When it's given a
+    PresentationBatch, it looks them up here instead, and the coverage
+    records it would have written are written for the whole batch at
+    once by write_coverage_records(). (The CoverageRecords for each
+    Work's presentation edition are still written one at a time.)
+
+    Each lookup method returns None if it's asked about an Identifier
+    that wasn't known when the batch was created (because a Work got a
+    new presentation edition along the way, say). The caller should
+    then go to the database as usual.
+    """
+
+    # Editions look for covers associated with Identifiers this many
+    # levels of equivalency away from their primary identifier. This
+    # is the same distance used by Edition.choose_cover().
+    COVER_DISTANCE = 5
+
+    def __init__(self, _db, works, policy=None):
+        from licensing import LicensePool
+        from resource import (
+            Hyperlink,
+            Resource,
+        )
+        self._db = _db
+        self.works = list(works)
+        self.policy = policy = policy or PresentationCalculationPolicy()
+
+        self._work_coverage = defaultdict(list)
+
+        self.equivalents = {}
+        self.equivalents_known_for = set()
+        self.classifications = defaultdict(list)
+        self.qualities = {}
+        self.descriptions = []
+        self.cover_equivalents = {}
+        self.cover_equivalents_known_for = set()
+        self.images = []
+        self.known_identifier_ids = set()
+        self.known_image_identifier_ids = set()
+        if not self.works:
+            return
+
+        # Load the LicensePools, their Identifiers and Editions, and
+        # the Contributors to each Work's presentation edition.
+        work_ids = [work.id for work in self.works]
+        pools = _db.query(LicensePool).filter(
+            LicensePool.work_id.in_(work_ids)
+        ).options(
+            joinedload(LicensePool.identifier).selectinload(
+                Identifier.primarily_identifies
+            ),
+            joinedload(LicensePool.presentation_edition),
+        ).all()
+        editions = [
+            work.presentation_edition for work in self.works
+            if work.presentation_edition
+        ]
+        if editions:
+            _db.query(Edition).filter(
+                Edition.id.in_([edition.id for edition in editions])
+            ).options(
+                joinedload(Edition.primary_identifier),
+                selectinload(Edition.contributions).joinedload(
+                    Contribution.contributor
+                )
+            ).all()
+
+        direct_identifier_ids = set(
+            pool.identifier_id for pool in pools if pool.identifier_id
+        )
+        if (direct_identifier_ids and (
+            policy.classify or policy.choose_summary
+            or policy.calculate_quality
+        )):
+            self.equivalents = Identifier.recursively_equivalent_identifier_ids(
+                _db, direct_identifier_ids, policy=policy
+            )
+            self.equivalents_known_for = direct_identifier_ids
+            known = set(direct_identifier_ids)
+            for equivalents in self.equivalents.values():
+                known.update(equivalents)
+            self.known_identifier_ids = known
+
+        if policy.classify and self.known_identifier_ids:
+            for classification in Identifier.classifications_for_identifier_ids(
+                _db, self.known_identifier_ids
+            ):
+                self.classifications[classification.identifier_id].append(
+                    classification
+                )
+
+        if policy.calculate_quality and self.known_identifier_ids:
+            # Calculate every Work's quality at once, leaving the
+            # default quality to be filled in later.
+            identifier_id_sets = [
+                frozenset(self.all_identifier_ids(work._direct_identifier_ids))
+                for work in self.works
+            ]
+            qualities = Measurement.overall_qualities(
+                _db, identifier_id_sets, default_value=None
+            )
+            self.qualities = dict(zip(identifier_id_sets, qualities))
+
+        if policy.choose_summary and self.known_identifier_ids:
+            rels = [Hyperlink.DESCRIPTION, Hyperlink.SHORT_DESCRIPTION]
+            self.descriptions = Identifier.resources_for_identifier_ids(
+                _db, self.known_identifier_ids, rels
+            ).add_columns(
+                Hyperlink.identifier_id, Hyperlink.data_source_id
+            ).all()
+
+        cover_identifier_ids = set(
+            edition.primary_identifier_id for edition in editions
+            if edition.primary_identifier_id
+        )
+        if policy.choose_cover and cover_identifier_ids:
+            self.cover_equivalents = Identifier.recursively_equivalent_identifier_ids(
+                _db, cover_identifier_ids,
+                policy=self._cover_policy(policy)
+            )
+            known = set(cover_identifier_ids)
+            for equivalents in self.cover_equivalents.values():
+                known.update(equivalents)
+            rels = [Hyperlink.IMAGE, Hyperlink.THUMBNAIL_IMAGE]
+            self.images = Identifier.resources_for_identifier_ids(
+                _db, known, rels
+            ).join(Resource.representation).add_columns(
+                Hyperlink.identifier_id, Hyperlink.rel
+            ).all()
+            self.cover_equivalents_known_for = cover_identifier_ids
+            self.known_image_identifier_ids = known
+
+    @classmethod
+    def _cover_policy(cls, policy):
+        """The policy Edition.best_cover_within_distance() uses when
+        looking for covers COVER_DISTANCE levels away.
+        """
+        return PresentationCalculationPolicy(
+            equivalent_identifier_levels=cls.COVER_DISTANCE,
+            equivalent_identifier_cutoff=policy.equivalent_identifier_cutoff,
+            equivalent_identifier_threshold=policy.equivalent_identifier_threshold,
+        )
+
+    def all_identifier_ids(self, direct_identifier_ids):
+        """Find all Identifier IDs equivalent to the given ones.
+
+        :return: A set of Identifier IDs, or None if this batch
+            doesn't know about all the given Identifiers.
+        """
+        if not self.equivalents_known_for.issuperset(direct_identifier_ids):
+            return None
+        all_identifier_ids = set()
+        for identifier_id in direct_identifier_ids:
+            all_identifier_ids.update(self.equivalents.get(identifier_id, []))
+        return all_identifier_ids
+
+    def _lookup(self, loaded, by_identifier_id, identifier_ids):
+        if not loaded or not self.known_identifier_ids.issuperset(identifier_ids):
+            return None
+        found = []
+        for identifier_id in identifier_ids:
+            found.extend(by_identifier_id.get(identifier_id, []))
+        return found
+
+    def classifications_for(self, identifier_ids):
+        """The Classifications of the given Identifiers, or None."""
+        return self._lookup(
+            self.policy.classify, self.classifications, identifier_ids
+        )
+
+    def quality_for(self, identifier_ids, default_quality=0):
+        """The overall quality of a Work associated with the given
+        Identifiers, or None if it wasn't calculated for exactly this
+        set of Identifiers.
+        """
+        key = frozenset(identifier_ids)
+        if key not in self.qualities:
+            return None
+        quality = self.qualities[key]
+        if quality is None:
+            return default_quality
+        return quality
+
+    def descriptions_for(self, identifier_ids, data_source=None):
+        """The description Resources associated with the given
+        Identifiers, optionally restricted to one or more DataSources,
+        or None.
+
+        This finds the same Resources as the query run by
+        Identifier.evaluate_summary_quality().
+        """
+        if (not self.policy.choose_summary
+            or not self.known_identifier_ids.issuperset(identifier_ids)):
+            return None
+        data_source_ids = None
+        if data_source:
+            if isinstance(data_source, DataSource):
+                data_source = [data_source]
+            data_source_ids = set(x.id for x in data_source)
+        identifier_ids = set(identifier_ids)
+        return self._distinct(
+            resource for resource, identifier_id, data_source_id
+            in self.descriptions
+            if identifier_id in identifier_ids and (
+                data_source_ids is None or data_source_id in data_source_ids
+            )
+        )
+
+    def best_cover_for(self, identifier, distance, rel):
+        """Find the best cover associated with the given Identifier, or
+        an Identifier within `distance` levels of equivalency.
+
+        :return: The same 2-tuple returned by Identifier.best_cover_for,
+            or None.
+        """
+        if (identifier.id not in self.known_image_identifier_ids
+            or distance not in (0, self.COVER_DISTANCE)):
+            return None
+        identifier_ids = set([identifier.id])
+        if distance:
+            if identifier.id not in self.cover_equivalents_known_for:
+                return None
+            identifier_ids.update(
+                self.cover_equivalents.get(identifier.id, [])
+            )
+        images = self._distinct(
+            resource for resource, identifier_id, image_rel in self.images
+            if identifier_id in identifier_ids and image_rel == rel
+        )
+        return Identifier.choose_best_cover(images), images
+
+    @classmethod
+    def _distinct(cls, resources):
+        seen = set()
+        distinct = []
+        for resource in resources:
+            if resource not in seen:
+                seen.add(resource)
+                distinct.append(resource)
+        return distinct
+
+    def add_work_coverage_record(self, work, operation):
+        """Note that a WorkCoverageRecord should be written for the
+        given Work and operation.
+        """
+        self._work_coverage[operation].append(work)
+
+    def write_coverage_records(self):
+        """Write all the WorkCoverageRecords noted so far, with one
+        UPDATE and one INSERT per operation.
+        """
+        # The bulk statements don't trigger a flush, and they need to
+        # see records created earlier in this session.
+        flush(self._db)
+        for operation, works in self._work_coverage.items():
+            WorkCoverageRecord.bulk_add(works, operation)
+        self._work_coverage.clear()
@@ -5,6 +5,7 @@ import traceback
 from sqlalchemy.orm import defer
 from sqlalchemy.sql.expression import (
     and_,
+    func,
     or_,
 )
 
@@ -14,6 +15,7 @@ from metadata_layer import TimestampData
 from model import (
     CachedFeed,
     CirculationEvent,
+    CirculationEventRollup,
     Collection,
     CollectionMissing,
     CoverageRecord,
@@ -777,6 +779,92 @@ class CustomListEntryWorkUpdateMonitor(CustomListEntrySweepMonitor):
         item.set_work()
 
 
+class CirculationEventRollupMonitor(TimelineMonitor):
+    """Keep the hourly and daily CirculationEventRollups up to date.
+
+    An event may be committed well after it starts -- for instance,
+    when it's written by a buffered LocalAnalyticsProvider, or as part
+    of a long import -- so events don't show up in order of their
+    start times, or of their IDs. Each run only rolls up events that
+    started at least SETTLE_TIME ago, and recounts every period it
+    touches from scratch, starting OVERLAP before the previous run's
+    cutoff. An event that shows up late is counted by the next run
+    rather than being skipped.
+    """
+    SERVICE_NAME = "Circulation Event Rollup"
+
+    # The first run rolls up every event in the database.
+    DEFAULT_START_TIME = Monitor.NEVER
+
+    # Events that started more recently than this may not all have
+    # been committed yet, so they're left for the next run.
+    SETTLE_TIME = datetime.timedelta(minutes=10)
+
+    # Periods that ended less than this long before the previous
+    # run's cutoff are recounted, in case events showed up late.
+    OVERLAP = datetime.timedelta(hours=1)
+
+    # Events will be rolled up in slices of this much time, with a
+    # commit after each.
+    DEFAULT_SLICE_SIZE = datetime.timedelta(days=1)
+
+    def __init__(self, _db, slice_size=None):
+        super(CirculationEventRollupMonitor, self).__init__(_db)
+        self.slice_size = slice_size or self.DEFAULT_SLICE_SIZE
+
+    def run_once(self, progress):
+        if progress.finish is None:
+            start = self.initial_start_time
+        else:
+            start = progress.finish - self.OVERLAP
+        cutoff = datetime.datetime.utcnow() - self.SETTLE_TIME
+        if start is None:
+            # Start with the earliest event.
+            start = self._db.query(
+                func.min(CirculationEvent.start)
+            ).scalar() or cutoff
+        if start >= cutoff:
+            # None of the events have settled yet. Next time, start
+            # from here.
+            return TimestampData(
+                start=start, finish=start,
+                achievements="No events to roll up."
+            )
+        self.catch_up_from(start, cutoff, progress)
+        progress.start = start
+        progress.finish = cutoff
+        return progress
+
+    def catch_up_from(self, start, cutoff, progress):
+        slices = 0
+        slice_start = start
+        while slice_start is not None:
+            slice_cutoff = min(slice_start + self.slice_size, cutoff)
+            for period in CirculationEventRollup.PERIODS:
+                CirculationEventRollup.roll_up(
+                    self._db, period, slice_start, slice_cutoff
+                )
+            slices += 1
+
+            # Commit after each slice so an exception in a later
+            # slice doesn't lose this one.
+            self._db.commit()
+
+            # Skip over any stretch of time with no events, so that
+            # a quiet month doesn't cost thirty empty slices.
+            slice_start = self._db.query(
+                func.min(CirculationEvent.start)
+            ).filter(
+                CirculationEvent.start >= slice_cutoff,
+                CirculationEvent.start < cutoff,
+            ).scalar()
+        progress.achievements = (
+            "Slices rolled up: %d. Events rolled up through %s." % (
+                slices, cutoff
+            )
+        )
+
+
 class ReaperMonitor(Monitor):
     """A Monitor that deletes database rows that have expired but
     have no other process to delete them.
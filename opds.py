@@ -44,6 +44,10 @@ from util.opds_writer import (
     OPDSFeed,
     OPDSMessage,
 )
+from util.request_timing import (
+    RequestTimer,
+    timed,
+)
 
 
 class UnfulfillableWork(Exception):
@@ -63,6 +67,12 @@ class Annotator(object):
 
     opds_cache_field = Work.simple_opds_entry.name
 
+    # Set this to True if annotate_work_entry() only ever adds tags to
+    # the end of an entry, without looking at or changing the tags
+    # that are already there. An AcquisitionFeed can then add those
+    # tags to a cached entry without parsing it.
+    splice_entries = False
+
     def is_work_entry_solo(self, work):
         """Return a boolean value indicating whether the work's OPDS catalog entry is served by itself,
             rather than as a part of the feed.
@@ -698,10 +708,13 @@ class AcquisitionFeed(OPDSFeed):
     def page(cls, _db, title, url, worklist, annotator,
              facets=None, pagination=None,
              max_age=None, search_engine=None, search_debug=False,
-             **response_kwargs
+             stream=False, **response_kwargs
     ):
         """Create a feed representing one page of works from a given lane.
 
+        :param stream: If this is True and the feed isn't cached, the
+            response will send each entry as soon as it's created,
+            rather than waiting for the whole feed.
         :param response_kwargs: Extra keyword arguments to pass into
             the OPDSFeedResponse constructor.
 
@@ -715,19 +728,19 @@ class AcquisitionFeed(OPDSFeed):
         def refresh():
             return cls._generate_page(
                 _db, title, url, worklist, annotator, facets, pagination,
-                search_engine, search_debug
+                search_engine, search_debug, defer_entries=stream
             )
 
         response_kwargs.setdefault('max_age', max_age)
         return CachedFeed.fetch(
             _db, worklist=worklist, pagination=pagination, facets=facets,
-            refresher_method=refresh, **response_kwargs
+            refresher_method=refresh, stream=stream, **response_kwargs
         )
 
     @classmethod
     def _generate_page(
         cls, _db, title, url, lane, annotator, facets, pagination,
-        search_engine, search_debug
+        search_engine, search_debug, defer_entries=False
     ):
         """Internal method called by page() when a cached feed
         must be regenerated.
@@ -748,7 +761,9 @@ class AcquisitionFeed(OPDSFeed):
             # Pagination.page_loaded may or may not have been called
             # yet.
             pagination.page_loaded(works)
-        feed = cls(_db, title, url, works, annotator)
+        feed = cls(
+            _db, title, url, works, annotator, defer_entries=defer_entries
+        )
 
         entrypoints = facets.selectable_entrypoints(lane)
         if entrypoints:
@@ -958,7 +973,7 @@ class AcquisitionFeed(OPDSFeed):
     @classmethod
     def search(cls, _db, title, url, lane, search_engine, query,
                pagination=None, facets=None, annotator=None,
-               **response_kwargs
+               stream=False, **response_kwargs
     ):
         """Run a search against the given search engine and return
         the results as a Flask Response.
@@ -971,6 +986,9 @@ class AcquisitionFeed(OPDSFeed):
         :param pagination: A Pagination
         :param facets: A Facets
         :param annotator: An Annotator
+        :param stream: If this is True, the response will send each
+            entry as soon as it's created, rather than waiting for the
+            whole feed.
         :param response_kwargs: Keyword arguments to pass into the OPDSFeedResponse
             constructor.
         :return: An ODPSFeedResponse
@@ -981,7 +999,8 @@ class AcquisitionFeed(OPDSFeed):
             _db, query, search_engine, pagination=pagination, facets=facets
         )
         opds_feed = AcquisitionFeed(
-            _db, title, url, results, annotator=annotator
+            _db, title, url, results, annotator=annotator,
+            defer_entries=stream
         )
         AcquisitionFeed.add_link_to_feed(
             feed=opds_feed.feed, rel='start',
@@ -1025,7 +1044,11 @@ class AcquisitionFeed(OPDSFeed):
         # imposed by this lane (notably language and audience).
 
         annotator.annotate_feed(opds_feed, lane)
-        return OPDSFeedResponse(response=unicode(opds_feed), **response_kwargs)
+        if stream:
+            body = opds_feed.iter_serialized()
+        else:
+            body = unicode(opds_feed)
+        return OPDSFeedResponse(response=body, **response_kwargs)
 
     @classmethod
     def single_entry(
@@ -1050,6 +1073,10 @@ class AcquisitionFeed(OPDSFeed):
         """
 
         feed = cls(_db, '', '', [], annotator=annotator)
+
+        # This <entry> tag will be the root of its own document, so
+        # it needs to be an Element.
+        feed.splice_entries = False
         if not isinstance(work, Edition) and not work.presentation_edition:
             return None
         entry = feed.create_entry(work, even_if_no_license_pool=True,
@@ -1120,9 +1147,15 @@ class AcquisitionFeed(OPDSFeed):
             )
 
     def __init__(self, _db, title, url, works, annotator=None,
-                 precomposed_entries=[]):
+                 precomposed_entries=[], defer_entries=False):
         """Turn a list of works, messages, and precomposed <opds> entries
         into a feed.
+
+        :param defer_entries: If this is True, the entries for `works`
+            aren't created until the feed is serialized, and then they
+            go at the end of the feed. This lets iter_serialized() send
+            each entry as soon as it's created, but it means
+            Annotator.annotate_feed() won't see them.
         """
         if not annotator:
             annotator = Annotator
@@ -1130,8 +1163,16 @@ class AcquisitionFeed(OPDSFeed):
             annotator = annotator()
         self.annotator = annotator
 
+        # If this is True, entries made from a Work's cached OPDS
+        # entry are kept as strings. See _splice_entry().
+        self.splice_entries = getattr(annotator, 'splice_entries', False)
+
         super(AcquisitionFeed, self).__init__(title, url)
 
+        self.deferred_works = []
+        if defer_entries:
+            self.deferred_works = list(works)
+            works = []
         for work in works:
             self.add_entry(work)
 
@@ -1145,14 +1186,41 @@ class AcquisitionFeed(OPDSFeed):
         """Attempt to create an OPDS <entry>. If successful, append it to
         the feed.
         """
-        entry = self.create_entry(work)
-
-        if entry is not None:
-            if isinstance(entry, OPDSMessage):
-                entry = entry.tag
+        entry = self._entry_tag(work)
+        if isinstance(entry, basestring):
+            self.append_serialized(entry)
+        elif entry is not None:
             self.feed.append(entry)
         return entry
 
+    def _entry_tag(self, work):
+        """Create the tag that represents `work` in this feed.
+
+        :return: An lxml Element, a unicode string if the entry was
+            spliced, or None if no tag could be created.
+        """
+        with timed(RequestTimer.OPDS_ENTRIES):
+            entry = self.create_entry(work)
+        if isinstance(entry, OPDSMessage):
+            entry = entry.tag
+        return entry
+
+    def iter_serialized(self):
+        """Serialize this feed a piece at a time, creating any deferred
+        entries as they're needed.
+        """
+        works, self.deferred_works = self.deferred_works, []
+        tags = (self._entry_tag(work) for work in works)
+        return super(AcquisitionFeed, self).iter_serialized(
+            tag for tag in tags if tag is not None
+        )
+
+    def __unicode__(self):
+        works, self.deferred_works = self.deferred_works, []
+        for work in works:
+            self.add_entry(work)
+        return super(AcquisitionFeed, self).__unicode__()
+
     def create_entry(self, work, even_if_no_license_pool=False,
                      force_create=False, use_cache=True):
         """Turn a work into an entry for an acquisition feed."""
@@ -1241,7 +1309,8 @@ class AcquisitionFeed(OPDSFeed):
             in the appropriate storage field of Work -- either
             simple_opds_entry or verbose_opds_entry. (NOTE: this has some
             overlap with force_create which is difficult to explain.)
-        :return: An lxml Element object
+        :return: An lxml Element object, or, if self.splice_entries
+            is set and a cached entry could be spliced, a unicode string.
         """
         xml = None
         field = self.annotator.opds_cache_field
@@ -1249,7 +1318,11 @@ class AcquisitionFeed(OPDSFeed):
         if field and work and not force_create and use_cache:
             xml = getattr(work, field)
 
-        if xml:
+        if xml and self.splice_entries and self.can_splice(xml):
+            return self._splice_entry(
+                xml, work, active_license_pool, edition, identifier
+            )
+        elif xml:
             xml = etree.fromstring(xml)
         else:
             xml = self._make_entry_xml(work, edition)
@@ -1264,6 +1337,45 @@ class AcquisitionFeed(OPDSFeed):
 
         return xml
 
+    # The start of an <entry> tag that declares every namespace prefix
+    # an Annotator might use, followed by the tag's attributes, if any.
+    SPLICEABLE_ENTRY_START = etree.tounicode(AtomFeed.entry())[:-len('/>')]
+
+    @classmethod
+    def can_splice(cls, cached):
+        """Can annotations be spliced onto this cached entry?
+
+        They can't if the entry was made with an older nsmap, since
+        the annotations may use prefixes it doesn't declare.
+        """
+        start = cls.SPLICEABLE_ENTRY_START
+        return (cached.startswith(start)
+                and cached[len(start):len(start)+1] in (u' ', u'>')
+                and cached.endswith(u'</entry>'))
+
+    def _splice_entry(self, cached, work, active_license_pool, edition,
+                      identifier):
+        """Annotate a cached OPDS entry without parsing it.
+
+        The annotator adds its tags to an empty <entry>, which is
+        serialized and spliced onto the end of the cached entry.
+
+        :param cached: A serialized <entry> tag, as stored in
+            Work.simple_opds_entry or Work.verbose_opds_entry, for
+            which can_splice() is True.
+        :return: A unicode string.
+        """
+        annotations = AtomFeed.entry()
+        self.annotator.annotate_work_entry(
+            work, active_license_pool, edition, identifier, self,
+            annotations
+        )
+        if not len(annotations):
+            return cached
+        serialized = etree.tounicode(annotations)
+        children = serialized[len(self.SPLICEABLE_ENTRY_START)+1:]
+        return cached[:-len(u'</entry>')] + children
+
     def _make_entry_xml(self, work, edition):
         """Create a new (incomplete) OPDS entry for the given work.
 
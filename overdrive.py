@@ -8,6 +8,7 @@ import urlparse
 import urllib
 import sys
 
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy.orm.exc import (
     NoResultFound,
 )
@@ -54,6 +55,7 @@ from metadata_layer import (
 
 from coverage import (
     BibliographicCoverageProvider,
+    CoverageFailure,
 )
 
 from testing import DatabaseTest
@@ -61,6 +63,7 @@ from testing import DatabaseTest
 from util.http import (
     HTTP,
     BadResponseException,
+    TokenBucket,
 )
 from util.string_helpers import base64
 from util.worker_pools import RLock
@@ -155,7 +158,16 @@ class OverdriveAPI(object):
     ILS_NAME_KEY = u"ils_name"
     ILS_NAME_DEFAULT = u"default"
 
-    def __init__(self, _db, collection):
+    # In batch mode (see get_many), this many requests are made at
+    # once...
+    BATCH_MAX_WORKERS = 8
+
+    # ...but no more than this many are started in any second, so that
+    # we stay within Overdrive's API quotas.
+    BATCH_REQUESTS_PER_SECOND = 10
+
+    def __init__(self, _db, collection, max_workers=None,
+                 requests_per_second=None):
         if collection.protocol != ExternalIntegration.OVERDRIVE:
             raise ValueError(
                 "Collection protocol is %s, but passed into OverdriveAPI!" %
@@ -211,6 +223,12 @@ class OverdriveAPI(object):
         # This is set by an access to .collection_token
         self._collection_token = None
 
+        # Configure batch mode.
+        self.max_workers = max_workers or self.BATCH_MAX_WORKERS
+        self.rate_limiter = TokenBucket(
+            requests_per_second or self.BATCH_REQUESTS_PER_SECOND
+        )
+
     def endpoint(self, url, **kwargs):
         """Create the URL to an Overdrive API endpoint.
 
@@ -346,6 +364,34 @@ class OverdriveAPI(object):
         else:
             return status_code, headers, content
 
+    def get_many(self, urls, extra_headers={}):
+        """Make many HTTP GET requests at once using the active Bearer
+        Token.
+
+        Up to `max_workers` requests are in flight at any one time,
+        and `rate_limiter` decides how quickly new ones are started.
+        A request that gets a 401 response is retried with get(),
+        which refreshes the token.
+
+        :return: A list of (status_code, headers, content) 3-tuples,
+            in the same order as `urls`.
+        """
+        if not urls:
+            return []
+        headers = dict(Authorization="Bearer %s" % self.token)
+        headers.update(extra_headers)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = []
+            for url in urls:
+                self.rate_limiter.take()
+                futures.append(self._submit_get(executor, url, headers))
+            responses = [future.result() for future in futures]
+
+        for i, url in enumerate(urls):
+            if responses[i][0] == 401:
+                responses[i] = self.get(url, extra_headers)
+        return responses
+
     def token_post(self, url, payload, headers={}, **kwargs):
         """Make an HTTP POST request for purposes of getting an OAuth token."""
         s = "%s:%s" % (self.client_key, self.client_secret)
@@ -464,6 +510,22 @@ class OverdriveAPI(object):
         )
         return availability_queue, next_link
 
+    def availability_lookups(self, availability_queue):
+        """Fetch the availability documents for a list of books in
+        batch mode.
+
+        :param availability_queue: A list of dictionaries, as returned
+            by _get_book_list_page. Books with no availability link are
+            skipped.
+        :return: A list of (book, availability) 2-tuples, in the same
+            order as `availability_queue`.
+        """
+        books = [x for x in availability_queue if 'availability_link' in x]
+        responses = self.get_many([x['availability_link'] for x in books])
+        return [
+            (book, self._json(content))
+            for book, (status_code, headers, content) in zip(books, responses)
+        ]
 
     def recently_changed_ids(self, start, cutoff):
         """Get IDs of books whose status has changed between the start time
@@ -499,12 +561,33 @@ class OverdriveAPI(object):
     def metadata_lookup(self, identifier):
         """Look up metadata for an Overdrive identifier.
         """
-        url = self.endpoint(
+        status_code, headers, content = self.get(
+            self._metadata_url(identifier), {}
+        )
+        return self._json(content)
+
+    def metadata_lookups(self, identifiers):
+        """Look up metadata for many Overdrive identifiers in batch mode.
+
+        :return: A list of metadata documents, in the same order as
+            `identifiers`.
+        """
+        responses = self.get_many(
+            [self._metadata_url(identifier) for identifier in identifiers]
+        )
+        return [
+            self._json(content) for status_code, headers, content in responses
+        ]
+
+    def _metadata_url(self, identifier):
+        return self.endpoint(
             self.METADATA_ENDPOINT,
             collection_token=self.collection_token,
             item_id=identifier.identifier
         )
-        status_code, headers, content = self.get(url, {})
+
+    @classmethod
+    def _json(cls, content):
         if isinstance(content, basestring):
             content = json.loads(content)
         return content
@@ -554,6 +637,15 @@ class OverdriveAPI(object):
             url, headers
         )
 
+    def _submit_get(self, executor, url, headers):
+        """Start a GET request in a worker thread.
+
+        This method is overridden in MockOverdriveAPI.
+
+        :return: A Future for the result of _do_get.
+        """
+        return executor.submit(self._do_get, url, headers)
+
     def _do_post(self, url, payload, headers, **kwargs):
         """This method is overridden in MockOverdriveAPI."""
         url = self.endpoint(url)
@@ -642,6 +734,14 @@ class MockOverdriveAPI(OverdriveAPI):
         response = self._make_request(url, *args, **kwargs)
         return response.status_code, response.headers, response.content
 
+    def _submit_get(self, executor, url, headers):
+        """Match the request with a queued response right away, so
+        that responses come back in the order they were queued even
+        though the requests are handled by worker threads.
+        """
+        result = self._do_get(url, headers)
+        return executor.submit(lambda: result)
+
     def _do_post(self, url, *args, **kwargs):
         return self._make_request(url, *args, **kwargs)
 
@@ -1337,8 +1437,27 @@ class OverdriveBibliographicCoverageProvider(BibliographicCoverageProvider):
             _db = Session.object_session(collection)
             self.api = api_class(_db, collection)
 
+    def process_batch(self, batch):
+        """Look up metadata for the whole batch at once, then process
+        the items in order.
+        """
+        infos = self.api.metadata_lookups(batch)
+        results = []
+        for identifier, info in zip(batch, infos):
+            result = self.process_metadata_lookup(identifier, info)
+            if not isinstance(result, CoverageFailure):
+                self.handle_success(identifier)
+            results.append(result)
+        return results
+
     def process_item(self, identifier):
         info = self.api.metadata_lookup(identifier)
+        return self.process_metadata_lookup(identifier, info)
+
+    def process_metadata_lookup(self, identifier, info):
+        """Turn an Overdrive metadata document into bibliographic
+        coverage for `identifier`.
+        """
         error = None
         if info.get('errorCode') == 'NotFound':
             error = "ID not recognized by Overdrive: %s" % identifier.identifier
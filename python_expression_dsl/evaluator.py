@@ -1,6 +1,9 @@
 import operator
+from collections import OrderedDict
 from copy import copy, deepcopy
+from threading import Lock
 
+import numpy
 from multipledispatch import dispatch
 
 from ..exceptions import BaseError
@@ -26,6 +29,11 @@ class DSLEvaluationError(BaseError):
     """Raised when evaluation of a DSL expression fails."""
 
 
+class DSLVectorizationError(BaseError):
+    """Raised when an expression cannot be evaluated column-wise
+    and has to be evaluated one context at a time."""
+
+
 class DSLEvaluationVisitor(Visitor):
     """Visitor traversing expression's AST and evaluating it."""
 
@@ -186,6 +194,19 @@ class DSLEvaluationVisitor(Visitor):
         :param value: New evaluation context
         :type value: Union[Dict, object]
         """
+        self._context = self.copy_context(value)
+
+    @staticmethod
+    def copy_context(value):
+        """Return a copy of the evaluation context that an expression can't use to
+        change the original.
+
+        :param value: Evaluation context
+        :type value: Union[Dict, object]
+
+        :return: Copy of the evaluation context
+        :rtype: Union[Dict, object]
+        """
         if not isinstance(value, (dict, object)):
             raise ValueError(
                 "Argument 'value' must be an either a dictionary or object"
@@ -200,7 +221,7 @@ class DSLEvaluationVisitor(Visitor):
             else:
                 new_context = deepcopy(value)
 
-        self._context = new_context
+        return new_context
 
     @property
     def safe_classes(self):
@@ -218,14 +239,26 @@ class DSLEvaluationVisitor(Visitor):
         :param value: List of safe classes which methods be called
         :type value: List[type]
         """
+        self._safe_classes = self.merge_safe_classes(value)
+
+    @classmethod
+    def merge_safe_classes(cls, value):
+        """Return a list containing the specified safe classes and the built-in ones.
+
+        :param value: List of safe classes which methods be called
+        :type value: List[type]
+
+        :return: List of safe classes which methods can be called
+        :rtype: List[type]
+        """
         if not isinstance(value, list):
             raise ValueError("Argument 'value' must be a list")
 
         new_safe_classes = copy(value)
-        new_safe_classes.extend(self.BUILTIN_CLASSES)
+        new_safe_classes.extend(cls.BUILTIN_CLASSES)
         new_safe_classes = list(set(new_safe_classes))
 
-        self._safe_classes = new_safe_classes
+        return new_safe_classes
 
     @dispatch(Identifier)
     def visit(self, node):
@@ -377,9 +410,712 @@ class DSLEvaluationVisitor(Visitor):
         return result
 
 
+class DSLEvaluationState(object):
+    """Mutable state of a single evaluation of a compiled expression.
+
+    Compiled expressions are shared between evaluations,
+    so everything changing during an evaluation is kept here.
+    """
+
+    __slots__ = ["context", "safe_classes", "current_scope", "root_dot_node"]
+
+    def __init__(self, context, safe_classes):
+        """Initialize a new instance of DSLEvaluationState class.
+
+        :param context: Evaluation context
+        :type context: Union[Dict, object]
+
+        :param safe_classes: List of classes which methods can be called
+        :type safe_classes: List[type]
+        """
+        self.context = context
+        self.safe_classes = safe_classes
+        self.current_scope = None
+        self.root_dot_node = None
+
+
+class DSLCompilationVisitor(Visitor):
+    """Visitor traversing expression's AST and transforming it into a tree of closures.
+
+    Each closure takes a DSLEvaluationState and returns the value of its node.
+    The closures follow exactly the same rules as DSLEvaluationVisitor,
+    whose operators, built-in functions and safe classes they use,
+    but the AST is traversed only once instead of once per evaluation.
+    """
+
+    def __init__(self, evaluation_visitor):
+        """Initialize a new instance of DSLCompilationVisitor class.
+
+        :param evaluation_visitor: Visitor defining the evaluation rules
+        :type evaluation_visitor: DSLEvaluationVisitor
+        """
+        self._evaluation_visitor = evaluation_visitor
+
+    @staticmethod
+    def _get_operator(expression, available_operators):
+        """Return the function implementing the expression's operator.
+
+        :param expression: Unary or binary expression
+        :type expression: Union[core.dsl.ast.UnaryExpression, core.dsl.ast.BinaryExpression]
+
+        :param available_operators: Dictionary containing available operators
+        :type available_operators: Dict[core.dsl.ast.Operator, operator]
+
+        :return: Function implementing the operator
+        :rtype: Callable
+        """
+        if expression.operator not in available_operators:
+            raise DSLEvaluationError(
+                "Wrong operator {0}. Was expecting one of {1}".format(
+                    expression.operator, available_operators.keys()
+                )
+            )
+
+        return available_operators[expression.operator]
+
+    def _compile_unary_expression(self, unary_expression, available_operators):
+        """Compile the unary expression.
+
+        :param unary_expression: Unary expression
+        :type unary_expression: core.dsl.ast.UnaryExpression
+
+        :param available_operators: Dictionary containing available operators
+        :type available_operators: Dict[core.dsl.ast.Operator, operator]
+
+        :return: Compiled expression
+        :rtype: Callable[[DSLEvaluationState], Any]
+        """
+        argument = unary_expression.argument.accept(self)
+        expression_operator = self._get_operator(
+            unary_expression, available_operators
+        )
+
+        def evaluate(state):
+            return expression_operator(argument(state))
+
+        return evaluate
+
+    def _compile_binary_expression(self, binary_expression, available_operators):
+        """Compile the binary expression.
+
+        :param binary_expression: Binary expression
+        :type binary_expression: core.dsl.ast.BinaryExpression
+
+        :param available_operators: Dictionary containing available operators
+        :type available_operators: Dict[core.dsl.ast.Operator, operator]
+
+        :return: Compiled expression
+        :rtype: Callable[[DSLEvaluationState], Any]
+        """
+        left_argument = binary_expression.left_argument.accept(self)
+        right_argument = binary_expression.right_argument.accept(self)
+        expression_operator = self._get_operator(
+            binary_expression, available_operators
+        )
+
+        def evaluate(state):
+            left_value = left_argument(state)
+            right_value = right_argument(state)
+
+            return expression_operator(left_value, right_value)
+
+        return evaluate
+
+    def compile(self, node):
+        """Compile the AST.
+
+        :param node: AST node
+        :type node: Node
+
+        :return: Compiled expression
+        :rtype: Callable[[DSLEvaluationState], Any]
+        """
+        return node.accept(self)
+
+    @dispatch(Identifier)
+    def visit(self, node):
+        """Process the Identifier node.
+
+        :param node: Identifier node
+        :type node: Identifier
+        """
+        name = node.value
+        builtin_functions = self._evaluation_visitor.BUILTIN_FUNCTIONS
+        is_builtin_function = name in builtin_functions
+        builtin_function = builtin_functions.get(name)
+        get_attribute_value = self._evaluation_visitor._get_attribute_value
+
+        def evaluate(state):
+            if state.current_scope is None:
+                if is_builtin_function:
+                    return builtin_function
+
+                return get_attribute_value(state.context, name)
+
+            return get_attribute_value(state.current_scope, name)
+
+        return evaluate
+
+    @dispatch(String)
+    def visit(self, node):
+        """Process the String node.
+
+        :param node: String node
+        :type node: String
+        """
+        value = str(node.value)
+
+        def evaluate(state):
+            return value
+
+        return evaluate
+
+    @dispatch(Number)
+    def visit(self, node):
+        """Process the Number node.
+
+        :param node: Number node
+        :type node: Number
+        """
+        try:
+            value = int(node.value)
+        except:
+            value = float(node.value)
+
+        def evaluate(state):
+            return value
+
+        return evaluate
+
+    @dispatch(DotExpression)
+    def visit(self, node):
+        """Process the DotExpression node.
+
+        :param node: DotExpression node
+        :type node: DotExpression
+        """
+        expressions = [expression.accept(self) for expression in node.expressions]
+
+        def evaluate(state):
+            is_root = state.root_dot_node is None
+
+            if is_root:
+                state.root_dot_node = node
+
+            value = None
+
+            for expression in expressions:
+                value = expression(state)
+
+                state.current_scope = value
+
+            if is_root:
+                state.root_dot_node = None
+                state.current_scope = None
+
+            return value
+
+        return evaluate
+
+    @dispatch(UnaryArithmeticExpression)
+    def visit(self, node):
+        """Process the UnaryArithmeticExpression node.
+
+        :param node: UnaryArithmeticExpression node
+        :type node: UnaryArithmeticExpression
+        """
+        return self._compile_unary_expression(
+            node, self._evaluation_visitor.ARITHMETIC_OPERATORS
+        )
+
+    @dispatch(BinaryArithmeticExpression)
+    def visit(self, node):
+        """Process the BinaryArithmeticExpression node.
+
+        :param node: BinaryArithmeticExpression node
+        :type node: BinaryArithmeticExpression
+        """
+        return self._compile_binary_expression(
+            node, self._evaluation_visitor.ARITHMETIC_OPERATORS
+        )
+
+    @dispatch(UnaryBooleanExpression)
+    def visit(self, node):
+        """Process the UnaryBooleanExpression node.
+
+        :param node: UnaryBooleanExpression node
+        :type node: UnaryBooleanExpression
+        """
+        return self._compile_unary_expression(
+            node, self._evaluation_visitor.BOOLEAN_OPERATORS
+        )
+
+    @dispatch(BinaryBooleanExpression)
+    def visit(self, node):
+        """Process the BinaryBooleanExpression node.
+
+        :param node: BinaryBooleanExpression node
+        :type node: BinaryBooleanExpression
+        """
+        return self._compile_binary_expression(
+            node, self._evaluation_visitor.BOOLEAN_OPERATORS
+        )
+
+    @dispatch(ComparisonExpression)
+    def visit(self, node):
+        """Process the ComparisonExpression node.
+
+        :param node: ComparisonExpression node
+        :type node: ComparisonExpression
+        """
+        return self._compile_binary_expression(
+            node, self._evaluation_visitor.COMPARISON_OPERATORS
+        )
+
+    @dispatch(SliceExpression)
+    def visit(self, node):
+        """Process the SliceExpression node.
+
+        :param node: SliceExpression node
+        :type node: SliceExpression
+        """
+        array = node.array.accept(self)
+        index = node.slice.accept(self)
+
+        def evaluate(state):
+            return operator.getitem(array(state), index(state))
+
+        return evaluate
+
+    @dispatch(FunctionCallExpression)
+    def visit(self, node):
+        """Process the FunctionCallExpression node.
+
+        :param node: FunctionCallExpression node
+        :type node: FunctionCallExpression
+        """
+        function = node.function.accept(self)
+        arguments = [argument.accept(self) for argument in node.arguments or []]
+
+        def evaluate(state):
+            function_value = function(state)
+            argument_values = [argument(state) for argument in arguments]
+            function_class = getattr(function_value, "im_class", None)
+
+            if function_class and function_class not in state.safe_classes:
+                raise DSLEvaluationError(
+                    "Function {0} defined in a not-safe class {1} and cannot be called".format(
+                        function_value, function_class
+                    )
+                )
+
+            return function_value(*argument_values)
+
+        return evaluate
+
+
+class DSLColumnarState(object):
+    """State of a single column-wise evaluation of an expression over many contexts."""
+
+    # Kinds of NumPy arrays which can be operated on column-wise:
+    # booleans, signed and unsigned integers, floats
+    NUMERIC_KINDS = "biuf"
+
+    def __init__(self, columns, rows, count, safe_classes, copy_context):
+        """Initialize a new instance of DSLColumnarState class.
+
+        :param columns: Dictionary mapping identifiers to columns of values
+        :type columns: Dict[str, Sequence]
+
+        :param rows: List of evaluation contexts, if the contexts are not columnar
+        :type rows: Optional[List[Union[Dict, object]]]
+
+        :param count: Number of contexts
+        :type count: int
+
+        :param safe_classes: List of classes which methods can be called
+        :type safe_classes: List[type]
+
+        :param copy_context: Function copying an evaluation context
+        :type copy_context: Callable[[Union[Dict, object]], Union[Dict, object]]
+        """
+        self.columns = columns
+        self.rows = rows
+        self.count = count
+        self.safe_classes = safe_classes
+        self.copy_context = copy_context
+        self._arrays = {}
+
+    def as_array(self, values):
+        """Transform a sequence of values into a NumPy array if all of them are numbers.
+
+        :param values: Sequence of values
+        :type values: Sequence
+
+        :return: NumPy array
+        :rtype: numpy.ndarray
+        """
+        array = numpy.asarray(values)
+
+        if array.dtype.kind not in self.NUMERIC_KINDS or array.shape != (self.count,):
+            raise DSLVectorizationError(
+                "Values of type {0} cannot be evaluated column-wise".format(array.dtype)
+            )
+
+        return array
+
+    def column(self, name):
+        """Return the column of values of the identifier as a NumPy array.
+
+        :param name: Identifier
+        :type name: str
+
+        :return: NumPy array
+        :rtype: numpy.ndarray
+        """
+        if name not in self._arrays:
+            if self.rows is None:
+                if name not in self.columns:
+                    raise DSLVectorizationError(
+                        "Cannot find column '{0}'".format(name)
+                    )
+
+                values = self.columns[name]
+            else:
+                values = [
+                    DSLEvaluationVisitor._get_attribute_value(row, name)
+                    for row in self.rows
+                ]
+
+            self._arrays[name] = self.as_array(values)
+
+        return self._arrays[name]
+
+    def row_contexts(self):
+        """Return the list of evaluation contexts.
+
+        :return: List of evaluation contexts
+        :rtype: List[Union[Dict, object]]
+        """
+        if self.rows is None:
+            columns = dict(
+                (name, numpy.asarray(values).tolist())
+                for name, values in self.columns.items()
+            )
+            self.rows = [
+                dict((name, values[index]) for name, values in columns.items())
+                for index in range(self.count)
+            ]
+
+        return self.rows
+
+
+class DSLVectorizationVisitor(Visitor):
+    """Visitor traversing expression's AST and transforming it into a tree of column-wise closures.
+
+    Each closure takes a DSLColumnarState and returns either a NumPy array containing
+    the node's value for each context or a single number shared by all of them.
+
+    Arithmetic, comparison and boolean nodes are evaluated using NumPy.
+    All other nodes are evaluated one context at a time by their compiled closures.
+    Whenever NumPy's result could differ from the one of DSLEvaluationVisitor
+    (non-numeric values, division by zero, possible integer overflow),
+    DSLVectorizationError is raised and the whole expression has to be evaluated
+    one context at a time.
+    """
+
+    # Integers this large could overflow NumPy's 64-bit integers when multiplied.
+    INTEGER_LIMIT = 2 ** 31
+
+    ARITHMETIC_OPERATORS = {
+        Operator.NEGATION: operator.neg,
+        Operator.ADDITION: operator.add,
+        Operator.SUBTRACTION: operator.sub,
+        Operator.MULTIPLICATION: operator.mul,
+        Operator.DIVISION: operator.truediv,
+    }
+
+    BOOLEAN_OPERATORS = {
+        Operator.INVERSION: numpy.logical_not,
+        Operator.CONJUNCTION: operator.and_,
+        Operator.DISJUNCTION: operator.or_,
+    }
+
+    COMPARISON_OPERATORS = {
+        Operator.EQUAL: operator.eq,
+        Operator.NOT_EQUAL: operator.ne,
+        Operator.GREATER: operator.gt,
+        Operator.GREATER_OR_EQUAL: operator.ge,
+        Operator.LESS: operator.lt,
+        Operator.LESS_OR_EQUAL: operator.le,
+    }
+
+    def __init__(self, evaluation_visitor, compilation_visitor):
+        """Initialize a new instance of DSLVectorizationVisitor class.
+
+        :param evaluation_visitor: Visitor defining the evaluation rules
+        :type evaluation_visitor: DSLEvaluationVisitor
+
+        :param compilation_visitor: Visitor compiling nodes which cannot be evaluated column-wise
+        :type compilation_visitor: DSLCompilationVisitor
+        """
+        self._evaluation_visitor = evaluation_visitor
+        self._compilation_visitor = compilation_visitor
+
+    @staticmethod
+    def _kind(value):
+        """Return the NumPy kind of the value.
+
+        :param value: NumPy array or a number
+        :type value: Union[numpy.ndarray, int, float, bool]
+
+        :return: NumPy kind
+        :rtype: str
+        """
+        return numpy.asarray(value).dtype.kind
+
+    def _check_arguments(self, expression_operator, arguments):
+        """Make sure NumPy will return the same result as DSLEvaluationVisitor.
+
+        :param expression_operator: Operator
+        :type expression_operator: core.dsl.ast.Operator
+
+        :param arguments: List of arguments
+        :type arguments: List[Union[numpy.ndarray, int, float, bool]]
+
+        :return: List of arguments ready to be used by NumPy
+        :rtype: List[Union[numpy.ndarray, int, float, bool]]
+        """
+        kinds = [self._kind(argument) for argument in arguments]
+
+        if any(kind not in DSLColumnarState.NUMERIC_KINDS for kind in kinds):
+            raise DSLVectorizationError("Only numbers can be evaluated column-wise")
+
+        if expression_operator in self.ARITHMETIC_OPERATORS:
+            # Python treats booleans as integers in arithmetic, NumPy does not.
+            arguments = [
+                numpy.asarray(argument, dtype=int)
+                if kind == "b" and isinstance(argument, numpy.ndarray)
+                else argument
+                for argument, kind in zip(arguments, kinds)
+            ]
+
+            if all(kind in "biu" for kind in kinds) and any(
+                numpy.any(numpy.abs(argument) >= self.INTEGER_LIMIT)
+                for argument in arguments
+            ):
+                raise DSLVectorizationError("Integer arithmetic could overflow")
+
+            if expression_operator == Operator.DIVISION and numpy.any(
+                numpy.asarray(arguments[1]) == 0
+            ):
+                raise DSLVectorizationError("Division by zero")
+        elif expression_operator in (Operator.CONJUNCTION, Operator.DISJUNCTION):
+            if any(kind == "f" for kind in kinds):
+                raise DSLVectorizationError("Floats do not support bitwise operators")
+
+        return arguments
+
+    def _vectorize_operation(self, expression, arguments, available_operators):
+        """Vectorize the unary or binary expression.
+
+        :param expression: Unary or binary expression
+        :type expression: Union[core.dsl.ast.UnaryExpression, core.dsl.ast.BinaryExpression]
+
+        :param arguments: List of the expression's argument nodes
+        :type arguments: List[Node]
+
+        :param available_operators: Dictionary containing available operators
+        :type available_operators: Dict[core.dsl.ast.Operator, operator]
+
+        :return: Vectorized expression
+        :rtype: Callable[[DSLColumnarState], Union[numpy.ndarray, int, float, bool]]
+        """
+        if expression.operator not in available_operators:
+            return self._evaluate_row_by_row(expression)
+
+        expression_operator = expression.operator
+        function = available_operators[expression_operator]
+        arguments = [argument.accept(self) for argument in arguments]
+
+        def evaluate(state):
+            values = self._check_arguments(
+                expression_operator, [argument(state) for argument in arguments]
+            )
+
+            return function(*values)
+
+        return evaluate
+
+    def _evaluate_row_by_row(self, node):
+        """Evaluate the node one context at a time.
+
+        :param node: AST node
+        :type node: Node
+
+        :return: Vectorized expression
+        :rtype: Callable[[DSLColumnarState], numpy.ndarray]
+        """
+        compiled_expression = self._compilation_visitor.compile(node)
+
+        def evaluate(state):
+            return state.as_array(
+                [
+                    compiled_expression(
+                        DSLEvaluationState(state.copy_context(row), state.safe_classes)
+                    )
+                    for row in state.row_contexts()
+                ]
+            )
+
+        return evaluate
+
+    def vectorize(self, node):
+        """Vectorize the AST.
+
+        :param node: AST node
+        :type node: Node
+
+        :return: Vectorized expression
+        :rtype: Callable[[DSLColumnarState], Union[numpy.ndarray, int, float, bool]]
+        """
+        return node.accept(self)
+
+    @dispatch(Identifier)
+    def visit(self, node):
+        """Process the Identifier node.
+
+        :param node: Identifier node
+        :type node: Identifier
+        """
+        name = node.value
+
+        if name in self._evaluation_visitor.BUILTIN_FUNCTIONS:
+            return self._evaluate_row_by_row(node)
+
+        def evaluate(state):
+            return state.column(name)
+
+        return evaluate
+
+    @dispatch(String)
+    def visit(self, node):
+        """Process the String node.
+
+        :param node: String node
+        :type node: String
+        """
+        return self._evaluate_row_by_row(node)
+
+    @dispatch(Number)
+    def visit(self, node):
+        """Process the Number node.
+
+        :param node: Number node
+        :type node: Number
+        """
+        try:
+            value = int(node.value)
+        except:
+            value = float(node.value)
+
+        def evaluate(state):
+            return value
+
+        return evaluate
+
+    @dispatch(DotExpression)
+    def visit(self, node):
+        """Process the DotExpression node.
+
+        :param node: DotExpression node
+        :type node: DotExpression
+        """
+        if len(node.expressions) == 1 and isinstance(node.expressions[0], Identifier):
+            return node.expressions[0].accept(self)
+
+        return self._evaluate_row_by_row(node)
+
+    @dispatch(UnaryArithmeticExpression)
+    def visit(self, node):
+        """Process the UnaryArithmeticExpression node.
+
+        :param node: UnaryArithmeticExpression node
+        :type node: UnaryArithmeticExpression
+        """
+        return self._vectorize_operation(
+            node, [node.argument], self.ARITHMETIC_OPERATORS
+        )
+
+    @dispatch(BinaryArithmeticExpression)
+    def visit(self, node):
+        """Process the BinaryArithmeticExpression node.
+
+        :param node: BinaryArithmeticExpression node
+        :type node: BinaryArithmeticExpression
+        """
+        return self._vectorize_operation(
+            node, [node.left_argument, node.right_argument], self.ARITHMETIC_OPERATORS
+        )
+
+    @dispatch(UnaryBooleanExpression)
+    def visit(self, node):
+        """Process the UnaryBooleanExpression node.
+
+        :param node: UnaryBooleanExpression node
+        :type node: UnaryBooleanExpression
+        """
+        return self._vectorize_operation(
+            node, [node.argument], self.BOOLEAN_OPERATORS
+        )
+
+    @dispatch(BinaryBooleanExpression)
+    def visit(self, node):
+        """Process the BinaryBooleanExpression node.
+
+        :param node: BinaryBooleanExpression node
+        :type node: BinaryBooleanExpression
+        """
+        return self._vectorize_operation(
+            node, [node.left_argument, node.right_argument], self.BOOLEAN_OPERATORS
+        )
+
+    @dispatch(ComparisonExpression)
+    def visit(self, node):
+        """Process the ComparisonExpression node.
+
+        :param node: ComparisonExpression node
+        :type node: ComparisonExpression
+        """
+        return self._vectorize_operation(
+            node, [node.left_argument, node.right_argument], self.COMPARISON_OPERATORS
+        )
+
+    @dispatch(SliceExpression)
+    def visit(self, node):
+        """Process the SliceExpression node.
+
+        :param node: SliceExpression node
+        :type node: SliceExpression
+        """
+        return self._evaluate_row_by_row(node)
+
+    @dispatch(FunctionCallExpression)
+    def visit(self, node):
+        """Process the FunctionCallExpression node.
+
+        :param node: FunctionCallExpression node
+        :type node: FunctionCallExpression
+        """
+        return self._evaluate_row_by_row(node)
+
+
 class DSLEvaluator(object):
     """Evaluates the expression."""
 
+    # Maximum number of compiled expressions kept in the cache
+    CACHE_SIZE = 1024
+
     def __init__(self, parser, visitor):
         """Initialize a new instance of DSLEvaluator class.
 
@@ -402,6 +1138,10 @@ class DSLEvaluator(object):
 
         self._parser = parser
         self._visitor = visitor
+        self._compiler = DSLCompilationVisitor(visitor)
+        self._vectorizer = DSLVectorizationVisitor(visitor, self._compiler)
+        self._cache = OrderedDict()
+        self._cache_lock = Lock()
 
     @property
     def parser(self):
@@ -412,6 +1152,38 @@ class DSLEvaluator(object):
         """
         return self._parser
 
+    def parse_and_compile(self, expression):
+        """Parse and compile the expression.
+
+        Results are cached by the expression's text,
+        so repeated evaluations of the same expression are parsed only once.
+
+        :param expression: String containing the expression
+        :type expression: str
+
+        :return: 2-tuple containing the expression's AST and the compiled expression
+        :rtype: Tuple[core.python_expression_dsl.ast.Node, Callable[[DSLEvaluationState], Any]]
+        """
+        with self._cache_lock:
+            result = self._cache.pop(expression, None)
+
+            if result is not None:
+                # Move the expression to the end of the queue of expressions to discard.
+                self._cache[expression] = result
+
+                return result
+
+        node = self._parser.parse(expression)
+        result = (node, self._compiler.compile(node))
+
+        with self._cache_lock:
+            self._cache[expression] = result
+
+            while len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+        return result
+
     def evaluate(self, expression, context=None, safe_classes=None):
         """Evaluate the expression and return the resulting value.
 
@@ -427,18 +1199,77 @@ class DSLEvaluator(object):
         :return: Evaluation result
         :rtype: Any
         """
-        node = self._parser.parse(expression)
+        _, compiled_expression = self.parse_and_compile(expression)
 
-        old_context = self._visitor.context
-        old_safe_classes = self._visitor.safe_classes
+        if safe_classes is None:
+            safe_classes = []
 
-        self._visitor.context = context
-        self._visitor.safe_classes = safe_classes
+        state = DSLEvaluationState(
+            self._visitor.copy_context(context),
+            self._visitor.merge_safe_classes(safe_classes),
+        )
 
-        try:
-            result = self._visitor.visit(node)
+        return compiled_expression(state)
+
+    def evaluate_many(self, expression, contexts, safe_classes=None):
+        """Evaluate the expression against each of the contexts and return the resulting values.
+
+        Arithmetic, comparison and boolean operations are evaluated column-wise using NumPy;
+        everything else is evaluated one context at a time.
+        The results are the same as the ones returned by evaluate.
+
+        :param expression: String containing the expression
+        :type expression: str
+
+        :param contexts: Either a list of evaluation contexts
+            or a dictionary mapping identifiers to columns (lists or NumPy arrays) of their values
+        :type contexts: Union[List[Union[Dict, object]], Dict[str, Sequence]]
+
+        :param safe_classes: List of classes which methods can be called
+        :type safe_classes: List[type]
+
+        :return: List of evaluation results, one for each context
+        :rtype: List[Any]
+        """
+        node, compiled_expression = self.parse_and_compile(expression)
 
-            return result
-        finally:
-            self._visitor.context = old_context
-            self._visitor.safe_classes = old_safe_classes
+        if safe_classes is None:
+            safe_classes = []
+
+        safe_classes = self._visitor.merge_safe_classes(safe_classes)
+
+        if isinstance(contexts, dict):
+            counts = set(len(values) for values in contexts.values())
+
+            if len(counts) > 1:
+                raise ValueError("All columns must have the same length")
+
+            count = counts.pop() if counts else 0
+            state = DSLColumnarState(
+                contexts, None, count, safe_classes, self._visitor.copy_context
+            )
+        else:
+            contexts = list(contexts)
+            state = DSLColumnarState(
+                {}, contexts, len(contexts), safe_classes, self._visitor.copy_context
+            )
+
+        if not state.count:
+            return []
+
+        try:
+            result = self._vectorizer.vectorize(node)(state)
+
+            if isinstance(result, numpy.ndarray):
+                return result.tolist()
+            if isinstance(result, numpy.generic):
+                result = result.item()
+
+            return [result] * state.count
+        except DSLVectorizationError:
+            return [
+                compiled_expression(
+                    DSLEvaluationState(self._visitor.copy_context(row), safe_classes)
+                )
+                for row in state.row_contexts()
+            ]
@@ -19,6 +19,7 @@ from config import Configuration
 
 from lane import (
     Lane,
+    LaneTree,
 )
 from model.constants import MediaTypes
 from model import (
@@ -71,6 +72,7 @@ from coverage import (
 )
 
 from external_search import (
+    Filter,
     MockExternalSearchIndex,
     ExternalSearchIndex,
     SearchIndexCoverageProvider,
@@ -221,6 +223,8 @@ class DatabaseTest(object):
         ExternalIntegration.reset_cache()
         Genre.reset_cache()
         Library.reset_cache()
+        LaneTree.reset_cache()
+        Filter.reset_cache()
 
         # Also roll back any record of those changes in the
         # Configuration instance.
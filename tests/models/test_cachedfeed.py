@@ -477,10 +477,10 @@ class TestCachedFeed(DatabaseTest):
                 return "mock type"
 
         class MockFacets(object):
-            query_string = b"facets query string"
+            cache_key = b"facets cache key"
 
         class MockPagination(object):
-            query_string = b"pagination query string"
+            cache_key = b"pagination cache key"
 
         m = MockCachedFeed._prepare_keys
         # A WorkList of some kind is required.
@@ -505,8 +505,8 @@ class TestCachedFeed(DatabaseTest):
         # When pagination and/or facets are available, facets_key and
         # pagination_key are set appropriately.
         keys = m(self._db, lane, MockFacets, MockPagination)
-        assert u"facets query string" == keys.facets_key
-        assert u"pagination query string" == keys.pagination_key
+        assert u"facets cache key" == keys.facets_key
+        assert u"pagination cache key" == keys.pagination_key
 
         # Now we can check that feed_type was obtained by passing
         # `worklist` and `facets` into MockCachedFeed.feed_type.
@@ -590,8 +590,8 @@ class TestCachedFeed(DatabaseTest):
         feed = CachedFeed.fetch(*args, max_age=0, raw=True)
         assert "This is feed #1" == feed.content
 
-        assert pagination.query_string == feed.pagination
-        assert facets.query_string == feed.facets
+        assert pagination.cache_key == feed.pagination
+        assert facets.cache_key == feed.facets
         assert lane.id == feed.lane_id
 
         # Fetch it again, with a high max_age, and it's cached!
@@ -618,8 +618,8 @@ class TestCachedFeed(DatabaseTest):
         feed = CachedFeed.fetch(*args, max_age=0, raw=True)
         assert "This is feed #1" == feed.content
 
-        assert pagination.query_string == feed.pagination
-        assert facets.query_string == feed.facets
+        assert pagination.cache_key == feed.pagination
+        assert facets.cache_key == feed.facets
         assert None == feed.lane_id
         assert lane.unique_key == feed.unique_key
 
@@ -636,3 +636,81 @@ class TestCachedFeed(DatabaseTest):
             *args, max_age=CachedFeed.CACHE_FOREVER, raw=True
         )
         assert "This is feed #2" == feed.content
+
+    def test_equivalent_requests_share_a_feed(self):
+        # Requests that differ only in their max_age setting or in
+        # whether the default page size was given explicitly are
+        # served from the same CachedFeed.
+        lane = self._lane(u"My Lane")
+        refresher = MockFeedGenerator()
+        facets = Facets.default(self._default_library)
+        feed = CachedFeed.fetch(
+            self._db, lane, facets, Pagination.default(), refresher,
+            max_age=0, raw=True
+        )
+        assert "This is feed #1" == feed.content
+
+        facets = Facets.default(self._default_library)
+        facets.max_cache_age = 600
+        pagination = Pagination.from_request(
+            dict(size=str(Pagination.DEFAULT_SIZE)).get
+        )
+        feed2 = CachedFeed.fetch(
+            self._db, lane, facets, pagination, refresher, raw=True
+        )
+        assert feed == feed2
+        assert "This is feed #1" == feed2.content
+        assert 1 == self._db.query(CachedFeed).count()
+
+    def test_fetch_stream(self):
+        class MockStreamingFeed(object):
+            def __init__(self):
+                self.sent = []
+            def iter_serialized(self):
+                for piece in (u"This is ", u"a streamed feed"):
+                    self.sent.append(piece)
+                    yield piece
+            def __unicode__(self):
+                return u"This is an unstreamed feed"
+
+        lane = self._lane()
+        feed = MockStreamingFeed()
+        args = (self._db, lane, None, None, lambda: feed)
+        response = CachedFeed.fetch(*args, max_age=600, stream=True)
+        assert isinstance(response, OPDSFeedResponse)
+        assert True == response.is_streamed
+        assert 600 == response.max_age
+
+        # Nothing has been sent or stored yet.
+        assert [] == feed.sent
+        assert [] == self._db.query(CachedFeed).all()
+
+        # Once the whole feed has been sent, a copy is stored.
+        assert (b"This is a streamed feed" ==
+                b"".join(response.iter_encoded()))
+        [cached] = self._db.query(CachedFeed).all()
+        assert u"This is a streamed feed" == cached.content
+        assert lane.id == cached.lane_id
+
+        # Now that it's cached, it's sent in one piece.
+        response = CachedFeed.fetch(*args, max_age=600, stream=True)
+        assert False == response.is_streamed
+        assert b"This is a streamed feed" == response.data
+
+        # A feed that's not supposed to be cached is streamed but
+        # not stored.
+        self._db.delete(cached)
+        feed = MockStreamingFeed()
+        args = (self._db, lane, None, None, lambda: feed)
+        response = CachedFeed.fetch(
+            *args, max_age=CachedFeed.IGNORE_CACHE, stream=True
+        )
+        assert 0 == response.max_age
+        list(response.iter_encoded())
+        assert 2 == len(feed.sent)
+        assert [] == self._db.query(CachedFeed).all()
+
+        # If the caller wants the CachedFeed itself, the feed isn't
+        # streamed.
+        cached = CachedFeed.fetch(*args, max_age=600, stream=True, raw=True)
+        assert u"This is an unstreamed feed" == cached.content
@@ -7,7 +7,10 @@ from ...model import (
     create,
     get_one_or_create
 )
-from ...model.circulationevent import CirculationEvent
+from ...model.circulationevent import (
+    CirculationEvent,
+    CirculationEventRollup,
+)
 from ...model.datasource import DataSource
 from ...model.identifier import Identifier
 from ...model.licensing import LicensePool
@@ -216,3 +219,150 @@ class TestCirculationEvent(DatabaseTest):
             **kwargs
         )
         self._db.rollback()
+
+    def test_bulk_log(self):
+        pool = self._licensepool(edition=None)
+        library = self._default_library
+        start = datetime.datetime(2019, 1, 1)
+        data = CirculationEvent.event_data
+
+        # An event that's already in the database.
+        existing, ignore = CirculationEvent.log(
+            self._db, pool, CirculationEvent.DISTRIBUTOR_CHECKOUT, 10, 8,
+            start=start, library=library
+        )
+
+        events = [
+            # This is the same as the existing event.
+            data(pool, CirculationEvent.DISTRIBUTOR_CHECKOUT, 10, 8,
+                 start=start, library=library),
+
+            # This is new, and has no library.
+            data(pool, CirculationEvent.DISTRIBUTOR_CHECKOUT, 8, 7,
+                 start=start, location=u"Westgate Branch"),
+
+            # These two are new, but they're duplicates of each other.
+            data(pool, CirculationEvent.DISTRIBUTOR_CHECKIN, 7, 8,
+                 start=start, library=library),
+            data(pool, CirculationEvent.DISTRIBUTOR_CHECKIN, 7, 8,
+                 start=start, library=library),
+        ]
+        assert 2 == CirculationEvent.bulk_log(self._db, events)
+
+        events = self._db.query(CirculationEvent).order_by(
+            CirculationEvent.id
+        ).all()
+        assert 3 == len(events)
+        ignore, no_library, checkin = events
+        assert None == no_library.library
+        assert -1 == no_library.delta
+        assert start == no_library.end
+        assert u"Westgate Branch" == no_library.location
+        assert library == checkin.library
+        assert CirculationEvent.DISTRIBUTOR_CHECKIN == checkin.type
+
+        # Nothing happens if there are no events to log.
+        assert 0 == CirculationEvent.bulk_log(self._db, [])
+
+
+class TestCirculationEventRollup(DatabaseTest):
+
+    def test_truncate(self):
+        m = CirculationEventRollup.truncate
+        time = datetime.datetime(2019, 1, 2, 10, 15, 30, 5)
+        assert (datetime.datetime(2019, 1, 2, 10) ==
+                m(CirculationEventRollup.HOUR, time))
+        assert (datetime.datetime(2019, 1, 2) ==
+                m(CirculationEventRollup.DAY, time))
+        with pytest.raises(ValueError) as excinfo:
+            m("fortnight", time)
+        assert "Unknown rollup period: fortnight" in str(excinfo.value)
+
+    def test_roll_up(self):
+        pool = self._licensepool(edition=None)
+        library = self._default_library
+        start = datetime.datetime(2019, 1, 1, 10, 15)
+        m = CirculationEvent.log
+        events = [
+            m(self._db, pool, CirculationEvent.CM_CHECKOUT, 2, 1,
+              start=start, library=library, location=u"Westgate")[0],
+            m(self._db, pool, CirculationEvent.CM_CHECKOUT, 1, 0,
+              start=start + datetime.timedelta(minutes=1), library=library,
+              location=u"Westgate")[0],
+
+            # This event has a different location.
+            m(self._db, pool, CirculationEvent.CM_CHECKOUT, None, None,
+              start=start + datetime.timedelta(minutes=2),
+              library=library)[0],
+
+            # This event has no license pool at all.
+            m(self._db, None, CirculationEvent.NEW_PATRON, None, None,
+              start=start, library=library)[0],
+        ]
+        cutoff = start + datetime.timedelta(hours=1)
+
+        assert 3 == CirculationEventRollup.roll_up(
+            self._db, CirculationEventRollup.HOUR, start, cutoff
+        )
+        rollups = self._db.query(CirculationEventRollup).order_by(
+            CirculationEventRollup.count.desc(), CirculationEventRollup.type
+        ).all()
+        westgate, no_location, new_patron = rollups
+        assert CirculationEventRollup.HOUR == westgate.period
+        assert datetime.datetime(2019, 1, 1, 10) == westgate.period_start
+        assert library.id == westgate.library_id
+        assert pool.collection_id == westgate.collection_id
+        assert pool.id == westgate.license_pool_id
+        assert u"Westgate" == westgate.location
+        assert 2 == westgate.count
+        assert -2 == westgate.delta
+
+        assert None == no_location.location
+        assert 1 == no_location.count
+        assert 0 == no_location.delta
+
+        assert None == new_patron.license_pool_id
+        assert None == new_patron.collection_id
+
+        # Rolling up the same span of time again recounts the periods
+        # from scratch, so nothing is counted twice.
+        assert 3 == CirculationEventRollup.roll_up(
+            self._db, CirculationEventRollup.HOUR, start, cutoff
+        )
+        self._db.expire_all()
+        assert 3 == self._db.query(CirculationEventRollup).count()
+        [westgate] = self._db.query(CirculationEventRollup).filter(
+            CirculationEventRollup.location==u"Westgate"
+        ).all()
+        assert 2 == westgate.count
+
+        # Only events that started before the cutoff are counted, but
+        # the whole period containing `start` is recounted.
+        CirculationEventRollup.roll_up(
+            self._db, CirculationEventRollup.HOUR,
+            start + datetime.timedelta(minutes=30),
+            start + datetime.timedelta(minutes=1)
+        )
+        self._db.expire_all()
+        assert [(u"Westgate", 1)] == [
+            (x.location, x.count)
+            for x in self._db.query(CirculationEventRollup).filter(
+                CirculationEventRollup.type==CirculationEvent.CM_CHECKOUT
+            )
+        ]
+
+        # Each period is rolled up separately.
+        CirculationEventRollup.roll_up(
+            self._db, CirculationEventRollup.DAY, start, cutoff
+        )
+        days = self._db.query(CirculationEventRollup).filter(
+            CirculationEventRollup.period==CirculationEventRollup.DAY
+        ).all()
+        assert 3 == len(days)
+        assert set([datetime.datetime(2019, 1, 1)]) == set(
+            x.period_start for x in days
+        )
+
+        with pytest.raises(ValueError) as excinfo:
+            CirculationEventRollup.roll_up(self._db, "fortnight", start, cutoff)
+        assert "Unknown rollup period: fortnight" in str(excinfo.value)
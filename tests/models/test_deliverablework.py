@@ -0,0 +1,178 @@
+# encoding: utf-8
+import pytest
+from sqlalchemy import (
+    and_,
+    exists,
+)
+from ...testing import DatabaseTest
+from ...classifier import Classifier
+from ...model.deliverablework import (
+    CannotUseDeliverableWorks,
+    DeliverableWork,
+    DeliverableWorkQuery,
+)
+from ...model import tuple_to_numericrange
+from ...model.edition import Edition
+from ...model.licensing import (
+    LicensePool,
+    LicensePoolDeliveryMechanism,
+)
+from ...model.work import Work
+
+
+class TestDeliverableWork(DatabaseTest):
+
+    def rows(self):
+        return self._db.query(DeliverableWork).order_by(
+            DeliverableWork.license_pool_id
+        ).all()
+
+    def test_refresh(self):
+        work = self._work(
+            title=u"A Title", authors=[u"An Author"], with_license_pool=True,
+            audience=Classifier.AUDIENCE_YOUNG_ADULT, fiction=False
+        )
+        work.target_age = tuple_to_numericrange((14, 17))
+        [pool] = work.license_pools
+        pool.licenses_owned = 3
+        pool.licenses_available = 1
+        edition = work.presentation_edition
+
+        # A LicensePool that has been superceded is left out.
+        superceded = self._licensepool(edition, collection=self._collection())
+        superceded.work = work
+        superceded.superceded = True
+
+        # So is a work that isn't presentation-ready.
+        not_ready = self._work(with_license_pool=True)
+        not_ready.presentation_ready = False
+        self._db.flush()
+
+        assert 1 == DeliverableWork.refresh(self._db)
+        [row] = self.rows()
+        assert work.id == row.work_id
+        assert pool.id == row.license_pool_id
+        assert pool.collection_id == row.collection_id
+        assert pool.data_source_id == row.data_source_id
+        assert pool.identifier_id == row.identifier_id
+        assert False == row.suppressed
+        assert False == row.open_access
+        assert 3 == row.licenses_owned
+        assert 1 == row.licenses_available
+        assert Classifier.AUDIENCE_YOUNG_ADULT == row.audience
+        assert work.target_age == row.target_age
+        assert False == row.fiction
+        assert work.quality == row.quality
+        assert work.last_update_time == row.last_update_time
+        assert edition.medium == row.medium
+        assert edition.language == row.language
+        assert edition.sort_title == row.sort_title
+        assert edition.sort_author == row.sort_author
+
+        # Refreshing specific works replaces only their rows.
+        pool.licenses_available = 0
+        not_ready.presentation_ready = True
+        self._db.flush()
+        assert 1 == DeliverableWork.refresh(self._db, [work])
+        [row] = self.rows()
+        self._db.refresh(row)
+        assert 0 == row.licenses_available
+
+        # Work IDs can be used instead of Works.
+        assert 1 == DeliverableWork.refresh(self._db, [not_ready.id])
+        assert ([work.id, not_ready.id] ==
+            sorted(x.work_id for x in self.rows()))
+
+        # A work that's no longer presentation-ready loses its rows.
+        work.presentation_ready = False
+        self._db.flush()
+        assert 0 == DeliverableWork.refresh(self._db, [work])
+        assert [not_ready.id] == [x.work_id for x in self.rows()]
+
+        # Refreshing no works does nothing.
+        assert 0 == DeliverableWork.refresh(self._db, [])
+        assert 1 == len(self.rows())
+
+        # Deleting a LicensePool deletes its row.
+        self._db.delete(not_ready.license_pools[0])
+        self._db.flush()
+        assert [] == self.rows()
+
+    def test_column_for(self):
+        m = DeliverableWork.column_for
+        table = DeliverableWork.__table__
+        assert table.c.medium is m(Edition.medium.expression)
+        assert table.c.license_pool_id is m(LicensePool.id.expression)
+        assert table.c.work_id is m(LicensePool.work_id.expression)
+        assert table.c.work_id is m(Work.id.expression)
+        assert table.c.audience is m(Work.audience.expression)
+
+        # Work fields that aren't copied are left alone, since the
+        # Work is always part of the query.
+        assert None == m(Work.presentation_ready.expression)
+
+        # Fields from other tables are left alone.
+        assert None == m(LicensePoolDeliveryMechanism.data_source_id.expression)
+
+        # LicensePool and Edition fields that aren't copied can't be
+        # used.
+        for column in (
+            LicensePool.patrons_in_hold_queue, Edition.title
+        ):
+            with pytest.raises(CannotUseDeliverableWorks) as excinfo:
+                m(column.expression)
+            assert "is not copied into the deliverableworks table" in str(
+                excinfo.value
+            )
+
+    def test_source_column_for(self):
+        m = DeliverableWork.source_column_for
+        table = DeliverableWork.__table__
+        assert Edition.__table__.c.sort_title is m(table.c.sort_title)
+        assert Work.__table__.c.id is m(table.c.work_id)
+        assert (Work.__table__.c.last_update_time is
+                m(table.c.last_update_time))
+
+        # Anything else is returned unchanged.
+        column = Edition.sort_author.expression
+        assert column is m(column)
+
+    def test_adapt(self):
+        LPDM = LicensePoolDeliveryMechanism
+        clause = and_(
+            Edition.medium == Edition.BOOK_MEDIUM,
+            LicensePool.unlimited_access,
+            Work.presentation_ready == True,
+            exists().where(
+                LicensePool.identifier_id == LPDM.identifier_id
+            )
+        )
+        adapted = str(DeliverableWork.adapt(clause))
+        assert "deliverableworks.medium = " in adapted
+        assert "deliverableworks.licenses_owned = " in adapted
+        assert "works.presentation_ready = " in adapted
+        assert ("deliverableworks.identifier_id = "
+                "licensepooldeliveries.identifier_id" in adapted)
+        assert "licensepools" not in adapted
+        assert "editions" not in adapted
+
+    def test_query(self):
+        # A DeliverableWorkQuery adapts its filters, sort order and
+        # DISTINCT clause.
+        qu = DeliverableWorkQuery(Work, session=self._db).join(
+            DeliverableWork, DeliverableWork.work_id==Work.id
+        ).filter(
+            Edition.language == u"eng"
+        ).order_by(
+            Edition.sort_title
+        ).distinct(
+            Edition.sort_title
+        )
+        sql = str(qu)
+        assert "deliverableworks.language = " in sql
+        assert "ORDER BY deliverableworks.sort_title" in sql
+        assert "DISTINCT ON (deliverableworks.sort_title)" in sql
+        assert "editions" not in sql
+
+        with pytest.raises(CannotUseDeliverableWorks):
+            qu.filter(Edition.title == u"A Title")
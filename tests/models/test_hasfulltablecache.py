@@ -1,6 +1,15 @@
 # encoding: utf-8
+import os
+
 from ...testing import DatabaseTest
-from ...model.hasfulltablecache import HasFullTableCache
+from ...model import (
+    DataSource,
+    Library,
+)
+from ...model.hasfulltablecache import (
+    CacheInvalidationListener,
+    HasFullTableCache,
+)
 
 class MockHasTableCache(HasFullTableCache):
 
@@ -43,6 +52,289 @@ class TestHasFullTableCache(DatabaseTest):
         assert {MockHasTableCache.KEY: self.mock} == temp_cache
         assert {MockHasTableCache.ID: self.mock} == temp_id_cache
 
+    def test_evict_from_cache(self):
+        other = MockHasTableCache()
+        self.mock_class._cache = {MockHasTableCache.KEY: self.mock,
+                                  "other key": other}
+        self.mock_class._id_cache = {MockHasTableCache.ID: self.mock,
+                                     "other ID": other}
+
+        # Evicting an ID that's not in the cache does nothing.
+        self.mock_class.evict_from_cache("no such ID")
+        assert 2 == len(self.mock_class._cache)
+
+        # Evicting a cached object removes it from both caches but
+        # leaves everything else alone.
+        self.mock_class.evict_from_cache(MockHasTableCache.ID)
+        assert {"other key": other} == self.mock_class._cache
+        assert {"other ID": other} == self.mock_class._id_cache
+
+        # Evicting from a reset cache does nothing.
+        self.mock_class.reset_cache()
+        self.mock_class.evict_from_cache("other ID")
+        assert HasFullTableCache.RESET == self.mock_class._id_cache
+
+    def test_evict_from_cache_detached_object(self):
+        # If the cached object can't calculate its cache key, it's
+        # found by identity instead.
+        class Detached(MockHasTableCache):
+            def cache_key(self):
+                raise Exception("I'm detached!")
+        detached = Detached()
+        self.mock_class._cache = {"some key": detached}
+        self.mock_class._id_cache = {MockHasTableCache.ID: detached}
+        self.mock_class.evict_from_cache(MockHasTableCache.ID)
+        assert {} == self.mock_class._cache
+        assert {} == self.mock_class._id_cache
+
+    def test_cache_generation(self):
+        # Resetting the cache changes its generation.
+        generation = self.mock_class._cache_generation
+        self.mock_class.reset_cache()
+        assert generation + 1 == self.mock_class._cache_generation
+
+        # Evicting an object doesn't, but it's recorded in the
+        # eviction log.
+        self.mock_class.evict_from_cache("an ID")
+        assert generation + 1 == self.mock_class._cache_generation
+        sequence, cls, id = HasFullTableCache._eviction_log[-1]
+        assert HasFullTableCache._eviction_sequence == sequence
+        assert (self.mock_class, "an ID") == (cls, id)
+
+    def test_populate_cache_discarded_after_concurrent_reset(self):
+        # If the cache is reset while populate_cache() is loading
+        # rows, the data it loaded may be out of date, so it's thrown
+        # away rather than installed.
+        class ResetWhileLoading(MockHasTableCache):
+            @classmethod
+            def _all_rows(cls, _db):
+                yield MockHasTableCache()
+                cls.reset_cache()
+        ResetWhileLoading.populate_cache(self._db)
+        assert HasFullTableCache.RESET == ResetWhileLoading._cache
+        assert HasFullTableCache.RESET == ResetWhileLoading._id_cache
+
+        # Without the reset, the new caches are installed.
+        class Loader(MockHasTableCache):
+            @classmethod
+            def _all_rows(cls, _db):
+                yield MockHasTableCache()
+        Loader.populate_cache(self._db)
+        assert [MockHasTableCache.KEY] == list(Loader._cache.keys())
+        assert [MockHasTableCache.ID] == list(Loader._id_cache.keys())
+
+    def test_populate_cache_applies_concurrent_evictions(self):
+        # If an object is evicted while populate_cache() is loading
+        # rows, the new cache is installed without that object.
+        class Row(MockHasTableCache):
+            def __init__(self, id):
+                self._id = id
+            @property
+            def id(self):
+                return self._id
+            def cache_key(self):
+                return "key %s" % self._id
+
+        class EvictWhileLoading(MockHasTableCache):
+            @classmethod
+            def _all_rows(cls, _db):
+                yield Row(1)
+                yield Row(2)
+                cls.evict_from_cache(1)
+
+                # An eviction from some other class's cache is ignored.
+                MockHasTableCache.evict_from_cache(2)
+
+        EvictWhileLoading.populate_cache(self._db)
+        assert ["key 2"] == list(EvictWhileLoading._cache.keys())
+        assert [2] == list(EvictWhileLoading._id_cache.keys())
+
+        # If there were too many evictions to keep track of, the new
+        # cache is thrown away.
+        class EvictTooMuch(MockHasTableCache):
+            @classmethod
+            def _all_rows(cls, _db):
+                yield Row(1)
+                for i in range(HasFullTableCache.EVICTION_LOG_SIZE + 1):
+                    MockHasTableCache.evict_from_cache(i)
+        EvictTooMuch.populate_cache(self._db)
+        assert HasFullTableCache.RESET == EvictTooMuch._cache
+
+    def test_all_rows(self):
+        # Rows are loaded in batches, ordered by ID.
+        for i in range(3):
+            self._library()
+        expect = self._db.query(Library).order_by(Library.id).all()
+
+        old_size = Library.POPULATE_BATCH_SIZE
+        Library.POPULATE_BATCH_SIZE = 2
+        try:
+            assert expect == list(Library._all_rows(self._db))
+        finally:
+            Library.POPULATE_BATCH_SIZE = old_size
+
+    def test_class_for_table(self):
+        m = HasFullTableCache.class_for_table
+        assert Library == m("libraries")
+        assert DataSource == m("datasources")
+        assert None == m("no such table")
+
+    def test_notify_change(self):
+        # notify_change() sends a notification that will be delivered
+        # when the transaction is committed.
+        library = self._default_library
+        connection = self._db.connection()
+        Library.notify_change(connection, library)
+
+        # We can't see the notification since this test's transaction
+        # will be rolled back, so check the arguments sent to Postgres.
+        class MockConnection(object):
+            def execute(self, statement, **kwargs):
+                self.args = (str(statement), kwargs)
+        connection = MockConnection()
+        Library.notify_change(connection, library)
+        statement, kwargs = connection.args
+        assert "pg_notify" in statement
+        assert dict(
+            channel=HasFullTableCache.CHANGE_CHANNEL,
+            payload="libraries:%s" % library.id
+        ) == kwargs
+
+    def test_new_object_not_cached_until_committed(self):
+        # Creating a DataSource resets the cache rather than putting
+        # an uncommitted object in it.
+        DataSource.populate_cache(self._db)
+        transaction = self._db.begin_nested()
+        source = DataSource.lookup(self._db, "New source", autocreate=True)
+        assert HasFullTableCache.RESET == DataSource._cache
+
+        # Looking the DataSource up again in the same transaction
+        # repopulates the cache, and the new DataSource is in there.
+        assert source == DataSource.lookup(self._db, "New source")
+        assert source == DataSource._cache["New source"]
+        assert (set([DataSource]) ==
+                self._db.info[HasFullTableCache.CHANGED_CLASSES])
+
+        # But when the transaction is rolled back, the cache is reset,
+        # so the DataSource isn't found.
+        transaction.rollback()
+        assert HasFullTableCache.RESET == DataSource._cache
+        assert None == DataSource.lookup(self._db, "New source")
+
+    def test_forget_changed_caches(self):
+        # Once the outermost transaction is over, there's nothing
+        # left to reset.
+        self._db.info[HasFullTableCache.CHANGED_CLASSES] = set([DataSource])
+        HasFullTableCache.forget_changed_caches(self._db)
+        assert HasFullTableCache.CHANGED_CLASSES not in self._db.info
+
+        # Resetting the caches for a session with no changes does
+        # nothing.
+        DataSource.populate_cache(self._db)
+        HasFullTableCache.reset_changed_caches(self._db)
+        assert HasFullTableCache.RESET != DataSource._cache
+
     # populate_cache(), by_cache_key(), and by_id() are tested in
     # TestGenre since those methods must be backed by a real database
     # table.
+
+
+class TestCacheInvalidationListener(DatabaseTest):
+
+    def test_handle(self):
+        library = self._default_library
+        other = self._library()
+        Library.populate_cache(self._db)
+        assert library.id in Library._id_cache
+        assert other.id in Library._id_cache
+
+        listener = CacheInvalidationListener(None)
+
+        # A notification about one library evicts only that library.
+        listener.handle("libraries:%s" % library.id)
+        assert library.id not in Library._id_cache
+        assert library.short_name not in Library._cache
+        assert other == Library._id_cache[other.id]
+
+        # A notification without an ID resets the whole cache.
+        listener.handle("libraries:")
+        assert HasFullTableCache.RESET == Library._id_cache
+
+        # A notification about an unknown table is ignored.
+        listener.handle("nosuchtable:1")
+
+    def test_reset_all_caches(self):
+        Library.populate_cache(self._db)
+        DataSource.populate_cache(self._db)
+        CacheInvalidationListener(None).reset_all_caches()
+        assert HasFullTableCache.RESET == Library._cache
+        assert HasFullTableCache.RESET == DataSource._cache
+
+    def test_ensure_running(self):
+        class MockThread(object):
+            alive = True
+            def is_alive(self):
+                return self.alive
+
+        class MockListener(CacheInvalidationListener):
+            _instance = None
+            _pid = None
+            _engine = None
+            started = []
+            def start(self):
+                self.thread = MockThread()
+                self.started.append(self)
+
+        # Nothing is started until start_for_process() says which
+        # engine to use.
+        assert None == MockListener.ensure_running()
+        assert [] == MockListener.started
+
+        listener = MockListener.start_for_process("engine")
+        assert [listener] == MockListener.started
+        assert "engine" == listener.engine
+        assert os.getpid() == MockListener._pid
+
+        # As long as the listener is running, it's reused.
+        assert listener == MockListener.ensure_running()
+        assert [listener] == MockListener.started
+
+        # A forked process starts a listener of its own.
+        MockListener._pid = -1
+        forked = MockListener.ensure_running()
+        assert forked != listener
+        assert [listener, forked] == MockListener.started
+        assert os.getpid() == MockListener._pid
+
+        # So does a process whose listener thread has died.
+        forked.thread.alive = False
+        replacement = MockListener.ensure_running()
+        assert [listener, forked, replacement] == MockListener.started
+
+    def test_cache_lookup_ensures_listener_is_running(self):
+        class MockListener(object):
+            calls = 0
+            @classmethod
+            def ensure_running(cls):
+                cls.calls += 1
+
+        from ...model import hasfulltablecache
+        old = hasfulltablecache.CacheInvalidationListener
+        hasfulltablecache.CacheInvalidationListener = MockListener
+        try:
+            DataSource.lookup(self._db, DataSource.GUTENBERG)
+        finally:
+            hasfulltablecache.CacheInvalidationListener = old
+        assert MockListener.calls > 0
+
+    def test_listen(self):
+        # The listener uses a connection of its own, outside the
+        # engine's pool.
+        listener = CacheInvalidationListener(self._db.get_bind().engine)
+        listener.listen()
+        try:
+            assert True == listener.connection.autocommit
+            assert 0 == listener.connection.closed
+        finally:
+            listener.close()
+        assert None == listener.connection
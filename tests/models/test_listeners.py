@@ -135,9 +135,11 @@ class TestSiteConfigurationHasChanged(DatabaseTest):
         ConfigurationSetting, site_configuration_has_changed is called.
         """
         ConfigurationSetting.sitewide(self._db, "setting").value = "value"
+        self._db.flush()
         self.mock.assert_was_called()
 
         ConfigurationSetting.sitewide(self._db, "setting").value = "value2"
+        self._db.flush()
         self.mock.assert_was_called()
 
     def test_lane_change_updates_configuration(self):
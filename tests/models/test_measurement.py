@@ -1,10 +1,12 @@
 import datetime
+import pytest
 
 from ...model import (
     DataSource,
     Measurement,
     get_one_or_create
 )
+from ...model.measurement import MeasurementColumns
 
 from ...testing import (
     DatabaseTest,
@@ -213,6 +215,78 @@ class TestMeasurement(DatabaseTest):
         irrelevant = self._measurement("Some other quantity", 42, self.source, 1)
         assert 0 == Measurement.overall_quality([irrelevant])
 
+    def test_measurement_columns_match_overall_quality(self):
+        oclc = DataSource.lookup(self._db, DataSource.OCLC)
+        overdrive = DataSource.lookup(self._db, DataSource.OVERDRIVE)
+        stored = self._popularity(5000)
+        stored._normalized_value = 0.25
+        zero_stored = self._rating(4)
+        zero_stored._normalized_value = 0
+        groups = [
+            [],
+            [self._popularity(59)],
+            [self._rating(4), self._quality(0.5)],
+            [self._popularity(4), self._quality(0.5)],
+            [self._popularity(4), self._rating(4), self._quality(0.66)],
+            [self._popularity(4), self._rating(7), self._quality(0)],
+            [self._quality(0)],
+            [self._rating(10, weight=10), self._rating(1, weight=1)],
+            [self._measurement("Some other quantity", 42, self.source, 1)],
+            [self._popularity(None), self._rating(3, source=oclc)],
+            [self._measurement(Measurement.HOLDINGS, 400, oclc, 10),
+             self._measurement(Measurement.PUBLISHED_EDITIONS, 7, oclc, 2),
+             self._popularity(1000, source=overdrive, weight=0.5),
+             self._rating(3)],
+            [stored, zero_stored],
+        ]
+
+        # The columns are built first, so the Measurements haven't
+        # cached their normalized values yet.
+        columns = MeasurementColumns.from_measurements(groups)
+        for weights in ((0.3, 0.7), (0.75, 0.25)):
+            expect = [
+                Measurement.overall_quality(group, *weights, default_value=0.1)
+                for group in groups
+            ]
+            assert expect == columns.overall_qualities(
+                *weights, default_value=0.1
+            )
+            assert 0.1 == expect[0]
+
+        with pytest.raises(ValueError):
+            columns.overall_qualities(0.5, 0.6)
+
+    def test_overall_qualities(self):
+        w = self._identifier()
+        oclc = DataSource.lookup(self._db, DataSource.OCLC)
+        w.add_measurement(self.source, Measurement.POPULARITY, 6000)
+        popularity = w.add_measurement(self.source, Measurement.POPULARITY, 59)
+        w.add_measurement(self.source, Measurement.PUBLISHED_EDITIONS, 42)
+        other = self._identifier()
+        editions = other.add_measurement(
+            oclc, Measurement.PUBLISHED_EDITIONS, 800
+        )
+        nothing = self._identifier()
+
+        # Each set of identifiers gets the same quality it would get
+        # from Measurement.overall_quality. An identifier's
+        # measurements count towards every set it's in, and outdated
+        # measurements are ignored.
+        sets = [[w.id], [w.id, other.id], [other.id], [nothing.id], []]
+        qualities = Measurement.overall_qualities(
+            self._db, sets, default_value=None
+        )
+        assert [
+            Measurement.overall_quality([popularity]),
+            Measurement.overall_quality([popularity, editions]),
+            Measurement.overall_quality([editions]),
+            None,
+            None,
+        ] == qualities
+        assert 0.5 == qualities[0]
+
+        assert [] == Measurement.overall_qualities(self._db, [])
+
     def test_calculate_quality(self):
         w = self._work(with_open_access_download=True)
 
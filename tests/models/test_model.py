@@ -1,8 +1,11 @@
 # encoding: utf-8
 import pytest
 import datetime
+import time
 from psycopg2.extras import NumericRange
 from sqlalchemy import not_
+from sqlalchemy.pool import NullPool
+from sqlalchemy.sql.expression import select
 from sqlalchemy.orm.exc import MultipleResultsFound
 
 from ...testing import DatabaseTest
@@ -13,12 +16,24 @@ from ...model import (
     DataSource,
     Edition,
     Genre,
+    get_many_or_create,
     get_one,
+    get_one_or_create,
+    Identifier,
+    LicensePool,
+    needs_primary,
+    replica_reads,
+    ReplicaSet,
+    RoutingSession,
     SessionManager,
+    Subject,
+    TimedQueuePool,
     Timestamp,
     numericrange_to_tuple,
     tuple_to_numericrange,
+    _Upsert,
 )
+from ...util.request_timing import RequestTimer
 
 
 class TestDatabaseInterface(DatabaseTest):
@@ -55,6 +70,127 @@ class TestDatabaseInterface(DatabaseTest):
         result = get_one(self._db, Edition, constraint=constraint)
         assert None == result
 
+    def test_get_one_or_create(self):
+        # An Identifier can be created with INSERT ... ON CONFLICT.
+        timer = RequestTimer.start()
+        identifier, is_new = get_one_or_create(
+            self._db, Identifier, type=Identifier.ISBN, identifier=u"1234"
+        )
+        RequestTimer.stop()
+        assert True == is_new
+        assert u"1234" == identifier.identifier
+        assert identifier in self._db
+
+        # That took one statement to look for the Identifier and one
+        # to create it -- no savepoint.
+        assert 2 == timer.counts[RequestTimer.DATABASE]
+
+        # The second time, the Identifier is found.
+        assert (identifier, False) == get_one_or_create(
+            self._db, Identifier, type=Identifier.ISBN, identifier=u"1234"
+        )
+
+        # Relationships are turned into foreign keys, and the values
+        # in create_method_kwargs are used to create the object.
+        data_source = DataSource.lookup(self._db, DataSource.GUTENBERG)
+        identifier.licensed_through
+        pool, is_new = get_one_or_create(
+            self._db, LicensePool, identifier=identifier,
+            data_source=data_source, collection=self._default_collection,
+            create_method_kwargs=dict(licenses_owned=3)
+        )
+        assert True == is_new
+        assert 3 == pool.licenses_owned
+        assert identifier == pool.identifier
+        assert self._default_collection == pool.collection
+
+        # The Identifier's LicensePools had already been loaded, and
+        # the new one was added to them, just as if the ORM had
+        # created it.
+        assert [pool] == identifier.licensed_through
+
+        # A model with no unique constraint is created the usual way.
+        genre, is_new = get_one_or_create(
+            self._db, Genre, name=u"A new genre"
+        )
+        assert True == is_new
+        assert (genre, False) == get_one_or_create(
+            self._db, Genre, name=u"A new genre"
+        )
+
+    def test_get_many_or_create(self):
+        existing = self._identifier(Identifier.ISBN)
+        kwargs_list = [
+            dict(type=Identifier.ISBN, identifier=u"new 1"),
+            dict(type=Identifier.ISBN, identifier=existing.identifier),
+            dict(type=Identifier.ISBN, identifier=u"new 2"),
+            dict(type=Identifier.ISBN, identifier=u"new 1"),
+        ]
+        timer = RequestTimer.start()
+        results = get_many_or_create(self._db, Identifier, kwargs_list)
+        RequestTimer.stop()
+
+        # The whole batch took one statement.
+        assert 1 == timer.counts[RequestTimer.DATABASE]
+
+        # Each item got an answer, in order. An object that shows up
+        # twice is only new the first time.
+        [(new1, is_new1), (old, is_new2), (new2, is_new3), (again, is_new4)] = results
+        assert (existing, False) == (old, is_new2)
+        assert (u"new 1", True) == (new1.identifier, is_new1)
+        assert (u"new 2", True) == (new2.identifier, is_new3)
+        assert (new1, False) == (again, is_new4)
+
+        # The same objects are found the next time around.
+        assert [(new1, False), (existing, False), (new2, False), (new1, False)] == (
+            get_many_or_create(self._db, Identifier, kwargs_list)
+        )
+
+        # Arguments that don't match a unique constraint are handled
+        # one at a time by get_one_or_create().
+        [(genre, is_new)] = get_many_or_create(
+            self._db, Genre, [dict(name=u"Another new genre")]
+        )
+        assert True == is_new
+        assert u"Another new genre" == genre.name
+
+        # So is an item with a missing value for a unique column,
+        # since NULL never conflicts with anything.
+        [(subject, is_new)] = get_many_or_create(
+            self._db, Subject, [dict(type=Subject.TAG, identifier=None)]
+        )
+        assert True == is_new
+        assert None == subject.identifier
+
+    def test_upsert_for_model(self):
+        m = _Upsert.for_model
+
+        # An _Upsert can be found for a unique constraint, whether its
+        # columns are named directly or through a relationship.
+        upsert = m(Identifier, dict(type=1, identifier=2))
+        assert [Identifier.__table__.c.type,
+                Identifier.__table__.c.identifier] == upsert.columns
+        table = LicensePool.__table__
+        expect = set([
+            table.c.identifier_id, table.c.data_source_id,
+            table.c.collection_id
+        ])
+        for kwargs in (
+            dict(identifier=1, data_source=2, collection=3),
+            dict(identifier_id=1, data_source_id=2, collection_id=3),
+        ):
+            assert expect == set(m(LicensePool, kwargs).columns)
+
+        # Not if the arguments aren't exactly the columns of a unique
+        # constraint.
+        assert None == m(Identifier, dict(type=1))
+        assert None == m(Identifier, dict(type=1, identifier=2, id=3))
+        assert None == m(Identifier, dict(type=1, identifier=2, nosuch=3))
+
+        # And not for a model that needs the ORM to create its rows,
+        # because something listens for it to be inserted.
+        assert None == m(DataSource, dict(name=1))
+
     def test_initialize_data_does_not_reset_timestamp(self):
         # initialize_data() has already been called, so the database is
         # initialized and the 'site configuration changed' Timestamp has
@@ -68,6 +204,249 @@ class TestDatabaseInterface(DatabaseTest):
         assert old_timestamp == timestamp.finish
 
 
+class TestSessionManager(DatabaseTest):
+
+    def test_engine(self):
+        # There's only ever one Engine per database URL.
+        url = Configuration.database_url()
+        engine = SessionManager.engine(url)
+        assert engine == SessionManager.engine(url)
+        assert engine == SessionManager.engines[url]
+        assert isinstance(engine.pool, TimedQueuePool)
+
+        # A sessionmaker for that URL uses the same Engine, rather
+        # than creating a new connection pool.
+        factory = SessionManager.sessionmaker(url=url)
+        assert engine == factory.kw['bind']
+
+    def test_engine_options(self):
+        m = SessionManager.engine_options
+
+        # By default, we use a TimedQueuePool with SQLAlchemy's
+        # default settings.
+        options = m({})
+        assert TimedQueuePool == options.pop('poolclass')
+        assert dict(echo=False) == options
+
+        # Connection pool settings are passed along.
+        options = m(dict(
+            pool_size=20, max_overflow=5, pool_recycle=None,
+            pool_pre_ping=True, statement_timeout=1000
+        ))
+        assert 20 == options['pool_size']
+        assert 5 == options['max_overflow']
+        assert 'pool_recycle' not in options
+        assert True == options['pool_pre_ping']
+        assert (
+            dict(options='-c statement_timeout=1000') ==
+            options['connect_args']
+        )
+
+        # If pooling is disabled, the pool size settings are ignored.
+        options = m(dict(disable_pool=True, pool_size=20))
+        assert NullPool == options['poolclass']
+        assert 'pool_size' not in options
+
+    def test_pool_status(self):
+        url = Configuration.database_url()
+        engine = SessionManager.engine(url)
+        engine.connect().close()
+        status = SessionManager.pool_status()
+        [data] = [
+            v for k, v in status.items()
+            if k == engine.url.__to_string__()
+        ]
+        assert engine.pool.status() == data['status']
+        assert data['checkouts'] > 0
+        assert data['max_wait'] >= data['average_wait']
+
+
+class MockReplicaSet(object):
+    """Pretend to choose a read replica."""
+
+    def __init__(self, engine):
+        self._engine = engine
+        self.calls = []
+
+    def engine(self, last_write):
+        self.calls.append(last_write)
+        return self._engine
+
+
+class TestRoutingSession(DatabaseTest):
+
+    def setup_method(self):
+        super(TestRoutingSession, self).setup_method()
+        self.replica = object()
+        self.replicas = MockReplicaSet(self.replica)
+        self.session = RoutingSession(self.connection, replicas=self.replicas)
+
+    def teardown_method(self):
+        self.session.close()
+        super(TestRoutingSession, self).teardown_method()
+
+    def test_get_bind(self):
+        session = self.session
+        query = select([Edition.id])
+
+        # By default, everything goes to the primary.
+        assert self.connection == session.get_bind(clause=query)
+
+        with replica_reads(session):
+            # Within a replica_reads block, a read-only query goes to
+            # a replica.
+            assert self.replica == session.get_bind(clause=query)
+            assert [None] == self.replicas.calls
+
+            # Anything else goes to the primary.
+            assert self.connection == session.get_bind(
+                clause=query.with_for_update()
+            )
+
+            # So does everything within a needs_primary block.
+            with needs_primary(session):
+                assert self.connection == session.get_bind(clause=query)
+            assert self.replica == session.get_bind(clause=query)
+
+            # Once a statement that writes has gone to the primary,
+            # reads go there too until the transaction is over.
+            assert self.connection == session.get_bind(
+                clause=Edition.__table__.delete()
+            )
+            assert self.connection == session.get_bind(clause=query)
+
+        assert self.connection == session.get_bind(clause=query)
+
+        # Without any replicas, everything goes to the primary.
+        session.replicas = None
+        with replica_reads(session):
+            assert self.connection == session.get_bind(clause=query)
+
+    def test_last_write(self):
+        session = self.session
+        query = select([Edition.id])
+        assert RoutingSession.LAST_WRITE not in session.info
+        edition = Edition(title=u"A title")
+        session.add(edition)
+        session.flush()
+
+        # A replica can't see a write that hasn't been committed, so
+        # for the rest of the transaction, reads go to the primary no
+        # matter how much time has passed.
+        assert True == session.info[RoutingSession.UNCOMMITTED_WRITES]
+        with replica_reads(session):
+            assert self.connection == session.get_bind(clause=query)
+        assert [] == self.replicas.calls
+
+        # When the transaction is over, the time is recorded so that
+        # the ReplicaSet can choose a replica that has seen the write.
+        session.commit()
+        assert RoutingSession.UNCOMMITTED_WRITES not in session.info
+        last_write = session.info[RoutingSession.LAST_WRITE]
+        with replica_reads(session):
+            assert self.replica == session.get_bind(clause=query)
+        assert [last_write] == self.replicas.calls
+
+    def test_write_outside_flush(self):
+        # A statement that may write, run directly rather than through
+        # a flush, also sends the rest of the transaction's reads to
+        # the primary.
+        session = self.session
+        query = select([Edition.id])
+        with replica_reads(session):
+            session.get_bind(clause=Edition.__table__.delete())
+            assert self.connection == session.get_bind(clause=query)
+        assert [] == self.replicas.calls
+
+        # A nested transaction ending doesn't change that.
+        session.begin_nested()
+        session.rollback()
+        assert True == session.info[RoutingSession.UNCOMMITTED_WRITES]
+
+        session.rollback()
+        assert RoutingSession.UNCOMMITTED_WRITES not in session.info
+        with replica_reads(session):
+            assert self.replica == session.get_bind(clause=query)
+
+    def test_routing_query(self):
+        # A query marked with the 'read_from_replica' execution option
+        # asks for a replica when it's run.
+        self.replicas._engine = None
+        qu = self.session.query(Edition).execution_options(
+            read_from_replica=True
+        ).filter(Edition.id==-1)
+        assert [] == qu.all()
+        assert [None] == self.replicas.calls
+
+        # An ordinary query doesn't.
+        assert [] == self.session.query(Edition).all()
+        assert [None] == self.replicas.calls
+
+        # And the replica_reads block ended when the query was run.
+        assert not self.session.info.get(RoutingSession.READ_FROM_REPLICA)
+
+
+class TestReplicaSet(object):
+
+    class Mock(ReplicaSet):
+        def __init__(self, lags, **kwargs):
+            super(TestReplicaSet.Mock, self).__init__(
+                list(lags.keys()), **kwargs
+            )
+            self.lags = lags
+            self.measured = []
+
+        def measure_lag(self, engine):
+            self.measured.append(engine)
+            return self.lags[engine]
+
+    def test_lag(self):
+        replicas = self.Mock(dict(replica=1.5))
+        assert 1.5 == replicas.lag("replica")
+
+        # The measurement is cached for a while.
+        replicas.lags["replica"] = 100
+        assert 1.5 == replicas.lag("replica")
+        assert ["replica"] == replicas.measured
+
+        # Once it's old enough, it's measured again.
+        replicas.LAG_CHECK_INTERVAL = -1
+        assert 100 == replicas.lag("replica")
+
+    def test_engine(self):
+        replicas = self.Mock(
+            dict(fresh=1, stale=100, unreachable=None), max_lag=10
+        )
+
+        # A replica that's too far behind, or that can't be reached,
+        # isn't used.
+        assert "fresh" == replicas.engine()
+
+        # Neither is a replica that hasn't caught up to the caller's
+        # most recent write.
+        assert None == replicas.engine(last_write=time.time())
+        assert "fresh" == replicas.engine(last_write=time.time() - 5)
+
+
+class TestTimedQueuePool(object):
+
+    def test_wait_statistics(self):
+        class Connection(object):
+            def close(self):
+                pass
+        pool = TimedQueuePool(Connection, pool_size=1)
+        assert dict(
+            checkouts=0, total_wait=0, max_wait=0, average_wait=None
+        ) == pool.wait_statistics()
+
+        pool.connect().close()
+        pool.connect().close()
+        stats = pool.wait_statistics()
+        assert 2 == stats['checkouts']
+        assert stats['total_wait'] >= stats['max_wait']
+        assert stats['average_wait'] == stats['total_wait'] / 2
+
+
 class TestNumericRangeConversion(object):
     """Test the helper functions that convert between tuples and NumericRange
     objects.
@@ -15,6 +15,7 @@ from ...classifier import (
 )
 from ...model import (
     get_one_or_create,
+    PresentationCalculationPolicy,
     tuple_to_numericrange,
 )
 from ...model.coverage import WorkCoverageRecord
@@ -28,12 +29,14 @@ from ...model.datasource import DataSource
 from ...model.edition import Edition
 from ...model.identifier import Identifier
 from ...model.licensing import LicensePool
+from ...model.measurement import Measurement
 from ...model.resource import (
     Hyperlink,
     Representation,
     Resource,
 )
 from ...model.work import (
+    PresentationBatch,
     Work,
     WorkGenre,
 )
@@ -414,6 +417,82 @@ class TestWork(DatabaseTest):
 
         assert default_audience == work.audience
 
+    def _presentation_sources(self, work, name):
+        """Give a Work's LicensePool an equivalent Identifier with
+        a classification, a measurement, a description and a cover.
+        """
+        [pool] = work.license_pools
+        oclc = DataSource.lookup(self._db, DataSource.OCLC)
+        staff = DataSource.lookup(self._db, DataSource.LIBRARY_STAFF)
+        wrangler = DataSource.lookup(self._db, DataSource.METADATA_WRANGLER)
+        equivalent = self._identifier()
+        pool.identifier.equivalent_to(oclc, equivalent, 1)
+        equivalent.classify(
+            staff, Subject.SIMPLIFIED_GENRE, name, weight=100
+        )
+        equivalent.add_measurement(wrangler, Measurement.QUALITY, 0.8)
+        pool.identifier.add_link(
+            Hyperlink.DESCRIPTION, None, staff, content=u"About " + name
+        )
+        link, ignore = equivalent.add_link(
+            Hyperlink.IMAGE, "http://cover/" + name, oclc
+        )
+        representation, ignore = get_one_or_create(
+            self._db, Representation, url=link.resource.url
+        )
+        representation.media_type = Representation.JPEG_MEDIA_TYPE
+        representation.mirrored_at = datetime.datetime.now()
+        representation.mirror_url = "http://mirror/" + name
+        link.resource.representation = representation
+        return equivalent
+
+    def test_bulk_calculate_presentation(self):
+        names = [u"Romance", u"Science Fiction"]
+        works = []
+        for name in names:
+            work = self._work(with_license_pool=True)
+            self._presentation_sources(work, name)
+            works.append(work)
+
+        policy = PresentationCalculationPolicy.recalculate_everything()
+        Work.bulk_calculate_presentation(works, policy)
+        calculated = [
+            (work.genres, work.summary_text, work.cover_full_url,
+             work.quality)
+            for work in works
+        ]
+        for name, work in zip(names, works):
+            assert [name] == [genre.name for genre in work.genres]
+            assert u"About " + name == work.summary_text
+            assert "http://mirror/" + name == work.cover_full_url
+            assert 0.8 == work.quality
+
+            # The WorkCoverageRecords were written for the whole batch.
+            for operation in (
+                WorkCoverageRecord.CHOOSE_EDITION_OPERATION,
+                WorkCoverageRecord.CLASSIFY_OPERATION,
+                WorkCoverageRecord.QUALITY_OPERATION,
+            ):
+                record = self._db.query(WorkCoverageRecord).filter(
+                    WorkCoverageRecord.work_id==work.id
+                ).filter(
+                    WorkCoverageRecord.operation==operation
+                ).one()
+                assert WorkCoverageRecord.SUCCESS == record.status
+
+        # Calculating presentation one Work at a time gives the same
+        # results.
+        for work in works:
+            work.calculate_presentation(policy)
+        assert calculated == [
+            (work.genres, work.summary_text, work.cover_full_url,
+             work.quality)
+            for work in works
+        ]
+
+        # An empty batch is fine.
+        Work.bulk_calculate_presentation([], policy)
+
     def test__choose_summary(self):
         # Test the _choose_summary helper method, called by
         # calculate_presentation().
@@ -1633,6 +1712,119 @@ class TestWork(DatabaseTest):
         assert s.removed == [work]
 
 
+class TestPresentationBatch(DatabaseTest):
+
+    def test_lookups(self):
+        work = self._work(with_license_pool=True)
+        [pool] = work.license_pools
+        identifier = pool.identifier
+        oclc = DataSource.lookup(self._db, DataSource.OCLC)
+        staff = DataSource.lookup(self._db, DataSource.LIBRARY_STAFF)
+        equivalent = self._identifier()
+        identifier.equivalent_to(oclc, equivalent, 1)
+        classification = equivalent.classify(oclc, Subject.TAG, u"Cats")
+        wrangler = DataSource.lookup(self._db, DataSource.METADATA_WRANGLER)
+        identifier.add_measurement(wrangler, Measurement.QUALITY, 0.5)
+        description, ignore = equivalent.add_link(
+            Hyperlink.DESCRIPTION, None, oclc, content=u"A summary"
+        )
+        description = description.resource
+        image, ignore = equivalent.add_link(
+            Hyperlink.IMAGE, "http://cover/", oclc
+        )
+        image = image.resource
+        image.representation, ignore = get_one_or_create(
+            self._db, Representation, url=image.url
+        )
+
+        batch = PresentationBatch(self._db, [work])
+        ids = set([identifier.id, equivalent.id])
+        assert ids == batch.all_identifier_ids([identifier.id])
+        assert [classification] == batch.classifications_for(ids)
+
+        # Quality was calculated ahead of time for the Work's
+        # Identifiers.
+        assert 0.5 == batch.quality_for(ids)
+        assert None == batch.quality_for([identifier.id])
+
+        # Descriptions can be restricted to one or more data sources.
+        assert [description] == batch.descriptions_for(ids)
+        assert [description] == batch.descriptions_for(ids, oclc)
+        assert [description] == batch.descriptions_for(ids, set([oclc]))
+        assert [] == batch.descriptions_for(ids, staff)
+        assert [] == batch.descriptions_for([identifier.id])
+
+        # The cover is associated with an equivalent identifier, so
+        # it's only found when looking further away.
+        m = batch.best_cover_for
+        assert (None, []) == m(identifier, 0, Hyperlink.IMAGE)
+        assert (image, [image]) == m(
+            identifier, PresentationBatch.COVER_DISTANCE, Hyperlink.IMAGE
+        )
+        assert (image, [image]) == m(equivalent, 0, Hyperlink.IMAGE)
+        assert (None, []) == m(
+            identifier, PresentationBatch.COVER_DISTANCE,
+            Hyperlink.THUMBNAIL_IMAGE
+        )
+
+        # The batch doesn't know about other Identifiers, or about
+        # covers at other distances, so the caller will have to go to
+        # the database.
+        other = self._identifier()
+        assert None == batch.all_identifier_ids([identifier.id, other.id])
+        assert None == batch.classifications_for([other.id])
+        assert None == batch.quality_for(ids | set([other.id]))
+        assert None == batch.descriptions_for([other.id])
+        assert None == m(other, 0, Hyperlink.IMAGE)
+        assert None == m(equivalent, PresentationBatch.COVER_DISTANCE,
+                         Hyperlink.IMAGE)
+        assert None == m(identifier, 1, Hyperlink.IMAGE)
+
+        # The policy decides what gets loaded.
+        policy = PresentationCalculationPolicy(
+            classify=False, choose_summary=False, calculate_quality=False,
+            choose_cover=False
+        )
+        batch = PresentationBatch(self._db, [work], policy)
+        assert None == batch.all_identifier_ids([identifier.id])
+        assert None == batch.classifications_for([identifier.id])
+        assert None == batch.quality_for(ids)
+        assert None == batch.descriptions_for([identifier.id])
+        assert None == batch.best_cover_for(identifier, 0, Hyperlink.IMAGE)
+
+    def test_write_coverage_records(self):
+        work1 = self._work()
+        work2 = self._work()
+        batch = PresentationBatch(self._db, [work1, work2])
+        batch.add_work_coverage_record(
+            work1, WorkCoverageRecord.QUALITY_OPERATION
+        )
+        batch.add_work_coverage_record(
+            work2, WorkCoverageRecord.QUALITY_OPERATION
+        )
+        batch.add_work_coverage_record(
+            work2, WorkCoverageRecord.CLASSIFY_OPERATION
+        )
+        batch.write_coverage_records()
+
+        records = self._db.query(WorkCoverageRecord).filter(
+            WorkCoverageRecord.work_id.in_([work1.id, work2.id])
+        ).filter(
+            WorkCoverageRecord.operation.in_([
+                WorkCoverageRecord.QUALITY_OPERATION,
+                WorkCoverageRecord.CLASSIFY_OPERATION,
+            ])
+        )
+        assert (
+            sorted([
+                (work1.id, WorkCoverageRecord.QUALITY_OPERATION),
+                (work2.id, WorkCoverageRecord.CLASSIFY_OPERATION),
+                (work2.id, WorkCoverageRecord.QUALITY_OPERATION),
+            ]) ==
+            sorted((x.work_id, x.operation) for x in records)
+        )
+
+
 class TestWorkConsolidation(DatabaseTest):
 
     def test_calculate_work_success(self):
@@ -1,4 +1,6 @@
+import numpy
 import pytest
+from mock import MagicMock
 from parameterized import parameterized
 
 from ...python_expression_dsl.evaluator import (
@@ -193,3 +195,172 @@ class TestDSLEvaluator(object):
 
             # Assert
             assert expected_result == result
+
+    def test_expression_is_parsed_once(self):
+        # Arrange
+        parser = DSLParser()
+        parser.parse = MagicMock(side_effect=parser.parse)
+        evaluator = DSLEvaluator(parser, DSLEvaluationVisitor())
+
+        # Act
+        results = [
+            evaluator.evaluate("foo * 2", {"foo": foo}, []) for foo in range(3)
+        ]
+
+        # Assert
+        assert [0, 2, 4] == results
+        parser.parse.assert_called_once_with("foo * 2")
+
+    def test_cache_is_bounded(self):
+        # Arrange
+        parser = DSLParser()
+        parser.parse = MagicMock(side_effect=parser.parse)
+        evaluator = DSLEvaluator(parser, DSLEvaluationVisitor())
+        evaluator.CACHE_SIZE = 2
+
+        # Act
+        evaluator.evaluate("1", None, [])
+        evaluator.evaluate("2", None, [])
+        evaluator.evaluate("1", None, [])
+        evaluator.evaluate("3", None, [])
+        evaluator.evaluate("1", None, [])
+        evaluator.evaluate("2", None, [])
+
+        # Assert
+        # "2" was the least recently used expression when "3" was added,
+        # so it had to be parsed again.
+        assert ["1", "2", "3", "2"] == [
+            args[0] for args, _ in parser.parse.call_args_list
+        ]
+
+    def test_incorrect_expression_is_not_cached(self):
+        # Arrange
+        parser = DSLParser()
+        parser.parse = MagicMock(side_effect=parser.parse)
+        evaluator = DSLEvaluator(parser, DSLEvaluationVisitor())
+
+        # Act
+        for _ in range(2):
+            with pytest.raises(DSLParseError):
+                evaluator.evaluate("?", None, [])
+
+        # Assert
+        assert 2 == parser.parse.call_count
+
+    @parameterized.expand(
+        [
+            ("nested_identifier", "foo.bar.baz", {"foo": {"bar": {"baz": 9}}}),
+            ("slice_in_scope", "foo.bar[0].baz", {"foo": {"bar": [{"baz": 9}]}}),
+            # The right argument is looked up in the scope left behind by foo.bar.
+            ("comparison_in_scope", "foo.bar.baz == baz", {"foo": {"bar": {"baz": {"baz": 1}}}}),
+            ("builtin_function", "max(foo, 3) + abs(-2)", {"foo": 9}),
+            ("boolean", "not foo < 3 and foo != 4 or foo in list", {"foo": 9, "list": [9]}),
+            ("method_call", "string.upper()", {"string": "Hello World"}),
+        ]
+    )
+    def test_compiled_expression_matches_interpreted_expression(
+        self, _, expression, context
+    ):
+        # Arrange
+        parser = DSLParser()
+        visitor = DSLEvaluationVisitor(context, [])
+        evaluator = DSLEvaluator(parser, DSLEvaluationVisitor())
+
+        # Act
+        interpreted_result = visitor.visit(parser.parse(expression))
+        compiled_result = evaluator.evaluate(expression, context, [])
+
+        # Assert
+        assert interpreted_result == compiled_result
+
+    @parameterized.expand(
+        [
+            ("constant", "9 * 3"),
+            ("arithmetic", "-(a + b) * c / 2 - a"),
+            ("boolean_arithmetic", "(a > b) + (a > c)"),
+            ("comparison", "a * 2 >= b + c"),
+            ("boolean", "not a < 3 and b != 4 or c == 10"),
+            ("bitwise_integers", "a and b or a"),
+            ("bitwise_float", "a and b or c", TypeError),
+            ("float_conjunction", "a / 2 and b", TypeError),
+            ("builtin_function", "max(a, b) - min(b, c) > 2"),
+            ("exponentiation", "a ** 2 + b"),
+            ("in_operator", "a in list"),
+            ("string", "'a' + string"),
+            ("method_call", "string.upper() == 'B'"),
+            ("division_by_zero", "c / (a - a)", ZeroDivisionError),
+            ("integer_overflow", "a * 3000000000 * 3000000000 * 3000000000"),
+            ("unknown_identifier", "a + foo", DSLEvaluationError),
+        ]
+    )
+    def test_evaluate_many(self, _, expression, expected_exception=None):
+        # Arrange
+        evaluator = DSLEvaluator(DSLParser(), DSLEvaluationVisitor())
+        contexts = [
+            {"a": a, "b": b, "c": c, "list": [1, 2], "string": string}
+            for a, b, c, string in [
+                (1, 2, 3, "a"),
+                (4, -5, 6.5, "b"),
+                (7, 8, 10, "c"),
+                (True, 0, False, "d"),
+            ]
+        ]
+        columns = dict((key, [context[key] for context in contexts]) for key in "abc")
+        columns["list"] = [[1, 2]] * len(contexts)
+        columns["string"] = numpy.array([context["string"] for context in contexts])
+
+        # Act
+        if expected_exception:
+            with pytest.raises(expected_exception):
+                evaluator.evaluate_many(expression, contexts, [])
+            with pytest.raises(expected_exception):
+                evaluator.evaluate_many(expression, columns, [])
+        else:
+            expected_results = [
+                evaluator.evaluate(expression, context, []) for context in contexts
+            ]
+
+            # Assert
+            for results in (
+                evaluator.evaluate_many(expression, contexts, []),
+                evaluator.evaluate_many(expression, columns, []),
+            ):
+                assert expected_results == results
+                assert [type(result) for result in expected_results] == [
+                    type(result) for result in results
+                ]
+
+    def test_evaluate_many_uses_numpy(self):
+        # Arrange
+        evaluator = DSLEvaluator(DSLParser(), DSLEvaluationVisitor())
+        columns = {"a": numpy.arange(1000), "b": numpy.arange(1000) % 7}
+        vectorizer = evaluator._vectorizer
+        vectorizer._compilation_visitor = MagicMock(
+            wraps=vectorizer._compilation_visitor
+        )
+
+        # Act
+        results = evaluator.evaluate_many("a * 2 > b + 500 and not b == 3", columns)
+
+        # Assert
+        assert [
+            (a * 2 > a % 7 + 500) & (not a % 7 == 3) for a in range(1000)
+        ] == results
+        # Nothing had to be evaluated one context at a time.
+        assert [] == vectorizer._compilation_visitor.compile.call_args_list
+
+    def test_evaluate_many_with_no_contexts(self):
+        # Arrange
+        evaluator = DSLEvaluator(DSLParser(), DSLEvaluationVisitor())
+
+        # Act, Assert
+        assert [] == evaluator.evaluate_many("a + 1", [])
+        assert [] == evaluator.evaluate_many("a + 1", {"a": []})
+
+    def test_evaluate_many_with_columns_of_different_lengths(self):
+        # Arrange
+        evaluator = DSLEvaluator(DSLParser(), DSLEvaluationVisitor())
+
+        # Act, Assert
+        with pytest.raises(ValueError):
+            evaluator.evaluate_many("a + b", {"a": [1, 2], "b": [1]})
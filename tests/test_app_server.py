@@ -34,6 +34,7 @@ from ..app_server import (
     URNLookupHandler,
     ErrorHandler,
     ComplaintController,
+    RequestTimingHandler,
     compressible,
     load_facets_from_request,
     load_pagination_from_request,
@@ -59,6 +60,11 @@ from ..util.opds_writer import (
     OPDSMessage,
 )
 
+from ..util.request_timing import (
+    RequestTimer,
+    timed,
+)
+
 
 class TestHeartbeatController(object):
 
@@ -178,6 +184,49 @@ class TestURNLookupHandler(DatabaseTest):
         assert ([(work.presentation_edition.primary_identifier, work)] ==
             self.handler.works)
 
+    def test_load_works(self):
+        works = [self._work(with_license_pool=True) for i in range(3)]
+        identifiers = [
+            work.license_pools[0].identifier for work in works
+        ] + [self._identifier()]
+        urns = [identifier.urn for identifier in identifiers]
+        self._db.flush()
+        self._db.expunge_all()
+
+        # process_urns() loads everything it needs to know about the
+        # Identifiers' Works up front.
+        loaded = []
+        class Mock(URNLookupHandler):
+            def load_works(self, identifiers):
+                super(Mock, self).load_works(identifiers)
+                loaded.extend(identifiers)
+        handler = Mock(self._db)
+        timer = RequestTimer.start()
+        handler.process_urns(urns)
+        RequestTimer.stop()
+        assert set(urns) == set(identifier.urn for identifier in loaded)
+
+        # One query parsed the URNs and one loaded the Works, no
+        # matter how many URNs there were.
+        assert 2 == timer.counts[RequestTimer.DATABASE]
+        assert (set(work.id for work in works) ==
+                set(work.id for identifier, work in handler.works))
+        [message] = handler.precomposed_entries
+        assert identifiers[-1].urn == message.urn
+
+        # Nothing else needs to be loaded to turn the Works into OPDS
+        # entries.
+        timer = RequestTimer.start()
+        for identifier, work in handler.works:
+            identifier.licensed_through[0].presentation_edition.title
+            work.presentation_edition.title
+            work.simple_opds_entry
+        RequestTimer.stop()
+        assert 0 == timer.counts.get(RequestTimer.DATABASE, 0)
+
+        # An Identifier that's not in the database yet is ignored.
+        handler.load_works([Identifier()])
+
 class TestURNLookupController(DatabaseTest):
 
     def setup_method(self):
@@ -581,3 +630,115 @@ class TestCompressibleAnnotator(object):
         response = ask_for_compression("gzip", "Accept-Transfer-Encoding")
         assert value == response.data
         assert 'Content-Encoding' not in response.headers
+
+        # The time spent compressing a response is recorded if the
+        # request is being timed.
+        timer = RequestTimer.start()
+        try:
+            ask_for_compression("gzip")
+            ask_for_compression(None)
+            assert {RequestTimer.GZIP: 1} == timer.counts
+        finally:
+            RequestTimer.stop()
+
+    def test_compressible_streamed_response(self):
+        # A streamed response is compressed a piece at a time.
+        pieces = ["Compress me! ", "(Or not.)"]
+
+        @compressible
+        def function():
+            return flask.Response(x for x in pieces)
+
+        with self.app.test_request_context(
+            headers={"Accept-Encoding": "gzip"}
+        ):
+            response = function()
+            self.app.process_response(response)
+            assert response.is_streamed
+            assert "gzip" == response.headers['Content-Encoding']
+            assert 'Content-Length' not in response.headers
+
+            # Each piece of the input produced some output, so the
+            # client can start decompressing before it's all been
+            # sent.
+            compressed = list(response.response)
+            assert len(compressed) == len(pieces) + 1
+            assert all(compressed[:-1])
+            data = b"".join(compressed)
+
+        uncompressed = gzip.GzipFile(fileobj=BytesIO(data)).read()
+        assert "".join(pieces) == uncompressed
+
+
+class TestRequestTimingHandler(object):
+
+    def setup_method(self):
+        self.app = Flask(__name__)
+
+        @self.app.route('/feed')
+        def feed():
+            with timed(RequestTimer.SEARCH):
+                pass
+            return "a feed"
+
+        self.logged = []
+        self.handler = RequestTimingHandler(self.app)
+        self.handler.log = self.mock_log()
+
+    def mock_log(self):
+        logged = self.logged
+        class MockLog(object):
+            def info(self, *args, **kwargs):
+                logged.append(("info", args, kwargs))
+            def warn(self, *args, **kwargs):
+                logged.append(("warn", args, kwargs))
+        return MockLog()
+
+    def test_timing(self):
+        response = self.app.test_client().get('/feed')
+        assert 200 == response.status_code
+        header = response.headers['Server-Timing']
+        assert header.startswith(
+            'search;dur=0.0;desc="Elasticsearch requests (1)", total;dur='
+        )
+
+        # The timing information was logged as structured data.
+        [(level, args, kwargs)] = self.logged
+        assert "info" == level
+        assert ("GET", "/feed", 200) == args[1:4]
+        data = kwargs['extra']['json_data']
+        assert "/feed" == data['path']
+        assert 200 == data['status']
+        assert 1 == data['timing'][RequestTimer.SEARCH]['count']
+
+        # The timer was stopped at the end of the request.
+        assert None == RequestTimer.current()
+
+    def test_slow_request_threshold(self):
+        # With a threshold in place, only slow requests are logged.
+        self.handler.slow_request_threshold = 60
+        response = self.app.test_client().get('/feed')
+        assert 'Server-Timing' in response.headers
+        assert [] == self.logged
+
+        self.handler.slow_request_threshold = 0
+        self.app.test_client().get('/feed')
+        [(level, args, kwargs)] = self.logged
+        assert "warn" == level
+
+    def test_threshold_from_configuration(self):
+        variable = Configuration.SLOW_REQUEST_THRESHOLD_ENVIRONMENT_VARIABLE
+        old_value = os.environ.get(variable)
+        try:
+            os.environ[variable] = "1500"
+            handler = RequestTimingHandler(Flask(__name__))
+            assert 1.5 == handler.slow_request_threshold
+
+            # An explicit threshold takes precedence.
+            handler = RequestTimingHandler(Flask(__name__), 2)
+            assert 2 == handler.slow_request_threshold
+        finally:
+            if old_value is None:
+                os.environ.pop(variable, None)
+            else:
+                os.environ[variable] = old_value
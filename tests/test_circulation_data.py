@@ -27,6 +27,7 @@ from ..model import (
     Subject,
 )
 from ..model.configuration import ExternalIntegrationLink
+from ..mock_analytics_provider import MockAnalyticsProvider
 
 from ..testing import (
     DatabaseTest,
@@ -604,6 +605,56 @@ class TestCirculationData(DatabaseTest):
         assert False == pool.open_access
         assert 1 == len(pool.delivery_mechanisms)
 
+    def test_bulk_apply(self):
+        # CirculationData.bulk_apply() leaves the database in the same
+        # state as calling CirculationData.apply() on each object in
+        # turn.
+        collection = self._default_collection
+        last_checked = datetime.datetime(2019, 1, 1)
+
+        def circulation(prefix, number):
+            return CirculationData(
+                DataSource.GUTENBERG,
+                IdentifierData(Identifier.GUTENBERG_ID,
+                               u"%s%d" % (prefix, number)),
+                licenses_owned=number, licenses_available=number,
+                formats=[FormatData(
+                    Representation.EPUB_MEDIA_TYPE, DeliveryMechanism.NO_DRM,
+                    rights_uri=RightsStatus.IN_COPYRIGHT
+                )],
+                last_checked=last_checked,
+            )
+
+        results = {}
+        for prefix in (u"a", u"b"):
+            # One book already has a LicensePool.
+            circulation(prefix, 1).apply(self._db, collection)
+
+            analytics = MockAnalyticsProvider()
+            policy = ReplacementPolicy(analytics=analytics)
+            circulations = [circulation(prefix, number) for number in (1, 2)]
+            if prefix == u"a":
+                applied = [
+                    x.apply(self._db, collection, policy)
+                    for x in circulations
+                ]
+            else:
+                applied = CirculationData.bulk_apply(
+                    self._db, circulations, collection, policy
+                )
+            results[prefix] = (analytics.count, [
+                (changed, pool.licenses_owned, pool.licenses_available,
+                 pool.last_checked, pool.availability_time, pool.open_access,
+                 [x.delivery_mechanism.content_type
+                  for x in pool.delivery_mechanisms])
+                for pool, changed in applied
+            ])
+
+        assert results[u"a"] == results[u"b"]
+
+        count, pools = results[u"b"]
+        assert [1, 2] == [x[1] for x in pools]
+
 
 class TestMetaToModelUtility(DatabaseTest):
 
@@ -1,9 +1,13 @@
 import os
+import pytest
 from sqlalchemy.orm.session import Session
 
 from ..testing import DatabaseTest
 
-from ..config import Configuration as BaseConfiguration
+from ..config import (
+    CannotLoadConfiguration,
+    Configuration as BaseConfiguration,
+)
 from ..model import (
     ConfigurationSetting,
     ExternalIntegration,
@@ -102,3 +106,93 @@ class TestConfiguration(DatabaseTest):
         assert new_db != self._db
         assert isinstance(new_db, Session)
         assert None == none
+
+    def test_database_pool_settings(self):
+        C = self.Conf
+        variables = [
+            C.DATABASE_POOL_SIZE_ENVIRONMENT_VARIABLE,
+            C.DATABASE_MAX_OVERFLOW_ENVIRONMENT_VARIABLE,
+            C.DATABASE_POOL_PRE_PING_ENVIRONMENT_VARIABLE,
+            C.DATABASE_POOL_RECYCLE_ENVIRONMENT_VARIABLE,
+            C.DATABASE_STATEMENT_TIMEOUT_ENVIRONMENT_VARIABLE,
+            C.DATABASE_DISABLE_POOL_ENVIRONMENT_VARIABLE,
+        ]
+        old_values = dict((x, os.environ.get(x)) for x in variables)
+        try:
+            for variable in variables:
+                os.environ.pop(variable, None)
+
+            # With no environment variables set, every setting is None.
+            settings = C.database_pool_settings()
+            assert set(settings.values()) == set([None])
+
+            os.environ[C.DATABASE_POOL_SIZE_ENVIRONMENT_VARIABLE] = "20"
+            os.environ[C.DATABASE_MAX_OVERFLOW_ENVIRONMENT_VARIABLE] = "0"
+            os.environ[C.DATABASE_POOL_PRE_PING_ENVIRONMENT_VARIABLE] = "true"
+            os.environ[C.DATABASE_POOL_RECYCLE_ENVIRONMENT_VARIABLE] = "3600"
+            os.environ[C.DATABASE_STATEMENT_TIMEOUT_ENVIRONMENT_VARIABLE] = "30000"
+            os.environ[C.DATABASE_DISABLE_POOL_ENVIRONMENT_VARIABLE] = "no"
+            assert dict(
+                pool_size=20, max_overflow=0, pool_pre_ping=True,
+                pool_recycle=3600, statement_timeout=30000,
+                disable_pool=False
+            ) == C.database_pool_settings()
+
+            # A value that should be an integer but isn't is an error.
+            os.environ[C.DATABASE_POOL_SIZE_ENVIRONMENT_VARIABLE] = "many"
+            with pytest.raises(CannotLoadConfiguration) as excinfo:
+                C.database_pool_settings()
+            assert (
+                "Environment variable SIMPLIFIED_DATABASE_POOL_SIZE must be an integer"
+                in str(excinfo.value)
+            )
+        finally:
+            for variable, value in old_values.items():
+                if value is None:
+                    os.environ.pop(variable, None)
+                else:
+                    os.environ[variable] = value
+
+    def test_slow_request_threshold(self):
+        variable = self.Conf.SLOW_REQUEST_THRESHOLD_ENVIRONMENT_VARIABLE
+        old_value = os.environ.get(variable)
+        try:
+            os.environ.pop(variable, None)
+            assert None == self.Conf.slow_request_threshold()
+
+            # The environment variable is in milliseconds.
+            os.environ[variable] = "250"
+            assert 0.25 == self.Conf.slow_request_threshold()
+        finally:
+            if old_value is None:
+                os.environ.pop(variable, None)
+            else:
+                os.environ[variable] = old_value
+
+    def test_database_replica_settings(self):
+        C = self.Conf
+        variables = [
+            C.DATABASE_TEST_REPLICAS_ENVIRONMENT_VARIABLE,
+            C.DATABASE_REPLICA_MAX_LAG_ENVIRONMENT_VARIABLE,
+        ]
+        old_values = dict((x, os.environ.get(x)) for x in variables)
+        try:
+            for variable in variables:
+                os.environ.pop(variable, None)
+            assert dict(urls=[], max_lag=None) == C.database_replica_settings()
+
+            # We're running tests, so the test replicas are used.
+            os.environ[C.DATABASE_TEST_REPLICAS_ENVIRONMENT_VARIABLE] = (
+                "postgres://replica1/db, postgres://replica2/db,"
+            )
+            os.environ[C.DATABASE_REPLICA_MAX_LAG_ENVIRONMENT_VARIABLE] = "5"
+            assert dict(
+                urls=["postgres://replica1/db", "postgres://replica2/db"],
+                max_lag=5
+            ) == C.database_replica_settings()
+        finally:
+            for variable, value in old_values.items():
+                if value is None:
+                    os.environ.pop(variable, None)
+                else:
+                    os.environ[variable] = value
@@ -2189,6 +2189,32 @@ class TestWorkPresentationEditionCoverageProvider(DatabaseTest):
              policy.calculate_quality]
         )
 
+    def test_process_batch(self):
+        # A whole batch of works is handled with one call to
+        # Work.bulk_calculate_presentation.
+        work1 = self._work(with_license_pool=True)
+        work2 = self._work(with_license_pool=True)
+        for work in (work1, work2):
+            work.presentation_edition.title = u"New title"
+            work.presentation_edition.sort_title = None
+        provider = WorkPresentationEditionCoverageProvider(self._db)
+        assert [work1, work2] == provider.process_batch([work1, work2])
+
+        # Each work's presentation was recalculated.
+        for work in (work1, work2):
+            assert u"New title" == work.sort_title
+
+        # The WorkCoverageRecords that calculate_presentation would
+        # have written one at a time were written for the whole batch.
+        for work in (work1, work2):
+            record = self._db.query(WorkCoverageRecord).filter(
+                WorkCoverageRecord.work==work
+            ).filter(
+                WorkCoverageRecord.operation==
+                WorkCoverageRecord.CHOOSE_EDITION_OPERATION
+            ).one()
+            assert WorkCoverageRecord.SUCCESS == record.status
+
 
 class TestWorkClassificationCoverageProvider(DatabaseTest):
 
@@ -17,6 +17,7 @@ from elasticsearch_dsl.function import (
     ScriptScore,
     RandomScore,
 )
+from elasticsearch_dsl.response import Hit
 from elasticsearch_dsl.query import (
     Bool,
     DisMax,
@@ -54,6 +55,7 @@ from ..model import (
     Contribution,
     Contributor,
     DataSource,
+    DeliverableWork,
     Edition,
     ExternalIntegration,
     Genre,
@@ -72,6 +74,7 @@ from ..external_search import (
     QueryParser,
     SearchBase,
     SearchIndexCoverageProvider,
+    SearchResultCache,
     SortKeyPagination,
     WorkSearchResult,
     mock_search_index,
@@ -3664,6 +3667,68 @@ class TestFilter(DatabaseTest):
         built_filters, subfilters = self.assert_filter_builds_to([{'term': {'fiction': 'nonfiction'}}], filter)
         assert {} == subfilters
 
+    def test_build_cache(self):
+        # build() remembers what it built for a given set of inputs.
+        Filter.reset_cache()
+        filter = Filter(
+            media=[Edition.BOOK_MEDIUM], languages=["eng"],
+            genre_restriction_sets=[[self.literary_fiction]],
+            collections=[self._default_collection]
+        )
+        key = filter.cache_key
+        assert key not in Filter._built_filters
+        built, nested = filter.build()
+        assert key in Filter._built_filters
+
+        # An identical Filter gets the same result without building
+        # anything.
+        def explode(*args, **kwargs):
+            raise Exception("Should not be called.")
+        identical = Filter(
+            media=[Edition.BOOK_MEDIUM], languages=["eng"],
+            genre_restriction_sets=[[self.literary_fiction]],
+            collections=[self._default_collection]
+        )
+        identical._build = explode
+        assert key == identical.cache_key
+        built2, nested2 = identical.build()
+        assert built.to_dict() == built2.to_dict()
+        assert (
+            dict((k, [x.to_dict() for x in v]) for k, v in nested.items()) ==
+            dict((k, [x.to_dict() for x in v]) for k, v in nested2.items()))
+
+        # Changing what we got back doesn't change what's in the cache.
+        nested2['licensepools'].append("junk")
+        nested2['new'].append("junk")
+        built2.must.append("junk")
+        built3, nested3 = identical.build()
+        assert built.to_dict() == built3.to_dict()
+        assert ['genres', 'licensepools'] == sorted(nested3.keys())
+        assert 1 == len(nested3['licensepools'])
+
+        # Changing a Filter after it's created changes its key.
+        identical.languages = ["spa"]
+        assert key != identical.cache_key
+
+        # Filters that are specific to one request aren't cached, and
+        # neither are filters built with a mock _chain_filters.
+        assert None == Filter(match_nothing=True).cache_key
+        assert None == Filter(
+            identifiers=[self._identifier()]
+        ).cache_key
+        assert None == Filter(
+            author=ContributorData(sort_name=u"Author")
+        ).cache_key
+        Filter.reset_cache()
+        filter.build(_chain_filters=Filter._chain_filters)
+        assert {} == dict(Filter._built_filters)
+
+        # Filters are forgotten when lane configuration changes.
+        filter.build()
+        assert 1 == len(Filter._built_filters)
+        self._lane()
+        assert 0 == len(Filter._built_filters)
+
     def test_build_series(self):
         # Test what happens when a series restriction is placed on a Filter.
         f = Filter(series="Talking Hedgehog Mysteries")
@@ -4150,6 +4215,158 @@ class TestFilter(DatabaseTest):
         return filters
 
 
+class TestSearchResultCache(DatabaseTest):
+
+    def hit(self, work_id, sort=None):
+        document = dict(_id=unicode(work_id), _source=dict(work_id=work_id))
+        if sort is not None:
+            document['sort'] = sort
+        return Hit(document)
+
+    def test_key(self):
+        key = SearchResultCache.key
+        pagination = Pagination(offset=0, size=10)
+        filter = Filter(media=[Edition.BOOK_MEDIUM])
+
+        base = key("index", "  moby   dick ", filter, pagination)
+        index, query_string, filter_key, pagination_class, page = base
+        assert "index" == index
+
+        # Whitespace in the query string is normalized.
+        assert "moby dick" == query_string
+        assert base == key("index", "moby dick", filter, pagination)
+
+        # The filter is summarized by its cache key plus the values
+        # that control the sort order.
+        assert (filter.cache_key, None, False, None) == filter_key
+        assert "Pagination" == pagination_class
+        assert pagination.query_string == page
+
+        # Anything that could change the results changes the key.
+        assert base != key("index2", "moby dick", filter, pagination)
+        assert base != key("index", "moby duck", filter, pagination)
+        assert base != key(
+            "index", "moby dick", Filter(media=[Edition.AUDIO_MEDIUM]),
+            pagination
+        )
+        assert base != key(
+            "index", "moby dick", filter, pagination.next_page
+        )
+        sorted_filter = Filter(media=[Edition.BOOK_MEDIUM])
+        sorted_filter.order = ['sort_author']
+        assert base != key("index", "moby dick", sorted_filter, pagination)
+        sort_key = SortKeyPagination(size=10)
+        assert base != key("index", "moby dick", filter, sort_key)
+
+        # A search with no query string or filter can be cached.
+        assert ("index", None, None, "Pagination", pagination.query_string) == (
+            key("index", None, None, pagination))
+
+        # Searches whose results need more than IDs and sort keys can't
+        # be cached.
+        for uncacheable in (
+            Filter(match_nothing=True),
+            Filter(script_fields=dict(last_update=dict())),
+            Filter(author=ContributorData(sort_name=u"Author")),
+        ):
+            assert None == key("index", "moby dick", uncacheable, pagination)
+        scored = Filter()
+        scored.scoring_functions = [RandomScore(seed=1)]
+        assert None == key("index", "moby dick", scored, pagination)
+
+    def test_get_and_put(self):
+        cache = SearchResultCache(60, max_length=10)
+        assert 60 == cache.results.max_age
+        assert 10 == cache.results.max_len
+        assert None == cache.hit_rate
+
+        assert None == cache.get("key")
+        assert 0 == cache.hit_rate
+
+        cache.put("key", [self.hit(1, [u"Author", 1]), self.hit(2)])
+        hit1, hit2 = cache.get("key")
+        assert 0.5 == cache.hit_rate
+
+        # Only IDs and sort keys are remembered.
+        assert 1 == hit1.work_id
+        assert u"1" == hit1.meta.id
+        assert [u"Author", 1] == hit1.meta.sort
+        assert 2 == hit2.work_id
+        assert not hasattr(hit2.meta, 'sort')
+
+        cache.clear()
+        assert None == cache.get("key")
+
+    def test_query_works(self):
+        class Mock(ExternalSearchIndex):
+            def __init__(self):
+                self.works_alias = "works-current"
+                self.calls = []
+                self.result_cache = SearchResultCache(60)
+
+            def query_works_multi(self, queries, debug=False):
+                self.calls.append((queries, debug))
+                [(query_string, filter, pagination)] = queries
+                results = [hit(5, [u"Author", 5])]
+                pagination.page_loaded(results)
+                yield results
+        hit = self.hit
+        search = Mock()
+        filter = Filter(languages=["eng"])
+
+        # The first time a search is run, it goes to Elasticsearch.
+        pagination = SortKeyPagination(size=1)
+        [result] = search.query_works("query", filter, pagination)
+        assert 5 == result.work_id
+        assert 1 == len(search.calls)
+        assert 0 == search.result_cache.hit_rate
+
+        # The second time, the results come from the cache, and the
+        # Pagination object still learns how to find the next page.
+        pagination = SortKeyPagination(size=1)
+        [result] = search.query_works("query", filter, pagination)
+        assert 5 == result.work_id
+        assert 1 == len(search.calls)
+        assert 0.5 == search.result_cache.hit_rate
+        assert [u"Author", 5] == pagination.next_page.last_item_on_previous_page
+
+        # Debugging searches always go to Elasticsearch.
+        search.query_works("query", filter, pagination, debug=True)
+        assert 2 == len(search.calls)
+
+        # So do searches that can't be cached.
+        search.query_works("query", Filter(script_fields=dict(x=1)))
+        assert 3 == len(search.calls)
+
+        # Without a cache, every search goes to Elasticsearch.
+        search.result_cache = None
+        search.query_works("query", filter, pagination)
+        assert 4 == len(search.calls)
+
+    def test_constructor(self):
+        # The cache lifetime is configured on the search integration.
+        integration = self._external_integration(
+            ExternalIntegration.ELASTICSEARCH,
+            goal=ExternalIntegration.SEARCH_GOAL,
+            url=u"http://search/",
+            settings={
+                ExternalSearchIndex.WORKS_INDEX_PREFIX_KEY: u"prefix",
+            }
+        )
+        index = ExternalSearchIndex(self._db, in_testing=True)
+        assert None == index.result_cache
+
+        integration.setting(ExternalSearchIndex.RESULT_CACHE_TTL_KEY).value = 30
+        index = ExternalSearchIndex(self._db, in_testing=True)
+        assert 30 == index.result_cache.ttl
+
+        # It can also be set directly.
+        index = ExternalSearchIndex(
+            self._db, in_testing=True, result_cache_ttl=5
+        )
+        assert 5 == index.result_cache.ttl
+
+
 class TestSortKeyPagination(DatabaseTest):
     """Test the Elasticsearch-implementation of Pagination that does
     pagination by tracking the last item on the previous page,
@@ -4497,6 +4714,30 @@ class TestSearchIndexCoverageProvider(DatabaseTest):
         # The work was added to the search index.
         assert 1 == len(index.docs)
 
+    def test_deliverable_works_refreshed(self):
+        # Reindexing a batch of works also brings their rows in the
+        # DeliverableWork table up to date.
+        work = self._work(with_license_pool=True)
+        work.set_presentation_ready()
+        [pool] = work.license_pools
+        provider = SearchIndexCoverageProvider(
+            self._db, search_index_client=MockExternalSearchIndex()
+        )
+        provider.process_batch([work])
+        [row] = self._db.query(DeliverableWork).all()
+        assert work.id == row.work_id
+        assert pool.id == row.license_pool_id
+
+        # This happens even if the search index can't be updated.
+        work.presentation_ready = False
+        provider.search_index_client.bulk = lambda docs, **kwargs: (
+            0, [dict(data=dict(_id=doc['_id']), error="Error!")
+                for doc in docs]
+        )
+        self._db.flush()
+        [failure] = provider.process_batch([work])
+        assert [] == self._db.query(DeliverableWork).all()
+
     def test_failure(self):
         class DoomedExternalSearchIndex(MockExternalSearchIndex):
             """All documents sent to this index will fail."""
@@ -48,6 +48,8 @@ from ..lane import (
     Facets,
     FacetsWithEntryPoint,
     FeaturedFacets,
+    KeysetPagination,
+    LaneTree,
     Pagination,
     SearchFacets,
     TopLevelWorkList,
@@ -62,6 +64,7 @@ from ..model import (
     CachedFeed,
     CustomListEntry,
     DataSource,
+    DeliverableWork,
     Edition,
     Genre,
     Identifier,
@@ -97,6 +100,27 @@ class TestFacetsWithEntryPoint(DatabaseTest):
         ]
         assert expect_items == list(f.items())
 
+    def test_cache_key(self):
+        ep = AudiobooksEntryPoint
+        f = FacetsWithEntryPoint(ep)
+        assert f.query_string == f.cache_key
+
+        # max_age controls how the feed is cached, not what's in it,
+        # so it's left out of the cache key.
+        for max_cache_age in (0, 41, CachedFeed.IGNORE_CACHE):
+            f.max_cache_age = max_cache_age
+            assert "max_age" in f.query_string
+            assert u"entrypoint=%s" % ep.INTERNAL_NAME == f.cache_key
+
+        # The key doesn't depend on the order of the items, or on
+        # whether an item shows up twice.
+        class Mock(FacetsWithEntryPoint):
+            def items(self):
+                yield ("b", "2")
+                yield ("a", "1")
+                yield ("b", "2")
+        assert u"a=1&b=2" == Mock().cache_key
+
 
     def test_modify_database_query(self):
         class MockEntryPoint(object):
@@ -1626,6 +1650,182 @@ class TestPagination(DatabaseTest):
         o = [1,2,3,4,5,6]
         assert o[2:2+3] == pagination.modify_search_query(o)
 
+    def test_cache_key(self):
+        # The default page size is left out of the key, but the
+        # offset is always present.
+        assert u"after=0" == Pagination.default().cache_key
+        assert u"after=0" == Pagination.from_request(
+            dict(size=str(Pagination.DEFAULT_SIZE)).get
+        ).cache_key
+        assert u"after=10&size=20" == Pagination(10, 20).cache_key
+
+        # Keyset pagination has no offset, so its first page with the
+        # default size gets an empty key.
+        assert u"" == KeysetPagination().cache_key
+        key = json.dumps([u"Title", 5])
+        assert u"key=%s&size=2" % key == KeysetPagination(
+            [u"Title", 5], 2
+        ).cache_key
+
+
+class TestKeysetPagination(DatabaseTest):
+
+    def test_from_request(self):
+        # No arguments -> Class defaults.
+        pagination = KeysetPagination.from_request({}.get, None)
+        assert isinstance(pagination, KeysetPagination)
+        assert Pagination.DEFAULT_SIZE == pagination.size
+        assert None == pagination.pagination_key
+        assert 0 == pagination.offset
+
+        # The pagination key is a JSON list of sort values.
+        key = json.dumps([u"Dickens, Charles", None, 5])
+        pagination = KeysetPagination.from_request(dict(key=key, size=4).get)
+        assert 4 == pagination.size
+        assert ([u"Dickens, Charles", None, 5] ==
+            pagination.last_item_on_previous_page)
+        assert key == pagination.pagination_key
+        assert [("key", key), ("size", 4)] == list(pagination.items())
+
+        # Invalid key -> problem detail
+        for bad_key in ("not json", json.dumps(dict(a=1))):
+            error = KeysetPagination.from_request(dict(key=bad_key).get)
+            assert INVALID_INPUT.uri == error.uri
+            assert "Invalid page key: %s" % bad_key == str(error.detail)
+
+        # Invalid size -> problem detail
+        error = KeysetPagination.from_request(dict(size="string").get)
+        assert INVALID_INPUT.uri == error.uri
+
+    def test_page_links(self):
+        pagination = KeysetPagination(size=2)
+        assert None == pagination.previous_page
+        assert None == pagination.total_size
+
+        # We can't say anything about the next page until a page
+        # has been loaded.
+        assert None == pagination.next_page
+
+        # There's no next page after an empty page.
+        pagination.page_loaded([])
+        assert None == pagination.next_page
+
+        pagination.this_page_size = 2
+        pagination.last_item_on_this_page = [u"Title", 5]
+        next_page = pagination.next_page
+        assert [u"Title", 5] == next_page.last_item_on_previous_page
+        assert 2 == next_page.size
+
+        first_page = next_page.first_page
+        assert None == first_page.last_item_on_previous_page
+        assert 2 == first_page.size
+
+        with pytest.raises(NotImplementedError):
+            pagination.modify_search_query(object())
+
+    def test_modify_database_query(self):
+        # Paging through a feed with KeysetPagination finds the same
+        # works, in the same order, as OFFSET-based pagination, no
+        # matter how the feed is sorted.
+        works = []
+        authors = [u"Adams", u"Brown", None, u"Adams", u"Chen", None, u"Brown"]
+        titles = [u"Zed", u"Alpha", u"Beta", u"Zed", None, u"Gamma", u"Alpha"]
+        update_times = [datetime.datetime(2019, 1, i % 3 + 1) for i in range(7)]
+        for author, title, updated in zip(authors, titles, update_times):
+            work = self._work(with_license_pool=True)
+            work.presentation_edition.sort_author = author
+            work.presentation_edition.sort_title = title
+            work.last_update_time = updated
+            works.append(work)
+
+        wl = DatabaseBackedWorkList()
+        wl.initialize(self._default_library)
+
+        def all_pages(facets, size):
+            pagination = KeysetPagination(size=size)
+            found = []
+            while pagination:
+                page = wl.works_from_database(
+                    self._db, facets, pagination
+                ).all()
+                pagination.page_loaded(page)
+                assert len(page) <= size
+                found.extend(page)
+                # Round-trip the next page through a URL.
+                next_page = pagination.next_page
+                if next_page:
+                    next_page = KeysetPagination.from_request(
+                        dict(next_page.items()).get
+                    )
+                pagination = next_page
+            return found
+
+        for order in DatabaseBackedFacets.ORDER_FACET_TO_DATABASE_FIELD:
+            for ascending in (True, False):
+                facets = DatabaseBackedFacets(
+                    self._default_library,
+                    collection=Facets.COLLECTION_FULL,
+                    availability=Facets.AVAILABLE_ALL,
+                    order=order, order_ascending=ascending,
+                )
+                expect = wl.works_from_database(self._db, facets).all()
+                assert 7 == len(expect)
+                for size in (1, 2, 3, 7, 10):
+                    assert expect == all_pages(facets, size)
+
+        # Without facets, the works are sorted by ID.
+        expect = sorted(works, key=lambda x: x.id)
+        assert expect == all_pages(None, 3)
+
+        # A pagination key that doesn't match the sort order is
+        # ignored.
+        for key in ([u"Adams"], [expect[0].id, 1], [True]):
+            pagination = KeysetPagination(key, size=3)
+            assert (expect[:3] ==
+                wl.works_from_database(self._db, None, pagination).all())
+
+        # A query can't be paginated if it's sorted on a field we
+        # can't find on a Work.
+        qu = self._db.query(Work).join(Work.license_pools).order_by(
+            LicensePool.id
+        )
+        with pytest.raises(ValueError) as excinfo:
+            KeysetPagination().modify_database_query(self._db, qu)
+        assert "Cannot paginate a query ordered by" in str(excinfo.value)
+
+    def test_sort_value(self):
+        work = self._work()
+        work.presentation_edition.sort_title = u"The Title"
+        work.last_update_time = datetime.datetime(2019, 1, 2, 3, 4, 5, 6)
+        m = KeysetPagination.sort_value
+        assert u"The Title" == m(work, Edition.sort_title.property.columns[0])
+        assert work.id == m(work, Work.id.property.columns[0])
+
+        # Datetimes are converted to strings so they can go into a
+        # pagination key.
+        assert ("2019-01-02T03:04:05.000006" ==
+            m(work, Work.last_update_time.property.columns[0]))
+
+    def test_sort_values(self):
+        # Values from a pagination key are converted back into values
+        # that can be compared against the sort fields.
+        pagination = KeysetPagination()
+        pagination.sort_fields = [
+            (Work.last_update_time.property.columns[0], True),
+            (Edition.sort_title.property.columns[0], False),
+            (Work.id.property.columns[0], False),
+        ]
+        m = pagination.sort_values
+        assert ([datetime.datetime(2019, 1, 2, 3, 4, 5, 6), None, 5] ==
+            m(["2019-01-02T03:04:05.000006", None, "5"]))
+
+        # If the key doesn't fit the sort fields, None is returned.
+        assert None == m([None, None])
+        assert None == m(["not a date", u"Title", 5])
+        assert None == m([None, 4, 5])
+        assert None == m([None, u"Title", u"five"])
+        assert None == m([None, u"Title", True])
+
 
 class MockWork(object):
     """Acts enough like a Work to trick code that doesn't need to make
@@ -2418,9 +2618,10 @@ class TestDatabaseBackedWorkList(DatabaseTest):
             # This is a lot of instrumentation but it means we can
             # test what happened inside works() mainly by looking at a
             # string of method names in the result object.
-            def __init__(self, clauses, distinct=False):
+            def __init__(self, clauses, distinct=False, options=None):
                 self.clauses = clauses
                 self._distinct = distinct
+                self.options = options or {}
 
             def filter(self, clause):
                 # Create a new MockQuery object with a new clause
@@ -2429,6 +2630,9 @@ class TestDatabaseBackedWorkList(DatabaseTest):
             def distinct(self, fields):
                 return MockQuery(self.clauses, fields)
 
+            def execution_options(self, **kwargs):
+                return MockQuery(self.clauses, self._distinct, kwargs)
+
             def __repr__(self):
                 return "<MockQuery %d clauses, most recent %s>" % (
                     len(self.clauses), self.clauses[-1]
@@ -2527,6 +2731,9 @@ class TestDatabaseBackedWorkList(DatabaseTest):
         # Work.id.
         assert Work.id == result._distinct
 
+        # The query was marked as safe to run on a read replica.
+        assert dict(read_from_replica=True) == result.options
+
         # Now we're going to do a more complicated test, with
         # faceting, pagination, and a bibliographic_filter_clauses that
         # actually does something.
@@ -2688,6 +2895,132 @@ class TestDatabaseBackedWorkList(DatabaseTest):
         facets.availability = Facets.AVAILABLE_OPEN_ACCESS
         assert 0 == wl.works_from_database(self._db, facets).count()
 
+    def test_works_from_database_deliverable_works(self):
+        # When USE_DELIVERABLE_WORKS is set, works_from_database()
+        # finds the same works as usual, but by querying the
+        # DeliverableWork table instead of LicensePool and Edition.
+        authors = [u"Dickens", u"Austen", u"Dickens", u"Eliot", u"Austen"]
+        works = []
+        for i, author in enumerate(authors):
+            work = self._work(
+                authors=[author], with_license_pool=True,
+                language=("eng" if i % 2 else "spa"), fiction=(i != 3),
+                genre="Romance" if i < 3 else "Mystery",
+            )
+            [pool] = work.license_pools
+            pool.open_access = (i == 0)
+            pool.licenses_owned = i
+            pool.licenses_available = i % 2
+            works.append(work)
+        works[4].license_pools[0].suppressed = True
+        audio = works[3].presentation_edition
+        audio.medium = Edition.AUDIO_MEDIUM
+
+        # One work is on a custom list.
+        customlist, ignore = self._customlist(num_entries=0)
+        customlist.add_entry(works[2])
+
+        self._db.flush()
+        DeliverableWork.refresh(self._db)
+
+        def compare(wl, facets=None, pagination_size=None):
+            def run(use_deliverable_works, pagination=None):
+                wl.USE_DELIVERABLE_WORKS = use_deliverable_works
+                pagination = (
+                    Pagination(0, pagination_size) if pagination_size
+                    else None
+                )
+                qu = wl.works_from_database(self._db, facets, pagination)
+                return qu, qu.all()
+
+            fast_query, fast = run(True)
+            slow_query, slow = run(False)
+            assert slow == fast
+            # LicensePools are loaded along with the Works, but the
+            # query itself doesn't use them.
+            assert "deliverableworks" in str(fast_query)
+            assert "JOIN licensepools ON" not in str(fast_query)
+            assert "JOIN licensepools ON" in str(slow_query)
+            return fast
+
+        wl = DatabaseBackedWorkList()
+        wl.initialize(self._default_library)
+        assert 4 == len(compare(wl))
+
+        for order in DatabaseBackedFacets.ORDER_FACET_TO_DATABASE_FIELD:
+            for availability in (
+                Facets.AVAILABLE_ALL, Facets.AVAILABLE_NOW,
+                Facets.AVAILABLE_OPEN_ACCESS, Facets.AVAILABLE_NOT_NOW
+            ):
+                facets = DatabaseBackedFacets(
+                    self._default_library,
+                    collection=Facets.COLLECTION_FULL,
+                    availability=availability, order=order,
+                    entrypoint=EbooksEntryPoint,
+                )
+                compare(wl, facets)
+                compare(wl, facets, pagination_size=2)
+
+        wl.initialize(
+            self._default_library, languages=["eng"], fiction=True,
+            genres=[Genre.lookup(self._db, "Romance")[0]],
+            audiences=[Classifier.AUDIENCE_ADULT],
+        )
+        assert [works[1]] == compare(wl)
+
+        wl.initialize(self._default_library, customlists=[customlist])
+        assert [works[2]] == compare(wl)
+
+        # The table is only as up to date as the last refresh.
+        works[0].presentation_edition.language = "fre"
+        self._db.flush()
+        wl.initialize(self._default_library, languages=["fre"])
+        wl.USE_DELIVERABLE_WORKS = True
+        assert [] == wl.works_from_database(self._db).all()
+        DeliverableWork.refresh(self._db, [works[0]])
+        assert [works[0]] == compare(wl)
+
+        # If a query needs a field that isn't copied into the
+        # DeliverableWork table, the usual tables are used instead.
+        class Mock(DatabaseBackedWorkList):
+            USE_DELIVERABLE_WORKS = True
+            def modify_database_query_hook(self, _db, qu):
+                return qu.filter(LicensePool.patrons_in_hold_queue == 0)
+        wl = Mock()
+        wl.initialize(self._default_library)
+        qu = wl.works_from_database(self._db)
+        assert "deliverableworks" not in str(qu)
+        assert 4 == qu.count()
+
+    def test_works_from_database_deliverable_works_keyset_pagination(self):
+        # KeysetPagination works the same way when works are found
+        # through the DeliverableWork table.
+        for title in (u"C", u"A", u"B", u"A"):
+            self._work(title=title, with_license_pool=True)
+        DeliverableWork.refresh(self._db)
+
+        class Mock(DatabaseBackedWorkList):
+            USE_DELIVERABLE_WORKS = True
+        wl = Mock()
+        wl.initialize(self._default_library)
+        facets = DatabaseBackedFacets(
+            self._default_library, collection=Facets.COLLECTION_FULL,
+            availability=Facets.AVAILABLE_ALL, order=Facets.ORDER_TITLE,
+        )
+        expect = wl.works_from_database(self._db, facets).all()
+
+        found = []
+        pagination = KeysetPagination(size=3)
+        while pagination:
+            qu = wl.works_from_database(self._db, facets, pagination)
+            assert "deliverableworks" in str(qu)
+            page = qu.all()
+            pagination.page_loaded(page)
+            found.extend(page)
+            pagination = pagination.next_page
+        assert expect == found
+        assert 4 == len(found)
+
     def test_base_query(self):
         # Verify that base_query makes the query we expect and then
         # calls some optimization methods (not tested).
@@ -3864,6 +4197,181 @@ class TestLane(DatabaseTest):
         Lane._groups_for_lanes = old_value
 
 
+class TestLaneTree(DatabaseTest):
+
+    def test_build(self):
+        fiction = self._lane(u"Fiction", fiction=True, languages=[u"eng"])
+        fantasy = self._lane(u"Fantasy", parent=fiction, genres=[u"Fantasy"])
+        fantasy.priority = 1
+        sf = self._lane(u"Science Fiction", parent=fiction)
+        sf.priority = 0
+        sf.audiences = [Classifier.AUDIENCE_YOUNG_ADULT]
+        hidden = self._lane(u"Hidden", parent=fiction)
+        hidden.visible = False
+        under_hidden = self._lane(u"Under hidden", parent=hidden)
+        independent = self._lane(
+            u"Independent", parent=sf, inherit_parent_restrictions=False
+        )
+        customlist, ignore = self._customlist(num_entries=0)
+        sf.customlists.append(customlist)
+        top_level_2 = self._lane(u"Nonfiction", fiction=False)
+        top_level_2.priority = 1
+        self._db.flush()
+
+        tree = LaneTree.build(self._db, self._default_library.id)
+        assert self._default_library.id == tree.library_id
+        assert (fiction.id, top_level_2.id) == tree.top_level_ids
+
+        node = tree.get(fantasy.id)
+        assert (fiction.id,) == node.parentage
+        assert True == node.visible
+        assert set(fantasy.genre_ids) == node.genre_ids
+        assert None == node.customlist_ids
+        assert (sf.id, fantasy.id) == tree.get(fiction.id).visible_children
+        assert (customlist.id,) == tree.get(sf.id).customlist_ids
+
+        # Visibility is inherited from a lane's parentage.
+        assert False == tree.get(under_hidden.id).visible
+        assert ((hidden.id, fiction.id) ==
+                tree.get(under_hidden.id).parentage)
+        assert () == tree.get(hidden.id).visible_children
+
+        # Restrictions are inherited, as WorkList.inherited_value
+        # would inherit them, and come out as lists.
+        assert True == tree.inherited_value(fantasy.id, 'fiction')
+        assert [u"eng"] == tree.inherited_value(fantasy.id, 'languages')
+        assert ([Classifier.AUDIENCE_YOUNG_ADULT] ==
+                tree.inherited_value(sf.id, 'audiences'))
+        assert None == tree.inherited_value(independent.id, 'fiction')
+        assert (sf.id, fiction.id) == tree.get(independent.id).parentage
+
+        # Lanes from another library aren't included.
+        other = self._lane(library=self._library())
+        assert None == tree.get(other.id)
+
+    def test_incomplete_parentage(self):
+        # A lane whose parent belongs to some other library can't be
+        # fully described by the snapshot, so the Lane itself is
+        # consulted.
+        parent = self._lane(library=self._library())
+        lane = self._lane(parent=parent)
+        self._db.flush()
+
+        tree = LaneTree.build(self._db, self._default_library.id)
+        assert None == tree.get(lane.id).parentage
+        assert None == tree.get(lane.id).inherited
+        assert [parent] == list(lane.parentage)
+
+    def test_lanes(self):
+        lane1 = self._lane()
+        lane2 = self._lane()
+        self._db.flush()
+        tree = LaneTree.build(self._db, self._default_library.id)
+
+        # Lanes already in the session are used as-is, and the order
+        # of the IDs is respected. Unknown IDs are ignored.
+        assert [lane2, lane1] == tree.lanes(
+            self._db, [lane2.id, lane1.id, -1]
+        )
+
+        # Lanes that aren't in the session are loaded.
+        self._db.expunge(lane1)
+        [reloaded] = tree.lanes(self._db, [lane1.id])
+        assert reloaded is not lane1
+        assert lane1.id == reloaded.id
+
+    def test_for_library(self):
+        library_id = self._default_library.id
+        lane = self._lane()
+        self._db.flush()
+
+        tree = LaneTree.for_library(self._db, library_id)
+        assert lane.id in tree.nodes
+
+        # The snapshot is cached.
+        assert tree is LaneTree.for_library(self._db, library_id)
+
+        # While a relevant change is pending, the snapshot isn't used.
+        lane.display_name = u"A new name"
+        assert None == LaneTree.for_library(self._db, library_id)
+
+        # Once the change is flushed, the listeners clear the cache and
+        # a new snapshot is taken.
+        self._db.flush()
+        assert library_id not in LaneTree._cache
+        tree2 = LaneTree.for_library(self._db, library_id)
+        assert u"A new name" == tree2.get(lane.id).display_name
+
+        # The same thing happens when a new lane is created...
+        new_lane = self._lane()
+        assert library_id not in LaneTree._cache
+        assert new_lane.id in LaneTree.for_library(
+            self._db, library_id
+        ).nodes
+
+        # ...when a CustomList is created...
+        customlist, ignore = self._customlist(num_entries=0)
+        assert library_id not in LaneTree._cache
+        LaneTree.for_library(self._db, library_id)
+
+        # ...or when a lane's CustomLists change.
+        lane.customlists.append(customlist)
+        assert library_id not in LaneTree._cache
+        self._db.flush()
+        assert ((customlist.id,) ==
+                LaneTree.for_library(self._db, library_id).get(
+                    lane.id
+                ).customlist_ids)
+
+        # A snapshot is also discarded once the site configuration is
+        # known to have changed, possibly in some other process.
+        tree = LaneTree.for_library(self._db, library_id)
+        Configuration.site_configuration_last_update(
+            self._db, known_value=datetime.datetime.utcnow()
+        )
+        assert tree is not LaneTree.for_library(self._db, library_id)
+
+        LaneTree.reset_cache()
+        assert {} == LaneTree._cache
+
+    def test_lane_uses_snapshot(self):
+        parent = self._lane(fiction=True)
+        child = self._lane(parent=parent, genres=[u"Fantasy"])
+        hidden = self._lane(parent=parent)
+        hidden.visible = False
+        self._db.flush()
+
+        # Tamper with the snapshot to show that the Lane consults it
+        # rather than the database.
+        tree = LaneTree.for_library(self._db, self._default_library.id)
+        node = tree.get(child.id)
+        tree.nodes[child.id] = node._replace(
+            genre_ids=frozenset([1]), customlist_ids=(2,),
+            inherited=dict(node.inherited, fiction=False),
+        )
+        tree.nodes[parent.id] = tree.get(parent.id)._replace(
+            visible_children=(hidden.id, child.id)
+        )
+        assert set([1]) == child.genre_ids
+        assert [2] == child.customlist_ids
+        assert False == child.inherited_value('fiction')
+        assert [hidden, child] == parent.visible_children
+        assert [parent] == list(child.parentage)
+
+        # Keys that aren't part of the snapshot are looked up as usual.
+        assert child.display_name == child.inherited_value('display_name')
+
+        # WorkList.top_level_for_library uses the snapshot too.
+        tree.top_level_ids = (child.id,)
+        assert child == WorkList.top_level_for_library(
+            self._db, self._default_library
+        )
+
+        # A Lane with unflushed changes ignores the snapshot.
+        child.fiction = None
+        assert True == child.inherited_value('fiction')
+
+
 class TestWorkListGroupsEndToEnd(EndToEndSearchTest):
     # A comprehensive end-to-end test of WorkList.groups()
     # using a real Elasticsearch index.
@@ -1,9 +1,13 @@
 import pytest
 from ..testing import DatabaseTest
-from ..local_analytics_provider import LocalAnalyticsProvider
+from ..local_analytics_provider import (
+    CirculationEventBuffer,
+    LocalAnalyticsProvider,
+)
 from ..model import (
     CirculationEvent,
     ExternalIntegration,
+    SessionManager,
     create,
 )
 import datetime
@@ -80,6 +84,58 @@ class TestLocalAnalyticsProvider(DatabaseTest):
             self.la.collect_event(None, None, "event", now)
         assert "Either library or license_pool must be provided." in str(excinfo.value)
 
+    def test_collect_event_buffered(self):
+        # If the integration is configured to buffer events, they're
+        # queued up instead of being written immediately.
+        p = LocalAnalyticsProvider
+        self.integration.setting(p.WRITE_MODE).value = p.WRITE_MODE_BUFFERED
+        self.integration.setting(p.FULL_BUFFER_POLICY).value = (
+            CirculationEventBuffer.BLOCK
+        )
+        self.integration.setting(p.LOCATION_SOURCE).value = (
+            p.LOCATION_SOURCE_NEIGHBORHOOD
+        )
+        la = p(self.integration, self._default_library)
+        assert CirculationEventBuffer.BLOCK == la.full_buffer_policy
+        la.buffer = CirculationEventBuffer(
+            SessionManager.sessionmaker(session=self._db)
+        )
+
+        pool = self._licensepool(None)
+        now = datetime.datetime.utcnow()
+        event, is_new = la.collect_event(
+            self._default_library, pool, CirculationEvent.CM_CHECKOUT, now,
+            neighborhood="Gormenghast"
+        )
+
+        # The result has the same shape as when the event is written
+        # immediately, but there's no CirculationEvent yet.
+        assert None == event
+        assert True == is_new
+        assert 0 == self._db.query(CirculationEvent).count()
+        assert 1 == la.buffer.counters['pending']
+
+        la.buffer.flush()
+        [event] = self._db.query(CirculationEvent).all()
+        assert pool == event.license_pool
+        assert self._default_library == event.library
+        assert CirculationEvent.CM_CHECKOUT == event.type
+        assert now == event.start
+        assert "Gormenghast" == event.location
+
+        # If the buffer is full and the event is dropped, is_new is
+        # False.
+        la.buffer = CirculationEventBuffer(
+            SessionManager.sessionmaker(session=self._db), max_size=1
+        )
+        args = (self._default_library, pool, CirculationEvent.CM_CHECKOUT, now)
+        assert (None, True) == la.collect_event(*args)
+        assert (None, False) == la.collect_event(*args)
+
+        # By default, events are written immediately.
+        assert p.WRITE_MODE_IMMEDIATE == self.la.write_mode
+        assert CirculationEventBuffer.DROP == self.la.full_buffer_policy
+
     def test_neighborhood_is_location(self):
         # If a 'neighborhood' argument is provided, its value
         # is used as CirculationEvent.location.
@@ -117,3 +173,81 @@ class TestLocalAnalyticsProvider(DatabaseTest):
         assert event2 != event
         assert True == is_new
         assert None == event2.location
+
+
+class TestCirculationEventBuffer(DatabaseTest):
+
+    def setup_method(self):
+        super(TestCirculationEventBuffer, self).setup_method()
+        self.session_factory = SessionManager.sessionmaker(session=self._db)
+        self.pool = self._licensepool(None)
+
+    def _event(self, event_type=CirculationEvent.CM_CHECKOUT, start=None):
+        return CirculationEvent.event_data(
+            self.pool, event_type, None, None, start=start,
+            library=self._default_library
+        )
+
+    def test_unknown_policy(self):
+        with pytest.raises(ValueError) as excinfo:
+            CirculationEventBuffer(self.session_factory, policy="explode")
+        assert "Unknown full buffer policy: explode" in str(excinfo.value)
+
+    def test_drop_policy(self):
+        buffer = CirculationEventBuffer(self.session_factory, max_size=2)
+        assert True == buffer.add(self._event())
+        assert True == buffer.add(self._event())
+
+        # The queue is full, so the third event is dropped.
+        assert False == buffer.add(self._event())
+        assert dict(
+            queued=2, flushed=0, dropped=1, failed=0, pending=2
+        ) == buffer.counters
+
+    def test_block_policy(self):
+        buffer = CirculationEventBuffer(
+            self.session_factory, policy=CirculationEventBuffer.BLOCK,
+            max_size=1, block_timeout=0.01
+        )
+        assert True == buffer.add(self._event())
+
+        # Nothing made room in the queue while we waited, so the
+        # event is dropped.
+        assert False == buffer.add(self._event())
+        assert 1 == buffer.dropped
+
+    def test_flush(self):
+        buffer = CirculationEventBuffer(self.session_factory, batch_size=2)
+        for i in range(5):
+            buffer.add(self._event())
+        buffer.flush()
+        assert 5 == self._db.query(CirculationEvent).count()
+        assert dict(
+            queued=5, flushed=5, dropped=0, failed=0, pending=0
+        ) == buffer.counters
+
+    def test_write_failure(self):
+        # An event that can't be written is counted as a failure;
+        # it doesn't take down the buffer.
+        buffer = CirculationEventBuffer(self.session_factory)
+        bad = self._event()
+        bad['type'] = "x" * 100
+        buffer.write([bad])
+        assert 1 == buffer.failed
+        assert 0 == buffer.flushed
+
+    def test_background_thread(self):
+        buffer = CirculationEventBuffer(
+            self.session_factory, flush_interval=0.01
+        )
+        buffer.start()
+        start = datetime.datetime(2019, 1, 1)
+        buffer.add(self._event(start=start))
+        buffer.add(self._event(CirculationEvent.CM_CHECKIN, start=start))
+
+        # Shutting down the buffer stops the thread, and makes sure
+        # everything has been written.
+        buffer.shutdown()
+        assert False == buffer.thread.is_alive()
+        assert 2 == buffer.flushed
+        assert 2 == self._db.query(CirculationEvent).count()
@@ -49,6 +49,19 @@ class TestJSONFormatter(object):
         assert "pathname" == data['filename']
         assert 'ValueError: fake exception' in data['traceback']
 
+    def test_format_with_json_data(self):
+        # Structured data passed in as `json_data` is included in the
+        # output, but it can't overwrite the standard fields.
+        formatter = JSONFormatter("some app")
+        record = logging.LogRecord(
+            "some logger", logging.INFO, "pathname",
+            104, "A message", {}, None, None
+        )
+        record.json_data = dict(timing=dict(total=1), message="Overwritten")
+        data = json.loads(formatter.format(record))
+        assert dict(total=1) == data['timing']
+        assert "A message" == data['message']
+
     def test_format_with_different_types_of_strings(self):
         # As long as all data is either Unicode or UTF-8, any combination
         # of Unicode and bytestrings can be combined in log messages.
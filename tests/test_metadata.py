@@ -11,10 +11,12 @@ from ..testing import (
     DummyHTTPClient,
     DummyMetadataClient,
 )
+from .. import metadata_layer
 from ..analytics import Analytics
 from ..classifier import Classifier
 from ..classifier import NO_VALUE, NO_NUMBER
 from ..metadata_layer import (
+    ApplyBatch,
     CSVMetadataImporter,
     CirculationData,
     ContributorData,
@@ -26,6 +28,7 @@ from ..metadata_layer import (
     ReplacementPolicy,
     SubjectData,
     TimestampData,
+    intern_value,
 )
 from ..model import (
     Contributor,
@@ -55,6 +58,60 @@ class TestIdentifierData(object):
         assert "foo" == data.identifier
         assert 0.5 == data.weight
 
+    def test_slots(self):
+        # Data objects have no per-instance __dict__, so they can't
+        # pick up attributes by accident.
+        data = IdentifierData(Identifier.ISBN, "foo")
+        assert False == hasattr(data, '__dict__')
+        with pytest.raises(AttributeError):
+            data.typo = "bar"
+
+        # Copies are still separate objects with the same values.
+        copy = deepcopy(data)
+        assert copy is not data
+        assert (data.type, data.identifier, data.weight) == (
+            copy.type, copy.identifier, copy.weight
+        )
+
+
+class TestInternValue(object):
+
+    def test_intern_value(self):
+        # Equal strings are turned into the same object.
+        media_type = u"".join([u"application/", u"epub+zip"])
+        interned = intern_value(media_type)
+        assert media_type == interned
+        other = u"".join([u"application/", u"epub+zip"])
+        assert other is not media_type
+        assert interned is intern_value(other)
+
+        # A bytestring isn't replaced with an equal Unicode string.
+        assert str == type(intern_value("application/epub+zip"))
+
+        # Anything that's not a string is left alone.
+        assert None == intern_value(None)
+        assert 5 == intern_value(5)
+
+        # Data objects intern the values that come from a small
+        # vocabulary.
+        link = LinkData(rel=u"".join([u"http://opds-spec.org/", u"image"]),
+                        href=u"http://cover/", media_type=other)
+        assert link.media_type is interned
+        assert link.rel is intern_value(Hyperlink.IMAGE)
+
+    def test_limit(self):
+        old_limit = metadata_layer.INTERN_LIMIT
+        metadata_layer.INTERN_LIMIT = len(metadata_layer._interned)
+        try:
+            # Once the limit is reached, new values are returned as
+            # they are.
+            value = u"".join([u"a value", u" never seen before"])
+            assert value is intern_value(value)
+            other = u"".join([u"a value", u" never seen before"])
+            assert other is intern_value(other)
+        finally:
+            metadata_layer.INTERN_LIMIT = old_limit
+
 
 class TestMetadataImporter(DatabaseTest):
     def test_parse(self):
@@ -1328,6 +1385,127 @@ class TestMetadata(DatabaseTest):
         assert equivalency.output.type == u"abc"
         assert equivalency.output.identifier == u"def"
 
+    def _bulk_apply_metadata(self, prefix, number, version):
+        """A Metadata that touches everything ApplyBatch writes."""
+        primary = IdentifierData(Identifier.GUTENBERG_ID, u"%s%d" % (prefix, number))
+        taken_at = datetime.datetime(2019, 1, version)
+        return Metadata(
+            data_source=DataSource.GUTENBERG,
+            title=u"Title %d, version %d" % (number, version),
+            primary_identifier=primary,
+            identifiers=[
+                IdentifierData(Identifier.ISBN, u"%sisbn%d" % (prefix, number),
+                               weight=0.25 * version),
+            ],
+            subjects=[
+                SubjectData(Subject.TAG, u"%s-tag-%d" % (prefix, version),
+                            name=u"Tag %d" % version),
+                SubjectData(Subject.TAG, u"%s-always" % prefix,
+                            weight=version),
+                SubjectData(Subject.TAG, None, name=u"%s name only" % prefix),
+            ],
+            measurements=[
+                MeasurementData(Measurement.POPULARITY, number * version,
+                                taken_at=taken_at),
+                MeasurementData(Measurement.RATING, version,
+                                taken_at=taken_at),
+            ],
+            circulation=CirculationData(
+                DataSource.GUTENBERG, primary, licenses_owned=version,
+                licenses_available=version, last_checked=taken_at
+            ),
+        )
+
+    def _bulk_apply_state(self, prefix, edition):
+        """Everything Metadata.apply() wrote about an edition, with the
+        prefix taken out of identifiers and subjects.
+        """
+        identifier = edition.primary_identifier
+        self._db.expire_all()
+        def strip(value):
+            if value and value.startswith(prefix):
+                return value[len(prefix):]
+            return value
+        pool = identifier.licensed_through[0]
+        return dict(
+            title=edition.title,
+            equivalencies=sorted(
+                (e.output.type, strip(e.output.identifier), e.strength)
+                for e in identifier.equivalencies
+            ),
+            classifications=sorted(
+                (c.subject.type, strip(c.subject.identifier),
+                 strip(c.subject.name), c.weight)
+                for c in identifier.classifications
+            ),
+            measurements=sorted(
+                (m.quantity_measured, m.value, m.taken_at, m.is_most_recent)
+                for m in identifier.measurements
+            ),
+            pool=(pool.licenses_owned, pool.licenses_available,
+                  pool.last_checked, len(identifier.licensed_through)),
+            coverage_records=sorted(
+                (r.data_source.name, r.operation)
+                for r in identifier.coverage_records
+            ),
+        )
+
+    def test_bulk_apply(self):
+        # Metadata.bulk_apply() leaves the database in the same state
+        # as calling Metadata.apply() on each Metadata in turn.
+        collection = self._default_collection
+        policy = ReplacementPolicy(subjects=True)
+        results = {}
+        for prefix in (u"a", u"b"):
+            # Two books are already in the database.
+            for number in (1, 2):
+                metadata = self._bulk_apply_metadata(prefix, number, 1)
+                edition, ignore = metadata.edition(self._db)
+                metadata.apply(edition, collection, replace=policy)
+
+            # Now there's new information about them and about a third
+            # book.
+            metadatas = [
+                self._bulk_apply_metadata(prefix, number, 2)
+                for number in (1, 2, 3)
+            ]
+            if prefix == u"a":
+                applied = []
+                for metadata in metadatas:
+                    edition, ignore = metadata.edition(self._db)
+                    applied.append(
+                        metadata.apply(edition, collection, replace=policy)
+                    )
+            else:
+                applied = Metadata.bulk_apply(
+                    self._db, metadatas, collection, replace=policy
+                )
+            results[prefix] = [
+                (changed, self._bulk_apply_state(prefix, edition))
+                for edition, changed in applied
+            ]
+
+        assert results[u"a"] == results[u"b"]
+
+        # Version 2 of the first book replaced one of its version 1
+        # subjects and kept the other.
+        changed, state = results[u"b"][0]
+        assert True == changed
+        assert u"Title 1, version 2" == state['title']
+        assert [
+            (Subject.TAG, None, u" name only", 1),
+            (Subject.TAG, u"-always", None, 2),
+            (Subject.TAG, u"-tag-2", u"Tag 2", 1),
+        ] == state['classifications']
+        assert [(Identifier.ISBN, u"isbn1", 0.5)] == state['equivalencies']
+
+        # Each quantity has one most recent measurement.
+        assert 4 == len(state['measurements'])
+        assert [2, 2] == [
+            value for (quantity, value, taken_at, most_recent)
+            in state['measurements'] if most_recent
+        ]
+
     def test_apply_no_value(self):
         edition_old, pool = self._edition(with_license_pool=True)
 
@@ -1615,6 +1793,97 @@ class TestCirculationData(DatabaseTest):
         assert analytics == pool.update_availability_called_with['analytics']
 
 
+class TestApplyBatch(DatabaseTest):
+
+    def test_constructor(self):
+        collection = self._default_collection
+        gutenberg = DataSource.lookup(self._db, DataSource.GUTENBERG)
+        up_to_date = datetime.datetime(2019, 1, 1)
+
+        def metadata(identifier, **kwargs):
+            primary = IdentifierData(Identifier.GUTENBERG_ID, identifier)
+            return Metadata(
+                DataSource.GUTENBERG, primary_identifier=primary,
+                circulation=CirculationData(DataSource.GUTENBERG, primary),
+                **kwargs
+            )
+
+        # One book is new.
+        new = metadata(
+            u"new", subjects=[SubjectData(Subject.TAG, u"a tag")],
+            identifiers=[IdentifierData(Identifier.ISBN, u"9781453219539")]
+        )
+
+        # One has already been imported, and has a LicensePool.
+        edition, pool = self._edition(
+            data_source_name=DataSource.GUTENBERG,
+            identifier_type=Identifier.GUTENBERG_ID, identifier_id=u"old",
+            with_license_pool=True, collection=collection
+        )
+        old = metadata(
+            u"old",
+            measurements=[MeasurementData(Measurement.DOWNLOADS, 10)]
+        )
+
+        # This one has already been applied.
+        existing = self._edition(
+            data_source_name=DataSource.GUTENBERG,
+            identifier_type=Identifier.GUTENBERG_ID, identifier_id=u"current",
+        )
+        CoverageRecord.add_for(existing, gutenberg, timestamp=up_to_date)
+        current = metadata(u"current", data_source_last_updated=up_to_date)
+
+        # This one describes the same book as the first one.
+        duplicate = metadata(u"new", subjects=[SubjectData(Subject.TAG, u"b")])
+
+        # This one mentions an identifier that can't be created.
+        invalid = metadata(
+            u"invalid",
+            identifiers=[IdentifierData(Identifier.BIBLIOTHECA_ID, u"a,b")]
+        )
+
+        batch = ApplyBatch(
+            self._db, [new, old, current, duplicate, invalid],
+            collection=collection
+        )
+
+        # Every valid identifier has been created.
+        assert (
+            set([(Identifier.GUTENBERG_ID, x)
+                 for x in (u"new", u"old", u"current", u"invalid")] +
+                [(Identifier.ISBN, u"9781453219539")]) ==
+            set(batch.identifiers.keys())
+        )
+
+        # The duplicate and invalid Metadata are left to
+        # Metadata.apply().
+        assert set([new, old, current]) == set(batch.editions.keys())
+        assert edition == batch.editions[old]
+        assert u"new" == batch.editions[new].primary_identifier.identifier
+
+        # The up-to-date Metadata will be skipped by Metadata.apply(),
+        # so nothing is written for it. The others need their Works
+        # fully recalculated.
+        assert {new: True, old: True} == batch.applied
+        [classification] = batch.identifiers[
+            (Identifier.GUTENBERG_ID, u"new")
+        ].classifications
+        assert u"a tag" == classification.subject.identifier
+        [equivalency] = batch.editions[new].primary_identifier.equivalencies
+        assert u"9781453219539" == equivalency.output.identifier
+        [measurement] = edition.primary_identifier.measurements
+        assert 10 == measurement.value
+
+        # LicensePools are found or created for the Metadata being
+        # applied.
+        assert (pool, False) == batch.license_pools[old.circulation]
+        new_pool, is_new = batch.license_pools[new.circulation]
+        assert True == is_new
+        assert collection == new_pool.collection
+        assert 0 == new_pool.licenses_owned
+        assert 2 == len(batch.license_pools)
+
+
 class TestTimestampData(DatabaseTest):
 
     def test_constructor(self):
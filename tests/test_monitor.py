@@ -8,6 +8,7 @@ from ..metadata_layer import TimestampData
 from ..model import (
     CachedFeed,
     CirculationEvent,
+    CirculationEventRollup,
     Collection,
     CollectionMissing,
     ConfigurationSetting,
@@ -30,6 +31,7 @@ from ..model import (
 from ..monitor import (
     CachedFeedReaper,
     CirculationEventLocationScrubber,
+    CirculationEventRollupMonitor,
     CollectionMonitor,
     CollectionReaper,
     CoverageProvidersFailed,
@@ -919,6 +921,93 @@ class TestCustomListEntryWorkUpdateMonitor(DatabaseTest):
         assert old_work == entry.work
 
 
+class TestCirculationEventRollupMonitor(DatabaseTest):
+
+    def test_run(self):
+        pool = self._licensepool(None)
+        start = datetime.datetime(2019, 1, 1, 10, 15)
+
+        def log(minutes, event_type=CirculationEvent.CM_CHECKOUT, start=start):
+            CirculationEvent.log(
+                self._db, pool, event_type, 1, 0,
+                start=start + datetime.timedelta(minutes=minutes),
+                library=self._default_library
+            )
+        log(0)
+        log(1)
+        log(60)
+
+        # This event is too recent to be rolled up.
+        now = datetime.datetime.utcnow()
+        log(0, start=now)
+
+        monitor = CirculationEventRollupMonitor(
+            self._db, slice_size=datetime.timedelta(hours=1)
+        )
+        monitor.run()
+
+        def rollups(period):
+            return [
+                (x.period_start.hour, x.type, x.count, x.delta)
+                for x in self._db.query(CirculationEventRollup).filter(
+                    CirculationEventRollup.period==period,
+                    CirculationEventRollup.period_start < now - datetime.timedelta(days=1)
+                ).order_by(
+                    CirculationEventRollup.period_start,
+                    CirculationEventRollup.type
+                )
+            ]
+        def total(period):
+            return sum(
+                x.count for x in self._db.query(CirculationEventRollup).filter(
+                    CirculationEventRollup.period==period
+                )
+            )
+        checkout = CirculationEvent.CM_CHECKOUT
+        assert [(10, checkout, 2, -2), (11, checkout, 1, -1)] == rollups(
+            CirculationEventRollup.HOUR
+        )
+        assert [(0, checkout, 3, -3)] == rollups(CirculationEventRollup.DAY)
+        assert 3 == total(CirculationEventRollup.DAY)
+
+        # The first run started with the earliest event, and went up
+        # to SETTLE_TIME ago.
+        timestamp = monitor.timestamp()
+        assert start == timestamp.start
+        cutoff = timestamp.finish
+        assert abs(
+            (now - monitor.SETTLE_TIME - cutoff).total_seconds()
+        ) < 5
+        assert "Slices rolled up:" in timestamp.achievements
+
+        # Running the monitor again recounts only recent periods, and
+        # nothing is counted twice.
+        monitor.run()
+        assert 3 == total(CirculationEventRollup.DAY)
+
+        # An event that started a while ago, but was committed after
+        # the last run, is picked up by the next run.
+        log(-10, CirculationEvent.CM_CHECKIN, start=cutoff)
+        monitor.run()
+        assert 4 == total(CirculationEventRollup.DAY)
+        assert [(0, checkout, 3, -3)] == rollups(CirculationEventRollup.DAY)
+
+    def test_run_with_no_settled_events(self):
+        # If no event has settled yet, the next run will start with
+        # the earliest event.
+        pool = self._licensepool(None)
+        now = datetime.datetime.utcnow()
+        CirculationEvent.log(
+            self._db, pool, CirculationEvent.CM_CHECKOUT, 1, 0, start=now
+        )
+        monitor = CirculationEventRollupMonitor(self._db)
+        monitor.run()
+        timestamp = monitor.timestamp()
+        assert now == timestamp.finish
+        assert "No events to roll up." == timestamp.achievements
+        assert 0 == self._db.query(CirculationEventRollup).count()
+
+
 class MockReaperMonitor(ReaperMonitor):
     MODEL_CLASS = Timestamp
     TIMESTAMP_FIELD = 'timestamp'
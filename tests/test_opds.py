@@ -77,6 +77,7 @@ from ..util.opds_writer import (
     OPDSFeed,
     OPDSMessage,
 )
+from ..util.request_timing import RequestTimer
 
 
 class TestBaseAnnotator(DatabaseTest):
@@ -1291,6 +1292,17 @@ class TestOPDS(DatabaseTest):
         breadcrumbs = root.find("{%s}breadcrumbs" % AtomFeed.SIMPLIFIED_NS)
         assert None == breadcrumbs
 
+        # The feed can also be streamed.
+        response = AcquisitionFeed.search(
+            self._db, "test", self._url, fantasy_lane, search_client,
+            "fantasy", pagination=pagination.next_page, facets=facets,
+            annotator=TestAnnotator, stream=True
+        )
+        assert True == response.is_streamed
+        parsed = feedparser.parse(response.data)
+        assert work2.title == parsed['entries'][0]['title']
+        assert 1 == len(self.links(parsed, 'previous'))
+
     def test_cache(self):
         work1 = self._work(title="The Original Title",
                            genre=Epic_Fantasy, with_open_access_download=True)
@@ -1331,6 +1343,23 @@ class TestOPDS(DatabaseTest):
 
 class TestAcquisitionFeed(DatabaseTest):
 
+    def test_request_timing(self):
+        # If a request is being timed, the time spent creating entries
+        # and serializing the feed is recorded.
+        work1 = self._work(with_open_access_download=True)
+        work2 = self._work(with_open_access_download=True)
+        timer = RequestTimer.start()
+        try:
+            feed = AcquisitionFeed(
+                self._db, "title", "url", [work1, work2], TestAnnotator
+            )
+            unicode(feed)
+        finally:
+            RequestTimer.stop()
+        assert 2 == timer.counts[RequestTimer.OPDS_ENTRIES]
+        assert 1 == timer.counts[RequestTimer.SERIALIZATION]
+        assert timer.counts[RequestTimer.DATABASE] > 0
+
     def test_page(self):
         # Verify that AcquisitionFeed.page() returns an appropriate OPDSFeedResponse
 
@@ -1350,6 +1379,40 @@ class TestAcquisitionFeed(DatabaseTest):
 
         assert '<title>feed title</title>' in response.data
 
+    def test_page_stream(self):
+        # AcquisitionFeed.page() can stream a feed that has to be
+        # generated.
+        work = self._work(with_open_access_download=True)
+        search_engine = MockExternalSearchIndex()
+        search_engine.bulk_update([work])
+        wl = WorkList()
+        wl.initialize(self._default_library)
+
+        def page(**kwargs):
+            return AcquisitionFeed.page(
+                self._db, "feed title", "url", wl, TestAnnotator,
+                search_engine=search_engine, **kwargs
+            )
+        response = page(stream=True, max_age=600)
+        assert True == response.is_streamed
+        streamed = response.data
+        assert '<title>feed title</title>' in streamed
+
+        # The entries come after the feed-level links, but otherwise
+        # the feed is the same one page() would have generated without
+        # streaming.
+        unstreamed = page(max_age=0).data
+        def parts(feed):
+            parsed = feedparser.parse(feed)
+            return (
+                [x['id'] for x in parsed['entries']],
+                sorted(x['href'] for x in parsed['feed']['links'])
+            )
+        assert [work.presentation_edition.primary_identifier.urn] == (
+            parts(streamed)[0]
+        )
+        assert parts(unstreamed) == parts(streamed)
+
     def test_as_response(self):
         # Verify the ability to convert an AcquisitionFeed object to an
         # OPDSFeedResponse containing the feed.
@@ -1796,6 +1859,71 @@ class TestAcquisitionFeed(DatabaseTest):
         )
         assert entry_string == etree.tounicode(full_entry)
 
+    def test_splice_entries(self):
+        work = self._work(with_open_access_download=True)
+        [pool] = work.license_pools
+
+        class SplicingAnnotator(TestAnnotatorWithGroup):
+            splice_entries = True
+
+        def entries(annotator):
+            feed = AcquisitionFeed(
+                self._db, self._str, self._url, [work], annotator=annotator
+            )
+            # Only the non-spliced entries are pretty-printed.
+            parser = etree.XMLParser(remove_blank_text=True)
+            parsed = etree.fromstring(unicode(feed), parser)
+            return [
+                etree.tostring(x, method='c14n')
+                for x in parsed.findall("{%s}entry" % AtomFeed.ATOM_NS)
+            ]
+
+        # The first time, there's no cached entry to splice, so the
+        # entry is created and annotated as usual.
+        spliced = entries(SplicingAnnotator)
+        assert work.simple_opds_entry is not None
+
+        # After that, the annotations are spliced onto the cached entry
+        # without parsing it, and the result is the same.
+        feed = AcquisitionFeed(
+            self._db, self._str, self._url, [], annotator=SplicingAnnotator
+        )
+        entry = feed.create_entry(work)
+        assert isinstance(entry, unicode)
+        assert entry.startswith(work.simple_opds_entry[:-len('</entry>')])
+        assert spliced == entries(SplicingAnnotator)
+        assert spliced == entries(TestAnnotatorWithGroup)
+        assert 'rel="collection"' in spliced[0]
+
+        # An annotator that adds nothing gets the cached entry as is.
+        class NoAnnotations(SplicingAnnotator):
+            def annotate_work_entry(self, *args, **kwargs):
+                pass
+        feed = AcquisitionFeed(
+            self._db, self._str, self._url, [], annotator=NoAnnotations
+        )
+        assert work.simple_opds_entry == feed.create_entry(work)
+
+        # A cached entry made with an older namespace map can't be
+        # spliced, so it's parsed and annotated as usual.
+        assert True == AcquisitionFeed.can_splice(work.simple_opds_entry)
+        work.simple_opds_entry = u"<entry><foo>bar</foo></entry>"
+        assert False == AcquisitionFeed.can_splice(work.simple_opds_entry)
+        feed = AcquisitionFeed(
+            self._db, self._str, self._url, [], annotator=SplicingAnnotator
+        )
+        entry = feed.create_entry(work)
+        assert isinstance(entry, etree._Element)
+        assert "foo" == entry[0].tag
+        assert pool.identifier.urn == entry.findtext("id")
+
+        # A single entry is always an Element, since it's going to be
+        # the root of its own document.
+        entry = AcquisitionFeed.single_entry(
+            self._db, work, SplicingAnnotator, raw=True
+        )
+        assert isinstance(entry, etree._Element)
+
     def test_exception_during_entry_creation_is_not_reraised(self):
         # This feed will raise an exception whenever it's asked
         # to create an entry.
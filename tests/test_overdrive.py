@@ -231,6 +231,106 @@ class TestOverdriveAPI(OverdriveTestWithAPI):
         # The bearer token has been updated.
         assert "new bearer token" == self.api.token
 
+    def test_get_many(self):
+        self.api.queue_response(200, content="first")
+        self.api.queue_response(404, content="second")
+        self.api.queue_response(200, content="third")
+
+        urls = ["http://first/", "http://second/", "http://third/"]
+        responses = self.api.get_many(urls, {"extra": "header"})
+
+        # The responses come back in the same order as the URLs.
+        assert (
+            [(200, "first"), (404, "second"), (200, "third")] ==
+            [(status_code, content) for status_code, headers, content in responses]
+        )
+        assert urls == [url for url, args, kwargs in self.api.requests]
+        for url, args, kwargs in self.api.requests:
+            [headers] = args
+            assert "Bearer bearer token" == headers['Authorization']
+            assert "header" == headers['extra']
+
+        # Every request took a token from the rate limiter.
+        assert self.api.rate_limiter.capacity - 3 == pytest.approx(
+            self.api.rate_limiter.tokens, abs=0.1
+        )
+
+        # Nothing is requested for an empty list.
+        assert [] == self.api.get_many([])
+        assert 3 == len(self.api.requests)
+
+    def test_get_many_configuration(self):
+        api = MockOverdriveAPI(
+            self._db, self.collection, max_workers=2, requests_per_second=3
+        )
+        assert 2 == api.max_workers
+        assert 3 == api.rate_limiter.rate
+
+        # By default, the class constants are used.
+        assert OverdriveAPI.BATCH_MAX_WORKERS == self.api.max_workers
+        assert (OverdriveAPI.BATCH_REQUESTS_PER_SECOND ==
+                self.api.rate_limiter.rate)
+
+    def test_401_on_get_many_refreshes_bearer_token(self):
+        # One of the requests in a batch gets a 401.
+        self.api.queue_response(200, content="first")
+        self.api.queue_response(401)
+        self.api.access_token_response = self.api.mock_access_token_response(
+            "new bearer token"
+        )
+
+        # Once the batch is done, that request is retried with a new
+        # bearer token.
+        self.api.queue_response(200, content="second")
+
+        responses = self.api.get_many(["http://first/", "http://second/"])
+        assert ["first", "second"] == [
+            content for status_code, headers, content in responses
+        ]
+        assert (["http://first/", "http://second/", "http://second/"] ==
+                [url for url, args, kwargs in self.api.requests])
+        assert "new bearer token" == self.api.token
+
+    def test_metadata_lookups(self):
+        self.api.queue_collection_token()
+        identifiers = [
+            self._identifier(identifier_type=Identifier.OVERDRIVE_ID)
+            for i in range(3)
+        ]
+        for identifier in identifiers:
+            self.api.queue_response(
+                200, content=json.dumps(dict(id=identifier.identifier))
+            )
+
+        infos = self.api.metadata_lookups(identifiers)
+        assert [x.identifier for x in identifiers] == [x['id'] for x in infos]
+
+        # The collection token was looked up once, and then every
+        # identifier's metadata was requested.
+        expect = [
+            self.api.endpoint(
+                OverdriveAPI.METADATA_ENDPOINT,
+                collection_token="collection token",
+                item_id=identifier.identifier
+            ) for identifier in identifiers
+        ]
+        assert expect == [url for url, args, kwargs in self.api.requests[1:]]
+
+    def test_availability_lookups(self):
+        data, raw = self.sample_json("overdrive_book_list.json")
+        books = OverdriveRepresentationExtractor.availability_link_list(raw)
+        books = books[:2] + [dict(id="no link")]
+        for book in books[:2]:
+            self.api.queue_response(
+                200, content=json.dumps(dict(id=book['id']))
+            )
+
+        # The book with no availability link is skipped.
+        results = self.api.availability_lookups(books)
+        assert [(book, dict(id=book['id'])) for book in books[:2]] == results
+        assert ([book['availability_link'] for book in books[:2]] ==
+                [url for url, args, kwargs in self.api.requests])
+
     def test_credential_refresh_success(self):
         """Verify the process of refreshing the Overdrive bearer token.
         """
@@ -804,6 +904,28 @@ class TestOverdriveBibliographicCoverageProvider(OverdriveTest):
         assert False == failure.transient
         assert "ID not recognized by Overdrive: bad guid" == failure.exception
 
+    def test_process_batch(self):
+        """Metadata for a whole batch is looked up at once, and the
+        results are processed in order.
+        """
+        self.api.queue_collection_token()
+        raw, info = self.sample_json("overdrive_metadata.json")
+        good = self._identifier(identifier_type=Identifier.OVERDRIVE_ID)
+        good.identifier = info['id']
+        bad = self._identifier(identifier_type=Identifier.OVERDRIVE_ID)
+
+        self.api.queue_response(200, content=raw)
+        self.api.queue_response(
+            200, content='{"errorCode": "NotFound", "message": "Not found in Overdrive collection."}'
+        )
+
+        success, failure = self.provider.process_batch([good, bad])
+        assert good == success
+        assert "Agile Documentation" == good.primarily_identifies[0].title
+        assert isinstance(failure, CoverageFailure)
+        assert bad == failure.obj
+        assert "ID not recognized by Overdrive: %s" % bad.identifier == failure.exception
+
     def test_process_item_creates_presentation_ready_work(self):
         """Test the normal workflow where we ask Overdrive for data,
         Overdrive provides it, and we create a presentation-ready work.
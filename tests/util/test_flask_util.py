@@ -2,8 +2,12 @@
 """Test functionality of util/flask_util.py."""
 
 import datetime
+import flask
 import time
-from flask import Response as FlaskResponse
+from flask import (
+    Flask,
+    Response as FlaskResponse,
+)
 from wsgiref.handlers import format_date_time
 from ...util.flask_util import (
     OPDSEntryResponse,
@@ -83,6 +87,25 @@ class TestResponse(object):
         obj = Response(u"some data")
         assert u"some data" == unicode(obj)
 
+    def test_streamed(self):
+        # A generator is used as the body of a streamed response.
+        sent = []
+        def body():
+            for piece in (u"some ", u"data"):
+                sent.append(piece)
+                yield piece
+        response = Response(body())
+        assert True == response.is_streamed
+        assert [] == sent
+        assert [b"some ", b"data"] == list(response.iter_encoded())
+
+        # Inside a request, the generator keeps the request context
+        # around until it's done.
+        app = Flask(__name__)
+        with app.test_request_context("/feed"):
+            response = Response(x for x in [flask.request.path])
+        assert [b"/feed"] == list(response.iter_encoded())
+
 
 class TestOPDSFeedResponse(object):
     """Test the OPDS feed-specific specialization of Response."""
@@ -7,6 +7,7 @@ from ...util.http import (
     RemoteIntegrationException,
     RequestNetworkException,
     RequestTimedOut,
+    TokenBucket,
     INTEGRATION_ERROR,
 )
 from ...testing import MockRequestsResponse
@@ -327,3 +328,64 @@ class TestRequestNetworkException(object):
         # The status code corresponding to an upstream timeout is 502.
         document, status_code, headers = standard_detail.response
         assert 502 == status_code
+
+
+class MockTokenBucket(TokenBucket):
+    """A TokenBucket with a clock that only moves when it's told to."""
+
+    def __init__(self, *args, **kwargs):
+        self.clock = 0
+        self.sleeps = []
+        super(MockTokenBucket, self).__init__(*args, **kwargs)
+
+    def now(self):
+        return self.clock
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.clock += seconds
+
+
+class TestTokenBucket(object):
+
+    def test_constructor(self):
+        bucket = MockTokenBucket(5)
+        assert 5 == bucket.rate
+        assert 5 == bucket.capacity
+        assert 5 == bucket.tokens
+
+        bucket = MockTokenBucket(5, capacity=2)
+        assert 2 == bucket.capacity
+        assert 2 == bucket.tokens
+
+        with pytest.raises(ValueError) as excinfo:
+            TokenBucket(0)
+        assert "A TokenBucket needs a positive rate." in str(excinfo.value)
+
+    def test_take(self):
+        bucket = MockTokenBucket(2, capacity=3)
+
+        # A burst as big as the bucket goes through without waiting.
+        assert [0, 0, 0] == [bucket.take() for i in range(3)]
+        assert [] == bucket.sleeps
+
+        # After that, requests are spaced out according to the rate.
+        assert 0.5 == bucket.take()
+        assert 0.5 == bucket.take()
+        assert [0.5, 0.5] == bucket.sleeps
+
+        # Time passes, refilling the bucket, but it never holds more
+        # than its capacity.
+        bucket.clock += 60
+        assert [0, 0, 0] == [bucket.take() for i in range(3)]
+        assert 0.5 == bucket.take()
+
+    def test_take_leaves_bucket_in_debt(self):
+        # When several requests are waiting, each one waits in line
+        # behind the ones that came before it.
+        bucket = MockTokenBucket(2, capacity=1)
+        bucket.sleep = lambda seconds: None
+        assert 0 == bucket.take()
+        assert 0.5 == bucket.take()
+        assert 1.0 == bucket.take()
+        assert -2 == bucket.tokens
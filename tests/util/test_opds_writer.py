@@ -61,3 +61,61 @@ class TestAtomFeed(object):
         assert tag.startswith('<author')
         assert 'xmlns:opf="http://www.idpf.org/2007/opf"' in tag
         assert tag.endswith('opf:role="ctb"/>')
+
+    def test_append_serialized(self):
+        feed = AtomFeed("A Feed", "http://url/")
+        feed.feed.append(AtomFeed.E.entry(AtomFeed.E.id("first")))
+        feed.append_serialized(u'<entry xmlns="%s"><id>second</id></entry>'
+                               % AtomFeed.ATOM_NS)
+        feed.feed.append(AtomFeed.E.entry(AtomFeed.E.id("third")))
+
+        # Until the feed is serialized, the tag is represented by a
+        # placeholder.
+        placeholder = feed.feed[-2]
+        assert AtomFeed.SPLICE_TARGET == placeholder.target
+        assert "0" == placeholder.text
+
+        # Once it's serialized, the tag shows up in its place.
+        text = unicode(feed)
+        assert "<?splice" not in text
+        parsed = etree.fromstring(text)
+        entries = parsed.findall("{%s}entry" % AtomFeed.ATOM_NS)
+        assert (["first", "second", "third"] ==
+            [x.findtext("{%s}id" % AtomFeed.ATOM_NS) for x in entries])
+
+    def test_iter_serialized(self):
+        feed = AtomFeed("A Feed", "http://url/")
+        feed.append_serialized(u'<entry xmlns="%s"><id>first</id></entry>'
+                               % AtomFeed.ATOM_NS)
+
+        created = []
+        def more_tags():
+            for id in ("second", "third"):
+                created.append(id)
+                yield AtomFeed.E.entry(AtomFeed.E.id(id))
+            yield u'<entry xmlns="%s"><id>fourth</id></entry>' % (
+                AtomFeed.ATOM_NS
+            )
+
+        # The tags already in the feed are serialized first, before
+        # any of the others are created.
+        pieces = feed.iter_serialized(more_tags())
+        head = next(pieces)
+        assert [] == created
+        assert head.startswith("<feed")
+        assert "<id>first</id>" in head
+        assert "</feed>" not in head
+
+        # Then each of the others is serialized as it's created.
+        second = next(pieces)
+        assert ["second"] == created
+        assert "<entry><id>second</id></entry>\n" == second
+
+        rest = list(pieces)
+        assert u"</feed>\n" == rest[-1]
+
+        # Together they make up a feed.
+        parsed = etree.fromstring("".join([head, second] + rest))
+        entries = parsed.findall("{%s}entry" % AtomFeed.ATOM_NS)
+        assert (["first", "second", "third", "fourth"] ==
+            [x.findtext("{%s}id" % AtomFeed.ATOM_NS) for x in entries])
@@ -0,0 +1,72 @@
+import re
+
+from ...testing import DatabaseTest
+from ...util.request_timing import (
+    RequestTimer,
+    timed,
+)
+
+
+class TestRequestTimer(object):
+
+    def teardown_method(self):
+        RequestTimer.stop()
+
+    def test_start_and_stop(self):
+        assert None == RequestTimer.current()
+        timer = RequestTimer.start()
+        assert timer == RequestTimer.current()
+        assert timer == RequestTimer.stop()
+        assert None == RequestTimer.current()
+        assert None == RequestTimer.stop()
+
+    def test_timed(self):
+        # If no request is being timed, timed() does nothing.
+        with timed(RequestTimer.SEARCH):
+            pass
+
+        timer = RequestTimer.start()
+        for i in range(2):
+            with timed(RequestTimer.SEARCH):
+                pass
+
+        # Time is recorded even if the operation raises an exception.
+        try:
+            with timed(RequestTimer.GZIP):
+                raise ValueError()
+        except ValueError:
+            pass
+
+        assert dict(search=2, gzip=1) == timer.counts
+        data = timer.as_dict()
+        assert 2 == data['search']['count']
+        assert 1 == data['gzip']['count']
+        assert data['total']['ms'] >= data['search']['ms']
+
+    def test_server_timing_header(self):
+        timer = RequestTimer.start()
+        timer.record(RequestTimer.SEARCH, 0.25)
+        timer.record(RequestTimer.SEARCH, 0.5)
+        timer.record(RequestTimer.DATABASE, 0.0123)
+        header = timer.server_timing_header()
+        db, search, total = header.split(", ")
+        assert 'db;dur=12.3;desc="SQL statements (1)"' == db
+        assert 'search;dur=750.0;desc="Elasticsearch requests (2)"' == search
+        assert re.compile("total;dur=[0-9.]+$").match(total)
+
+
+class TestSQLTiming(DatabaseTest):
+
+    def teardown_method(self):
+        RequestTimer.stop()
+        super(TestSQLTiming, self).teardown_method()
+
+    def test_sql_statements_are_timed(self):
+        # Statements run while no request is being timed aren't counted.
+        self._db.execute("select 1")
+
+        timer = RequestTimer.start()
+        self._db.execute("select 1")
+        self._db.execute("select 2")
+        assert 2 == timer.counts[RequestTimer.DATABASE]
+        assert timer.durations[RequestTimer.DATABASE] > 0
@@ -1,6 +1,7 @@
 """Utilities for Flask applications."""
 import datetime
 import flask
+import types
 from lxml import etree
 
 from flask import Response as FlaskResponse
@@ -33,6 +34,7 @@ class Response(FlaskResponse):
        * It's easy to calculate header values such as Cache-Control.
        * A response can be easily converted into a string for use in
          tests.
+       * A generator can be used as the body, and will be streamed.
     """
 
     def __init__(self, response=None, status=None, headers=None, mimetype=None,
@@ -68,6 +70,12 @@ class Response(FlaskResponse):
         body = response
         if isinstance(body, etree._Element):
             body = etree.tostring(body)
+        elif isinstance(body, types.GeneratorType):
+            # The body will be sent a piece at a time. Keep the
+            # request context (and its database session) around
+            # until the whole thing has been sent.
+            if flask.has_request_context():
+                body = flask.stream_with_context(body)
         elif not isinstance(body, (bytes, unicode)):
             body = unicode(body)
 
@@ -1,4 +1,6 @@
 import logging
+import time
+from threading import Lock
 
 import requests
 import urlparse
@@ -400,3 +402,59 @@ class HTTP(object):
                 response.content,
             )
         )
+
+
+class TokenBucket(object):
+    """Limit how often requests are made to a third-party service,
+    while allowing short bursts.
+
+    The bucket holds up to `capacity` tokens and is refilled at a
+    steady `rate` tokens per second. Every request takes a token; if
+    there are none left, the request waits until one is available.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """Constructor.
+
+        :param rate: Refill the bucket with this many tokens per second.
+        :param capacity: The bucket holds at most this many tokens, so
+            this is the biggest burst of requests that can be made at
+            once. Defaults to `rate`.
+        """
+        if rate <= 0:
+            raise ValueError("A TokenBucket needs a positive rate.")
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.last_refill = self.now()
+        self.lock = Lock()
+
+    def take(self, tokens=1):
+        """Take tokens from the bucket, waiting for them if necessary.
+
+        A caller that has to wait takes its tokens right away, leaving
+        the bucket in debt, so that callers in other threads are
+        served in the order they arrived.
+
+        :return: The number of seconds spent waiting.
+        """
+        with self.lock:
+            now = self.now()
+            self.tokens = min(
+                self.capacity,
+                self.tokens + (now - self.last_refill) * self.rate
+            )
+            self.last_refill = now
+            self.tokens -= tokens
+            wait = max(0, -self.tokens / self.rate)
+        if wait:
+            self.sleep(wait)
+        return wait
+
+    def now(self):
+        """This method is overridden in tests."""
+        return time.time()
+
+    def sleep(self, seconds):
+        """This method is overridden in tests."""
+        time.sleep(seconds)
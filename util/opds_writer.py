@@ -1,10 +1,16 @@
 
 import datetime
 import logging
+import re
 from flask import Response
 
 from lxml import builder, etree
 
+from request_timing import (
+    RequestTimer,
+    timed,
+)
+
 
 class ElementMaker(builder.ElementMaker):
     """A helper object for creating etree elements."""
@@ -56,6 +62,11 @@ class AtomFeed(object):
         'lcp': LCP_NS
     }
 
+    # A processing instruction with this target marks the spot where
+    # an already-serialized tag will be spliced into the feed.
+    SPLICE_TARGET = 'splice'
+    SPLICE_PLACEHOLDER = re.compile(r'<\?%s (\d+)\?>' % SPLICE_TARGET)
+
     default_typemap = {datetime: lambda e, v: _strftime(v)}
     E = ElementMaker(typemap=default_typemap, nsmap=nsmap)
     SIMPLIFIED = ElementMaker(typemap=default_typemap, nsmap=nsmap, namespace=SIMPLIFIED_NS)
@@ -162,15 +173,70 @@ class AtomFeed(object):
             self.E.updated(self._strftime(datetime.datetime.utcnow())),
             self.E.link(href=url, rel="self"),
         )
+
+        # Tags added with append_serialized().
+        self.spliced = []
         super(AtomFeed, self).__init__(**kwargs)
 
+    def append_serialized(self, tag):
+        """Add a tag to the end of the feed without parsing it.
+
+        Until the feed is converted to a string, the tag is
+        represented in self.feed by a placeholder.
+
+        :param tag: A unicode string containing a single serialized
+            XML tag, which must declare any namespace prefixes it uses.
+        """
+        placeholder = etree.ProcessingInstruction(
+            self.SPLICE_TARGET, str(len(self.spliced))
+        )
+        self.feed.append(placeholder)
+        self.spliced.append(tag)
+
+    def iter_serialized(self, more_tags=()):
+        """Serialize this feed a piece at a time.
+
+        The tags already in the feed come first, followed by
+        `more_tags`. Each of those is serialized as soon as it's
+        available and can then be thrown away, so if `more_tags` is a
+        generator, neither the tags nor the document ever need to be
+        held in memory all at once.
+
+        :param more_tags: An iterable of lxml Elements, or unicode
+            strings containing already-serialized tags.
+        :yield: Unicode strings that together make up the document.
+        """
+        head = unicode(self)
+        end = head.rindex(u'</')
+        yield head[:end]
+
+        # Serialized inside an element with the same nsmap as the
+        # feed, a tag doesn't need to declare its namespaces again.
+        carrier = etree.Element(self.feed.tag, nsmap=self.feed.nsmap)
+        start_length = len(etree.tounicode(carrier)) - len(u'/>') + len(u'>')
+        for tag in more_tags:
+            if not isinstance(tag, basestring):
+                with timed(RequestTimer.SERIALIZATION):
+                    carrier.append(tag)
+                    serialized = etree.tounicode(carrier)
+                    carrier.remove(tag)
+                tag = serialized[start_length:serialized.rindex(u'</')]
+            yield tag + u"\n"
+        yield head[end:]
 
     # TODO PYTHON3 rename to __str__
     def __unicode__(self):
         if self.feed is None:
             return None
 
-        return etree.tounicode(self.feed, pretty_print=True)
+        with timed(RequestTimer.SERIALIZATION):
+            document = etree.tounicode(self.feed, pretty_print=True)
+            if self.spliced:
+                document = self.SPLICE_PLACEHOLDER.sub(
+                    lambda match: self.spliced[int(match.group(1))],
+                    document
+                )
+            return document
 
 
 class OPDSFeed(AtomFeed):
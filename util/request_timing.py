@@ -0,0 +1,136 @@
+"""Find out where the time goes while a request is being handled."""
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class RequestTimer(object):
+    """Count and time the expensive operations performed while
+    handling a single request.
+
+    The timer for the request currently being handled by this thread
+    is available as RequestTimer.current(). When there is no current
+    timer, timing an operation costs next to nothing.
+
+    Operations may be nested -- the database queries run while
+    generating OPDS entries are counted as both -- so the times for
+    different categories may add up to more than the total time.
+    """
+
+    # The categories of operation we keep track of.
+    DATABASE = "db"
+    SEARCH = "search"
+    OPDS_ENTRIES = "opds"
+    SERIALIZATION = "xml"
+    GZIP = "gzip"
+    TOTAL = "total"
+
+    DESCRIPTIONS = {
+        DATABASE: "SQL statements",
+        SEARCH: "Elasticsearch requests",
+        OPDS_ENTRIES: "OPDS entries",
+        SERIALIZATION: "Feed serialization",
+        GZIP: "Compression",
+    }
+
+    _local = threading.local()
+
+    def __init__(self):
+        self.started = time.time()
+        self.counts = {}
+        self.durations = {}
+
+    @classmethod
+    def current(cls):
+        """The RequestTimer for the request this thread is handling, if any."""
+        return getattr(cls._local, 'timer', None)
+
+    @classmethod
+    def start(cls):
+        """Start timing a new request in this thread."""
+        timer = cls()
+        cls._local.timer = timer
+        return timer
+
+    @classmethod
+    def stop(cls):
+        """Stop timing the current request.
+
+        :return: The RequestTimer that was stopped, if there was one.
+        """
+        timer = cls.current()
+        cls._local.timer = None
+        return timer
+
+    @property
+    def elapsed(self):
+        """Seconds since this timer was started."""
+        return time.time() - self.started
+
+    def record(self, category, duration):
+        """Record that an operation took `duration` seconds."""
+        self.counts[category] = self.counts.get(category, 0) + 1
+        self.durations[category] = self.durations.get(category, 0) + duration
+
+    def as_dict(self):
+        """Summarize the timings, with durations in milliseconds."""
+        data = dict(
+            (category, dict(
+                count=self.counts[category],
+                ms=round(self.durations[category] * 1000, 3),
+            ))
+            for category in self.counts
+        )
+        data[self.TOTAL] = dict(ms=round(self.elapsed * 1000, 3))
+        return data
+
+    def server_timing_header(self):
+        """Summarize the timings as the value of a Server-Timing header.
+
+        See https://www.w3.org/TR/server-timing/
+        """
+        metrics = []
+        for category in sorted(self.counts):
+            description = self.DESCRIPTIONS.get(category, category)
+            metrics.append('%s;dur=%.1f;desc="%s (%d)"' % (
+                category, self.durations[category] * 1000, description,
+                self.counts[category]
+            ))
+        metrics.append('%s;dur=%.1f' % (self.TOTAL, self.elapsed * 1000))
+        return ", ".join(metrics)
+
+
+@contextmanager
+def timed(category):
+    """Time the code inside this context manager as an operation of the
+    given category, if a request is being timed.
+    """
+    timer = RequestTimer.current()
+    if timer is None:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        timer.record(category, time.time() - start)
+
+
+# Time every SQL statement run by any Engine.
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    if RequestTimer.current() is not None:
+        conn.info.setdefault('request_timing', []).append(time.time())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    timer = RequestTimer.current()
+    started = conn.info.get('request_timing')
+    if timer is not None and started:
+        timer.record(RequestTimer.DATABASE, time.time() - started.pop())